@@ -0,0 +1,69 @@
+"""Precompute the ground truth of a B2D_E2E_Dataset split into a GT cache.
+
+The cache holds the outputs of get_data_info for every sample: the maps, the
+camera matrices, the annotations, the trajectories and the occupancy infos.
+The dataset reads them from the cache when it is given with ``gt_cache_file``
+and was built with the same config, so the dataloader workers only load and
+augment the images, e.g.
+
+    python adzoo/uniad/analysis_tools/build_gt_cache.py \
+        adzoo/uniad/configs/stage2_e2e/base_e2e_b2d.py --split train \
+        --out data/infos/b2d_gt_cache_train.bin --nproc 16
+
+and in the config, ``data.train.gt_cache_file='data/infos/b2d_gt_cache_train.bin'``.
+A cache built with another annotation file, map file or dataset config is
+ignored with a warning.
+
+With --benchmark, the time of get_data_info with and without the cache is
+compared on the first samples.
+"""
+import argparse
+import os
+import time
+
+from mmcv import Config
+from mmcv.datasets import build_dataset
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Precompute the ground truth of a B2D dataset split')
+    parser.add_argument('config', help='config file path')
+    parser.add_argument('--split', default='train', choices=['train', 'val', 'test'], help='dataset split')
+    parser.add_argument('--out', required=True, help='path of the GT cache')
+    parser.add_argument('--nproc', type=int, default=1, help='number of processes computing the samples')
+    parser.add_argument('--benchmark', type=int, default=0, metavar='N',
+                        help='time get_data_info on the first N samples with and without the cache')
+    return parser.parse_args()
+
+
+def benchmark(dataset, cache_file, num_samples):
+    num_samples = min(num_samples, len(dataset))
+    start = time.perf_counter()
+    for index in range(num_samples):
+        dataset.get_data_info(index)
+    computed = (time.perf_counter() - start) / num_samples
+
+    dataset.load_gt_cache(cache_file)
+    assert dataset.gt_cache is not None
+    start = time.perf_counter()
+    for index in range(num_samples):
+        dataset.get_data_info(index)
+    cached = (time.perf_counter() - start) / num_samples
+    print(f'get_data_info: {computed * 1000:.2f} ms computed, {cached * 1000:.2f} ms cached')
+
+
+def main():
+    args = parse_args()
+    cfg = Config.fromfile(args.config)
+    dataset_cfg = cfg.data[args.split]
+    dataset_cfg.pop('gt_cache_file', None)
+    dataset = build_dataset(dataset_cfg)
+
+    dataset.build_gt_cache(args.out, nproc=args.nproc)
+    print(f'saved {args.out} ({os.path.getsize(args.out) / 2 ** 20:.0f} MB, {len(dataset)} samples)')
+    if args.benchmark:
+        benchmark(dataset, args.out, args.benchmark)
+
+
+if __name__ == '__main__':
+    main()
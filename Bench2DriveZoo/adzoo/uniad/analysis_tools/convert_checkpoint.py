@@ -0,0 +1,87 @@
+"""Convert a checkpoint into a memory-mapped checkpoint.
+
+load_checkpoint maps the '.safetensors' files it is given instead of unpickling
+them, e.g. for the agents:
+
+    python adzoo/uniad/analysis_tools/convert_checkpoint.py ckpts/uniad_base_b2d.pth \
+        ckpts/uniad_base_b2d.safetensors --benchmark
+
+With --benchmark, loading both checkpoints into preallocated weights (as
+load_state_dict does) is timed in fresh interpreters, and the anonymous memory
+of the process after loading is reported. The mapped file is in the page cache,
+which is shared between the processes and can be reclaimed.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+from mmcv.utils import convert_to_mmap_checkpoint, is_mmap_checkpoint
+
+sys.path.append('.')
+from adzoo.uniad.analysis_tools.fresh_interpreter import run_child
+
+_CHILD = '''
+import json, resource, sys, time
+import torch
+from mmcv.utils import load_mmap_checkpoint
+
+path, mmap_path = sys.argv[1], sys.argv[2]
+# the destination weights, like the parameters of a model
+weights = {k: torch.zeros_like(v) for k, v in load_mmap_checkpoint(mmap_path)['state_dict'].items()}
+
+start = time.perf_counter()
+if path.endswith('.safetensors'):
+    state_dict = load_mmap_checkpoint(path)['state_dict']
+else:
+    checkpoint = torch.load(path, map_location='cpu')
+    state_dict = checkpoint.get('state_dict', checkpoint)
+for key, weight in weights.items():
+    weight.copy_(state_dict[key])
+duration = time.perf_counter() - start
+
+with open('/proc/self/status') as f:
+    status = dict(line.split(':', 1) for line in f)
+print(json.dumps({
+    'time': duration,
+    'rss_anon_mb': int(status['RssAnon'].split()[0]) / 1024,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+'''
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Convert a checkpoint into a memory-mapped checkpoint')
+    parser.add_argument('src', help='checkpoint to convert')
+    parser.add_argument('dst', help='memory-mapped checkpoint, ending with .safetensors')
+    parser.add_argument('--benchmark', action='store_true', help='compare the loading times with torch.load')
+    parser.add_argument('--runs', type=int, default=3, help='number of benchmark runs per format')
+    return parser.parse_args()
+
+
+def benchmark(src, dst, num_runs):
+    runs = {src: [], dst: []}
+    for _ in range(num_runs):
+        for path in runs:
+            runs[path].append(run_child(_CHILD, [path, dst])[0])
+
+    print(f'{"checkpoint":<40}{"load (s)":>10}{"anon (MB)":>12}{"max rss (MB)":>14}')
+    for path, results in runs.items():
+        print(f'{os.path.basename(path):<40}'
+              f'{np.median([r["time"] for r in results]):>10.3f}'
+              f'{np.median([r["rss_anon_mb"] for r in results]):>12.0f}'
+              f'{np.median([r["max_rss_mb"] for r in results]):>14.0f}')
+
+
+def main():
+    args = parse_args()
+    if not is_mmap_checkpoint(args.dst):
+        raise ValueError(f'{args.dst} must end with .safetensors to be loaded as a memory-mapped checkpoint')
+    convert_to_mmap_checkpoint(args.src, args.dst)
+    print(f'saved {args.dst} ({os.path.getsize(args.dst) / 2 ** 20:.0f} MB)')
+    if args.benchmark:
+        benchmark(args.src, args.dst, args.runs)
+
+
+if __name__ == '__main__':
+    main()
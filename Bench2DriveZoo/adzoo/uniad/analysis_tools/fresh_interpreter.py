@@ -0,0 +1,19 @@
+"""Run benchmark code in a fresh interpreter, to time it without the modules and caches of the caller."""
+import json
+import os
+import subprocess
+import sys
+
+
+def run_child(code, args, extra_flags=()):
+    """Run the code with the arguments in a new interpreter started from the repository root.
+
+    The last line printed by the code must be a JSON object. Returns it, with the stderr of the run.
+    """
+    command = [sys.executable, *extra_flags, '-c', code, *args]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, ['.', os.environ.get('PYTHONPATH')])))
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True, env=env)
+    if result.returncode != 0:
+        raise RuntimeError('The benchmark run failed:\n' + result.stderr)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
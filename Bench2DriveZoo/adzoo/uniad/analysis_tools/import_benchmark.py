@@ -0,0 +1,88 @@
+"""Cold start benchmark of the UniAD agent setup.
+
+Each run starts a fresh interpreter that does what UniadAgent.setup does before
+loading the checkpoint: import mmcv, load the config, build the model and the
+inference pipeline. The time of each phase and the number of imported mmcv
+modules are reported, e.g.
+
+    python adzoo/uniad/analysis_tools/import_benchmark.py \
+        adzoo/uniad/configs/stage2_e2e/base_e2e_b2d.py --runs 5
+
+Use --importtime to save the ``python -X importtime`` report of the last run.
+"""
+import argparse
+import sys
+
+import numpy as np
+
+sys.path.append('.')
+from adzoo.uniad.analysis_tools.fresh_interpreter import run_child
+
+_CHILD = '''
+import importlib, json, sys, time
+start = time.perf_counter()
+from mmcv import Config
+from mmcv.models import build_model
+from mmcv.utils import load_checkpoint
+from mmcv.datasets.pipelines import Compose
+from mmcv.core.bbox import get_box_type
+imported = time.perf_counter()
+
+cfg = Config.fromfile(sys.argv[1])
+if cfg.get('plugin', False) and cfg.get('plugin_dir', None):
+    importlib.import_module(cfg.plugin_dir.rstrip('/').replace('/', '.'))
+config = time.perf_counter()
+
+model = build_model(cfg.model, train_cfg=cfg.get('train_cfg'), test_cfg=cfg.get('test_cfg'))
+model_built = time.perf_counter()
+
+pipeline = Compose([p for p in cfg.inference_only_pipeline
+                    if p['type'] not in ['LoadMultiViewImageFromFilesInCeph']])
+pipeline_built = time.perf_counter()
+
+print(json.dumps({
+    'import': imported - start,
+    'config': config - imported,
+    'build_model': model_built - config,
+    'build_pipeline': pipeline_built - model_built,
+    'total': pipeline_built - start,
+    'mmcv_modules': len([m for m in sys.modules if m == 'mmcv' or m.startswith('mmcv.')]),
+}))
+'''
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the cold start of the UniAD agent setup')
+    parser.add_argument('config', help='config file path')
+    parser.add_argument('--runs', type=int, default=5, help='number of fresh interpreters to time')
+    parser.add_argument('--importtime', default=None,
+                        help='file to save the -X importtime report of the last run to')
+    return parser.parse_args()
+
+
+def run_once(config, importtime=None):
+    extra_flags = ['-X', 'importtime'] if importtime is not None else []
+    result, stderr = run_child(_CHILD, [config], extra_flags)
+    if importtime is not None:
+        with open(importtime, 'w') as f:
+            f.write(stderr)
+    return result
+
+
+def main():
+    args = parse_args()
+    runs = []
+    for i in range(args.runs):
+        importtime = args.importtime if i == args.runs - 1 else None
+        runs.append(run_once(args.config, importtime))
+        print(f'run {i + 1}/{args.runs}: {runs[-1]["total"]:.2f} s')
+
+    print(f'{"phase":<16}{"median (s)":>12}{"min (s)":>10}')
+    for phase in ['import', 'config', 'build_model', 'build_pipeline', 'total']:
+        times = np.array([run[phase] for run in runs])
+        print(f'{phase:<16}{np.median(times):>12.3f}{times.min():>10.3f}')
+    print(f'imported mmcv modules: {runs[-1]["mmcv_modules"]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -43,6 +43,15 @@ def parse_args():
         '--tmpdir',
         help='tmp directory used for collecting results from multiple '
         'workers, available when gpu-collect is not specified')
+    parser.add_argument(
+        '--streaming-eval',
+        action='store_true',
+        help='evaluate the detections online instead of collecting the '
+        'results of all the samples, to bound the host memory')
+    parser.add_argument(
+        '--spill-dir',
+        help='with --streaming-eval, directory where each worker writes the '
+        'results of its samples to a shard')
     parser.add_argument('--seed', type=int, default=0, help='random seed')
     parser.add_argument(
         '--deterministic',
@@ -121,7 +130,8 @@ def main():
                                         device_ids=[torch.cuda.current_device()],
                                         broadcast_buffers=False,
                                         )
-        outputs = custom_multi_gpu_test(model, data_loader, args.tmpdir, args.gpu_collect)
+        outputs = custom_multi_gpu_test(model, data_loader, args.tmpdir, args.gpu_collect,
+                                        streaming=args.streaming_eval, spill_dir=args.spill_dir)
 
 
 
@@ -38,21 +38,72 @@ def custom_encode_mask_results(mask_results):
                         dtype='uint8'))[0])  # encoded with RLE
     return [encoded_mask_results]
 
-def custom_multi_gpu_test(model, data_loader, tmpdir=None, gpu_collect=False):
+class ResultSpillWriter(object):
+    """Appends the results of the samples of a rank to its own shard file,
+    one pickle record (sample index, result) per sample, so that they don't
+    have to be kept in memory. Read them back with iter_spilled_results.
+    """
+
+    def __init__(self, spill_dir, rank):
+        mkdir_or_exist(spill_dir)
+        self.path = osp.join(spill_dir, f'results_{rank:03d}.pkl')
+        self.file = open(self.path, 'wb')
+
+    def write(self, index, result):
+        pickle.dump((index, result), self.file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def close(self):
+        self.file.close()
+
+
+def iter_spilled_results(spill_dir):
+    """Yields the (sample index, result) records of all the shards of a
+    streaming evaluation, shard by shard."""
+    for filename in sorted(os.listdir(spill_dir)):
+        if not (filename.startswith('results_') and filename.endswith('.pkl')):
+            continue
+        with open(osp.join(spill_dir, filename), 'rb') as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    break
+
+
+def load_spilled_results(spill_dir):
+    """Loads the results spilled by a streaming evaluation, ordered by sample
+    index, in the same format as the 'bbox_results' of custom_multi_gpu_test."""
+    return [result for _, result in sorted(iter_spilled_results(spill_dir), key=lambda record: record[0])]
+
+
+def custom_multi_gpu_test(model, data_loader, tmpdir=None, gpu_collect=False, streaming=False, spill_dir=None):
     """Test model with multiple gpus.
     This method tests model with multiple gpus and collects the results
     under two different modes: gpu and cpu modes. By setting 'gpu_collect=True'
     it encodes results to gpu tensors and use gpu communication for results
     collection. On cpu mode it saves the results on different gpus to 'tmpdir'
     and collects them by the rank 0 worker.
+
+    With 'streaming=True', the results are not kept: the detections of each
+    sample are matched to the ground truth as soon as they are predicted, in
+    the detection accumulator of the dataset, and only the compact states of
+    the accumulators are collected at the end. The planning and occupancy
+    metrics are accumulated online in both modes.
     Args:
         model (nn.Module): Model to be tested.
         data_loader (nn.Dataloader): Pytorch data loader.
         tmpdir (str): Path of directory to save the temporary results from
             different gpus under cpu mode.
         gpu_collect (bool): Option to use either gpu or cpu to collect results.
+        streaming (bool): Whether to evaluate the detections online instead of
+            collecting the results of all the samples.
+        spill_dir (str, optional): In streaming mode, directory where the
+            results of each rank are written to a shard, see
+            load_spilled_results.
     Returns:
-        list: The prediction results.
+        dict: The prediction results ('bbox_results'), or the merged
+            'detection_accumulator' in streaming mode, and the computed
+            planning and occupancy metrics.
     """
     model.eval()
 
@@ -86,6 +137,14 @@ def custom_multi_gpu_test(model, data_loader, tmpdir=None, gpu_collect=False):
     time.sleep(2)  # This line can prevent deadlock problem in some cases.
     have_mask = False
     num_occ = 0
+    if streaming:
+        assert hasattr(dataset, 'create_detection_accumulator'), \
+            f'{type(dataset).__name__} does not support the streaming evaluation'
+        detection_accumulator = dataset.create_detection_accumulator()
+        sample_indices = list(data_loader.sampler) if data_loader.sampler is not None else list(range(len(dataset)))
+        num_samples = len(sample_indices)
+        position = 0
+        spill_writer = ResultSpillWriter(spill_dir, rank) if spill_dir is not None else None
     for i, data in enumerate(data_loader):
         with torch.no_grad():
             result = model(data, return_loss=False, rescale=True)
@@ -130,8 +189,20 @@ def custom_multi_gpu_test(model, data_loader, tmpdir=None, gpu_collect=False):
                     if k in result[0]['pts_bbox'] and isinstance(result[0]['pts_bbox'][k], torch.Tensor):
                         result[0]['pts_bbox'][k] = result[0]['pts_bbox'][k].detach().cpu()
 
+            if streaming:
+                sample_results = result['bbox_results'] if isinstance(result, dict) else result
+                batch_size = len(sample_results)
+                for sample_result in sample_results:
+                    # the samples padded by the sampler are skipped, as when collecting the results
+                    if rank * num_samples + position < len(dataset):
+                        index = sample_indices[position]
+                        dataset.accumulate_sample(detection_accumulator, sample_result, index)
+                        if spill_writer is not None:
+                            spill_writer.write(index, sample_result)
+                    position += 1
+
             # # encode mask results
-            if isinstance(result, dict):
+            elif isinstance(result, dict):
                 if 'bbox_results' in result.keys():
                     bbox_result = result['bbox_results']
                     batch_size = len(result['bbox_results'])
@@ -152,7 +223,17 @@ def custom_multi_gpu_test(model, data_loader, tmpdir=None, gpu_collect=False):
         # break
 
     # collect results from all ranks
-    if gpu_collect:
+    if streaming:
+        if spill_writer is not None:
+            spill_writer.close()
+        states = collect_results_cpu([detection_accumulator.state_dict()], world_size, tmpdir)
+        if rank == 0:
+            detection_accumulator = dataset.create_detection_accumulator()
+            for state in states:
+                detection_accumulator.merge(state)
+        bbox_results = None
+        mask_results = None
+    elif gpu_collect:
         bbox_results = collect_results_gpu(bbox_results, len(dataset))
         if have_mask:
             mask_results = collect_results_gpu(mask_results, len(dataset))
@@ -171,7 +252,10 @@ def custom_multi_gpu_test(model, data_loader, tmpdir=None, gpu_collect=False):
         planning_metrics.reset()
 
     ret_results = dict()
-    ret_results['bbox_results'] = bbox_results
+    if streaming:
+        ret_results['detection_accumulator'] = detection_accumulator
+    else:
+        ret_results['bbox_results'] = bbox_results
     if eval_occ:
         occ_results = {}
         for key, grid in EVALUATION_RANGES.items():
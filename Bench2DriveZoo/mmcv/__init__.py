@@ -3,13 +3,30 @@
 __version__ = '0.0.1'
 
 from .fileio import *
-from .image import *
 from .utils import *
-from .core.bbox.coder.nms_free_coder import NMSFreeCoder
-from .core.bbox.match_costs import BBox3DL1Cost, DiceCost 
-from .core.evaluation.eval_hooks import CustomDistEvalHook
-from .models.utils import *
-from .models.opt.adamw import AdamW2
-from .losses import *
-from .structures import Instances, BoxMode, Boxes
-from .layers import cat, Conv2d, batched_nms, get_norm
\ No newline at end of file
+
+# The types registered in mmcv are imported when a registry resolves them from
+# a config, e.g. by build_model or build_dataset
+register_lazy_package(__name__)
+
+# The heavier modules are only imported when one of their names is accessed.
+# Like the star imports they replace, the last modules take precedence.
+_LAZY_ATTRS = {
+    'NMSFreeCoder': '.core.bbox.coder.nms_free_coder',
+    'BBox3DL1Cost': '.core.bbox.match_costs',
+    'DiceCost': '.core.bbox.match_costs',
+    'CustomDistEvalHook': '.core.evaluation.eval_hooks',
+    'AdamW2': '.models.opt.adamw',
+    'Instances': '.structures',
+    'BoxMode': '.structures',
+    'Boxes': '.structures',
+    'cat': '.layers',
+    'Conv2d': '.layers',
+    'batched_nms': '.layers',
+    'get_norm': '.layers',
+}
+_LAZY_STAR_MODULES = ('.losses', '.models.utils', '.image')
+
+
+def __getattr__(name):
+    return lazy_getattr(__name__, name, _LAZY_ATTRS, _LAZY_STAR_MODULES)
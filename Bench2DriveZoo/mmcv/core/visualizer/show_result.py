@@ -1,6 +1,5 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 import numpy as np
-import trimesh
 from os import path as osp
 
 from mmcv.utils import mkdir_or_exist
@@ -43,6 +42,9 @@ def _write_oriented_bbox(scene_bbox, out_filename):
         out_filename(str): Filename.
     """
 
+    # trimesh is slow to import and only needed here
+    import trimesh
+
     def heading2rotmat(heading_angle):
         rotmat = np.zeros((3, 3))
         rotmat[2, 2] = 1
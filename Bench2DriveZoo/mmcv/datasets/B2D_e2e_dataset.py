@@ -6,6 +6,8 @@ import torch
 import random
 import json, pickle
 import tempfile
+import warnings
+from multiprocessing import get_context
 import cv2
 from pyquaternion import Quaternion
 from mmcv.datasets import DATASETS
@@ -13,18 +15,29 @@ from mmcv.utils import save_tensor
 from mmcv.parallel import DataContainer as DC
 from mmcv.core.bbox.structures.lidar_box3d import LiDARInstance3DBoxes
 from mmcv.fileio.io import load, dump
-from mmcv.utils import track_iter_progress, mkdir_or_exist
+from mmcv.utils import track_iter_progress, mkdir_or_exist, ProgressBar
 from mmcv.datasets.pipelines import to_tensor
 from .custom_3d import Custom3DDataset
+from .sample_cache import SampleCache, SampleCacheWriter, encode_sample, file_digest, sample_cache_key
 from .pipelines import Compose
-from .nuscenes_styled_eval_utils import DetectionMetrics, EvalBoxes, DetectionBox,center_distance,accumulate,DetectionMetricDataList,calc_ap, calc_tp, quaternion_yaw
+from .nuscenes_styled_eval_utils import DetectionMetrics, EvalBoxes, DetectionBox,center_distance,accumulate,DetectionMetricDataList,calc_ap, calc_tp, quaternion_yaw, DetectionAccumulator
 from prettytable import PrettyTable
 
 
+# bump when the outputs of get_data_info change, to invalidate the existing GT caches
+GT_CACHE_VERSION = 1
+
+
+_gt_cache_dataset = None
+
+
+def _encode_data_info(index):
+    return encode_sample(_gt_cache_dataset._compute_data_info(index))
+
 
 @DATASETS.register_module()
 class B2D_E2E_Dataset(Custom3DDataset):
-    def __init__(self, queue_length=4, bev_size=(200, 200),overlap_test=False,with_velocity=True,sample_interval=5,name_mapping= None,eval_cfg = None, map_root =None,map_file=None,past_frames=4, future_frames=4,predict_frames=12,planning_frames=6,patch_size = [102.4, 102.4],point_cloud_range = [-51.2, -51.2, -5.0, 51.2, 51.2, 3.0] ,occ_receptive_field=3,occ_n_future=6,occ_filter_invalid_sample=False,occ_filter_by_valid_flag=False,eval_mod=None,*args, **kwargs):
+    def __init__(self, queue_length=4, bev_size=(200, 200),overlap_test=False,with_velocity=True,sample_interval=5,name_mapping= None,eval_cfg = None, map_root =None,map_file=None,past_frames=4, future_frames=4,predict_frames=12,planning_frames=6,patch_size = [102.4, 102.4],point_cloud_range = [-51.2, -51.2, -5.0, 51.2, 51.2, 3.0] ,occ_receptive_field=3,occ_n_future=6,occ_filter_invalid_sample=False,occ_filter_by_valid_flag=False,eval_mod=None,gt_cache_file=None,*args, **kwargs):
         super().__init__(*args, **kwargs)
         self.queue_length = queue_length
         self.bev_size = (200, 200)
@@ -50,6 +63,10 @@ class B2D_E2E_Dataset(Custom3DDataset):
         self.map_element_class = {'Broken':0, 'Solid':1, 'SolidSolid':2,'Center':3,'TrafficLight':4,'StopSign':5}
         with open(self.map_file,'rb') as f: 
             self.map_infos = pickle.load(f)
+        self.gt_cache_file = gt_cache_file
+        self.gt_cache = None
+        if gt_cache_file is not None:
+            self.load_gt_cache(gt_cache_file)
 
     def invert_pose(self, pose):
         inv_pose = np.eye(4)
@@ -149,7 +166,82 @@ class B2D_E2E_Dataset(Custom3DDataset):
 
         return queue
 
+    def gt_cache_key(self):
+        """Key of the config the outputs of get_data_info depend on."""
+        config = dict(
+            version=GT_CACHE_VERSION,
+            ann_file=file_digest(self.ann_file),
+            map_file=file_digest(self.map_file),
+            data_root=self.data_root,
+            classes=list(self.CLASSES),
+            modality=self.modality,
+            box_mode_3d=self.box_mode_3d,
+            name_mapping=self.NameMapping,
+            with_velocity=self.with_velocity,
+            sample_interval=self.sample_interval,
+            past_frames=self.past_frames,
+            future_frames=self.future_frames,
+            predict_frames=self.predict_frames,
+            planning_frames=self.planning_frames,
+            patch_size=self.patch_size,
+            point_cloud_range=self.point_cloud_range.tolist(),
+            occ_receptive_field=self.occ_receptive_field,
+            occ_n_future=self.occ_n_future,
+        )
+        return sample_cache_key(config)
+
+    def load_gt_cache(self, filename):
+        """Reads get_data_info from a GT cache built by build_gt_cache.
+
+        The cache is only used if it was built with the same config, else
+        get_data_info keeps computing the samples.
+        """
+        if not osp.isfile(filename):
+            warnings.warn(f'GT cache {filename} does not exist, computing the samples')
+            return
+        cache = SampleCache(filename)
+        if cache.key != self.gt_cache_key() or len(cache) != len(self.data_infos):
+            warnings.warn(f'GT cache {filename} was built with another dataset config, '
+                          'computing the samples')
+            return
+        self.gt_cache = cache
+
+    def build_gt_cache(self, filename, nproc=1, chunksize=16):
+        """Precomputes get_data_info for all the samples into a GT cache.
+
+        Args:
+            filename (str): Path of the cache.
+            nproc (int): Number of processes computing the samples.
+            chunksize (int): Number of samples sent to a process at once.
+        """
+        global _gt_cache_dataset
+        indices = range(len(self.data_infos))
+        prog_bar = ProgressBar(len(indices))
+        with SampleCacheWriter(filename, self.gt_cache_key(), meta=dict(ann_file=self.ann_file)) as writer:
+            if nproc > 1:
+                # the workers are forked with the dataset
+                _gt_cache_dataset = self
+                try:
+                    with get_context('fork').Pool(nproc) as pool:
+                        for data in pool.imap(_encode_data_info, indices, chunksize):
+                            writer.add_encoded(data)
+                            prog_bar.update()
+                finally:
+                    _gt_cache_dataset = None
+            else:
+                for index in indices:
+                    writer.add(self._compute_data_info(index))
+                    prog_bar.update()
+        print()
+
     def get_data_info(self, index):
+        """Get data info according to the given index, from the GT cache if
+        one is loaded. See _compute_data_info for the keys."""
+        if self.gt_cache is not None:
+            return self.gt_cache[index]
+        return self._compute_data_info(index)
+
+    def _compute_data_info(self, index):
         """Get data info according to the given index.
 
         Args:
@@ -617,7 +709,9 @@ class B2D_E2E_Dataset(Custom3DDataset):
         """Evaluation in nuScenes protocol.
 
         Args:
-            results (list[dict]): Testing results of the dataset.
+            results (dict): Testing results of the dataset, with the
+                'bbox_results' of all the samples, or the
+                'detection_accumulator' of the streaming evaluation.
             metric (str | list[str]): Metrics to be evaluated.
             logger (logging.Logger | str | None): Logger used for printing
                 related information during evaluation. Default: None.
@@ -637,21 +731,29 @@ class B2D_E2E_Dataset(Custom3DDataset):
 
         # NOTE:Curremtly we only support evaluation on detection and planning 
 
-        result_files, tmp_dir = self.format_results(results['bbox_results'], jsonfile_prefix)    
-        result_path = result_files
-        with open(result_path) as f:
-            result_data = json.load(f)
-        pred_boxes = EvalBoxes.deserialize(result_data['results'], DetectionBox)
-        meta = result_data['meta']
-
         gt_boxes = self.load_gt()
 
-        metric_data_list = DetectionMetricDataList()
-        for class_name in self.eval_cfg['class_names']:
-            for dist_th in self.eval_cfg['dist_ths']:
-                md = accumulate(gt_boxes, pred_boxes, class_name, center_distance, dist_th)
-                metric_data_list.set(class_name, dist_th, md)
-                metrics = DetectionMetrics(self.eval_cfg)
+        if 'detection_accumulator' in results:
+            # streaming evaluation: the predictions were matched during the test
+            meta = self.modality
+            npos = {}
+            for gt_box in gt_boxes.all:
+                npos[gt_box.detection_name] = npos.get(gt_box.detection_name, 0) + 1
+            metric_data_list = results['detection_accumulator'].compute(npos)
+        else:
+            result_files, tmp_dir = self.format_results(results['bbox_results'], jsonfile_prefix)    
+            result_path = result_files
+            with open(result_path) as f:
+                result_data = json.load(f)
+            pred_boxes = EvalBoxes.deserialize(result_data['results'], DetectionBox)
+            meta = result_data['meta']
+
+            metric_data_list = DetectionMetricDataList()
+            for class_name in self.eval_cfg['class_names']:
+                for dist_th in self.eval_cfg['dist_ths']:
+                    md = accumulate(gt_boxes, pred_boxes, class_name, center_distance, dist_th)
+                    metric_data_list.set(class_name, dist_th, md)
+        metrics = DetectionMetrics(self.eval_cfg)
 
         for class_name in self.eval_cfg['class_names']:
             # Compute APs.
@@ -729,31 +831,96 @@ class B2D_E2E_Dataset(Custom3DDataset):
     def load_gt(self):
         all_annotations = EvalBoxes()
         for i in range(len(self.data_infos)):
-            sample_boxes = []
             sample_data = self.data_infos[i]
-
-            gt_boxes = sample_data['gt_boxes']
-            
-            for j in range(gt_boxes.shape[0]):
-                class_name = self.NameMapping[sample_data['gt_names'][j]]
-                if not class_name in self.eval_cfg['class_range'].keys():
-                    continue
-                range_x, range_y = self.eval_cfg['class_range'][class_name]
-                if abs(gt_boxes[j,0]) > range_x or abs(gt_boxes[j,1]) > range_y:
-                    continue
-                sample_boxes.append(DetectionBox(
-                                                sample_token=sample_data['folder']+'_'+str(sample_data['frame_idx']),
-                                                translation=gt_boxes[j,0:3],
-                                                size=gt_boxes[j,3:6],
-                                                rotation=list(Quaternion(axis=[0, 0, 1], radians=-gt_boxes[j,6]-np.pi/2)),
-                                                velocity=gt_boxes[j,7:9],
-                                                num_pts=int(sample_data['num_points'][j]),
-                                                detection_name=self.NameMapping[sample_data['gt_names'][j]],
-                                                detection_score=-1.0,  
-                                                attribute_name=self.NameMapping[sample_data['gt_names'][j]]
-                                                ))
-            all_annotations.add_boxes(sample_data['folder']+'_'+str(sample_data['frame_idx']), sample_boxes)
+            all_annotations.add_boxes(sample_data['folder']+'_'+str(sample_data['frame_idx']), self.get_sample_gt_boxes(i))
         return all_annotations
+
+    def get_sample_gt_boxes(self, index):
+        """Get the ground truth boxes of a sample used by the detection evaluation.
+
+        Args:
+            index (int): Index of the sample.
+
+        Returns:
+            list[DetectionBox]: The ground truth boxes in the evaluation ranges.
+        """
+        sample_boxes = []
+        sample_data = self.data_infos[index]
+
+        gt_boxes = sample_data['gt_boxes']
+        
+        for j in range(gt_boxes.shape[0]):
+            class_name = self.NameMapping[sample_data['gt_names'][j]]
+            if not class_name in self.eval_cfg['class_range'].keys():
+                continue
+            range_x, range_y = self.eval_cfg['class_range'][class_name]
+            if abs(gt_boxes[j,0]) > range_x or abs(gt_boxes[j,1]) > range_y:
+                continue
+            sample_boxes.append(DetectionBox(
+                                            sample_token=sample_data['folder']+'_'+str(sample_data['frame_idx']),
+                                            translation=gt_boxes[j,0:3],
+                                            size=gt_boxes[j,3:6],
+                                            rotation=list(Quaternion(axis=[0, 0, 1], radians=-gt_boxes[j,6]-np.pi/2)),
+                                            velocity=gt_boxes[j,7:9],
+                                            num_pts=int(sample_data['num_points'][j]),
+                                            detection_name=self.NameMapping[sample_data['gt_names'][j]],
+                                            detection_score=-1.0,  
+                                            attribute_name=self.NameMapping[sample_data['gt_names'][j]]
+                                            ))
+        return sample_boxes
+
+    def get_sample_pred_annos(self, det, index):
+        """Convert the detection results of a sample to the standard format.
+
+        Args:
+            det (dict): Detection results of the sample, with 'boxes_3d',
+                'scores_3d' and 'labels_3d'.
+            index (int): Index of the sample.
+
+        Returns:
+            list[dict]: The annotations of the predicted boxes.
+        """
+        annos = []
+        mapped_class_names = self.CLASSES
+        box3d = det['boxes_3d']
+        scores = det['scores_3d']
+        labels = det['labels_3d']
+        box_gravity_center = box3d.gravity_center
+        box_dims = box3d.dims
+        box_yaw = box3d.yaw.numpy()
+        box_yaw = -box_yaw - np.pi / 2
+        sample_token = self.data_infos[index]['folder'] + '_' + str(self.data_infos[index]['frame_idx'])
+
+        for i in range(len(box3d)):
+            quat = list(Quaternion(axis=[0, 0, 1], radians=box_yaw[i]))
+            velocity = [box3d.tensor[i, 7].item(),box3d.tensor[i, 8].item()]
+            name = mapped_class_names[labels[i]]
+            nusc_anno = dict(
+                sample_token=sample_token,
+                translation=box_gravity_center[i].tolist(),
+                size=box_dims[i].tolist(),
+                rotation=quat,
+                velocity=velocity,
+                detection_name=name,
+                detection_score=scores[i].item(),
+                attribute_name=name)
+            annos.append(nusc_anno)
+        return annos
+
+    def create_detection_accumulator(self):
+        """Create the accumulator of the streaming detection evaluation."""
+        return DetectionAccumulator(self.eval_cfg['class_names'], self.eval_cfg['dist_ths'])
+
+    def accumulate_sample(self, accumulator, det, index):
+        """Match the detection results of a sample in a streaming evaluation.
+
+        Args:
+            accumulator (DetectionAccumulator): The accumulator to update.
+            det (dict): Detection results of the sample.
+            index (int): Index of the sample.
+        """
+        pred_boxes = [DetectionBox.deserialize(anno) for anno in self.get_sample_pred_annos(det, index)]
+        accumulator.add_sample(index, self.get_sample_gt_boxes(index), pred_boxes)
     
     def _format_bbox(self, results, jsonfile_prefix=None):
         """Convert the results to the standard format.
@@ -770,39 +937,11 @@ class B2D_E2E_Dataset(Custom3DDataset):
 
 
         nusc_annos = {}
-        mapped_class_names = self.CLASSES
 
         print('Start to convert detection format...')
         for sample_id, det in enumerate(track_iter_progress(results)):
-            #pdb.set_trace()
-            annos = []
-            box3d = det['boxes_3d']
-            scores = det['scores_3d']
-            labels = det['labels_3d']
-            box_gravity_center = box3d.gravity_center
-            box_dims = box3d.dims
-            box_yaw = box3d.yaw.numpy()
-            box_yaw = -box_yaw - np.pi / 2
             sample_token = self.data_infos[sample_id]['folder'] + '_' + str(self.data_infos[sample_id]['frame_idx'])
-
-
-
-            for i in range(len(box3d)):
-                #import pdb;pdb.set_trace()
-                quat = list(Quaternion(axis=[0, 0, 1], radians=box_yaw[i]))
-                velocity = [box3d.tensor[i, 7].item(),box3d.tensor[i, 8].item()]
-                name = mapped_class_names[labels[i]]
-                nusc_anno = dict(
-                    sample_token=sample_token,
-                    translation=box_gravity_center[i].tolist(),
-                    size=box_dims[i].tolist(),
-                    rotation=quat,
-                    velocity=velocity,
-                    detection_name=name,
-                    detection_score=scores[i].item(),
-                    attribute_name=name)
-                annos.append(nusc_anno)
-            nusc_annos[sample_token] = annos
+            nusc_annos[sample_token] = self.get_sample_pred_annos(det, sample_id)
         nusc_submissions = {
             'meta': self.modality,
             'results': nusc_annos,
@@ -1,15 +1,25 @@
+from mmcv.utils import lazy_getattr
 from .builder import DATASETS, PIPELINES, build_dataloader, build_dataset
-from .custom_3d import Custom3DDataset
-from .custom import CustomDataset
-from .nuscenes_dataset import NuScenesDataset
-from .nuscenes_e2e_dataset import NuScenesE2EDataset
 from .samplers import DistributedGroupSampler, DistributedSampler, GroupSampler
-from .utils import replace_ImageToTensor
-from .custom_nuscenes_dataset_v2 import CustomNuScenesDatasetV2
-from .custom_nuscenes_dataset import CustomNuScenesDataset
-from .dd3d_nuscenes_dataset import DD3DNuscenesDataset
-from .lyft_dataset import LyftDataset
-from .B2D_dataset import B2D_Dataset
-from .B2D_e2e_dataset import B2D_E2E_Dataset
-from .nuscenes_vad_dataset import VADCustomNuScenesDataset
-from .B2D_vad_dataset import B2D_VAD_Dataset
\ No newline at end of file
+
+# The datasets are imported when build_dataset resolves them from a config, or
+# when their name is accessed
+_LAZY_ATTRS = {
+    'Custom3DDataset': '.custom_3d',
+    'CustomDataset': '.custom',
+    'NuScenesDataset': '.nuscenes_dataset',
+    'NuScenesE2EDataset': '.nuscenes_e2e_dataset',
+    'replace_ImageToTensor': '.utils',
+    'CustomNuScenesDatasetV2': '.custom_nuscenes_dataset_v2',
+    'CustomNuScenesDataset': '.custom_nuscenes_dataset',
+    'DD3DNuscenesDataset': '.dd3d_nuscenes_dataset',
+    'LyftDataset': '.lyft_dataset',
+    'B2D_Dataset': '.B2D_dataset',
+    'B2D_E2E_Dataset': '.B2D_e2e_dataset',
+    'VADCustomNuScenesDataset': '.nuscenes_vad_dataset',
+    'B2D_VAD_Dataset': '.B2D_vad_dataset',
+}
+
+
+def __getattr__(name):
+    return lazy_getattr(__name__, name, _LAZY_ATTRS)
@@ -125,6 +125,9 @@ def build_dataloader(dataset,
                                          rank=rank,
                                          seed=seed)
                                      )
+            # the samplers ordering the indices for the dataloader workers need their number
+            if getattr(sampler, 'num_workers', 0) is None:
+                sampler.num_workers = workers_per_gpu
 
         else:
             sampler = build_sampler(nonshuffler_sampler if nonshuffler_sampler is not None else dict(type='DistributedSampler'),
@@ -9,7 +9,7 @@ import json
 from os import path as osp
 import os
 from functools import partial
-from .tpfp import tpfp_gen, custom_tpfp_gen
+from .tpfp import tpfp_gen, custom_tpfp_gen, custom_tpfp_gen_batch
 from mmcv.fileio.io import dump,load
 
 def average_precision(recalls, precisions, mode='area'):
@@ -229,7 +229,9 @@ def eval_map(gen_results,
              num_pred_pts_per_instance=30,
              nproc=24):
     timer = mmcv.Timer()
-    pool = Pool(nproc)
+    # chamfer is computed in-process for all the images of a class at once,
+    # the other metrics still go image by image in a pool
+    pool = Pool(nproc) if metric != 'chamfer' and nproc > 1 else None
 
     eval_results = []
     
@@ -253,12 +255,15 @@ def eval_map(gen_results,
         # TODO this is a hack
         tpfp_fn = partial(tpfp_fn, threshold=threshold, metric=metric)
         args = []
-        # compute tp and fp for each image with multiple processes
-        tpfp = pool.starmap(
-            tpfp_fn,
-            zip(cls_gen, cls_gt, *args))
-        # import pdb;pdb.set_trace()
-        tp, fp = tuple(zip(*tpfp))
+        if pool is None:
+            tp, fp = custom_tpfp_gen_batch(cls_gen, cls_gt, threshold=threshold, metric=metric)
+        else:
+            # compute tp and fp for each image with multiple processes
+            tpfp = pool.starmap(
+                tpfp_fn,
+                zip(cls_gen, cls_gt, *args))
+            # import pdb;pdb.set_trace()
+            tp, fp = tuple(zip(*tpfp))
 
 
 
@@ -313,7 +318,8 @@ def eval_map(gen_results,
             'ap': ap
         })
         print('cls:{} done in {:2f}s!!'.format(clsname,float(timer.since_last_check())))
-    pool.close()
+    if pool is not None:
+        pool.close()
     aps = []
     for cls_result in eval_results:
         if cls_result['num_gts'] > 0:
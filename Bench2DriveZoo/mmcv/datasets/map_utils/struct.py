@@ -3,6 +3,94 @@ import torch
 from shapely.geometry import LineString
 from mmcv.datasets.pipelines import to_tensor
 
+
+def pad_polylines(polylines):
+    """Stack polylines of different lengths into one array.
+
+    Args:
+        polylines (list[np.ndarray]): polylines of shape [num_pts_i, 2].
+
+    Returns:
+        tuple: padded points [N, max_pts, 2], repeating the last point of
+            each polyline so that padding segments have zero length, and
+            the number of points [N] of each polyline.
+    """
+    num_pts = np.array([len(pts) for pts in polylines], dtype=np.int64)
+    padded = np.zeros((len(polylines), max(num_pts.max(initial=0), 1), 2), dtype=np.float64)
+    for i, pts in enumerate(polylines):
+        padded[i, :len(pts)] = pts[:, :2]
+        padded[i, len(pts):] = pts[-1, :2]
+    return padded, num_pts
+
+
+def polyline_lengths(padded):
+    """Cumulative arc length [N, max_pts] of padded polylines."""
+    seg = np.diff(padded, axis=1)
+    seg_len = np.sqrt(seg[..., 0] * seg[..., 0] + seg[..., 1] * seg[..., 1])
+    return np.concatenate([np.zeros((len(padded), 1)), np.cumsum(seg_len, axis=1)], axis=1)
+
+
+def resample_polylines(padded, distances, cum_lengths=None):
+    """Sample points along padded polylines by arc length.
+
+    Batched equivalent of ``LineString.interpolate`` for every distance:
+    each point lies on the first segment whose end is further than the
+    distance, and distances beyond the polyline length give its last point.
+
+    Args:
+        padded (np.ndarray): padded polylines [N, max_pts, 2].
+        distances (np.ndarray): distances to sample [N, num_samples].
+        cum_lengths (np.ndarray, optional): cumulative arc length
+            [N, max_pts], computed if not given.
+
+    Returns:
+        np.ndarray: sampled points [N, num_samples, 2].
+    """
+    if cum_lengths is None:
+        cum_lengths = polyline_lengths(padded)
+    num_lines, max_pts, _ = padded.shape
+    if max_pts == 1:
+        return np.repeat(padded, distances.shape[1], axis=1)
+
+    # first segment whose end is beyond the distance
+    beyond = cum_lengths[:, None, 1:] > distances[:, :, None]
+    on_line = beyond.any(axis=-1)
+    seg_idx = np.where(on_line, beyond.argmax(axis=-1), max_pts - 2)
+
+    rows = np.arange(num_lines)[:, None]
+    p0 = padded[rows, seg_idx]
+    p1 = padded[rows, seg_idx + 1]
+    seg = p1 - p0
+    seg_len = np.sqrt(seg[..., 0] * seg[..., 0] + seg[..., 1] * seg[..., 1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frac = (distances - cum_lengths[rows, seg_idx]) / seg_len
+    frac = np.where(on_line, frac, 1.)[..., None]
+
+    points = seg * frac + p0
+    points = np.where(frac <= 0., p0, points)
+    points = np.where(frac >= 1., p1, points)
+    return np.where((distances <= 0.)[..., None], padded[:, None, 0], points)
+
+
+def closed_shift_indices(num_pts, flip=False):
+    """Point indices of all the rolls of a closed polyline.
+
+    The polyline has ``num_pts`` points, the last one repeating the first.
+    Row ``r`` is the polyline rolled ``r`` times (optionally reversed
+    first), closed again with its new first point.
+
+    Returns:
+        np.ndarray: indices [num_pts - 1, num_pts].
+    """
+    shift_num = num_pts - 1
+    base = np.arange(shift_num)
+    if flip:
+        base = base[::-1]
+    rolls = (np.arange(shift_num)[None, :] - np.arange(shift_num)[:, None]) % shift_num
+    idx = base[rolls]
+    return np.concatenate([idx, idx[:, :1]], axis=1)
+
+
 class LiDARInstanceLines(object):
     """Line instance in LIDAR coordinates
 
@@ -29,6 +117,49 @@ class LiDARInstanceLines(object):
         self.padding_value = padding_value
 
         self.instance_list = instance_line_list
+        self._padded_points = None
+
+    @property
+    def padded_points(self):
+        """
+        return (np.ndarray([N, max_pts, 2]), np.ndarray([N]), np.ndarray([N, max_pts])):
+            the padded instance points, the number of points of each instance and
+            their cumulative arc length
+        """
+        if self._padded_points is None:
+            padded, num_pts = pad_polylines([np.array(instance.coords) for instance in self.instance_list])
+            self._padded_points = (padded, num_pts, polyline_lengths(padded))
+        return self._padded_points
+
+    def _clamp(self, points):
+        points[..., 0] = np.clip(points[..., 0], -self.max_x, self.max_x)
+        points[..., 1] = np.clip(points[..., 1], -self.max_y, self.max_y)
+        return points
+
+    def _sample_fixed_num(self):
+        padded, _, cum_lengths = self.padded_points
+        distances = np.linspace(0, cum_lengths[:, -1], self.fixed_num, axis=1)
+        return resample_polylines(padded, distances, cum_lengths)
+
+    def _gather_shifts(self, points, poly_idx, num_shifts):
+        """
+        Gathers the shifted versions of fixed_num points [N, fixed_num, 2]: poly_idx for
+        closed instances, the points and their flip (then padding) for the rest.
+        return  np.ndarray([N, num_shifts, fixed_num, 2])
+        """
+        num_lines, fixed_num, _ = points.shape
+        line_idx = np.zeros((num_shifts, fixed_num), dtype=np.int64)
+        line_idx[0] = np.arange(fixed_num)
+        line_idx[1] = np.arange(fixed_num)[::-1]
+        line_valid = np.zeros((num_shifts, fixed_num), dtype=bool)
+        line_valid[:2] = True
+
+        is_poly = np.all(points[:, 0] == points[:, -1], axis=-1)[:, None, None]
+        idx = np.where(is_poly, poly_idx[None], line_idx[None])
+        valid = is_poly | line_valid[None]
+
+        shifts = points[np.arange(num_lines)[:, None, None], idx]
+        return np.where(valid[..., None], shifts, np.asarray(self.padding_value, dtype=points.dtype))
 
     @property
     def start_end_points(self):
@@ -79,18 +210,8 @@ class LiDARInstanceLines(object):
             N means the num of instances
         """
         assert len(self.instance_list) != 0
-        instance_points_list = []
-        for instance in self.instance_list:
-            distances = np.linspace(0, instance.length, self.fixed_num)
-            sampled_points = np.array([list(instance.interpolate(distance).coords) for distance in distances]).reshape(-1, 2)
-            instance_points_list.append(sampled_points)
-        instance_points_array = np.array(instance_points_list)
-        instance_points_tensor = to_tensor(instance_points_array)
-        instance_points_tensor = instance_points_tensor.to(
-                            dtype=torch.float32)
-        instance_points_tensor[:,:,0] = torch.clamp(instance_points_tensor[:,:,0], min=-self.max_x,max=self.max_x)
-        instance_points_tensor[:,:,1] = torch.clamp(instance_points_tensor[:,:,1], min=-self.max_y,max=self.max_y)
-        return instance_points_tensor
+        instance_points_array = self._clamp(self._sample_fixed_num().astype(np.float32))
+        return to_tensor(instance_points_array)
 
     @property
     def fixed_num_sampled_points_ambiguity(self):
@@ -98,20 +219,7 @@ class LiDARInstanceLines(object):
         return torch.Tensor([N,fixed_num,2]), in xmin, ymin, xmax, ymax form
             N means the num of instances
         """
-        assert len(self.instance_list) != 0
-        instance_points_list = []
-        for instance in self.instance_list:
-            distances = np.linspace(0, instance.length, self.fixed_num)
-            sampled_points = np.array([list(instance.interpolate(distance).coords) for distance in distances]).reshape(-1, 2)
-            instance_points_list.append(sampled_points)
-        instance_points_array = np.array(instance_points_list)
-        instance_points_tensor = to_tensor(instance_points_array)
-        instance_points_tensor = instance_points_tensor.to(
-                            dtype=torch.float32)
-        instance_points_tensor[:,:,0] = torch.clamp(instance_points_tensor[:,:,0], min=-self.max_x,max=self.max_x)
-        instance_points_tensor[:,:,1] = torch.clamp(instance_points_tensor[:,:,1], min=-self.max_y,max=self.max_y)
-        instance_points_tensor = instance_points_tensor.unsqueeze(1)
-        return instance_points_tensor
+        return self.fixed_num_sampled_points.unsqueeze(1)
 
     @property
     def fixed_num_sampled_points_torch(self):
@@ -143,85 +251,23 @@ class LiDARInstanceLines(object):
         """
         return  [instances_num, num_shifts, fixed_num, 2]
         """
-        fixed_num_sampled_points = self.fixed_num_sampled_points
-        instances_list = []
-        is_poly = False
-        # is_line = False
-        # import pdb;pdb.set_trace()
-        for fixed_num_pts in fixed_num_sampled_points:
-            # [fixed_num, 2]
-            is_poly = fixed_num_pts[0].equal(fixed_num_pts[-1])
-            fixed_num = fixed_num_pts.shape[0]
-            shift_pts_list = []
-            if is_poly:
-                # import pdb;pdb.set_trace()
-                for shift_right_i in range(fixed_num):
-                    shift_pts_list.append(fixed_num_pts.roll(shift_right_i,0))
-            else:
-                shift_pts_list.append(fixed_num_pts)
-                shift_pts_list.append(fixed_num_pts.flip(0))
-            shift_pts = torch.stack(shift_pts_list,dim=0)
-
-            shift_pts[:,:,0] = torch.clamp(shift_pts[:,:,0], min=-self.max_x,max=self.max_x)
-            shift_pts[:,:,1] = torch.clamp(shift_pts[:,:,1], min=-self.max_y,max=self.max_y)
-
-            if not is_poly:
-                padding = torch.full([fixed_num-shift_pts.shape[0],fixed_num,2], self.padding_value)
-                shift_pts = torch.cat([shift_pts,padding],dim=0)
-                # padding = np.zeros((self.num_samples - len(sampled_points), 2))
-                # sampled_points = np.concatenate([sampled_points, padding], axis=0)
-            instances_list.append(shift_pts)
-        instances_tensor = torch.stack(instances_list, dim=0)
-        instances_tensor = instances_tensor.to(
-                            dtype=torch.float32)
-        return instances_tensor
+        fixed_num_sampled_points = self.fixed_num_sampled_points.numpy()
+        fixed_num = fixed_num_sampled_points.shape[1]
+        # closed instances: all the rolls of the fixed_num points
+        poly_idx = (np.arange(fixed_num)[None, :] - np.arange(fixed_num)[:, None]) % fixed_num
+        instances_array = self._gather_shifts(fixed_num_sampled_points, poly_idx, fixed_num)
+        return to_tensor(np.ascontiguousarray(instances_array, dtype=np.float32))
 
     @property
     def shift_fixed_num_sampled_points_v1(self):
         """
         return  [instances_num, num_shifts, fixed_num, 2]
         """
-        fixed_num_sampled_points = self.fixed_num_sampled_points
-        instances_list = []
-        is_poly = False
-        # is_line = False
-        # import pdb;pdb.set_trace()
-        for fixed_num_pts in fixed_num_sampled_points:
-            # [fixed_num, 2]
-            is_poly = fixed_num_pts[0].equal(fixed_num_pts[-1])
-            pts_num = fixed_num_pts.shape[0]
-            shift_num = pts_num - 1
-            if is_poly:
-                pts_to_shift = fixed_num_pts[:-1,:]
-            shift_pts_list = []
-            if is_poly:
-                for shift_right_i in range(shift_num):
-                    shift_pts_list.append(pts_to_shift.roll(shift_right_i,0))
-            else:
-                shift_pts_list.append(fixed_num_pts)
-                shift_pts_list.append(fixed_num_pts.flip(0))
-            shift_pts = torch.stack(shift_pts_list,dim=0)
-
-            if is_poly:
-                _, _, num_coords = shift_pts.shape
-                tmp_shift_pts = shift_pts.new_zeros((shift_num, pts_num, num_coords))
-                tmp_shift_pts[:,:-1,:] = shift_pts
-                tmp_shift_pts[:,-1,:] = shift_pts[:,0,:]
-                shift_pts = tmp_shift_pts
-
-            shift_pts[:,:,0] = torch.clamp(shift_pts[:,:,0], min=-self.max_x,max=self.max_x)
-            shift_pts[:,:,1] = torch.clamp(shift_pts[:,:,1], min=-self.max_y,max=self.max_y)
-
-            if not is_poly:
-                padding = torch.full([shift_num-shift_pts.shape[0],pts_num,2], self.padding_value)
-                shift_pts = torch.cat([shift_pts,padding],dim=0)
-                # padding = np.zeros((self.num_samples - len(sampled_points), 2))
-                # sampled_points = np.concatenate([sampled_points, padding], axis=0)
-            instances_list.append(shift_pts)
-        instances_tensor = torch.stack(instances_list, dim=0)
-        instances_tensor = instances_tensor.to(
-                            dtype=torch.float32)
-        return instances_tensor
+        fixed_num_sampled_points = self.fixed_num_sampled_points.numpy()
+        pts_num = fixed_num_sampled_points.shape[1]
+        poly_idx = closed_shift_indices(pts_num)
+        instances_array = self._gather_shifts(fixed_num_sampled_points, poly_idx, pts_num - 1)
+        return to_tensor(np.ascontiguousarray(instances_array, dtype=np.float32))
 
     @property
     def shift_fixed_num_sampled_points_v2(self):
@@ -229,57 +275,7 @@ class LiDARInstanceLines(object):
         return  [instances_num, num_shifts, fixed_num, 2]
         """
         assert len(self.instance_list) != 0
-        instances_list = []
-        for instance in self.instance_list:
-            distances = np.linspace(0, instance.length, self.fixed_num)
-            poly_pts = np.array(list(instance.coords))
-            start_pts = poly_pts[0]
-            end_pts = poly_pts[-1]
-            is_poly = np.equal(start_pts, end_pts)
-            is_poly = is_poly.all()
-            shift_pts_list = []
-            pts_num, coords_num = poly_pts.shape
-            shift_num = pts_num - 1
-            final_shift_num = self.fixed_num - 1
-            if is_poly:
-                pts_to_shift = poly_pts[:-1,:]
-                for shift_right_i in range(shift_num):
-                    shift_pts = np.roll(pts_to_shift,shift_right_i,axis=0)
-                    pts_to_concat = shift_pts[0]
-                    pts_to_concat = np.expand_dims(pts_to_concat,axis=0)
-                    shift_pts = np.concatenate((shift_pts,pts_to_concat),axis=0)
-                    shift_instance = LineString(shift_pts)
-                    shift_sampled_points = np.array([list(shift_instance.interpolate(distance).coords) for distance in distances]).reshape(-1, 2)
-                    shift_pts_list.append(shift_sampled_points)
-                # import pdb;pdb.set_trace()
-            else:
-                sampled_points = np.array([list(instance.interpolate(distance).coords) for distance in distances]).reshape(-1, 2)
-                flip_sampled_points = np.flip(sampled_points, axis=0)
-                shift_pts_list.append(sampled_points)
-                shift_pts_list.append(flip_sampled_points)
-            
-            multi_shifts_pts = np.stack(shift_pts_list,axis=0)
-            shifts_num,_,_ = multi_shifts_pts.shape
-
-            if shifts_num > final_shift_num:
-                index = np.random.choice(multi_shifts_pts.shape[0], final_shift_num, replace=False)
-                multi_shifts_pts = multi_shifts_pts[index]
-            
-            multi_shifts_pts_tensor = to_tensor(multi_shifts_pts)
-            multi_shifts_pts_tensor = multi_shifts_pts_tensor.to(
-                            dtype=torch.float32)
-            
-            multi_shifts_pts_tensor[:,:,0] = torch.clamp(multi_shifts_pts_tensor[:,:,0], min=-self.max_x,max=self.max_x)
-            multi_shifts_pts_tensor[:,:,1] = torch.clamp(multi_shifts_pts_tensor[:,:,1], min=-self.max_y,max=self.max_y)
-            # if not is_poly:
-            if multi_shifts_pts_tensor.shape[0] < final_shift_num:
-                padding = torch.full([final_shift_num-multi_shifts_pts_tensor.shape[0],self.fixed_num,2], self.padding_value)
-                multi_shifts_pts_tensor = torch.cat([multi_shifts_pts_tensor,padding],dim=0)
-            instances_list.append(multi_shifts_pts_tensor)
-        instances_tensor = torch.stack(instances_list, dim=0)
-        instances_tensor = instances_tensor.to(
-                            dtype=torch.float32)
-        return instances_tensor
+        return self._resample_shifts(with_flip=False)
 
     @property
     def shift_fixed_num_sampled_points_v3(self):
@@ -287,117 +283,73 @@ class LiDARInstanceLines(object):
         return  [instances_num, num_shifts, fixed_num, 2]
         """
         assert len(self.instance_list) != 0
-        instances_list = []
-        for instance in self.instance_list:
-            distances = np.linspace(0, instance.length, self.fixed_num)
-            poly_pts = np.array(list(instance.coords))
-            start_pts = poly_pts[0]
-            end_pts = poly_pts[-1]
-            is_poly = np.equal(start_pts, end_pts)
-            is_poly = is_poly.all()
-            shift_pts_list = []
-            pts_num, coords_num = poly_pts.shape
-            shift_num = pts_num - 1
-            final_shift_num = self.fixed_num - 1
-            if is_poly:
-                pts_to_shift = poly_pts[:-1,:]
-                for shift_right_i in range(shift_num):
-                    shift_pts = np.roll(pts_to_shift,shift_right_i,axis=0)
-                    pts_to_concat = shift_pts[0]
-                    pts_to_concat = np.expand_dims(pts_to_concat,axis=0)
-                    shift_pts = np.concatenate((shift_pts,pts_to_concat),axis=0)
-                    shift_instance = LineString(shift_pts)
-                    shift_sampled_points = np.array([list(shift_instance.interpolate(distance).coords) for distance in distances]).reshape(-1, 2)
-                    shift_pts_list.append(shift_sampled_points)
-                flip_pts_to_shift = np.flip(pts_to_shift, axis=0)
-                for shift_right_i in range(shift_num):
-                    shift_pts = np.roll(flip_pts_to_shift,shift_right_i,axis=0)
-                    pts_to_concat = shift_pts[0]
-                    pts_to_concat = np.expand_dims(pts_to_concat,axis=0)
-                    shift_pts = np.concatenate((shift_pts,pts_to_concat),axis=0)
-                    shift_instance = LineString(shift_pts)
-                    shift_sampled_points = np.array([list(shift_instance.interpolate(distance).coords) for distance in distances]).reshape(-1, 2)
-                    shift_pts_list.append(shift_sampled_points)
-                # import pdb;pdb.set_trace()
+        return self._resample_shifts(with_flip=True)
+
+    def _resample_shifts(self, with_flip):
+        """
+        Resamples fixed_num points along every shift of the instances (and their flips for
+        closed ones if with_flip) in a single batch, see shift_fixed_num_sampled_points_v2/v3.
+        return  torch.Tensor([instances_num, num_shifts, fixed_num, 2])
+        """
+        padded, num_pts, cum_lengths = self.padded_points
+        final_shift_num = self.fixed_num - 1
+        max_shifts = final_shift_num * 2 if with_flip else final_shift_num
+
+        # gather every polyline to resample, closed instances are rolled from each of their points
+        lines, owners = [], []
+        is_poly = np.zeros(len(num_pts), dtype=bool)
+        for i, pts_num in enumerate(num_pts):
+            poly_pts = padded[i, :pts_num]
+            is_poly[i] = np.equal(poly_pts[0], poly_pts[-1]).all()
+            if is_poly[i]:
+                shift_idx = [closed_shift_indices(pts_num)]
+                if with_flip:
+                    shift_idx.append(closed_shift_indices(pts_num, flip=True))
+                shift_idx = np.concatenate(shift_idx, axis=0)
+                lines.extend(poly_pts[shift_idx])
+                owners.extend([i] * len(shift_idx))
             else:
-                sampled_points = np.array([list(instance.interpolate(distance).coords) for distance in distances]).reshape(-1, 2)
-                flip_sampled_points = np.flip(sampled_points, axis=0)
-                shift_pts_list.append(sampled_points)
-                shift_pts_list.append(flip_sampled_points)
-            
-            multi_shifts_pts = np.stack(shift_pts_list,axis=0)
-            shifts_num,_,_ = multi_shifts_pts.shape
-            # import pdb;pdb.set_trace()
-            if shifts_num > 2*final_shift_num:
+                lines.append(poly_pts)
+                owners.append(i)
+        owners = np.array(owners, dtype=np.int64)
+
+        lines_padded, _ = pad_polylines(lines)
+        # the distances come from the original instance, as in LineString.interpolate
+        distances = np.linspace(0, cum_lengths[owners, -1], self.fixed_num, axis=1)
+        sampled = resample_polylines(lines_padded, distances)
+
+        instances_list = []
+        for i in range(len(num_pts)):
+            multi_shifts_pts = sampled[owners == i]
+            shift_num = num_pts[i] - 1
+            if not is_poly[i]:
+                multi_shifts_pts = np.stack([multi_shifts_pts[0], np.flip(multi_shifts_pts[0], axis=0)], axis=0)
+            elif with_flip and len(multi_shifts_pts) > max_shifts:
                 index = np.random.choice(shift_num, final_shift_num, replace=False)
-                flip0_shifts_pts = multi_shifts_pts[index]
-                flip1_shifts_pts = multi_shifts_pts[index+shift_num]
-                multi_shifts_pts = np.concatenate((flip0_shifts_pts,flip1_shifts_pts),axis=0)
-            
-            multi_shifts_pts_tensor = to_tensor(multi_shifts_pts)
-            multi_shifts_pts_tensor = multi_shifts_pts_tensor.to(
-                            dtype=torch.float32)
-            
-            multi_shifts_pts_tensor[:,:,0] = torch.clamp(multi_shifts_pts_tensor[:,:,0], min=-self.max_x,max=self.max_x)
-            multi_shifts_pts_tensor[:,:,1] = torch.clamp(multi_shifts_pts_tensor[:,:,1], min=-self.max_y,max=self.max_y)
-            # if not is_poly:
-            if multi_shifts_pts_tensor.shape[0] < 2*final_shift_num:
-                padding = torch.full([final_shift_num*2-multi_shifts_pts_tensor.shape[0],self.fixed_num,2], self.padding_value)
-                multi_shifts_pts_tensor = torch.cat([multi_shifts_pts_tensor,padding],dim=0)
-            instances_list.append(multi_shifts_pts_tensor)
-        instances_tensor = torch.stack(instances_list, dim=0)
-        instances_tensor = instances_tensor.to(
-                            dtype=torch.float32)
-        return instances_tensor
+                multi_shifts_pts = np.concatenate(
+                    (multi_shifts_pts[index], multi_shifts_pts[index + shift_num]), axis=0)
+            elif not with_flip and len(multi_shifts_pts) > max_shifts:
+                index = np.random.choice(multi_shifts_pts.shape[0], final_shift_num, replace=False)
+                multi_shifts_pts = multi_shifts_pts[index]
+
+            multi_shifts_pts = self._clamp(multi_shifts_pts.astype(np.float32))
+            if multi_shifts_pts.shape[0] < max_shifts:
+                padding = np.full([max_shifts - multi_shifts_pts.shape[0], self.fixed_num, 2],
+                                  self.padding_value, dtype=np.float32)
+                multi_shifts_pts = np.concatenate([multi_shifts_pts, padding], axis=0)
+            instances_list.append(multi_shifts_pts)
+        return to_tensor(np.stack(instances_list, axis=0))
 
     @property
     def shift_fixed_num_sampled_points_v4(self):
         """
         return  [instances_num, num_shifts, fixed_num, 2]
         """
-        fixed_num_sampled_points = self.fixed_num_sampled_points
-        instances_list = []
-        is_poly = False
-        # is_line = False
-        # import pdb;pdb.set_trace()
-        for fixed_num_pts in fixed_num_sampled_points:
-            # [fixed_num, 2]
-            is_poly = fixed_num_pts[0].equal(fixed_num_pts[-1])
-            pts_num = fixed_num_pts.shape[0]
-            shift_num = pts_num - 1
-            shift_pts_list = []
-            if is_poly:
-                pts_to_shift = fixed_num_pts[:-1,:]
-                for shift_right_i in range(shift_num):
-                    shift_pts_list.append(pts_to_shift.roll(shift_right_i,0))
-                flip_pts_to_shift = pts_to_shift.flip(0)
-                for shift_right_i in range(shift_num):
-                    shift_pts_list.append(flip_pts_to_shift.roll(shift_right_i,0))
-            else:
-                shift_pts_list.append(fixed_num_pts)
-                shift_pts_list.append(fixed_num_pts.flip(0))
-            shift_pts = torch.stack(shift_pts_list,dim=0)
-
-            if is_poly:
-                _, _, num_coords = shift_pts.shape
-                tmp_shift_pts = shift_pts.new_zeros((shift_num*2, pts_num, num_coords))
-                tmp_shift_pts[:,:-1,:] = shift_pts
-                tmp_shift_pts[:,-1,:] = shift_pts[:,0,:]
-                shift_pts = tmp_shift_pts
-
-            shift_pts[:,:,0] = torch.clamp(shift_pts[:,:,0], min=-self.max_x,max=self.max_x)
-            shift_pts[:,:,1] = torch.clamp(shift_pts[:,:,1], min=-self.max_y,max=self.max_y)
-
-            if not is_poly:
-                padding = torch.full([shift_num*2-shift_pts.shape[0],pts_num,2], self.padding_value)
-                shift_pts = torch.cat([shift_pts,padding],dim=0)
-                # padding = np.zeros((self.num_samples - len(sampled_points), 2))
-                # sampled_points = np.concatenate([sampled_points, padding], axis=0)
-            instances_list.append(shift_pts)
-        instances_tensor = torch.stack(instances_list, dim=0)
-        instances_tensor = instances_tensor.to(
-                            dtype=torch.float32)
-        return instances_tensor
+        fixed_num_sampled_points = self.fixed_num_sampled_points.numpy()
+        pts_num = fixed_num_sampled_points.shape[1]
+        poly_idx = np.concatenate([closed_shift_indices(pts_num), closed_shift_indices(pts_num, flip=True)], axis=0)
+        instances_array = self._gather_shifts(fixed_num_sampled_points, poly_idx, (pts_num - 1) * 2)
+        return to_tensor(np.ascontiguousarray(instances_array, dtype=np.float32))
 
     @property
     def shift_fixed_num_sampled_points_torch(self):
@@ -3,6 +3,7 @@ import numpy as np
 
 from mmcv.core.evaluation.bbox_overlaps import bbox_overlaps
 from .tpfp_chamfer import vec_iou, convex_iou, rbbox_iou, polyline_score, custom_polyline_score
+from .tpfp_chamfer import polyline_bounds, bounds_candidates, chamfer_score_pairs
 from shapely.geometry import LineString, Polygon
 # from vecmapnet_ops.ops.iou import convex_iou
 
@@ -337,7 +338,26 @@ def custom_tpfp_gen(gen_lines,
 
     matrix = custom_polyline_score(
             gen_lines[:,:-1].reshape(num_gens,-1,2), 
-            gt_lines.reshape(num_gts,-1,2),linewidth=2.,metric=metric)
+            gt_lines.reshape(num_gts,-1,2),linewidth=2.,metric=metric,
+            threshold=threshold if metric == 'chamfer' else None)
+    return match_gens(matrix, gen_scores, threshold)
+
+
+def match_gens(matrix, gen_scores, threshold):
+    """Greedily match the generated lines of an image to the gts, by score.
+
+    Args:
+        matrix (ndarray): Similarity of each gen to each gt, of shape (m, n).
+        gen_scores (ndarray): Confidence of the gens, of shape (m, ).
+        threshold (float): Similarity threshold to be considered as matched.
+
+    Returns:
+        tuple[np.ndarray]: (tp, fp) whose elements are 0 and 1, of shape (m, ).
+    """
+    num_gens, num_gts = matrix.shape
+    tp = np.zeros((num_gens), dtype=np.float32)
+    fp = np.zeros((num_gens), dtype=np.float32)
+
     # for each det, the max iou with all gts
     matrix_max = matrix.max(axis=1)
     # for each det, which gt overlaps most with it
@@ -361,3 +381,81 @@ def custom_tpfp_gen(gen_lines,
 
     return tp, fp
 
+
+def custom_tpfp_gen_batch(cls_gen,
+                          cls_gt,
+                          threshold=0.5,
+                          metric='chamfer'):
+    """Same as `custom_tpfp_gen` over all the images of a class at once.
+
+    The chamfer scores of every image are computed together, on the pairs
+    of lines whose bounding boxes are close enough to reach the threshold.
+
+    Args:
+        cls_gen (list[ndarray]): Generated lines of each image, of shape
+            (m, npts * 2 + 1), the last column being the score.
+        cls_gt (list[ndarray]): GT lines of each image, of shape (n, npts * 2).
+        threshold (float): Chamfer distance to be considered as matched.
+        metric (str): Only 'chamfer' is batched, others go image by image.
+
+    Returns:
+        tuple[list[np.ndarray]]: tp and fp of each image.
+    """
+    if metric != 'chamfer':
+        tpfp = [custom_tpfp_gen(gen_lines, gt_lines, threshold=threshold, metric=metric)
+                for gen_lines, gt_lines in zip(cls_gen, cls_gt)]
+        return tuple(map(list, zip(*tpfp))) if tpfp else ([], [])
+
+    if threshold > 0:
+        threshold = -threshold
+
+    # gather the candidate pairs of all the images
+    gen_offsets = np.cumsum([0] + [len(gen_lines) for gen_lines in cls_gen])
+    gt_offsets = np.cumsum([0] + [len(gt_lines) for gt_lines in cls_gt])
+    gen_inds, gt_inds = [], []
+    for j, (gen_lines, gt_lines) in enumerate(zip(cls_gen, cls_gt)):
+        if len(gen_lines) == 0 or len(gt_lines) == 0:
+            continue
+        gen_bounds = polyline_bounds(gen_lines[:, :-1].reshape(len(gen_lines), -1, 2))
+        gt_bounds = polyline_bounds(gt_lines.reshape(len(gt_lines), -1, 2))
+        inds = bounds_candidates(gen_bounds, gt_bounds, -threshold)
+        gen_inds.append(inds[0] + gen_offsets[j])
+        gt_inds.append(inds[1] + gt_offsets[j])
+
+    scores = np.zeros(0)
+    if gen_inds:
+        gen_inds, gt_inds = np.concatenate(gen_inds), np.concatenate(gt_inds)
+        all_gens = np.concatenate([gen_lines for gen_lines in cls_gen if len(gen_lines)])
+        all_gts = np.concatenate([gt_lines for gt_lines in cls_gt if len(gt_lines)])
+        scores = chamfer_score_pairs(
+            all_gens[:, :-1].reshape(len(all_gens), -1, 2),
+            all_gts.reshape(len(all_gts), -1, 2),
+            gen_inds, gt_inds, linewidth=2., threshold=threshold)
+        pair_images = np.searchsorted(gen_offsets, gen_inds, side='right') - 1
+        pair_splits = np.searchsorted(pair_images, np.arange(1, len(cls_gen)))
+    else:
+        gen_inds = gt_inds = np.zeros(0, dtype=np.int64)
+        pair_splits = np.zeros(max(len(cls_gen) - 1, 0), dtype=np.int64)
+
+    tp, fp = [], []
+    pair_starts = np.concatenate([[0], pair_splits])
+    pair_ends = np.concatenate([pair_splits, [len(scores)]])
+    for j, (gen_lines, gt_lines) in enumerate(zip(cls_gen, cls_gt)):
+        num_gens, num_gts = len(gen_lines), len(gt_lines)
+        if num_gts == 0:
+            tp.append(np.zeros((num_gens), dtype=np.float32))
+            fp.append(np.ones((num_gens), dtype=np.float32))
+            continue
+        if num_gens == 0:
+            tp.append(np.zeros((0), dtype=np.float32))
+            fp.append(np.zeros((0), dtype=np.float32))
+            continue
+        matrix = np.full((num_gens, num_gts), -100.)
+        pairs = slice(pair_starts[j], pair_ends[j])
+        matrix[gen_inds[pairs] - gen_offsets[j], gt_inds[pairs] - gt_offsets[j]] = scores[pairs]
+        image_tp, image_fp = match_gens(matrix, gen_lines[:, -1], threshold)
+        tp.append(image_tp)
+        fp.append(image_fp)
+
+    return tp, fp
+
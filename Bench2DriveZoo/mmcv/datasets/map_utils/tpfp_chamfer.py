@@ -214,62 +214,176 @@ def polyline_score(pred_lines, gt_lines, linewidth=1., metric='POR'):
     return iou_matrix
 
 
-def custom_polyline_score(pred_lines, gt_lines, linewidth=1., metric='chamfer'):
+# shapely's default mitre limit, bounds how far a buffer can reach past its line
+MITRE_LIMIT = 5.
+
+
+def polyline_bounds(lines):
+    '''
+        lines: num_lines, npts, 2
+        return: num_lines, 4 as (min_x, min_y, max_x, max_y)
+    '''
+    lines = np.asarray(lines, dtype=np.float64)
+    return np.concatenate([lines.min(axis=1), lines.max(axis=1)], axis=-1)
+
+
+def bounds_candidates(pred_bounds, gt_bounds, margin):
+    '''
+        Pairs of pred and gt boxes less than margin apart.
+        return: pred indices, gt indices
+    '''
+    gap_x = np.maximum(pred_bounds[:, None, 0] - gt_bounds[None, :, 2],
+                       gt_bounds[None, :, 0] - pred_bounds[:, None, 2])
+    gap_y = np.maximum(pred_bounds[:, None, 1] - gt_bounds[None, :, 3],
+                       gt_bounds[None, :, 1] - pred_bounds[:, None, 3])
+    return np.nonzero((gap_x <= margin) & (gap_y <= margin))
+
+
+def chamfer_distance_pairs(pred_lines, gt_lines, pred_inds, gt_inds, chunk_size=1024):
+    '''
+        Symmetric chamfer distance of the (pred_lines[pred_inds[k]], gt_lines[gt_inds[k]]) pairs,
+        the same as averaging the row and column minimums of scipy's cdist.
+        pred_lines: num_preds, npts, 2
+        gt_lines: num_gts, npts, 2
+        return: num_pairs
+    '''
+    num_pairs = len(pred_inds)
+    chamfer = np.empty(num_pairs, dtype=np.float64)
+    for start in range(0, num_pairs, chunk_size):
+        end = min(start + chunk_size, num_pairs)
+        pred = pred_lines[pred_inds[start:end]]
+        gt = gt_lines[gt_inds[start:end]]
+        dx = pred[:, :, None, 0] - gt[:, None, :, 0]
+        dy = pred[:, :, None, 1] - gt[:, None, :, 1]
+        dist = np.sqrt(dx * dx + dy * dy)
+        valid_ab = dist.min(-1).mean(-1)
+        valid_ba = dist.min(-2).mean(-1)
+        chamfer[start:end] = (valid_ba + valid_ab) / 2
+    return chamfer
+
+
+def _points_in_segment_rects(points, line, width):
+    '''
+        Whether any point lies in the flat-capped buffer of one of the segments of line.
+    '''
+    seg_start = line[:-1]
+    seg_dir = line[1:] - line[:-1]
+    seg_len2 = (seg_dir ** 2).sum(-1)
+    keep = seg_len2 > 0
+    seg_start, seg_dir, seg_len2 = seg_start[keep], seg_dir[keep], seg_len2[keep]
+
+    rel = points[:, None, :] - seg_start[None]
+    t = (rel * seg_dir[None]).sum(-1) / seg_len2
+    cross = rel[..., 0] * seg_dir[None, :, 1] - rel[..., 1] * seg_dir[None, :, 0]
+    inside = (t >= 0) & (t <= 1) & (cross ** 2 <= width ** 2 * seg_len2)
+    return bool(inside.any())
+
+
+def _lines_crossing(line_a, line_b):
+    '''
+        Whether any segment of line_a properly crosses a segment of line_b.
+    '''
+    a0, a1 = line_a[:-1, None], line_a[1:, None]
+    b0, b1 = line_b[None, :-1], line_b[None, 1:]
+
+    def orient(p, q, r):
+        return (q[..., 0] - p[..., 0]) * (r[..., 1] - p[..., 1]) - \
+            (q[..., 1] - p[..., 1]) * (r[..., 0] - p[..., 0])
+
+    o1, o2 = orient(a0, a1, b0), orient(a0, a1, b1)
+    o3, o4 = orient(b0, b1, a0), orient(b0, b1, a1)
+    return bool(((o1 * o2 < 0) & (o3 * o4 < 0)).any())
+
+
+def buffers_intersect(pred_line, gt_line, linewidth):
+    '''
+        Same as intersecting the flat-capped, mitre-joined shapely buffers of both lines.
+        Close lines are settled with the segment rectangles, which lie inside the
+        buffers, and shapely is only used when that is inconclusive.
+    '''
+    if np.all(pred_line == pred_line[0]) or np.all(gt_line == gt_line[0]):
+        # zero length lines have an empty buffer
+        return False
+    if _points_in_segment_rects(pred_line, gt_line, linewidth) or \
+            _points_in_segment_rects(gt_line, pred_line, linewidth) or \
+            _lines_crossing(pred_line, gt_line):
+        return True
+    pred_buffer = LineString(pred_line).buffer(linewidth,
+        cap_style=CAP_STYLE.flat, join_style=JOIN_STYLE.mitre)
+    gt_buffer = LineString(gt_line).buffer(linewidth,
+        cap_style=CAP_STYLE.flat, join_style=JOIN_STYLE.mitre)
+    return pred_buffer.intersects(gt_buffer)
+
+
+def chamfer_score_pairs(pred_lines, gt_lines, pred_inds, gt_inds, linewidth=1., threshold=None):
+    '''
+        Chamfer scores of the given pairs as in custom_polyline_score: minus the chamfer
+        distance if the buffers of both lines intersect, -100 otherwise.
+        If threshold is given, only pairs scoring at least threshold are checked for
+        intersection, the lower scores can't make a match anyway.
+    '''
+    scores = -chamfer_distance_pairs(pred_lines, gt_lines, pred_inds, gt_inds)
+    if threshold is None:
+        check = np.arange(len(scores))
+    else:
+        check = np.flatnonzero(scores >= threshold)
+    for k in check:
+        if not buffers_intersect(pred_lines[pred_inds[k]], gt_lines[gt_inds[k]], linewidth):
+            scores[k] = -100.
+    return scores
+
+
+def custom_polyline_score(pred_lines, gt_lines, linewidth=1., metric='chamfer', threshold=None):
     '''
         each line with 1 meter width
         pred_lines: num_preds, List [npts, 2]
         gt_lines: num_gts, npts, 2
         gt_mask: num_gts, npts, 2
+        threshold: for chamfer, only the scores above it are guaranteed to be exact,
+            the pairs further apart are left at -100 without computing them
     '''
     if metric == 'iou':
         linewidth = 1.0
-    positive_threshold = 1.
     num_preds = len(pred_lines)
     num_gts = len(gt_lines)
-    line_length = pred_lines.shape[1]
-
-    # gt_lines = gt_lines + np.array((1.,1.))
-
-    pred_lines_shapely = \
-        [LineString(i).buffer(linewidth,
-            cap_style=CAP_STYLE.flat, join_style=JOIN_STYLE.mitre)
-                          for i in pred_lines]
-    gt_lines_shapely =\
-        [LineString(i).buffer(linewidth,
-            cap_style=CAP_STYLE.flat, join_style=JOIN_STYLE.mitre)
-                        for i in gt_lines]
-
-    # construct tree
-    tree = STRtree(pred_lines_shapely)
-    index_by_id = dict((id(pt), i) for i, pt in enumerate(pred_lines_shapely))
-
+    pred_lines = np.asarray(pred_lines, dtype=np.float64)
+    gt_lines = np.asarray(gt_lines, dtype=np.float64)
 
     if metric=='chamfer':
         iou_matrix = np.full((num_preds, num_gts), -100.)
+        # chamfer distance d needs two points at most d apart, and intersecting
+        # buffers can't be further apart than their mitre joins reach
+        if threshold is None:
+            margin = 2 * linewidth * MITRE_LIMIT
+        else:
+            margin = -threshold
+        pred_inds, gt_inds = bounds_candidates(
+            polyline_bounds(pred_lines), polyline_bounds(gt_lines), margin)
+        iou_matrix[pred_inds, gt_inds] = chamfer_score_pairs(
+            pred_lines, gt_lines, pred_inds, gt_inds, linewidth, threshold)
     elif metric=='iou':
         iou_matrix = np.zeros((num_preds, num_gts),dtype=np.float64)
+        pred_lines_shapely = \
+            [LineString(i).buffer(linewidth,
+                cap_style=CAP_STYLE.flat, join_style=JOIN_STYLE.mitre)
+                              for i in pred_lines]
+        gt_lines_shapely =\
+            [LineString(i).buffer(linewidth,
+                cap_style=CAP_STYLE.flat, join_style=JOIN_STYLE.mitre)
+                            for i in gt_lines]
+        pred_bounds = np.array([p.bounds if not p.is_empty else (np.inf,) * 2 + (-np.inf,) * 2
+                                for p in pred_lines_shapely]).reshape(-1, 4)
+        gt_bounds = np.array([g.bounds if not g.is_empty else (np.inf,) * 2 + (-np.inf,) * 2
+                              for g in gt_lines_shapely]).reshape(-1, 4)
+        for pred_id, i in zip(*bounds_candidates(pred_bounds, gt_bounds, 0.)):
+            o, pline = pred_lines_shapely[pred_id], gt_lines_shapely[i]
+            if o.intersects(pline):
+                inter = o.intersection(pline).area
+                union = o.union(pline).area
+                iou_matrix[pred_id, i] = inter / union
     else:
         raise NotImplementedError
 
-    for i, pline in enumerate(gt_lines_shapely):
-
-        for o in tree.query(pline):
-            if o.intersects(pline):
-                pred_id = index_by_id[id(o)]
-
-                if metric=='chamfer':
-                    dist_mat = distance.cdist(
-                        pred_lines[pred_id], gt_lines[i], 'euclidean')
-                    # import pdb;pdb.set_trace()
-                    valid_ab = dist_mat.min(-1).mean()
-                    valid_ba = dist_mat.min(-2).mean()
-
-                    iou_matrix[pred_id, i] = -(valid_ba+valid_ab)/2
-                elif metric=='iou':
-                    inter = o.intersection(pline).area
-                    union = o.union(pline).area
-                    iou_matrix[pred_id, i] = inter / union
-
     return iou_matrix
 
 if __name__ == '__main__':
@@ -677,6 +677,19 @@ def accumulate(gt_boxes,
             fp.append(1)
             conf.append(pred_box.detection_score)
 
+    return _metric_data_from_matches(tp, fp, conf, match_data, npos)
+
+
+def _metric_data_from_matches(tp, fp, conf, match_data, npos) -> DetectionMetricData:
+    """
+    Computes the interpolated metric data from the matches of the predictions, sorted by decreasing confidence.
+    :param tp: 1 for the true positives, 0 otherwise.
+    :param fp: 1 for the false positives, 0 otherwise.
+    :param conf: Confidence of the predictions.
+    :param match_data: Errors and confidence of the true positives.
+    :param npos: Number of ground truth boxes.
+    :return: The metric data.
+    """
     # Check if we have any matches. If not, just return a "no predictions" array.
     if len(match_data['trans_err']) == 0:
         return DetectionMetricData.no_predictions()
@@ -727,6 +740,126 @@ def accumulate(gt_boxes,
                                attr_err=match_data['attr_err'])
 
 
+MATCH_ERRORS = ('trans_err', 'vel_err', 'scale_err', 'orient_err', 'attr_err')
+
+
+class DetectionAccumulator:
+    """
+    Streaming version of accumulate() for several classes and distance thresholds.
+
+    The predictions of each sample are matched to its ground truth boxes as soon as they are available,
+    keeping only the confidence, the match and the errors of each prediction. The matching of a prediction
+    only depends on the predictions of the same sample with a higher confidence, so the accumulators of
+    different workers can be merged, and compute() returns the same metric data as accumulate() on all
+    the samples, with the samples in the order of their index.
+    """
+
+    def __init__(self, class_names, dist_ths, dist_fcn: Callable = center_distance):
+        self.class_names = list(class_names)
+        self.dist_ths = list(dist_ths)
+        self.dist_fcn = dist_fcn
+        self.sample_indices = set()
+        # For each (class_name, dist_th): lists of per sample arrays
+        self._matches = {(class_name, dist_th): defaultdict(list)
+                         for class_name in self.class_names for dist_th in self.dist_ths}
+
+    def __len__(self):
+        return len(self.sample_indices)
+
+    def add_sample(self, sample_index: int, gt_boxes: List[DetectionBox], pred_boxes: List[DetectionBox]):
+        """
+        Matches the predictions of a sample to its ground truth boxes.
+        :param sample_index: Index of the sample, which sets the order of the samples.
+        :param gt_boxes: Ground truth boxes of the sample.
+        :param pred_boxes: Predicted boxes of the sample, in their original order.
+        """
+        assert sample_index not in self.sample_indices, 'Error: sample %d added twice!' % sample_index
+        self.sample_indices.add(sample_index)
+
+        for class_name in self.class_names:
+            class_gts = [(gt_idx, gt_box) for gt_idx, gt_box in enumerate(gt_boxes) if gt_box.detection_name == class_name]
+            class_preds = [(i, box) for i, box in enumerate(pred_boxes) if box.detection_name == class_name]
+            if not class_preds:
+                continue
+            # Same order as the global sort of accumulate(): decreasing confidence, then decreasing index.
+            class_preds = sorted(class_preds, key=lambda pred: (pred[1].detection_score, pred[0]), reverse=True)
+
+            for dist_th in self.dist_ths:
+                taken = set()
+                errors = np.full((len(class_preds), len(MATCH_ERRORS)), np.nan)
+                is_tp = np.zeros(len(class_preds), dtype=bool)
+                for row, (_, pred_box) in enumerate(class_preds):
+                    min_dist = np.inf
+                    match_gt_idx = None
+                    for gt_idx, gt_box in class_gts:
+                        if gt_idx not in taken:
+                            this_distance = self.dist_fcn(gt_box, pred_box)
+                            if this_distance < min_dist:
+                                min_dist = this_distance
+                                match_gt_idx = gt_idx
+
+                    if min_dist < dist_th:
+                        taken.add(match_gt_idx)
+                        gt_box_match = gt_boxes[match_gt_idx]
+                        period = np.pi if class_name == 'barrier' else 2 * np.pi
+                        is_tp[row] = True
+                        errors[row] = (center_distance(gt_box_match, pred_box),
+                                       velocity_l2(gt_box_match, pred_box),
+                                       1 - scale_iou(gt_box_match, pred_box),
+                                       yaw_diff(gt_box_match, pred_box, period=period),
+                                       1 - attr_acc(gt_box_match, pred_box))
+
+                matches = self._matches[(class_name, dist_th)]
+                matches['conf'].append(np.array([box.detection_score for _, box in class_preds]))
+                matches['sample_index'].append(np.full(len(class_preds), sample_index, dtype=np.int64))
+                matches['pred_index'].append(np.array([i for i, _ in class_preds], dtype=np.int64))
+                matches['tp'].append(is_tp)
+                matches['errors'].append(errors)
+
+    def state_dict(self) -> dict:
+        """ Returns the compact state of the accumulator, as numpy arrays, to be merged with merge(). """
+        state = {'class_names': self.class_names, 'dist_ths': self.dist_ths,
+                 'sample_indices': np.array(sorted(self.sample_indices), dtype=np.int64), 'matches': {}}
+        for key, matches in self._matches.items():
+            state['matches'][key] = {name: np.concatenate(arrays) for name, arrays in matches.items()}
+        return state
+
+    def merge(self, state: dict):
+        """ Merges the state_dict() of another accumulator, with other samples. """
+        assert state['class_names'] == self.class_names and state['dist_ths'] == self.dist_ths
+        sample_indices = set(state['sample_indices'].tolist())
+        assert not sample_indices & self.sample_indices, 'Error: the accumulators have samples in common!'
+        self.sample_indices |= sample_indices
+        for key, matches in state['matches'].items():
+            for name, array in matches.items():
+                self._matches[key][name].append(array)
+
+    def compute(self, npos: Dict[str, int]) -> DetectionMetricDataList:
+        """
+        Computes the metric data of all the classes and distance thresholds.
+        :param npos: Number of ground truth boxes of each class, over the whole dataset.
+        :return: The metric data list.
+        """
+        metric_data_list = DetectionMetricDataList()
+        for (class_name, dist_th), matches in self._matches.items():
+            if npos.get(class_name, 0) == 0 or not matches:
+                metric_data_list.set(class_name, dist_th, DetectionMetricData.no_predictions())
+                continue
+
+            arrays = {name: np.concatenate(values) for name, values in matches.items()}
+            order = np.lexsort((arrays['pred_index'], arrays['sample_index'], arrays['conf']))[::-1]
+            conf = arrays['conf'][order]
+            is_tp = arrays['tp'][order]
+            errors = arrays['errors'][order][is_tp]
+
+            match_data = {name: errors[:, i].tolist() for i, name in enumerate(MATCH_ERRORS)}
+            match_data['conf'] = conf[is_tp].tolist()
+            metric_data = _metric_data_from_matches(is_tp.astype(int).tolist(), (~is_tp).astype(int).tolist(),
+                                                    conf.tolist(), match_data, npos[class_name])
+            metric_data_list.set(class_name, dist_th, metric_data)
+        return metric_data_list
+
+
 
 def calc_ap(md: DetectionMetricData, min_recall: float, min_precision: float) -> float:
     """ Calculated average precision. """
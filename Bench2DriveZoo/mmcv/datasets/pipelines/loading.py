@@ -1,5 +1,6 @@
 import os
 import os.path as osp
+from collections import OrderedDict
 import torch
 import mmcv
 import numpy as np
@@ -464,6 +465,53 @@ class FilterAnnotations:
             return results
         
 
+class FrameCache(object):
+    """LRU cache of the decoded multi-view images of the frames.
+
+    The temporal queues of the samples of a clip overlap, so with the
+    DistributedSequenceSampler, the frames loaded by a dataloader worker are
+    mostly the ones of its previous samples. Each worker has its own copy of
+    the pipeline, hence of the cache. The images are kept as decoded, before
+    any conversion or augmentation.
+
+    Args:
+        capacity (int): Number of frames to keep.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._frames = OrderedDict()
+
+    def get(self, key, load):
+        """Returns the images of the frame ``key``, calling ``load`` if they
+        are not cached. The returned array must not be modified in place."""
+        img = self._frames.get(key)
+        if img is None:
+            img = load()
+            self._frames[key] = img
+            if len(self._frames) > self.capacity:
+                self._frames.popitem(last=False)
+        else:
+            self._frames.move_to_end(key)
+        return img
+
+
+def load_multiview_images(results, load, frame_cache=None, to_float32=False):
+    """Loads the images of a sample with ``load``, through the frame cache
+    if there is one. The frames are identified by their clip and index, or
+    by their filenames."""
+    if frame_cache is None:
+        img = load()
+        return img.astype(np.float32) if to_float32 else img
+    if 'folder' in results and 'frame_idx' in results:
+        key = (results['folder'], results['frame_idx'])
+    else:
+        key = tuple(results['img_filename'])
+    img = frame_cache.get(key, load)
+    # the cached images are shared with the next samples
+    return img.astype(np.float32) if to_float32 else img.copy()
+
+
 @PIPELINES.register_module()
 class LoadMultiViewImageFromFiles(object):
     """Load multi channel images from a list of separate channel files.
@@ -474,11 +522,15 @@ class LoadMultiViewImageFromFiles(object):
         to_float32 (bool): Whether to convert the img to float32.
             Defaults to False.
         color_type (str): Color type of the file. Defaults to 'unchanged'.
+        frame_cache_size (int): Number of frames whose decoded images are
+            kept for the next samples, see :class:`FrameCache`.
+            Defaults to 0 (no cache).
     """
 
-    def __init__(self, to_float32=False, color_type='unchanged'):
+    def __init__(self, to_float32=False, color_type='unchanged', frame_cache_size=0):
         self.to_float32 = to_float32
         self.color_type = color_type
+        self.frame_cache = FrameCache(frame_cache_size) if frame_cache_size > 0 else None
 
     def __call__(self, results):
         """Call function to load multi-view image from files.
@@ -500,10 +552,9 @@ class LoadMultiViewImageFromFiles(object):
         """
         filename = results['img_filename']
         # img is of shape (h, w, c, num_views)
-        img = np.stack(
-            [imread(name, self.color_type) for name in filename], axis=-1)
-        if self.to_float32:
-            img = img.astype(np.float32)
+        img = load_multiview_images(
+            results, lambda: np.stack([imread(name, self.color_type) for name in filename], axis=-1),
+            self.frame_cache, self.to_float32)
         results['filename'] = filename
         # unravel to list, see `DefaultFormatBundle` in formating.py
         # which will transpose each image separately and then stack into array
@@ -1135,14 +1186,19 @@ class LoadMultiViewImageFromFilesInCeph(object):
         to_float32 (bool): Whether to convert the img to float32.
             Defaults to False.
         color_type (str): Color type of the file. Defaults to 'unchanged'.
+        frame_cache_size (int): Number of frames whose decoded images are
+            kept for the next samples, see :class:`FrameCache`.
+            Defaults to 0 (no cache).
     """
 
-    def __init__(self, to_float32=False, color_type='unchanged', file_client_args=dict(backend='disk'), img_root=''):
+    def __init__(self, to_float32=False, color_type='unchanged', file_client_args=dict(backend='disk'), img_root='',
+                 frame_cache_size=0):
         self.to_float32 = to_float32
         self.color_type = color_type
         self.file_client_args = file_client_args.copy()
         self.file_client = FileClient(**self.file_client_args)
         self.img_root = img_root
+        self.frame_cache = FrameCache(frame_cache_size) if frame_cache_size > 0 else None
 
     def __call__(self, results):
         """Call function to load multi-view image from files.
@@ -1162,22 +1218,10 @@ class LoadMultiViewImageFromFilesInCeph(object):
                 - scale_factor (float): Scale factor.
                 - img_norm_cfg (dict): Normalization configuration of images.
         """
-        images_multiView = []
         filename = results['img_filename']
-        for img_path in filename:
-            # img_path = os.path.join(self.img_root, img_path)
-            if self.file_client_args['backend'] == 'petrel':
-                img_bytes = self.file_client.get(img_path)
-                img = imfrombytes(img_bytes)
-            elif self.file_client_args['backend'] == 'disk':
-                img = imread(img_path, self.color_type)
-            images_multiView.append(img)
         # img is of shape (h, w, c, num_views)
-        img = np.stack(
-            #[mmcv.imread(name, self.color_type) for name in filename], axis=-1)
-            images_multiView, axis=-1)
-        if self.to_float32:
-            img = img.astype(np.float32)
+        img = load_multiview_images(results, lambda: self._load_images(filename), self.frame_cache,
+                                    self.to_float32)
         results['filename'] = filename
         # unravel to list, see `DefaultFormatBundle` in formating.py
         # which will transpose each image separately and then stack into array
@@ -1194,6 +1238,20 @@ class LoadMultiViewImageFromFilesInCeph(object):
             to_rgb=False)
         return results
 
+    def _load_images(self, filename):
+        images_multiView = []
+        for img_path in filename:
+            # img_path = os.path.join(self.img_root, img_path)
+            if self.file_client_args['backend'] == 'petrel':
+                img_bytes = self.file_client.get(img_path)
+                img = imfrombytes(img_bytes)
+            elif self.file_client_args['backend'] == 'disk':
+                img = imread(img_path, self.color_type)
+            images_multiView.append(img)
+        return np.stack(
+            #[mmcv.imread(name, self.color_type) for name in filename], axis=-1)
+            images_multiView, axis=-1)
+
     def __repr__(self):
         """str: Return a string that describes the module."""
         repr_str = self.__class__.__name__
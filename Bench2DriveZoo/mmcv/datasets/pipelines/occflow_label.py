@@ -159,13 +159,18 @@ class GenerateOccFlowLabels(object):
                     bbox_corners = np.round(
                         (bbox_corners - self.bev_start_position[:2] + self.bev_resolution[:2] / 2.0) / self.bev_resolution[:2]).astype(np.int32)
 
-                    for index, gt_ind in enumerate(ins_inds):
-                        if gt_ind == self.ignore_index:
-                            gt_ind = SPECIAL_INDEX   # 255 -> -20
-                        poly_region = bbox_corners[index]
-
-                        cv2.fillPoly(segmentation, [poly_region], 1.0)
-                        cv2.fillPoly(instance, [poly_region], int(gt_ind))
+                    ins_inds = np.asarray(ins_inds).astype(np.int64)
+                    ins_inds[ins_inds == self.ignore_index] = SPECIAL_INDEX   # 255 -> -20
+
+                    # rasterize the box slots (index + 1) once, later boxes overwrite the earlier ones,
+                    # then look up the instance ids. The polygons are filled one by one, as filling them
+                    # together in one call would apply the even-odd rule to the overlapping boxes
+                    slots = np.zeros((self.bev_dimension[1], self.bev_dimension[0]), dtype=np.int32)
+                    for index, poly_region in enumerate(bbox_corners):
+                        cv2.fillPoly(slots, [poly_region], index + 1)
+                    occupied = slots > 0
+                    segmentation[occupied] = 1.0
+                    instance[occupied] = ins_inds[slots[occupied] - 1]
 
             segmentations.append(segmentation)
             instances.append(instance)
@@ -200,6 +205,14 @@ class GenerateOccFlowLabels(object):
         return results
 
     def center_offset_flow(self, instance_img, all_gt_inds, ignore_index=255, sigma=3.0):
+        """
+        Computes the centerness, offset, future flow and backward flow labels of all the instances
+        of the sequence. The instance masks of all the frames are handled at once through a map of
+        each pixel to its instance column. The gaussian heatmaps are only computed around each center,
+        where they are normal float32 numbers: the values below ~1e-38, which are slow to compute
+        and have no effect on the losses, are 0. Everything else is the same as computing the labels
+        instance by instance on the whole grid.
+        """
         seq_len, h, w = instance_img.shape
         # heatmap
         center_label = torch.zeros(seq_len, 1, h, w)
@@ -221,46 +234,77 @@ class GenerateOccFlowLabels(object):
                 continue
             for ins_ind in ins_inds_per_frame:
                 gt_inds_all.append(ins_ind)
-        gt_inds_unique = np.unique(np.array(gt_inds_all))
-
-        # iterate over all instances across this sequence
-        for instance_id in gt_inds_unique:
-            instance_id = int(instance_id)
-            prev_xc = None
-            prev_yc = None
-            prev_mask = None
-            for t in range(seq_len):
-                instance_mask = (instance_img[t] == instance_id)
-                if instance_mask.sum() == 0:
-                    # this instance is not in this frame
-                    prev_xc = None
-                    prev_yc = None
-                    prev_mask = None
-                    continue
-
-                # the Bird-Eye-View center of the instance
-                xc = x[instance_mask].mean()
-                yc = y[instance_mask].mean()
-
-                off_x = xc - x
-                off_y = yc - y
-                g = torch.exp(-(off_x ** 2 + off_y ** 2) / sigma ** 2)
-                center_label[t, 0] = torch.maximum(center_label[t, 0], g)
-                offset_label[t, 0, instance_mask] = off_x[instance_mask]
-                offset_label[t, 1, instance_mask] = off_y[instance_mask]
-
-                if prev_xc is not None and instance_mask.sum() > 0:
-                    delta_x = xc - prev_xc
-                    delta_y = yc - prev_yc
-                    future_displacement_label[t-1, 0, prev_mask] = delta_x
-                    future_displacement_label[t-1, 1, prev_mask] = delta_y
-                    backward_flow[t-1, 0, instance_mask] = -1 * delta_x
-                    backward_flow[t-1, 1, instance_mask] = -1 * delta_y
-                        
-                prev_xc = xc
-                prev_yc = yc
-                prev_mask = instance_mask
-        
+        gt_inds_unique = np.unique(np.array(gt_inds_all)).astype(np.int64)
+        num_instances = len(gt_inds_unique)
+        if num_instances == 0:
+            return center_label, offset_label, future_displacement_label, backward_flow
+
+        # column of each pixel in gt_inds_unique, or the extra column num_instances for the pixels
+        # of no instance of the sequence. The masks are applied with torch.where and a dummy bin
+        # rather than boolean indexing, which is much slower
+        instance_np = instance_img.numpy()
+        columns = np.searchsorted(gt_inds_unique, instance_np)
+        columns = np.minimum(columns, num_instances - 1)
+        columns[gt_inds_unique[columns] != instance_np] = num_instances
+        columns = torch.from_numpy(columns)
+        matched = columns < num_instances
+
+        # the Bird-Eye-View center of each instance in each frame. The pixel coordinates are integers,
+        # so the sums are exact and the means are the same as the per instance torch means
+        num_bins = seq_len * (num_instances + 1)
+        bins = (torch.arange(seq_len).view(seq_len, 1, 1) * (num_instances + 1) + columns).flatten()
+        counts = torch.bincount(bins, minlength=num_bins).view(seq_len, num_instances + 1)
+        x_sums = torch.bincount(bins, weights=x.double().expand(seq_len, h, w).flatten(), minlength=num_bins)
+        y_sums = torch.bincount(bins, weights=y.double().expand(seq_len, h, w).flatten(), minlength=num_bins)
+        xc = x_sums.float().view(seq_len, num_instances + 1) / counts.clamp(min=1).float()
+        yc = y_sums.float().view(seq_len, num_instances + 1) / counts.clamp(min=1).float()
+        present = counts > 0
+        present[:, num_instances] = False
+
+        # heatmap: the gaussians of all the instances of all the frames at once, in a window around
+        # their centers, keeping the exponents whose result is a normal float32
+        min_exponent = float(np.log(np.finfo(np.float32).tiny))
+        radius = int(np.ceil(sigma * np.sqrt(-min_exponent))) + 1
+        window = torch.arange(-radius, radius + 1, dtype=torch.float)
+        present_t, present_k = torch.nonzero(present, as_tuple=True)
+        centers_x, centers_y = xc[present_t, present_k], yc[present_t, present_k]
+        rows = torch.round(centers_x).view(-1, 1) + window
+        cols = torch.round(centers_y).view(-1, 1) + window
+        off_x = (centers_x.view(-1, 1) - rows)[:, :, None]
+        off_y = (centers_y.view(-1, 1) - cols)[:, None, :]
+        exponents = -(off_x ** 2 + off_y ** 2) / sigma ** 2
+
+        rows, cols = rows.long()[:, :, None], cols.long()[:, None, :]
+        valid = (exponents >= min_exponent) & (rows >= 0) & (rows < h) & (cols >= 0) & (cols < w)
+        pixels = torch.where(valid, (present_t.view(-1, 1, 1) * h + rows) * w + cols, seq_len * h * w)
+        gaussians = torch.exp(torch.where(valid, exponents, torch.zeros_like(exponents)))
+        heatmap = torch.zeros(seq_len * h * w + 1)
+        heatmap.scatter_reduce_(0, pixels.flatten(), gaussians.flatten(), reduce='amax')
+        center_label[:, 0] = heatmap[:-1].view(seq_len, h, w)
+
+        # offset from each pixel of an instance to its center
+        frames = torch.arange(seq_len).view(seq_len, 1, 1)
+        offset_label[:, 0] = torch.where(matched, xc[frames, columns] - x, offset_label[:, 0])
+        offset_label[:, 1] = torch.where(matched, yc[frames, columns] - y, offset_label[:, 1])
+
+        # flows between the frames t - 1 and t, for the instances present in both. The future flow
+        # is set on the pixels of the frame t - 1, the backward flow on the pixels of the frame t
+        if seq_len > 1:
+            has_flow = present[1:] & present[:-1]
+            delta_x = xc[1:] - xc[:-1]
+            delta_y = yc[1:] - yc[:-1]
+            flow_frames = frames[:-1]
+
+            prev_columns = columns[:-1]
+            prev_mask = has_flow[flow_frames, prev_columns]
+            future_displacement_label[:-1, 0] = torch.where(prev_mask, delta_x[flow_frames, prev_columns], future_displacement_label[:-1, 0])
+            future_displacement_label[:-1, 1] = torch.where(prev_mask, delta_y[flow_frames, prev_columns], future_displacement_label[:-1, 1])
+
+            curr_columns = columns[1:]
+            curr_mask = has_flow[flow_frames, curr_columns]
+            backward_flow[:-1, 0] = torch.where(curr_mask, -1 * delta_x[flow_frames, curr_columns], backward_flow[:-1, 0])
+            backward_flow[:-1, 1] = torch.where(curr_mask, -1 * delta_y[flow_frames, curr_columns], backward_flow[:-1, 1])
+
         return center_label, offset_label, future_displacement_label, backward_flow
 
 
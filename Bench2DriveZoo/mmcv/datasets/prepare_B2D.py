@@ -152,48 +152,51 @@ def get_action(index):
 
 
 def gengrate_map(map_root):
+    # maps written by tools/gen_hdmap.py, the legacy npz ones are read if a town has no other
+    from leaderboard.utils.hd_map import HD_MAP_SUFFIX, LEGACY_HD_MAP_SUFFIX, load_hd_map
     map_infos = {}
-    for file_name in os.listdir(map_root):
-        if '.npz' in file_name:
-            map_info = dict(np.load(join(map_root,file_name), allow_pickle=True)['arr'])
-            town_name = file_name.split('_')[0]
-            # town_name = TOWN_NAME
-            map_infos[town_name] = {} 
-            lane_points = []
-            lane_types = []
-            lane_sample_points = []
-            trigger_volumes_points = []
-            trigger_volumes_types = []
-            trigger_volumes_sample_points = []
-            for road_id, road in map_info.items():
-                for lane_id, lane in road.items():
-                    if lane_id == 'Trigger_Volumes':
-                        for single_trigger_volume in lane:
-                            points = np.array(single_trigger_volume['Points'])
-                            points[:,1] *= -1 #left2right
-                            trigger_volumes_points.append(points)
-                            trigger_volumes_sample_points.append(points.mean(axis=0))
-                            trigger_volumes_types.append(single_trigger_volume['Type'])
-                    else:
-                        for single_lane in lane:
-                            points = np.array([raw_point[0] for raw_point in single_lane['Points']])
-                            points[:,1] *= -1
-                            lane_points.append(points)
-                            lane_types.append(single_lane['Type'])
-                            lane_lenth = points.shape[0]
-                            if lane_lenth % 50 != 0:
-                                devide_points = [50*i for i in range(lane_lenth//50+1)]
-                            else:
-                                devide_points = [50*i for i in range(lane_lenth//50)]
-                            devide_points.append(lane_lenth-1)
-                            lane_sample_points_tmp = points[devide_points]
-                            lane_sample_points.append(lane_sample_points_tmp)
-            map_infos[town_name]['lane_points'] = lane_points
-            map_infos[town_name]['lane_sample_points'] = lane_sample_points
-            map_infos[town_name]['lane_types'] = lane_types
-            map_infos[town_name]['trigger_volumes_points'] = trigger_volumes_points
-            map_infos[town_name]['trigger_volumes_sample_points'] = trigger_volumes_sample_points
-            map_infos[town_name]['trigger_volumes_types'] = trigger_volumes_types
+    file_names = os.listdir(map_root)
+    for file_name in sorted(file_names):
+        if file_name.endswith(LEGACY_HD_MAP_SUFFIX):
+            if file_name[:-len(LEGACY_HD_MAP_SUFFIX)] + HD_MAP_SUFFIX in file_names:
+                continue
+        elif not file_name.endswith(HD_MAP_SUFFIX):
+            continue
+        hd_map = load_hd_map(join(map_root,file_name))
+        town_name = file_name.split('_')[0]
+        # town_name = TOWN_NAME
+        map_infos[town_name] = {} 
+        lane_points = []
+        lane_types = []
+        lane_sample_points = []
+        trigger_volumes_points = []
+        trigger_volumes_types = []
+        trigger_volumes_sample_points = []
+        for index in range(len(hd_map.volume_types)):
+            points = hd_map.volume_vertices(index).astype(np.float64)
+            points[:,1] *= -1 #left2right
+            trigger_volumes_points.append(points)
+            trigger_volumes_sample_points.append(points.mean(axis=0))
+            trigger_volumes_types.append(hd_map.volume_type(index))
+        for index in range(len(hd_map)):
+            points = hd_map.line_points(index).astype(np.float64)
+            points[:,1] *= -1
+            lane_points.append(points)
+            lane_types.append(hd_map.line_type(index))
+            lane_lenth = points.shape[0]
+            if lane_lenth % 50 != 0:
+                devide_points = [50*i for i in range(lane_lenth//50+1)]
+            else:
+                devide_points = [50*i for i in range(lane_lenth//50)]
+            devide_points.append(lane_lenth-1)
+            lane_sample_points_tmp = points[devide_points]
+            lane_sample_points.append(lane_sample_points_tmp)
+        map_infos[town_name]['lane_points'] = lane_points
+        map_infos[town_name]['lane_sample_points'] = lane_sample_points
+        map_infos[town_name]['lane_types'] = lane_types
+        map_infos[town_name]['trigger_volumes_points'] = trigger_volumes_points
+        map_infos[town_name]['trigger_volumes_sample_points'] = trigger_volumes_sample_points
+        map_infos[town_name]['trigger_volumes_types'] = trigger_volumes_types
     with open(join(OUT_DIR,'b2d_map_infos.pkl'),'wb') as f:
         pickle.dump(map_infos,f)
 
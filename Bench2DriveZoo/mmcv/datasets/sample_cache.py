@@ -0,0 +1,167 @@
+"""Binary store of precomputed dataset samples.
+
+The store holds one zlib compressed pickle per sample. The file layout is::
+
+    header | sample 0 | ... | sample N-1 | offsets (N + 1 x uint64) | meta (JSON)
+
+where the header is the magic, the format version, the offset of the offsets
+array and the number of samples. The meta holds the key of the dataset config
+the samples were computed with, so that a dataset can tell whether a store is
+still valid for it. The samples are read from a memory map of the file, which
+is shared by the dataloader workers.
+"""
+import hashlib
+import io
+import json
+import mmap
+import os
+import pickle
+import struct
+import zlib
+
+import numpy as np
+import torch
+
+SAMPLE_CACHE_MAGIC = b'B2DCACHE'
+SAMPLE_CACHE_FORMAT = 1
+_HEADER = struct.Struct('<8sIQQ')
+
+
+def sample_cache_key(config):
+    """Hash of a JSON serializable dataset config."""
+    text = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def file_digest(filename, chunk_size=2**20):
+    """SHA1 of the content of a file."""
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _SamplePickler(pickle.Pickler):
+    """Pickles the CPU tensors as numpy arrays, which are much faster to
+    unpickle than the storages of torch."""
+
+    def reducer_override(self, obj):
+        if type(obj) is torch.Tensor and obj.device.type == 'cpu' and not obj.requires_grad \
+                and obj.dtype != torch.bfloat16:
+            return torch.from_numpy, (obj.numpy(),)
+        return NotImplemented
+
+
+def encode_sample(sample):
+    """Serializes a sample as it is stored in the cache."""
+    buffer = io.BytesIO()
+    _SamplePickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(sample)
+    return zlib.compress(buffer.getvalue(), 1)
+
+
+class SampleCacheWriter:
+    """Writes the encoded samples of a dataset, in order, into a store.
+
+    The store is written next to ``filename`` and only moved there by
+    :meth:`close`, so an interrupted build doesn't leave a truncated store.
+
+    Args:
+        filename (str): Path of the store.
+        key (str): Key of the dataset config, see :func:`sample_cache_key`.
+        meta (dict, optional): Extra JSON serializable information to save.
+    """
+
+    def __init__(self, filename, key, meta=None):
+        self.filename = filename
+        self.meta = dict(meta or {}, key=key)
+        self._tmp_filename = filename + '.tmp'
+        self._file = open(self._tmp_filename, 'wb')
+        self._file.write(_HEADER.pack(SAMPLE_CACHE_MAGIC, SAMPLE_CACHE_FORMAT, 0, 0))
+        self._offsets = [_HEADER.size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self._tmp_filename)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def add(self, sample):
+        self.add_encoded(encode_sample(sample))
+
+    def add_encoded(self, data):
+        """Appends a sample encoded with :func:`encode_sample`."""
+        self._file.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+
+    def close(self):
+        index_offset = self._offsets[-1]
+        self._file.write(np.array(self._offsets, dtype='<u8').tobytes())
+        self._file.write(json.dumps(self.meta).encode('utf-8'))
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(SAMPLE_CACHE_MAGIC, SAMPLE_CACHE_FORMAT, index_offset, len(self)))
+        self._file.close()
+        os.replace(self._tmp_filename, self.filename)
+
+
+class SampleCache:
+    """Reads the samples of a store written by :class:`SampleCacheWriter`.
+
+    Every access decodes a new copy of the sample, so the pipelines are free
+    to modify it. The file is mapped on first access, which lets the cache be
+    pickled into spawned dataloader workers.
+
+    Args:
+        filename (str): Path of the store.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._buffer = None
+        self._offsets = None
+        with open(filename, 'rb') as f:
+            magic, version, index_offset, num_samples = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != SAMPLE_CACHE_MAGIC:
+                raise ValueError(f'{filename} is not a sample cache')
+            if version != SAMPLE_CACHE_FORMAT:
+                raise ValueError(f'{filename} has format version {version}, '
+                                 f'expected {SAMPLE_CACHE_FORMAT}')
+            f.seek(index_offset + 8 * (num_samples + 1))
+            self.meta = json.loads(f.read().decode('utf-8'))
+        self._index_offset = index_offset
+        self._num_samples = num_samples
+
+    @property
+    def key(self):
+        return self.meta['key']
+
+    def __len__(self):
+        return self._num_samples
+
+    def __getitem__(self, index):
+        if not 0 <= index < self._num_samples:
+            raise IndexError(f'sample {index} out of range for {self._num_samples} samples')
+        if self._buffer is None:
+            self._open()
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return pickle.loads(zlib.decompress(self._buffer[start:end]))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_buffer'] = None
+        state['_offsets'] = None
+        return state
+
+    def _open(self):
+        with open(self.filename, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._offsets = np.frombuffer(
+            buffer, dtype='<u8', count=self._num_samples + 1, offset=self._index_offset).tolist()
+        self._buffer = buffer
@@ -1,5 +1,6 @@
 from .distributed_sampler import DistributedSampler
 from .sampler import SAMPLER, build_sampler
 from .group_sampler import DistributedGroupSampler, GroupSampler
+from .sequence_sampler import DistributedSequenceSampler
 
 # __all__ = ['DistributedSampler', 'DistributedGroupSampler', 'GroupSampler']
@@ -0,0 +1,105 @@
+import math
+
+import numpy as np
+import torch
+
+from .group_sampler import DistributedGroupSampler
+from .sampler import SAMPLER
+
+
+@SAMPLER.register_module()
+class DistributedSequenceSampler(DistributedGroupSampler):
+    """DistributedGroupSampler that keeps the temporal queues of consecutive
+    samples of a dataloader worker overlapping.
+
+    The queue of a sample of the B2D datasets holds frames spaced
+    ``sample_interval`` apart, so the samples ``i, i + sample_interval, ...``
+    of a clip share most of their frames. These samples are cut into chunks
+    of ``chunk_size``, the chunks are shuffled and split between the ranks
+    like DistributedGroupSampler does with the samples, and each worker of a
+    rank is given whole chunks. Used with the ``frame_cache_size`` of the
+    image loading, the frames of a chunk are then decoded once per worker.
+
+    Args:
+        dataset: Dataset used for sampling, with ``data_infos`` holding the
+            ``folder`` of the clips and ``sample_interval``.
+        samples_per_gpu (int): Batch size of each GPU.
+        num_replicas (optional): Number of processes participating in
+            distributed training.
+        rank (optional): Rank of the current process within num_replicas.
+        seed (int, optional): Random seed, identical across the processes.
+        chunk_size (int): Number of samples of a clip loaded in a row by a
+            worker. Default: 8.
+        num_workers (int, optional): Number of dataloader workers of each
+            rank. Set from ``workers_per_gpu`` by build_dataloader.
+    """
+
+    def __init__(self,
+                 dataset,
+                 samples_per_gpu=1,
+                 num_replicas=None,
+                 rank=None,
+                 seed=0,
+                 chunk_size=8,
+                 num_workers=None):
+        super().__init__(dataset, samples_per_gpu, num_replicas, rank, seed)
+        self.chunk_size = chunk_size
+        self.num_workers = num_workers
+        self.group_chunks = self._split_chunks()
+
+    def _split_chunks(self):
+        """Chunks of the samples of each group, in clip order."""
+        interval = getattr(self.dataset, 'sample_interval', 1)
+        folders = [info['folder'] for info in self.dataset.data_infos]
+        clip_starts = [0] + [i for i in range(1, len(folders)) if folders[i] != folders[i - 1]]
+        clip_ends = clip_starts[1:] + [len(folders)]
+
+        group_chunks = [[] for _ in self.group_sizes]
+        for start, end in zip(clip_starts, clip_ends):
+            for offset in range(interval):
+                strided = np.arange(start + offset, end, interval)
+                for group in np.unique(self.flag[strided]):
+                    indices = strided[self.flag[strided] == group]
+                    for i in range(0, len(indices), self.chunk_size):
+                        group_chunks[group].append(indices[i:i + self.chunk_size].tolist())
+        return group_chunks
+
+    def __iter__(self):
+        # deterministically shuffle based on epoch
+        g = torch.Generator()
+        g.manual_seed(self.epoch + self.seed)
+
+        indices = []
+        for size, chunks in zip(self.group_sizes, self.group_chunks):
+            if size == 0:
+                continue
+            indice = [i for c in torch.randperm(len(chunks), generator=g).tolist() for i in chunks[c]]
+            assert len(indice) == size
+            num_rank_samples = int(
+                math.ceil(size * 1.0 / self.samples_per_gpu / self.num_replicas)) * self.samples_per_gpu
+            # pad indice
+            extra = num_rank_samples * self.num_replicas - len(indice)
+            tmp = indice.copy()
+            for _ in range(extra // size):
+                indice.extend(tmp)
+            indice.extend(tmp[:extra % size])
+            # subsample, each rank gets a contiguous part of the chunks
+            offset = num_rank_samples * self.rank
+            indices.extend(indice[offset:offset + num_rank_samples])
+
+        assert len(indices) == self.num_samples
+        return iter(self._interleave_workers(indices))
+
+    def _interleave_workers(self, indices):
+        """Orders the batches so that the dataloader, which hands them to its
+        workers in turn, gives each worker a contiguous part of indices."""
+        num_workers = self.num_workers or 1
+        batches = [indices[i:i + self.samples_per_gpu] for i in range(0, len(indices), self.samples_per_gpu)]
+        num_rounds, num_longer = divmod(len(batches), num_workers)
+        streams = []
+        start = 0
+        for worker in range(num_workers):
+            length = num_rounds + (1 if worker < num_longer else 0)
+            streams.append(batches[start:start + length])
+            start += length
+        return [i for j in range(num_rounds + 1) for stream in streams if j < len(stream) for i in stream[j]]
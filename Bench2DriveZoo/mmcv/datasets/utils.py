@@ -1,6 +1,6 @@
 import copy
 import warnings
-from mmcv.models import VGG
+from mmcv.models.backbones import VGG
 from mmcv.runner.hooks import HOOKS, Hook
 
 from mmcv.datasets.pipelines import (Collect3D, DefaultFormatBundle3D,
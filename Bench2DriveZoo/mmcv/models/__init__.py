@@ -1,3 +1,4 @@
+from mmcv.utils import lazy_getattr
 from .backbones import *  # noqa: F401,F403
 from .builder import (BACKBONES, DETECTORS, HEADS, LOSSES, NECKS,
                       ROI_EXTRACTORS, SHARED_HEADS, FUSION_LAYERS, 
@@ -6,9 +7,13 @@ from .builder import (BACKBONES, DETECTORS, HEADS, LOSSES, NECKS,
                       build_head, build_loss, build_middle_encoder, 
                       build_model, build_neck, build_roi_extractor, 
                       build_shared_head, build_voxel_encoder, build_segmentor)
-from .dense_heads import *  # noqa: F401,F403
-from .detectors import *  # noqa: F401,F403
-from .losses import *  # noqa: F401,F403
-from .necks import *  # noqa: F401,F403
-from .bricks import *
-from .utils import *
\ No newline at end of file
+
+# The heads, detectors, losses and necks are imported when the registries
+# resolve them from a config, or when one of their names is accessed. Like the
+# star imports they replace, the last modules take precedence.
+_LAZY_STAR_MODULES = ('.utils', '.bricks', '.necks', '.losses', '.detectors',
+                      '.dense_heads')
+
+
+def __getattr__(name):
+    return lazy_getattr(__name__, name, {}, _LAZY_STAR_MODULES)
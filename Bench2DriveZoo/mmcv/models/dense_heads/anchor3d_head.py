@@ -2,7 +2,7 @@
 import numpy as np
 import torch
 from mmcv.utils import force_fp32
-from mmcv.models import BaseModule
+from mmcv.models.backbones import BaseModule
 from torch import nn as nn
 
 from mmcv.core import (PseudoSampler, box3d_multiclass_nms, limit_period,
@@ -3,12 +3,14 @@ from re import I
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from mmcv.models import Linear, bias_init_with_prob
+from mmcv.models.bricks import Linear
+from mmcv.models.utils import bias_init_with_prob
 from mmcv.utils import TORCH_VERSION, digit_version
 
 from mmcv.core import (multi_apply, multi_apply, reduce_mean)
 from mmcv.models.utils.transformer import inverse_sigmoid
-from mmcv.models import HEADS, BaseModule
+from mmcv.models import HEADS
+from mmcv.models.backbones import BaseModule
 from mmcv.models.dense_heads import DETRHead
 from mmcv.core.bbox.coder import build_bbox_coder
 from traitlets import import_item
@@ -4,7 +4,6 @@ calculate planner metric same as stp3
 import numpy as np
 import torch
 import cv2
-import copy
 import matplotlib.pyplot as plt
 from skimage.draw import polygon
 from nuscenes.utils.data_classes import Box
@@ -35,6 +34,7 @@ class PlanningMetric():
             'human':[2,3,4,5,6,7,8],
             'vehicle':[14,15,16,17,18,19,20,21,22,23]
         }
+        self._ego_footprint = None
 
         # self.n_future = n_future
 
@@ -114,23 +114,27 @@ class PlanningMetric():
         gt_agent_boxes[:,6:7] = -1*(gt_agent_boxes[:,6:7] + np.pi/2) # NOTE: convert yaw to lidar frame
         gt_agent_fut_trajs = gt_agent_fut_trajs + gt_agent_boxes[:, np.newaxis, 0:2]
         gt_agent_fut_yaw = gt_agent_fut_yaw + gt_agent_boxes[:, np.newaxis, 6:7]
-        
-        for t in range(T):
-            for i in range(agent_num):
-                if gt_agent_fut_mask[i][t] == 1:
-                    # Filter out all non vehicle instances
-                    category_index = int(gt_agent_feats[0,i][27])
-                    agent_length, agent_width = gt_agent_boxes[i][4], gt_agent_boxes[i][3]
-                    x_a = gt_agent_fut_trajs[i, t, 0]
-                    y_a = gt_agent_fut_trajs[i, t, 1]
-                    yaw_a = gt_agent_fut_yaw[i, t, 0]
-                    param = [x_a,y_a,yaw_a,agent_length, agent_width]
-                    if (category_index in self.category_index['vehicle']):
-                        poly_region = self._get_poly_region_in_image(param)
-                        cv2.fillPoly(segmentation[t], [poly_region], 1.0)
-                    if (category_index in self.category_index['human']):
-                        poly_region = self._get_poly_region_in_image(param)
-                        cv2.fillPoly(pedestrian[t], [poly_region], 1.0)
+
+        # Footprints of all the valid (timestep, agent) pairs at once
+        category_index = gt_agent_feats[0, :, 27].astype(np.int64)
+        is_vehicle = np.isin(category_index, self.category_index['vehicle'])
+        is_human = np.isin(category_index, self.category_index['human'])
+        valid = (gt_agent_fut_mask[:agent_num, :T] == 1).T & (is_vehicle | is_human)[None] # (T, A)
+        ts, agents = np.nonzero(valid)
+        params = np.stack([
+            gt_agent_fut_trajs[agents, ts, 0],
+            gt_agent_fut_trajs[agents, ts, 1],
+            gt_agent_fut_yaw[agents, ts, 0],
+            gt_agent_boxes[agents, 4],
+            gt_agent_boxes[agents, 3]], axis=-1)
+        poly_regions = self._get_poly_regions_in_image(params)
+
+        # cv2 fills several polygons with the even-odd rule, so each footprint is filled on its own
+        for t, i, poly_region in zip(ts, agents, poly_regions):
+            if is_vehicle[i]:
+                cv2.fillPoly(segmentation[t], [poly_region], 1.0)
+            else:
+                cv2.fillPoly(pedestrian[t], [poly_region], 1.0)
         
         # vis for debug
         # plt.figure('debug')
@@ -161,56 +165,89 @@ class PlanningMetric():
 
         return agent_corner_cv2
 
+    def _get_poly_regions_in_image(self, params):
+        '''
+        Same as _get_poly_region_in_image for (N, 5) params, returns (N, 4, 2) corners.
+        '''
+        lidar2cv_rot = np.array([[1,0], [0,-1]])
+        x_a, y_a, yaw_a, agent_length, agent_width = params.T
+        trans_a = np.stack([x_a, y_a], axis=-1)[:, :, None] #(N,2,1)
+        rot_mat_a = np.stack([
+            np.stack([np.cos(yaw_a), -np.sin(yaw_a)], axis=-1),
+            np.stack([np.sin(yaw_a), np.cos(yaw_a)], axis=-1)], axis=1) #(N,2,2)
+        agent_corner = np.stack([
+            np.stack([agent_length/2, -agent_length/2, -agent_length/2, agent_length/2], axis=-1),
+            np.stack([agent_width/2, agent_width/2, -agent_width/2, -agent_width/2], axis=-1)], axis=1) #(N,2,4)
+        agent_corner_lidar = np.matmul(rot_mat_a, agent_corner) + trans_a #(N,2,4)
+        # convert to cv frame
+        agent_corner_cv2 = (np.matmul(lidar2cv_rot, agent_corner_lidar) \
+            - self.bev_start_position[:2,None] + self.bev_resolution[:2,None] / 2.0).transpose(0, 2, 1) \
+            / self.bev_resolution[:2] #(N,4,2)
+        agent_corner_cv2 = np.round(agent_corner_cv2).astype(np.int32)
 
-    def evaluate_single_coll(self, traj, segmentation, input_gt):
+        return agent_corner_cv2
+
+
+    def get_ego_footprint(self):
         '''
-        traj: torch.Tensor (n_future, 2)
-            自车lidar系为轨迹参考系
-                ^ y
-                |
-                | 
-                0------->
-                        x
-        segmentation: torch.Tensor (n_future, 200, 200)
+        Pixel offsets (P, 2) of the ego box on the BEV grid, relative to the ego position.
         '''
-        pts = np.array([
-            [-self.H / 2. + 0.5, self.W / 2.],
-            [self.H / 2. + 0.5, self.W / 2.],
-            [self.H / 2. + 0.5, -self.W / 2.],
-            [-self.H / 2. + 0.5, -self.W / 2.],
-        ])
-        pts = (pts - self.bx.cpu().numpy()) / (self.dx.cpu().numpy())
-        pts[:, [0, 1]] = pts[:, [1, 0]]
-        rr, cc = polygon(pts[:,1], pts[:,0])
-        rc = np.concatenate([rr[:,None], cc[:,None]], axis=-1)
-
-        n_future, _ = traj.shape
-        trajs = traj.view(n_future, 1, 2)
+        if self._ego_footprint is None:
+            pts = np.array([
+                [-self.H / 2. + 0.5, self.W / 2.],
+                [self.H / 2. + 0.5, self.W / 2.],
+                [self.H / 2. + 0.5, -self.W / 2.],
+                [-self.H / 2. + 0.5, -self.W / 2.],
+            ])
+            pts = (pts - self.bx.cpu().numpy()) / (self.dx.cpu().numpy())
+            pts[:, [0, 1]] = pts[:, [1, 0]]
+            rr, cc = polygon(pts[:,1], pts[:,0])
+            self._ego_footprint = np.concatenate([rr[:,None], cc[:,None]], axis=-1)
+        return self._ego_footprint
+
+    def evaluate_box_coll(self, trajs, segmentation):
+        '''
+        Batched evaluate_single_coll.
+        trajs: torch.Tensor (B, n_future, 2)
+        segmentation: np.ndarray or torch.Tensor (B, n_future, 200, 200)
+        return: np.ndarray (B, n_future), whether the ego box collides at each timestep
+        '''
+        rc = self.get_ego_footprint()
+
+        B, n_future, _ = trajs.shape
         # 轨迹坐标系转换为:
         #  ^ x
         #  |
         #  | 
         #  0-------> y
-        trajs_ = copy.deepcopy(trajs)
-        trajs_[:,:,[0,1]] = trajs_[:,:,[1,0]] # can also change original tensor
+        trajs_ = trajs[:, :, [1, 0]].view(B, n_future, 1, 2)
         trajs_ = trajs_ / self.dx.to(trajs.device)
-        trajs_ = trajs_.cpu().numpy() + rc # (n_future, 32, 2)
+        trajs_ = trajs_.cpu().numpy() + rc # (B, n_future, 32, 2)
 
-        r = (self.bev_dimension[0] - trajs_[:,:,0]).astype(np.int32)
+        r = (self.bev_dimension[0] - trajs_[...,0]).astype(np.int32)
         r = np.clip(r, 0, self.bev_dimension[0] - 1)
 
-        c = trajs_[:,:,1].astype(np.int32)
+        c = trajs_[...,1].astype(np.int32)
         c = np.clip(c, 0, self.bev_dimension[1] - 1)
 
-        collision = np.full(n_future, False)
-        for t in range(n_future):
-            rr = r[t]
-            cc = c[t]
-            I = np.logical_and(
-                np.logical_and(rr >= 0, rr < self.bev_dimension[0]),
-                np.logical_and(cc >= 0, cc < self.bev_dimension[1]),
-            )
-            collision[t] = np.any(segmentation[t, rr[I], cc[I]].cpu().numpy())
+        if isinstance(segmentation, torch.Tensor):
+            segmentation = segmentation.cpu().numpy()
+        bi = np.arange(B)[:, None, None]
+        ti = np.arange(n_future)[None, :, None]
+        return np.any(segmentation[bi, ti, r, c], axis=-1)
+
+    def evaluate_single_coll(self, traj, segmentation, input_gt):
+        '''
+        traj: torch.Tensor (n_future, 2)
+            自车lidar系为轨迹参考系
+                ^ y
+                |
+                | 
+                0------->
+                        x
+        segmentation: torch.Tensor (n_future, 200, 200)
+        '''
+        collision = self.evaluate_box_coll(traj[None], segmentation[None])[0]
         
         # vis for debug
         # obs_occ = copy.deepcopy(segmentation)
@@ -261,30 +298,33 @@ class PlanningMetric():
         # trajs = trajs * torch.tensor([-1, 1], device=trajs.device)
         # gt_trajs = gt_trajs * torch.tensor([-1, 1], device=gt_trajs.device)
 
-        obj_coll_sum = torch.zeros(n_future, device=segmentation.device)
-        obj_box_coll_sum = torch.zeros(n_future, device=segmentation.device)
+        # the whole batch is evaluated at once on CPU
+        segmentation_np = segmentation.cpu().numpy()
+        gt_box_coll = self.evaluate_box_coll(gt_trajs, segmentation_np) # (B, n_future)
+        box_coll = self.evaluate_box_coll(trajs, segmentation_np)
 
-        for i in range(B):
-            gt_box_coll = self.evaluate_single_coll(gt_trajs[i], segmentation[i], input_gt=True)
+        xx, yy = trajs[:,:,0], trajs[:,:,1]
+        # lidar系下的轨迹转换到图片坐标系下
+        xi = ((-self.bx[0]/2 - yy) / self.dx[0]).long().cpu().numpy()
+        yi = ((-self.bx[1]/2 + xx) / self.dx[1]).long().cpu().numpy()
 
-            xx, yy = trajs[i,:,0], trajs[i, :, 1]
-            # lidar系下的轨迹转换到图片坐标系下
-            xi = ((-self.bx[0]/2 - yy) / self.dx[0]).long()
-            yi = ((-self.bx[1]/2 + xx) / self.dx[1]).long()
+        m1 = np.logical_and(
+            np.logical_and(xi >= 0, xi < self.bev_dimension[0]),
+            np.logical_and(yi >= 0, yi < self.bev_dimension[1]),
+        )
+        m1 = np.logical_and(m1, np.logical_not(gt_box_coll))
 
-            m1 = torch.logical_and(
-                torch.logical_and(xi >= 0, xi < self.bev_dimension[0]),
-                torch.logical_and(yi >= 0, yi < self.bev_dimension[1]),
-            ).to(gt_box_coll.device)
-            m1 = torch.logical_and(m1, torch.logical_not(gt_box_coll))
-            #import pdb;pdb.set_trace()
+        bi, ti = np.nonzero(m1)
+        obj_coll = np.zeros((B, n_future), dtype=np.int64)
+        obj_coll[bi, ti] = segmentation_np[bi, ti, xi[bi, ti], yi[bi, ti]]
 
-            ti = torch.arange(n_future)
-            obj_coll_sum[ti[m1]] += segmentation[i, ti[m1], xi[m1], yi[m1]].long()
+        m2 = np.logical_not(gt_box_coll)
+        obj_box_coll = np.logical_and(box_coll, m2)
 
-            m2 = torch.logical_not(gt_box_coll)
-            box_coll = self.evaluate_single_coll(trajs[i], segmentation[i], input_gt=False).to(ti.device)
-            obj_box_coll_sum[ti[m2]] += (box_coll[ti[m2]]).long()
+        obj_coll_sum = torch.from_numpy(obj_coll.sum(axis=0)).to(
+            device=segmentation.device, dtype=torch.float32)
+        obj_box_coll_sum = torch.from_numpy(obj_box_coll.sum(axis=0)).to(
+            device=segmentation.device, dtype=torch.float32)
 
         return obj_coll_sum, obj_box_coll_sum
 
@@ -1,3 +1,5 @@
+import torch
+
 from .track_instance import Instances
 from mmcv.core.bbox.iou_calculators.iou3d_calculator import (
     bbox_overlaps_nearest_3d as iou_3d, )
@@ -14,29 +16,58 @@ class RuntimeTrackerBase(object):
         self.max_obj_id = 0
 
     def update(self, track_instances: Instances, iou_thre=None):
-        track_instances.disappear_time[track_instances.scores >= self.score_thresh] = 0
-        for i in range(len(track_instances)):
-            if (
-                track_instances.obj_idxes[i] == -1
-                and track_instances.scores[i] >= self.score_thresh
-            ):  
-                if iou_thre is not None and track_instances.pred_boxes[track_instances.obj_idxes>=0].shape[0]!=0:
-                    iou3ds = iou_3d(denormalize_bbox(track_instances.pred_boxes[i].unsqueeze(0), None)[...,:7], denormalize_bbox(track_instances.pred_boxes[track_instances.obj_idxes>=0], None)[...,:7])
-                    if iou3ds.max()>iou_thre:
-                        continue
-                # new track
-                # print("track {} has score {}, assign obj_id {}".format(i, track_instances.scores[i], self.max_obj_id))
-                track_instances.obj_idxes[i] = self.max_obj_id
-                self.max_obj_id += 1
-            elif (
-                track_instances.obj_idxes[i] >= 0
-                and track_instances.scores[i] < self.filter_score_thresh
-            ):
-                # sleep time ++
-                track_instances.disappear_time[i] += 1
-                if track_instances.disappear_time[i] >= self.miss_tolerance:
-                    # mark deaded tracklets: Set the obj_id to -1.
-                    # TODO: remove it by following functions
-                    # Then this track will be removed by TrackEmbeddingLayer.
-                    track_instances.obj_idxes[i] = -1
-                    
\ No newline at end of file
+        obj_idxes = track_instances.obj_idxes
+        scores = track_instances.scores
+        disappear_time = track_instances.disappear_time
+        disappear_time.masked_fill_(scores >= self.score_thresh, 0)
+
+        # each query only updates itself, so births and deaths only depend on the state before the update
+        alive = obj_idxes >= 0
+        new_tracks = (obj_idxes == -1) & (scores >= self.score_thresh)
+        sleeping = alive & (scores < self.filter_score_thresh)
+
+        # sleep time ++
+        disappear_time += sleeping.to(disappear_time.dtype)
+        # mark deaded tracklets: Set the obj_id to -1.
+        # TODO: remove it by following functions
+        # Then this track will be removed by TrackEmbeddingLayer.
+        dead = sleeping & (disappear_time >= self.miss_tolerance)
+
+        if iou_thre is not None:
+            new_tracks = self._suppress_overlapping_tracks(
+                track_instances.pred_boxes, new_tracks, alive, dead, iou_thre)
+
+        # new tracks, in query order
+        new_obj_idxes = self.max_obj_id + torch.cumsum(new_tracks.long(), dim=0) - 1
+        obj_idxes.copy_(torch.where(new_tracks, new_obj_idxes, obj_idxes))
+        obj_idxes.masked_fill_(dead, -1)
+        self.max_obj_id += int(new_tracks.sum())
+
+    def _suppress_overlapping_tracks(self, pred_boxes, new_tracks, alive, dead, iou_thre):
+        """
+        Drops the new tracks overlapping (3D IoU > iou_thre) a live track, as if the queries were
+        processed one by one: a new track is compared with the tracks born from the previous queries,
+        and the tracks dying at previous queries are not live anymore.
+        """
+        candidates = torch.nonzero(new_tracks, as_tuple=True)[0]
+        if len(candidates) == 0:
+            return new_tracks
+
+        boxes = denormalize_bbox(pred_boxes, None)[..., :7]
+        overlaps = iou_3d(boxes[candidates], boxes) > iou_thre
+
+        # overlaps with the tracks that were live before the update and not dead yet at each candidate
+        queries = torch.arange(len(boxes), device=boxes.device)
+        dead_before = dead.unsqueeze(0) & (queries.unsqueeze(0) < candidates.unsqueeze(1))
+        suppressed = (overlaps & alive.unsqueeze(0) & ~dead_before).any(dim=1)
+
+        # overlaps with the tracks born at previous candidates, which depend on each other
+        suppressed = suppressed.cpu().tolist()
+        candidate_overlaps = overlaps[:, candidates].cpu()
+        born = torch.zeros(len(candidates), dtype=torch.bool)
+        for i in range(len(candidates)):
+            born[i] = not suppressed[i] and not bool((candidate_overlaps[i, :i] & born[:i]).any())
+
+        new_tracks = torch.zeros_like(new_tracks)
+        new_tracks[candidates[born.to(candidates.device)]] = True
+        return new_tracks
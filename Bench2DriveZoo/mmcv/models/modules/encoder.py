@@ -96,8 +96,12 @@ class BEVFormerEncoder(TransformerLayerSequence):
         lidar2img = []
         for img_meta in img_metas:
             lidar2img.append(img_meta['lidar2img'])
-        lidar2img = np.asarray(lidar2img)
-        lidar2img = reference_points.new_tensor(lidar2img)  # (B, N, 4, 4)
+        if all(torch.is_tensor(l) for l in lidar2img):
+            # already on the device, e.g. from the inference inputs of the agents
+            lidar2img = torch.stack(lidar2img).to(reference_points)  # (B, N, 4, 4)
+        else:
+            lidar2img = np.asarray(lidar2img)
+            lidar2img = reference_points.new_tensor(lidar2img)  # (B, N, 4, 4)
         reference_points = reference_points.clone()
 
         reference_points[..., 0:1] = reference_points[..., 0:1] * \
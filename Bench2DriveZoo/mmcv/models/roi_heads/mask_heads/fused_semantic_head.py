@@ -1,6 +1,6 @@
 import torch.nn as nn
 import torch.nn.functional as F
-from mmcv.models import ConvModule
+from mmcv.models.bricks import ConvModule
 from mmcv.models.backbones import BaseModule
 from mmcv.utils import auto_fp16, force_fp32
 
@@ -4,7 +4,8 @@ from .config import Config, ConfigDict, DictAction
 from .misc import (check_prerequisites, concat_list, deprecated_api_warning,
                    has_method, import_modules_from_strings, is_list_of,
                    is_method_overridden, is_seq_of, is_str, is_tuple_of,
-                   iter_cast, list_cast, requires_executable, requires_package,
+                   iter_cast, lazy_getattr, list_cast, requires_executable,
+                   requires_package,
                    slice_list, to_1tuple, to_2tuple, to_3tuple, to_4tuple,
                    to_ntuple, tuple_cast)
 from .path import (check_file_exist, fopen, is_filepath, mkdir_or_exist,
@@ -15,14 +16,17 @@ from .timer import Timer, TimerError, check_time
 from .version_utils import digit_version, get_git_hash
 import torch
 from .logging import get_logger, print_log
-from .registry import Registry, build_from_cfg
+from .registry import (Registry, build_from_cfg, register_lazy_module,
+                       register_lazy_package)
 from .hub import load_url
 from .logging import get_logger, print_log
 from .logger import get_root_logger
 from .collect_env import collect_env
 from .runner_utils import *
 from .fp16_utils import LossScaler, auto_fp16, force_fp32, wrap_fp16_model, TORCH_VERSION
-from .checkpoint import load_checkpoint, save_checkpoint
+from .checkpoint import (convert_to_mmap_checkpoint, is_mmap_checkpoint,
+                         load_checkpoint, load_mmap_checkpoint,
+                         save_checkpoint, save_mmap_checkpoint)
 from .log_buffer import LogBuffer
 from .priority import Priority, get_priority
 from .memory import retry_if_cuda_oom
@@ -1,9 +1,12 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 import io
+import json
+import mmap
 import os
 import os.path as osp
 import pkgutil
 import re
+import struct
 import time
 import warnings
 from collections import OrderedDict
@@ -14,6 +17,18 @@ from .runner_utils import get_dist_info
 from ..parallel import is_module_wrapper
 from mmcv.fileio.file_client import FileClient
 
+# Memory-mapped checkpoints use the safetensors layout: a little-endian uint64
+# header size, a JSON header describing the tensors (dtype, shape and
+# [begin, end) byte offsets in the data), then the raw tensor data.
+MMAP_CHECKPOINT_EXT = '.safetensors'
+_MMAP_DTYPES = {
+    'F64': torch.float64, 'F32': torch.float32, 'F16': torch.float16,
+    'BF16': torch.bfloat16, 'I64': torch.int64, 'I32': torch.int32,
+    'I16': torch.int16, 'I8': torch.int8, 'U8': torch.uint8,
+    'BOOL': torch.bool,
+}
+_MMAP_DTYPE_NAMES = {dtype: name for name, dtype in _MMAP_DTYPES.items()}
+
 def load_checkpoint(model,
                     filename,
                     map_location=None,
@@ -22,10 +37,16 @@ def load_checkpoint(model,
                     revise_keys=[(r'^module\.', '')]):
     """Load checkpoint from a file or URI.
 
+    Memory-mapped checkpoints (see :func:`save_mmap_checkpoint`) are mapped
+    instead of being unpickled, so that the weights are copied from the file
+    into the model without an intermediate copy in memory.
+
     Args:
         model (Module): Module to load checkpoint.
         filename (str): Accept local filepath
-        map_location (str): Same as :func:`torch.load`.
+        map_location (str): Same as :func:`torch.load`. Ignored for
+            memory-mapped checkpoints, which are loaded into the model
+            parameters wherever they are.
         strict (bool): Whether to allow different params for the model and
             checkpoint.
         logger (:mod:`logging.Logger` or None): The logger for error message.
@@ -41,7 +62,12 @@ def load_checkpoint(model,
         f'load checkpoint from path: {filename}', logger)
     if not osp.isfile(filename):
         raise IOError(f'{filename} is not a checkpoint file')
-    checkpoint = torch.load(filename, map_location=map_location)
+    if is_mmap_checkpoint(filename):
+        # the tensors are views of the mapped file, which load_state_dict
+        # copies straight into the parameters
+        checkpoint = load_mmap_checkpoint(filename)
+    else:
+        checkpoint = torch.load(filename, map_location=map_location)
     # OrderedDict is a subclass of dict
     if not isinstance(checkpoint, dict):
         raise RuntimeError(
@@ -87,6 +113,127 @@ def load_checkpoint(model,
             print(err_msg)
     return checkpoint
 
+def is_mmap_checkpoint(filename):
+    """Whether a file is a memory-mapped checkpoint, by its extension."""
+    return str(filename).endswith(MMAP_CHECKPOINT_EXT)
+
+
+def save_mmap_checkpoint(state_dict, filename, meta=None):
+    """Save a state_dict as a memory-mapped checkpoint.
+
+    The file follows the safetensors layout. The tensors are stored
+    contiguously, sorted by decreasing element size so that each of them is
+    aligned for its dtype. ``meta`` is stored in the header as JSON.
+
+    Args:
+        state_dict (dict): The tensors to save.
+        filename (str): Checkpoint filename.
+        meta (dict, optional): Metadata to be saved in checkpoint.
+    """
+    tensors = []
+    for key, val in state_dict.items():
+        if not isinstance(val, torch.Tensor):
+            raise TypeError(f'{key} is not a tensor but a {type(val)}')
+        if val.dtype not in _MMAP_DTYPE_NAMES:
+            raise TypeError(f'Unsupported dtype {val.dtype} of {key}')
+        tensors.append((key, val.detach().cpu().contiguous()))
+    # the header keeps the order of the state_dict
+    header = OrderedDict()
+    header['__metadata__'] = {
+        'format': 'pt',
+        'meta': json.dumps(meta or {}, default=str)
+    }
+    for key, val in tensors:
+        header[key] = {
+            'dtype': _MMAP_DTYPE_NAMES[val.dtype],
+            'shape': list(val.shape)
+        }
+    tensors.sort(key=lambda item: -item[1].element_size())
+    offset = 0
+    for key, val in tensors:
+        nbytes = val.numel() * val.element_size()
+        header[key]['data_offsets'] = [offset, offset + nbytes]
+        offset += nbytes
+    header = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    # pad the header so that the data starts 8-byte aligned
+    header += b' ' * (-len(header) % 8)
+
+    with open(filename, 'wb') as f:
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for _, val in tensors:
+            f.write(val.reshape(-1).view(torch.uint8).numpy().data)
+
+
+def load_mmap_checkpoint(filename):
+    """Load a memory-mapped checkpoint.
+
+    The file is mapped copy-on-write and the returned tensors are views of
+    the mapping: nothing is read before the tensors are accessed, and
+    modifying them doesn't modify the file.
+
+    Args:
+        filename (str): Checkpoint filename.
+
+    Returns:
+        dict: The checkpoint, with ``meta`` and ``state_dict`` fields.
+    """
+    with open(filename, 'rb') as f:
+        header_size = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(header_size).decode('utf-8'),
+                            object_pairs_hook=OrderedDict)
+        file_size = os.fstat(f.fileno()).st_size
+        # the tensors keep the mapping alive after the file is closed
+        data = torch.frombuffer(
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY),
+            dtype=torch.uint8)
+    data_start = 8 + header_size
+
+    metadata = header.pop('__metadata__', {})
+    state_dict = OrderedDict()
+    for key, info in header.items():
+        dtype = _MMAP_DTYPES.get(info['dtype'])
+        if dtype is None:
+            raise ValueError(
+                f'Unsupported dtype {info["dtype"]} of {key} in {filename}')
+        begin, end = info['data_offsets']
+        numel = 1
+        for size in info['shape']:
+            numel *= size
+        element_size = torch.empty(0, dtype=dtype).element_size()
+        if (end - begin != numel * element_size or begin > end
+                or data_start + end > file_size):
+            raise ValueError(f'Invalid data offsets of {key} in {filename}')
+        state_dict[key] = data[data_start + begin:data_start + end].view(
+            dtype).view(info['shape'])
+    return {
+        'meta': json.loads(metadata.get('meta', '{}')),
+        'state_dict': state_dict
+    }
+
+
+def convert_to_mmap_checkpoint(src, dst):
+    """Convert a checkpoint saved by torch into a memory-mapped checkpoint.
+
+    Only the ``meta`` and ``state_dict`` fields are kept, the optimizer
+    state is dropped.
+
+    Args:
+        src (str): The checkpoint to convert.
+        dst (str): The memory-mapped checkpoint filename.
+    """
+    checkpoint = torch.load(src, map_location='cpu')
+    if not isinstance(checkpoint, dict):
+        raise RuntimeError(f'No state_dict found in checkpoint file {src}')
+    if 'state_dict' in checkpoint:
+        state_dict = checkpoint['state_dict']
+        meta = checkpoint.get('meta')
+    else:
+        state_dict = checkpoint
+        meta = None
+    save_mmap_checkpoint(state_dict, dst, meta=meta)
+
+
 def weights_to_cpu(state_dict):
     """Copy a model state_dict to cpu.
 
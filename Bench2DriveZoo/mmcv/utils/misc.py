@@ -6,6 +6,7 @@ import subprocess
 import warnings
 from collections import abc
 from importlib import import_module
+from importlib.util import find_spec
 from inspect import getfullargspec
 from itertools import repeat
 
@@ -84,6 +85,47 @@ def import_modules_from_strings(imports, allow_failed_imports=False):
     return imported
 
 
+def lazy_getattr(package, name, attrs, star_modules=()):
+    """Resolve a lazily exported attribute of a package.
+
+    Meant for the module level ``__getattr__`` of a package (PEP 562), so that
+    its submodules are only imported when one of their names is accessed.
+    The submodules of the package are also resolved, as they were when
+    imported eagerly. The resolved value is cached in the package.
+
+    Args:
+        package (str): The name of the package, i.e. its ``__name__``.
+        name (str): The accessed attribute.
+        attrs (dict): Maps the exported names to the (relative) module
+            defining them.
+        star_modules (Sequence[str]): (Relative) modules whose public names
+            are exported, like ``from .module import *``. They are imported
+            in order until one of them has the name.
+
+    Returns:
+        object: The value of the attribute.
+    """
+    if name in attrs:
+        value = getattr(import_module(attrs[name], package), name)
+    elif not name.startswith('_') and find_spec(f'{package}.{name}'):
+        value = import_module(f'{package}.{name}')
+    else:
+        for star_module in star_modules:
+            if name.startswith('_'):
+                break
+            module = import_module(star_module, package)
+            exported = getattr(module, '__all__', None)
+            if (exported is None or name in exported) and hasattr(
+                    module, name):
+                value = getattr(module, name)
+                break
+        else:
+            raise AttributeError(
+                f'module {package!r} has no attribute {name!r}')
+    setattr(import_module(package), name, value)
+    return value
+
+
 def iter_cast(inputs, dst_type, return_type=None):
     """Cast elements of an iterable object into some type.
 
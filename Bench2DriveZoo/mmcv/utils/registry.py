@@ -1,5 +1,8 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+import importlib
 import inspect
+import os
+import re
 import warnings
 from functools import partial
 
@@ -55,6 +58,101 @@ def build_from_cfg(cfg, registry, default_args=None):
         raise type(e)(f'{obj_cls.__name__}: {e}')
 
 
+# Lazily registered modules: the types they register are looked up in their
+# source, and the modules are only imported when a registry resolves one of
+# these types.
+_LAZY_PACKAGES = []
+_LAZY_MODULES = {}
+
+# ``@XXX.register_module(...)`` decorating a class or a function, or
+# ``XXX.register_module('name', ...)`` / ``XXX.register_module(name='name')``
+_DECORATOR_PATTERN = re.compile(
+    r'^[ \t]*@[\w.]+\.register_module(?:\(([^)]*)\))?[ \t]*\n'
+    r'(?:[ \t]*@.*\n)*[ \t]*(?:class|def)[ \t]+(\w+)', re.MULTILINE)
+_CALL_PATTERN = re.compile(
+    r'^[ \t]*[\w.]+\.register_module\([ \t]*(?:name[ \t]*=[ \t]*)?'
+    r'[\'"](\w+)[\'"]', re.MULTILINE)
+_NAME_PATTERN = re.compile(r'^[ \t]*(?:name[ \t]*=[ \t]*)?[\'"](\w+)[\'"]')
+
+
+def register_lazy_module(name, module_path):
+    """Register a module to be imported when a type is not found.
+
+    The module is imported the first time a registry fails to resolve
+    ``name``, e.g. when building a config, and the lookup is retried.
+
+    Args:
+        name (str): The type name registered by the module.
+        module_path (str): The dotted path of the module, e.g.
+            ``mmcv.models.detectors.uniad_e2e``.
+    """
+    modules = _LAZY_MODULES.setdefault(name, [])
+    if module_path not in modules:
+        modules.append(module_path)
+
+
+def register_lazy_package(package):
+    """Register all the modules of a package to be imported lazily.
+
+    The sources of the package are scanned for ``register_module`` calls the
+    first time a registry fails to resolve a type, so that only the modules
+    registering the requested types are imported.
+
+    Args:
+        package (str): The dotted path of the package, e.g. ``mmcv``.
+    """
+    if package not in _LAZY_PACKAGES:
+        _LAZY_PACKAGES.append(package)
+
+
+def _scan_lazy_packages():
+    while _LAZY_PACKAGES:
+        package = _LAZY_PACKAGES.pop(0)
+        for root in importlib.import_module(package).__path__:
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if filename.endswith('.py'):
+                        _scan_lazy_file(package, root, dirpath, filename)
+
+
+def _scan_lazy_file(package, root, dirpath, filename):
+    path = os.path.join(dirpath, filename)
+    try:
+        with open(path, encoding='utf-8') as f:
+            source = f.read()
+    except (OSError, UnicodeDecodeError):
+        return
+    if 'register_module' not in source:
+        return
+
+    parts = os.path.relpath(path, root)[:-len('.py')].split(os.sep)
+    if parts[-1] == '__init__':
+        parts = parts[:-1]
+    module_path = '.'.join([package] + parts)
+
+    for args, obj_name in _DECORATOR_PATTERN.findall(source):
+        match = _NAME_PATTERN.match(args)
+        register_lazy_module(match.group(1) if match else obj_name,
+                             module_path)
+    for name in _CALL_PATTERN.findall(source):
+        register_lazy_module(name, module_path)
+
+
+def _import_lazy_modules(name):
+    """Import the next lazy module registering ``name``.
+
+    Returns:
+        bool: Whether a module was imported.
+    """
+    _scan_lazy_packages()
+    modules = _LAZY_MODULES.get(name)
+    if not modules:
+        return False
+    importlib.import_module(modules.pop(0))
+    return True
+
+
 class Registry:
     """A registry to map strings to classes.
 
@@ -139,9 +237,11 @@ class Registry:
         Returns:
             scope (str): The inferred scope name.
         """
-        # inspect.stack() trace where this function is called, the index-2
-        # indicates the frame where `infer_scope()` is called
-        filename = inspect.getmodule(inspect.stack()[2][0]).__name__
+        # the second outer frame is where `infer_scope()` is called. Unlike
+        # inspect.stack(), walking the frames doesn't read the source files
+        # of the whole stack, which is slow in deep (import) stacks
+        frame = inspect.currentframe().f_back.f_back
+        filename = frame.f_globals['__name__']
         split_filename = filename.split('.')
         return split_filename[0]
 
@@ -186,12 +286,22 @@ class Registry:
     def get(self, key):
         """Get the registry record.
 
+        The lazily registered modules (see :func:`register_lazy_package`)
+        registering the type are imported if it is not found.
+
         Args:
             key (str): The class name in string format.
 
         Returns:
             class: The corresponding class.
         """
+        obj_cls = self._get(key)
+        real_key = self.split_scope_key(key)[1]
+        while obj_cls is None and _import_lazy_modules(real_key):
+            obj_cls = self._get(key)
+        return obj_cls
+
+    def _get(self, key):
         scope, real_key = self.split_scope_key(key)
         if scope is None or scope == self._scope:
             # get from self
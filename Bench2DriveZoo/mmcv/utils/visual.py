@@ -1,11 +1,13 @@
 import torch
-from torchvision.utils import make_grid
-import torchvision
-import matplotlib.pyplot as plt
 import cv2
 
 
+# torchvision and matplotlib are imported by the functions, as they are slow to
+# import and not needed by most users of mmcv.utils
+
+
 def convert_color(img_path):
+    import matplotlib.pyplot as plt
     plt.figure()
     img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
     plt.imsave(img_path, img, cmap=plt.get_cmap('viridis'))
@@ -13,6 +15,8 @@ def convert_color(img_path):
 
 
 def save_tensor(tensor, path, pad_value=254.0,):
+    import torchvision
+    from torchvision.utils import make_grid
     print('save_tensor', path)
     tensor = tensor.to(torch.float).detach().cpu()
     if tensor.type() == 'torch.BoolTensor':
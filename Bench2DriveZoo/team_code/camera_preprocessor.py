@@ -0,0 +1,77 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+CAMERAS = ['CAM_FRONT','CAM_FRONT_LEFT','CAM_FRONT_RIGHT','CAM_BACK','CAM_BACK_LEFT','CAM_BACK_RIGHT']
+
+
+class CameraPreprocessor(object):
+    """
+    Converts the raw BGRA camera frames to RGB and applies the JPEG round trip used
+    to mimic the compression of the training data.
+
+    The cameras are processed concurrently in a persistent thread pool (OpenCV releases
+    the GIL), and the color conversion writes into buffers allocated once per camera.
+    The decoded images are new arrays every step, since they are handed to the model
+    pipeline and saved. The output is bit-exact with the serial version.
+
+    After each call, 'timings' holds the wall time of the whole stage and the time
+    spent in each operation summed over the cameras, in seconds.
+    """
+
+    def __init__(self, cameras=CAMERAS, jpeg_quality=20, num_workers=None):
+        self.cameras = list(cameras)
+        self.encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality]
+        if num_workers is None:
+            num_workers = len(self.cameras)
+        self._pool = ThreadPoolExecutor(max_workers=num_workers) if num_workers > 1 else None
+        self._buffers = {}
+        self.timings = {}
+
+    def _get_buffer(self, cam, shape):
+        buffer = self._buffers.get(cam)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, dtype=np.uint8)
+            self._buffers[cam] = buffer
+        return buffer
+
+    def _process_camera(self, cam, raw):
+        t0 = time.perf_counter()
+        rgb = self._get_buffer(cam, raw.shape[:2] + (3,))
+        if raw.shape[2] == 4:
+            cv2.cvtColor(raw, cv2.COLOR_BGRA2RGB, dst=rgb)
+        else:
+            cv2.cvtColor(raw[:, :, :3], cv2.COLOR_BGR2RGB, dst=rgb)
+        t1 = time.perf_counter()
+        _, encoded = cv2.imencode('.jpg', rgb, self.encode_param)
+        t2 = time.perf_counter()
+        img = cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+        t3 = time.perf_counter()
+        return img, (t1 - t0, t2 - t1, t3 - t2)
+
+    def __call__(self, input_data):
+        """
+        Returns a dict with the preprocessed image of each camera
+        """
+        start = time.perf_counter()
+        raws = [input_data[cam][1] for cam in self.cameras]
+        if self._pool is not None:
+            outputs = list(self._pool.map(self._process_camera, self.cameras, raws))
+        else:
+            outputs = [self._process_camera(cam, raw) for cam, raw in zip(self.cameras, raws)]
+
+        stage_times = np.sum([times for _, times in outputs], axis=0)
+        self.timings = {
+            'total': time.perf_counter() - start,
+            'convert': float(stage_times[0]),
+            'encode': float(stage_times[1]),
+            'decode': float(stage_times[2]),
+        }
+        return {cam: img for cam, (img, _) in zip(self.cameras, outputs)}
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
@@ -0,0 +1,234 @@
+import copy
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+from mmcv.core.bbox import get_box_type
+from mmcv.datasets.pipelines import Compose
+from mmcv.image import imnormalize, impad, impad_to_multiple, imresize
+from mmcv.parallel.collate import collate as mm_collate_to_batch_form
+
+from Bench2DriveZoo.team_code.camera_preprocessor import CAMERAS
+
+LOADING_TRANSFORMS = ['LoadMultiViewImageFromFilesInCeph', 'LoadMultiViewImageFromFiles']
+FORMAT_BUNDLES = ['DefaultFormatBundle3D', 'VADFormatBundle3D']
+
+
+def _compile_image_transforms(pipeline_cfg):
+    """
+    Returns the image operations of an inference pipeline made of the multi-view normalization,
+    padding and rescaling, a single test time augmentation, a format bundle and CustomCollect3D,
+    or None for any other pipeline.
+    """
+    ops = []
+    transforms = list(pipeline_cfg)
+    while transforms:
+        cfg = dict(transforms.pop(0))
+        kind = cfg.pop('type')
+        if kind == 'NormalizeMultiviewImage':
+            mean = np.array(cfg['mean'], dtype=np.float32)
+            std = np.array(cfg['std'], dtype=np.float32)
+            to_rgb = cfg.get('to_rgb', True)
+            ops.append(lambda img, mean=mean, std=std, to_rgb=to_rgb: imnormalize(img, mean, std, to_rgb))
+        elif kind == 'PadMultiViewImage':
+            pad_val = cfg.get('pad_val', 0)
+            if cfg.get('size') is not None:
+                ops.append(lambda img, size=cfg['size'], pad_val=pad_val: impad(img, shape=size, pad_val=pad_val))
+            else:
+                ops.append(lambda img, divisor=cfg['size_divisor'], pad_val=pad_val:
+                           impad_to_multiple(img, divisor, pad_val=pad_val))
+        elif kind == 'RandomScaleImageMultiViewImage':
+            if len(cfg['scales']) != 1:
+                return None
+            ops.append(lambda img, scale=cfg['scales'][0]:
+                       imresize(img, (int(img.shape[1] * scale), int(img.shape[0] * scale)), return_scale=False))
+        elif kind == 'MultiScaleFlipAug3D':
+            if cfg.get('flip', False) or isinstance(cfg['img_scale'], list) or isinstance(cfg['pts_scale_ratio'], list):
+                return None
+            transforms = list(cfg['transforms']) + transforms
+        elif kind in FORMAT_BUNDLES or kind == 'CustomCollect3D':
+            continue
+        else:
+            return None
+    return ops
+
+
+class InferenceInputBuilder(object):
+
+    """
+    Builds the model inputs of the agents, as running 'inference_only_pipeline' (without the image
+    loading) and collating a batch of one sample does, and moves them to the device.
+
+    The agent input layout is fixed: the cameras, their calibration and the collected keys don't
+    change between steps. So the first step goes through the pipeline once, which 'compiles' the
+    constant image metas and the shape of each collected key. The next steps only run the image
+    operations of the pipeline, concurrently for the cameras, into a reused (pinned) buffer, and
+    fill the other inputs into reused buffers before copying them to the device. lidar2img is
+    kept on the device, as the BEV encoder uses it.
+
+    The compiled inputs of the first step are checked against the pipeline outputs, and the
+    builder keeps using the pipeline if they differ or if the pipeline has other transforms.
+    """
+
+    def __init__(self, pipeline_cfg, lidar2img, lidar2cam, cameras=CAMERAS, device='cuda', num_workers=None):
+        pipeline_cfg = [cfg for cfg in pipeline_cfg if cfg['type'] not in LOADING_TRANSFORMS]
+        self.pipeline = Compose(pipeline_cfg)
+        self.cameras = list(cameras)
+        self.lidar2img = np.stack([lidar2img[cam] for cam in self.cameras], axis=0)
+        self.lidar2cam = np.stack([lidar2cam[cam] for cam in self.cameras], axis=0)
+        self.device = torch.device(device)
+        self.box_type_3d, _ = get_box_type('LiDAR')
+        self._image_ops = _compile_image_transforms(pipeline_cfg)
+        if num_workers is None:
+            num_workers = len(self.cameras)
+        self._pool = ThreadPoolExecutor(max_workers=num_workers) if num_workers > 1 else None
+        self._pin_memory = self.device.type == 'cuda'
+        self._compiled = None
+        self._compiled_shape = None
+        self._copy_done = None
+
+    def __call__(self, imgs, **inputs):
+        """
+        Returns the model input batch for the images of the cameras (dict of camera -> HWC uint8)
+        and the other inputs of the step, e.g. can_bus, timestamp, command.
+        """
+        imgs = [imgs[cam] for cam in self.cameras]
+        if self._image_ops is None:
+            return self.run_pipeline(imgs, **inputs)
+        input_shape = tuple(img.shape for img in imgs)
+        if self._compiled_shape != input_shape:
+            batch = self.run_pipeline(imgs, **inputs)
+            self._compile(batch, imgs, inputs)
+            self._compiled_shape = input_shape
+            return batch
+        return self._build(imgs, inputs)
+
+    def run_pipeline(self, imgs, **inputs):
+        """Builds the input batch with the generic pipeline and collate"""
+        results = dict(inputs)
+        results['lidar2img'] = self.lidar2img.copy()
+        results['lidar2cam'] = self.lidar2cam.copy()
+        results['img'] = list(imgs)
+        results['folder'] = ' '
+        results['scene_token'] = ' '
+        results['frame_idx'] = 0
+        results['box_type_3d'] = self.box_type_3d
+        stacked_shape = imgs[0].shape + (len(imgs),)
+        results['img_shape'] = stacked_shape
+        results['ori_shape'] = stacked_shape
+        results['pad_shape'] = stacked_shape
+        results = self.pipeline(results)
+        batch = mm_collate_to_batch_form([results], samples_per_gpu=1)
+        for key, data in batch.items():
+            if key != 'img_metas':
+                if torch.is_tensor(data[0]):
+                    data[0] = data[0].to(self.device)
+        return batch
+
+    def _compile(self, batch, imgs, inputs):
+        if any(key not in inputs for key in batch if key not in ['img_metas', 'img']):
+            self._image_ops = None
+            return
+        meta = batch['img_metas'][0][0]
+        self._compiled = {
+            'keys': list(batch),
+            'meta': copy.deepcopy(meta),
+            'meta_inputs': [key for key in meta if key in inputs],
+            'layout': {key: (tuple(data[0].shape), data[0].dtype) for key, data in batch.items()
+                       if key not in ['img_metas', 'img']},
+            'image_shape': tuple(batch['img'][0].shape[1:]),
+            'lidar2img': torch.as_tensor(np.asarray(meta['lidar2img']), device=self.device),
+            'buffers': {},
+        }
+        compiled = self._build(imgs, inputs)
+        if not self._same_inputs(batch, compiled):
+            warnings.warn('The compiled agent inputs differ from the inference pipeline, using the pipeline')
+            self._image_ops = None
+
+    def _buffer(self, key, shape, dtype):
+        buffer = self._compiled['buffers'].get(key)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = torch.empty(shape, dtype=dtype, pin_memory=self._pin_memory)
+            self._compiled['buffers'][key] = buffer
+        return buffer
+
+    def _to_device(self, buffer):
+        if self._pin_memory:
+            return buffer.to(self.device, non_blocking=True)
+        # the buffers are reused, the batch must not share them
+        return buffer.to(self.device, copy=True)
+
+    def _process_image(self, img, out):
+        for op in self._image_ops:
+            img = op(img)
+        out.copy_(torch.from_numpy(img.transpose(2, 0, 1)))
+
+    def _build(self, imgs, inputs):
+        compiled = self._compiled
+        if self._copy_done is not None:
+            # the previous copies from the buffers must be over before refilling them
+            self._copy_done.synchronize()
+
+        # the model modifies some of the metas in place, e.g. can_bus
+        meta = dict(compiled['meta'], lidar2img=compiled['lidar2img'])
+        for key in compiled['meta_inputs']:
+            meta[key] = copy.deepcopy(inputs[key])
+
+        img_buffer = self._buffer('img', compiled['image_shape'], torch.float32)
+        if self._pool is not None:
+            list(self._pool.map(self._process_image, imgs, img_buffer))
+        else:
+            for img, out in zip(imgs, img_buffer):
+                self._process_image(img, out)
+
+        batch = {}
+        for key in compiled['keys']:
+            if key == 'img_metas':
+                batch[key] = [[meta]]
+            elif key == 'img':
+                batch[key] = [self._to_device(img_buffer)[None]]
+            else:
+                shape, dtype = compiled['layout'][key]
+                buffer = self._buffer(key, shape, dtype)
+                buffer.copy_(torch.from_numpy(np.asarray(inputs[key]).reshape(shape)))
+                batch[key] = [self._to_device(buffer)]
+        if self.device.type == 'cuda':
+            self._copy_done = torch.cuda.Event()
+            self._copy_done.record()
+        return batch
+
+    def _same_inputs(self, batch, compiled):
+        if list(batch) != list(compiled):
+            return False
+        meta, compiled_meta = batch['img_metas'][0][0], compiled['img_metas'][0][0]
+        if list(meta) != list(compiled_meta):
+            return False
+        for key, value in meta.items():
+            compiled_value = compiled_meta[key]
+            if torch.is_tensor(compiled_value):
+                compiled_value = compiled_value.cpu().numpy()
+            if not _equal(value, compiled_value):
+                return False
+        for key in batch:
+            if key != 'img_metas':
+                data, compiled_data = batch[key][0], compiled[key][0]
+                if data.dtype != compiled_data.dtype or not torch.equal(data, compiled_data):
+                    return False
+        return True
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+def _equal(a, b):
+    if isinstance(a, dict):
+        return isinstance(b, dict) and list(a) == list(b) and all(_equal(a[k], b[k]) for k in a)
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all(_equal(x, y) for x, y in zip(a, b))
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        a, b = np.asarray(a), np.asarray(b)
+        return a.shape == b.shape and a.dtype == b.dtype and np.array_equal(a, b)
+    return a == b
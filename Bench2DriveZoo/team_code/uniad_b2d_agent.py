@@ -15,16 +15,19 @@ from PIL import Image
 from torchvision import transforms as T
 from Bench2DriveZoo.team_code.pid_controller import PIDController
 from Bench2DriveZoo.team_code.planner import RoutePlanner
+from Bench2DriveZoo.team_code.camera_preprocessor import CameraPreprocessor
+from Bench2DriveZoo.team_code.inference_inputs import InferenceInputBuilder
 from leaderboard.autoagents import autonomous_agent
+from leaderboard.utils.bev_renderer import BEVRenderer
+from leaderboard.utils.agent_recorder import AgentRecorder
 from mmcv import Config
 from mmcv.models import build_model
 from mmcv.utils import (get_dist_info, init_dist, load_checkpoint,wrap_fp16_model)
-from mmcv.datasets.pipelines import Compose
-from mmcv.parallel.collate import collate as  mm_collate_to_batch_form
-from mmcv.core.bbox import get_box_type
 from pyquaternion import Quaternion
 from scipy.optimize import fsolve
 SAVE_PATH = os.environ.get('SAVE_PATH', None)
+BEV_RENDERER = os.environ.get('BEV_RENDERER', 'camera')
+SAVE_FORMAT = os.environ.get('SAVE_FORMAT', 'png')
 
 def get_entry_point():
     return 'UniadAgent'
@@ -64,15 +67,13 @@ class UniadAgent(autonomous_agent.AutonomousAgent):
         checkpoint = load_checkpoint(self.model, self.ckpt_path, map_location='cpu', strict=True)
         self.model.cuda()
         self.model.eval()
-        self.inference_only_pipeline = []
-        for inference_only_pipeline in cfg.inference_only_pipeline:
-            if inference_only_pipeline["type"] not in ['LoadMultiViewImageFromFilesInCeph']:
-                self.inference_only_pipeline.append(inference_only_pipeline)
-        self.inference_only_pipeline = Compose(self.inference_only_pipeline)
         self.takeover = False
         self.stop_time = 0
         self.takeover_time = 0
         self.save_path = None
+        self.recorder = None
+        self.bev_renderer = BEVRenderer() if BEV_RENDERER == 'map' else None
+        self.camera_preprocessor = CameraPreprocessor(jpeg_quality=20)
         self._im_transform = T.Compose([T.ToTensor(), T.Normalize(mean=[0.485,0.456,0.406], std=[0.229,0.224,0.225])])
         self.last_steers = deque()
         self.lat_ref, self.lon_ref = 42.0, 2.0
@@ -89,14 +90,17 @@ class UniadAgent(autonomous_agent.AutonomousAgent):
             self.save_path = pathlib.Path(os.environ['SAVE_PATH']) / string
             # self.save_path = pathlib.Path(routes_path).stem + '_'
             self.save_path.mkdir(parents=True, exist_ok=False)
-            (self.save_path / 'rgb_front').mkdir()
-            (self.save_path / 'rgb_front_right').mkdir()
-            (self.save_path / 'rgb_front_left').mkdir()
-            (self.save_path / 'rgb_back').mkdir()
-            (self.save_path / 'rgb_back_right').mkdir()
-            (self.save_path / 'rgb_back_left').mkdir()
-            (self.save_path / 'meta').mkdir()
-            (self.save_path / 'bev').mkdir()
+            if SAVE_FORMAT != 'png':
+                self.recorder = AgentRecorder(self.save_path, recording_format=SAVE_FORMAT)
+            else:
+                (self.save_path / 'rgb_front').mkdir()
+                (self.save_path / 'rgb_front_right').mkdir()
+                (self.save_path / 'rgb_front_left').mkdir()
+                (self.save_path / 'rgb_back').mkdir()
+                (self.save_path / 'rgb_back_right').mkdir()
+                (self.save_path / 'rgb_back_left').mkdir()
+                (self.save_path / 'meta').mkdir()
+                (self.save_path / 'bev').mkdir()
    
         # write extrinsics directly
         self.lidar2img = {
@@ -158,6 +162,7 @@ class UniadAgent(autonomous_agent.AutonomousAgent):
                                    [-1. ,  0. ,  0. ,  0.  ],
                                    [ 0. ,  0. ,  1. ,  1.84],
                                    [ 0. ,  0. ,  0. ,  1.  ]])
+        self.input_builder = InferenceInputBuilder(cfg.inference_only_pipeline, self.lidar2img, self.lidar2cam, device='cuda')
         
         topdown_extrinsics =  np.array([[0.0, -0.0, -1.0, 50.0], [0.0, 1.0, -0.0, 0.0], [1.0, -0.0, 0.0, -0.0], [0.0, 0.0, 0.0, 1.0]])
         unreal2cam = np.array([[0,1,0,0], [0,0,-1,0], [1,0,0,0], [0,0,0,1]])
@@ -258,26 +263,26 @@ class UniadAgent(autonomous_agent.AutonomousAgent):
                 
             ]
         
-        sensors += [
-                {	
-                    'type': 'sensor.camera.rgb',
-                    'x': 0.0, 'y': 0.0, 'z': 50.0,
-                    'roll': 0.0, 'pitch': -90.0, 'yaw': 0.0,
-                    'width': 512, 'height': 512, 'fov': 5 * 10.0,
-                    'id': 'bev'
-                }]
+        if BEV_RENDERER == 'camera':
+            sensors += [
+                    {	
+                        'type': 'sensor.camera.rgb',
+                        'x': 0.0, 'y': 0.0, 'z': 50.0,
+                        'roll': 0.0, 'pitch': -90.0, 'yaw': 0.0,
+                        'width': 512, 'height': 512, 'fov': 5 * 10.0,
+                        'id': 'bev'
+                    }]
         return sensors
 
     def tick(self, input_data):
         self.step += 1
-        encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 20]
-        imgs = {}
-        for cam in ['CAM_FRONT','CAM_FRONT_LEFT','CAM_FRONT_RIGHT','CAM_BACK','CAM_BACK_LEFT','CAM_BACK_RIGHT']:
-            img = cv2.cvtColor(input_data[cam][1][:, :, :3], cv2.COLOR_BGR2RGB)
-            _, img = cv2.imencode('.jpg', img, encode_param)
-            img = cv2.imdecode(img, cv2.IMREAD_COLOR)
-            imgs[cam] = img
-        bev = cv2.cvtColor(input_data['bev'][1][:, :, :3], cv2.COLOR_BGR2RGB)
+        imgs = self.camera_preprocessor(input_data)
+        if self.bev_renderer is None:
+            bev = cv2.cvtColor(input_data['bev'][1][:, :, :3], cv2.COLOR_BGR2RGB)
+        elif self._is_save_step():
+            bev = self.bev_renderer.render()
+        else:
+            bev = None  # only drawn for the saved frames
         gps = input_data['GPS'][1][:2]
         speed = input_data['SPEED'][1]['speed']
         compass = input_data['IMU'][1][-1]
@@ -311,23 +316,6 @@ class UniadAgent(autonomous_agent.AutonomousAgent):
         if not self.initialized:
             self._init()
         tick_data = self.tick(input_data)
-        results = {}
-        results['lidar2img'] = []
-        results['lidar2cam'] = []
-        results['img'] = []
-        results['folder'] = ' '
-        results['scene_token'] = ' '  
-        results['frame_idx'] = 0
-        results['timestamp'] = self.step / frame_rate 
-        results['box_type_3d'], _ = get_box_type('LiDAR')
-  
-        for cam in ['CAM_FRONT','CAM_FRONT_LEFT','CAM_FRONT_RIGHT','CAM_BACK','CAM_BACK_LEFT','CAM_BACK_RIGHT']:
-            results['lidar2img'].append(self.lidar2img[cam])
-            results['lidar2cam'].append(self.lidar2cam[cam])
-            results['img'].append(tick_data['imgs'][cam])
-        results['lidar2img'] = np.stack(results['lidar2img'],axis=0)
-        results['lidar2cam'] = np.stack(results['lidar2cam'],axis=0)
-  
         raw_theta = tick_data['compass']   if not np.isnan(tick_data['compass']) else 0
         ego_theta = -raw_theta + np.pi/2
         rotation = list(Quaternion(axis=[0, 0, 1], radians=ego_theta))
@@ -342,12 +330,10 @@ class UniadAgent(autonomous_agent.AutonomousAgent):
         can_bus[13:16] = -tick_data['angular_velocity']
         can_bus[16] = ego_theta
         can_bus[17] = ego_theta / np.pi * 180 
-        results['can_bus'] = can_bus
         command = tick_data['command_near']
         if command < 0:
             command = 4
         command -= 1
-        results['command'] = command
   
         theta_to_lidar = raw_theta
         command_near_xy = np.array([tick_data['command_near_xy'][0]-can_bus[0],-tick_data['command_near_xy'][1]-can_bus[1]])
@@ -358,19 +344,12 @@ class UniadAgent(autonomous_agent.AutonomousAgent):
         ego2world[0:3,0:3] = Quaternion(axis=[0, 0, 1], radians=ego_theta).rotation_matrix
         ego2world[0:2,3] = can_bus[0:2]
         lidar2global = ego2world @ self.lidar2ego
-        results['l2g_r_mat'] = lidar2global[0:3,0:3]
-        results['l2g_t'] = lidar2global[0:3,3]
-        stacked_imgs = np.stack(results['img'],axis=-1)
-        results['img_shape'] = stacked_imgs.shape
-        results['ori_shape'] = stacked_imgs.shape
-        results['pad_shape'] = stacked_imgs.shape
-        results = self.inference_only_pipeline(results)
-        self.device="cuda"
-        input_data_batch = mm_collate_to_batch_form([results], samples_per_gpu=1)
-        for key, data in input_data_batch.items():
-            if key != 'img_metas':
-                if torch.is_tensor(data[0]):
-                    data[0] = data[0].to(self.device)
+        input_data_batch = self.input_builder(tick_data['imgs'],
+                                              timestamp=self.step / frame_rate,
+                                              can_bus=can_bus,
+                                              command=command,
+                                              l2g_r_mat=lidar2global[0:3,0:3],
+                                              l2g_t=lidar2global[0:3,3])
         output_data_batch = self.model(input_data_batch, return_loss=False, rescale=True)
         out_truck =  output_data_batch[0]['planning']['result_planning']['sdc_traj'][0].cpu().numpy()
         steer_traj, throttle_traj, brake_traj, metadata_traj = self.pidcontroller.control_pid(out_truck, tick_data['speed'], local_command_xy)
@@ -391,13 +370,28 @@ class UniadAgent(autonomous_agent.AutonomousAgent):
         self.pid_metadata['throttle_traj'] = float(throttle_traj)
         self.pid_metadata['brake_traj'] = float(brake_traj)
         self.pid_metadata['plan'] = out_truck.tolist()
-        if SAVE_PATH is not None and SAVE_PATH != 'None' and self.step % frame_rate == 0:
+        if self._is_save_step():
             self.save(tick_data)
         self.prev_control = control
         return control
 
+    def _is_save_step(self):
+        return SAVE_PATH is not None and SAVE_PATH != 'None' and self.step % frame_rate == 0
+
     def save(self, tick_data):
         frame = self.step // frame_rate
+        if self.recorder is not None:
+            images = {
+                'rgb_front': tick_data['imgs']['CAM_FRONT'],
+                'rgb_front_left': tick_data['imgs']['CAM_FRONT_LEFT'],
+                'rgb_front_right': tick_data['imgs']['CAM_FRONT_RIGHT'],
+                'rgb_back': tick_data['imgs']['CAM_BACK'],
+                'rgb_back_left': tick_data['imgs']['CAM_BACK_LEFT'],
+                'rgb_back_right': tick_data['imgs']['CAM_BACK_RIGHT'],
+                'bev': tick_data['bev'],
+            }
+            self.recorder.add_frame(frame, images, self.pid_metadata)
+            return
         Image.fromarray(tick_data['imgs']['CAM_FRONT']).save(self.save_path / 'rgb_front' / ('%04d.png' % frame))
         Image.fromarray(tick_data['imgs']['CAM_FRONT_LEFT']).save(self.save_path / 'rgb_front_left' / ('%04d.png' % frame))
         Image.fromarray(tick_data['imgs']['CAM_FRONT_RIGHT']).save(self.save_path / 'rgb_front_right' / ('%04d.png' % frame))
@@ -410,6 +404,10 @@ class UniadAgent(autonomous_agent.AutonomousAgent):
         outfile.close()
 
     def destroy(self):
+        self.camera_preprocessor.close()
+        self.input_builder.close()
+        if self.recorder is not None:
+            self.recorder.close()
         del self.model
         torch.cuda.empty_cache()
 
@@ -16,7 +16,10 @@ from PIL import Image
 from torchvision import transforms as T
 from Bench2DriveZoo.team_code.pid_controller import PIDController
 from Bench2DriveZoo.team_code.planner import RoutePlanner
+from Bench2DriveZoo.team_code.camera_preprocessor import CameraPreprocessor
 from leaderboard.autoagents import autonomous_agent
+from leaderboard.utils.bev_renderer import BEVRenderer
+from leaderboard.utils.agent_recorder import AgentRecorder
 from mmcv import Config
 from mmcv.models import build_model
 from mmcv.utils import (get_dist_info, init_dist, load_checkpoint,
@@ -30,6 +33,8 @@ import copy
 import seaborn as sns
 
 SAVE_PATH = os.environ.get('SAVE_PATH', None)
+BEV_RENDERER = os.environ.get('BEV_RENDERER', 'camera')
+SAVE_FORMAT = os.environ.get('SAVE_FORMAT', 'png')
 
 def float_to_uint8_color(float_clr):
     assert all([c >= 0. for c in float_clr])
@@ -97,6 +102,9 @@ class VadAgent(autonomous_agent.AutonomousAgent):
         self.stop_time = 0
         self.takeover_time = 0
         self.save_path = None
+        self.recorder = None
+        self.bev_renderer = BEVRenderer() if BEV_RENDERER == 'map' else None
+        self.camera_preprocessor = CameraPreprocessor(jpeg_quality=20)
         self._im_transform = T.Compose([T.ToTensor(), T.Normalize(mean=[0.485,0.456,0.406], std=[0.229,0.224,0.225])])
         self.lat_ref, self.lon_ref = 42.0, 2.0
 
@@ -113,14 +121,17 @@ class VadAgent(autonomous_agent.AutonomousAgent):
             string += self.save_name
             self.save_path = pathlib.Path(os.environ['SAVE_PATH']) / string
             self.save_path.mkdir(parents=True, exist_ok=False)
-            (self.save_path / 'rgb_front').mkdir()
-            (self.save_path / 'rgb_front_right').mkdir()
-            (self.save_path / 'rgb_front_left').mkdir()
-            (self.save_path / 'rgb_back').mkdir()
-            (self.save_path / 'rgb_back_right').mkdir()
-            (self.save_path / 'rgb_back_left').mkdir()
-            (self.save_path / 'meta').mkdir()
-            (self.save_path / 'bev').mkdir()
+            if SAVE_FORMAT != 'png':
+                self.recorder = AgentRecorder(self.save_path, recording_format=SAVE_FORMAT)
+            else:
+                (self.save_path / 'rgb_front').mkdir()
+                (self.save_path / 'rgb_front_right').mkdir()
+                (self.save_path / 'rgb_front_left').mkdir()
+                (self.save_path / 'rgb_back').mkdir()
+                (self.save_path / 'rgb_back_right').mkdir()
+                (self.save_path / 'rgb_back_left').mkdir()
+                (self.save_path / 'meta').mkdir()
+                (self.save_path / 'bev').mkdir()
 
         self.lidar2img = {
         'CAM_FRONT':np.array([[ 1.14251841e+03,  8.00000000e+02,  0.00000000e+00, -9.52000000e+02],
@@ -285,26 +296,26 @@ class VadAgent(autonomous_agent.AutonomousAgent):
                     'id': 'SPEED'
                 },
             ]
-        sensors += [
-                {	
-                    'type': 'sensor.camera.rgb',
-                    'x': 0.0, 'y': 0.0, 'z': 50.0,
-                    'roll': 0.0, 'pitch': -90.0, 'yaw': 0.0,
-                    'width': 512, 'height': 512, 'fov': 5 * 10.0,
-                    'id': 'bev'
-                }]
+        if BEV_RENDERER == 'camera':
+            sensors += [
+                    {	
+                        'type': 'sensor.camera.rgb',
+                        'x': 0.0, 'y': 0.0, 'z': 50.0,
+                        'roll': 0.0, 'pitch': -90.0, 'yaw': 0.0,
+                        'width': 512, 'height': 512, 'fov': 5 * 10.0,
+                        'id': 'bev'
+                    }]
         return sensors
 
     def tick(self, input_data):
         self.step += 1
-        encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 20]
-        imgs = {}
-        for cam in ['CAM_FRONT','CAM_FRONT_LEFT','CAM_FRONT_RIGHT','CAM_BACK','CAM_BACK_LEFT','CAM_BACK_RIGHT']:
-            img = cv2.cvtColor(input_data[cam][1][:, :, :3], cv2.COLOR_BGR2RGB)
-            _, img = cv2.imencode('.jpg', img, encode_param)
-            img = cv2.imdecode(img, cv2.IMREAD_COLOR)
-            imgs[cam] = img
-        bev = cv2.cvtColor(input_data['bev'][1][:, :, :3], cv2.COLOR_BGR2RGB)
+        imgs = self.camera_preprocessor(input_data)
+        if self.bev_renderer is None:
+            bev = cv2.cvtColor(input_data['bev'][1][:, :, :3], cv2.COLOR_BGR2RGB)
+        elif self._is_save_step():
+            bev = self.bev_renderer.render()
+        else:
+            bev = None  # only drawn for the saved frames
         gps = input_data['GPS'][1][:2]
         speed = input_data['SPEED'][1]['speed']
         compass = input_data['IMU'][1][-1]
@@ -437,7 +448,7 @@ class VadAgent(autonomous_agent.AutonomousAgent):
         self.pid_metadata['command'] = command
         self.pid_metadata['all_plan'] = all_out_truck.tolist()
         # if SAVE_PATH is not None and SAVE_PATH != 'None' and self.step % frame_rate == 0:
-        if SAVE_PATH is not None and SAVE_PATH != 'None':
+        if self._is_save_step():
             self.save(tick_data,out_truck,output_data_batch)
         self.prev_control = control
         
@@ -447,6 +458,9 @@ class VadAgent(autonomous_agent.AutonomousAgent):
         return control
 
 
+    def _is_save_step(self):
+        return SAVE_PATH is not None and SAVE_PATH != 'None'
+
     def save(self, tick_data,ego_traj,result=None):
         # print("vad agent save sensor datas.")
         frame = self.step #// frame_rate
@@ -456,6 +470,10 @@ class VadAgent(autonomous_agent.AutonomousAgent):
         imgs_with_box['bev'] = self.draw_lidar_bbox3d_on_img(result[0]['pts_bbox']['boxes_3d'], tick_data['bev'], self.coor2topdown, scores=result[0]['pts_bbox']['scores_3d'],labels=result[0]['pts_bbox']['labels_3d'],trajs=result[0]['pts_bbox']['trajs_3d'],canvas_size=(512,512))
         imgs_with_box['bev'] = self.draw_traj_bev(ego_traj, imgs_with_box['bev'],is_ego=True)
         imgs_with_box['CAM_FRONT'] = self.draw_traj(ego_traj, imgs_with_box['CAM_FRONT'])
+        if self.recorder is not None:
+            images = {str.lower(cam).replace('cam','rgb'): img for cam, img in imgs_with_box.items()}
+            self.recorder.add_frame(frame, images, self.pid_metadata)
+            return
         for cam, img in imgs_with_box.items():
             Image.fromarray(img).save(self.save_path / str.lower(cam).replace('cam','rgb') / ('%04d.png' % frame))   
                 
@@ -612,6 +630,9 @@ class VadAgent(autonomous_agent.AutonomousAgent):
         
 
     def destroy(self):
+        self.camera_preprocessor.close()
+        if self.recorder is not None:
+            self.recorder.close()
         del self.model
         torch.cuda.empty_cache()
 
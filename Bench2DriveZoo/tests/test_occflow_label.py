@@ -0,0 +1,287 @@
+import copy
+
+import cv2
+import numpy as np
+import pytest
+import torch
+
+from mmcv.core.bbox.structures.lidar_box3d import LiDARInstance3DBoxes
+from mmcv.datasets.pipelines.occflow_label import GenerateOccFlowLabels
+
+GRID_CONF = {
+    'xbound': [-50.0, 50.0, 0.5],
+    'ybound': [-50.0, 50.0, 0.5],
+    'zbound': [-10.0, 10.0, 20.0],
+}
+CLASS_NAMES = ['car', 'van', 'truck', 'bicycle', 'traffic_sign', 'traffic_cone', 'traffic_light', 'pedestrian', 'others']
+VEHICLE_CLASSES = ['car', 'van', 'truck', 'bicycle']
+PLAN_CLASSES = VEHICLE_CLASSES + ['pedestrian']
+
+
+class ReferenceOccFlowLabels(GenerateOccFlowLabels):
+    """The labels generation before it was vectorized, box by box and instance by instance"""
+
+    def __call__(self, results):
+        SPECIAL_INDEX = -20
+
+        all_gt_bboxes_3d = results['future_gt_bboxes_3d']
+        all_gt_labels_3d = results['future_gt_labels_3d']
+        all_gt_inds = results['future_gt_inds']
+        if 'future_gt_vis_tokens' in results.keys():
+            all_vis_tokens = results['future_gt_vis_tokens']
+        else:
+            all_vis_tokens = None
+        num_frame = len(all_gt_bboxes_3d)
+
+        l2e_r_mats = results['occ_l2e_r_mats']
+        l2e_t_vecs = results['occ_l2e_t_vecs']
+        e2g_r_mats = results['occ_e2g_r_mats']
+        e2g_t_vecs = results['occ_e2g_t_vecs']
+
+        t_ref = dict(l2e_r=l2e_r_mats[0], l2e_t=l2e_t_vecs[0], e2g_r=e2g_r_mats[0], e2g_t=e2g_t_vecs[0])
+
+        segmentations = []
+        instances = []
+        gt_future_boxes = []
+        gt_future_labels = []
+
+        for i in range(num_frame):
+            gt_bboxes_3d, gt_labels_3d = all_gt_bboxes_3d[i], all_gt_labels_3d[i]
+            ins_inds = all_gt_inds[i]
+            if all_vis_tokens is not None:
+                vis_tokens = all_vis_tokens[i]
+            else:
+                vis_tokens = None
+
+            if gt_bboxes_3d is None:
+                segmentation = np.ones(
+                    (self.bev_dimension[1], self.bev_dimension[0])) * self.ignore_index
+                instance = np.ones(
+                    (self.bev_dimension[1], self.bev_dimension[0])) * self.ignore_index
+            else:
+                t_curr = dict(l2e_r=l2e_r_mats[i], l2e_t=l2e_t_vecs[i], e2g_r=e2g_r_mats[i], e2g_t=e2g_t_vecs[i])
+                ref_bboxes_3d = self.reframe_boxes(gt_bboxes_3d, t_ref, t_curr)
+                gt_future_boxes.append(ref_bboxes_3d)
+                gt_future_labels.append(gt_labels_3d)
+
+                segmentation = np.zeros(
+                    (self.bev_dimension[1], self.bev_dimension[0]))
+                instance = np.zeros(
+                    (self.bev_dimension[1], self.bev_dimension[0]))
+
+                if self.only_vehicle:
+                    vehicle_mask = np.isin(gt_labels_3d, self.filter_cls_ids)
+                    ref_bboxes_3d = ref_bboxes_3d[vehicle_mask]
+                    gt_labels_3d = gt_labels_3d[vehicle_mask]
+                    ins_inds = ins_inds[vehicle_mask]
+                    if vis_tokens is not None:
+                        vis_tokens = vis_tokens[vehicle_mask]
+
+                if self.filter_invisible:
+                    assert vis_tokens is not None
+                    visible_mask = (vis_tokens != 1)
+                    ref_bboxes_3d = ref_bboxes_3d[visible_mask]
+                    gt_labels_3d = gt_labels_3d[visible_mask]
+                    ins_inds = ins_inds[visible_mask]
+
+                if len(ref_bboxes_3d.tensor) > 0:
+                    bbox_corners = ref_bboxes_3d.corners[:, [
+                        0, 3, 7, 4], :2].numpy()
+                    bbox_corners = np.round(
+                        (bbox_corners - self.bev_start_position[:2] + self.bev_resolution[:2] / 2.0) / self.bev_resolution[:2]).astype(np.int32)
+
+                    for index, gt_ind in enumerate(ins_inds):
+                        if gt_ind == self.ignore_index:
+                            gt_ind = SPECIAL_INDEX
+                        poly_region = bbox_corners[index]
+
+                        cv2.fillPoly(segmentation, [poly_region], 1.0)
+                        cv2.fillPoly(instance, [poly_region], int(gt_ind))
+
+            segmentations.append(segmentation)
+            instances.append(instance)
+
+        segmentations = torch.from_numpy(
+            np.stack(segmentations, axis=0)).long()
+        instances = torch.from_numpy(np.stack(instances, axis=0)).long()
+
+        instance_centerness, instance_offset, instance_flow, instance_backward_flow = self.center_offset_flow(
+            instances,
+            all_gt_inds,
+            ignore_index=255,
+            )
+
+        invalid_mask = (segmentations[:, 0, 0] == self.ignore_index)
+        instance_centerness[invalid_mask] = self.ignore_index
+
+        results['gt_occ_has_invalid_frame'] = results.pop('occ_has_invalid_frame')
+        results['gt_occ_img_is_valid'] = results.pop('occ_img_is_valid')
+        results.update({
+            'gt_segmentation': segmentations,
+            'gt_instance': instances,
+            'gt_centerness': instance_centerness,
+            'gt_offset': instance_offset,
+            'gt_flow': instance_flow,
+            'gt_backward_flow': instance_backward_flow,
+            'gt_future_boxes': gt_future_boxes,
+            'gt_future_labels': gt_future_labels
+        })
+        return results
+
+    def center_offset_flow(self, instance_img, all_gt_inds, ignore_index=255, sigma=3.0):
+        seq_len, h, w = instance_img.shape
+        center_label = torch.zeros(seq_len, 1, h, w)
+        offset_label = ignore_index * torch.ones(seq_len, 2, h, w)
+        future_displacement_label = ignore_index * torch.ones(seq_len, 2, h, w)
+        backward_flow = ignore_index * torch.ones(seq_len, 2, h, w)
+
+        x, y = torch.meshgrid(torch.arange(h, dtype=torch.float),
+                            torch.arange(w, dtype=torch.float))
+
+        gt_inds_all = []
+        for ins_inds_per_frame in all_gt_inds:
+            if ins_inds_per_frame is None:
+                continue
+            for ins_ind in ins_inds_per_frame:
+                gt_inds_all.append(ins_ind)
+        gt_inds_unique = np.unique(np.array(gt_inds_all))
+
+        for instance_id in gt_inds_unique:
+            instance_id = int(instance_id)
+            prev_xc = None
+            prev_yc = None
+            prev_mask = None
+            for t in range(seq_len):
+                instance_mask = (instance_img[t] == instance_id)
+                if instance_mask.sum() == 0:
+                    prev_xc = None
+                    prev_yc = None
+                    prev_mask = None
+                    continue
+
+                xc = x[instance_mask].mean()
+                yc = y[instance_mask].mean()
+
+                off_x = xc - x
+                off_y = yc - y
+                g = torch.exp(-(off_x ** 2 + off_y ** 2) / sigma ** 2)
+                center_label[t, 0] = torch.maximum(center_label[t, 0], g)
+                offset_label[t, 0, instance_mask] = off_x[instance_mask]
+                offset_label[t, 1, instance_mask] = off_y[instance_mask]
+
+                if prev_xc is not None and instance_mask.sum() > 0:
+                    delta_x = xc - prev_xc
+                    delta_y = yc - prev_yc
+                    future_displacement_label[t-1, 0, prev_mask] = delta_x
+                    future_displacement_label[t-1, 1, prev_mask] = delta_y
+                    backward_flow[t-1, 0, instance_mask] = -1 * delta_x
+                    backward_flow[t-1, 1, instance_mask] = -1 * delta_y
+
+                prev_xc = xc
+                prev_yc = yc
+                prev_mask = instance_mask
+
+        return center_label, offset_label, future_displacement_label, backward_flow
+
+
+def _yaw_matrix(yaw):
+    return np.array([[np.cos(yaw), -np.sin(yaw), 0.0],
+                     [np.sin(yaw), np.cos(yaw), 0.0],
+                     [0.0, 0.0, 1.0]])
+
+
+def _random_results(rng, num_frames, invalid_ratio=0.2, max_boxes=40):
+    """
+    Random sequence of boxes, crowded around the ego so that many of them overlap. The instance ids
+    are drawn from a small pool, including the ignore index, so they are shared between frames
+    """
+    results = {
+        'future_gt_bboxes_3d': [],
+        'future_gt_labels_3d': [],
+        'future_gt_inds': [],
+        'future_gt_vis_tokens': [],
+        'occ_l2e_r_mats': [],
+        'occ_l2e_t_vecs': [],
+        'occ_e2g_r_mats': [],
+        'occ_e2g_t_vecs': [],
+        'occ_has_invalid_frame': False,
+        'occ_img_is_valid': np.ones(num_frames, dtype=bool),
+    }
+    ego_yaw = rng.uniform(-np.pi, np.pi)
+    ego_location = rng.uniform(-100, 100, 3)
+    for _ in range(num_frames):
+        ego_yaw += rng.uniform(-0.1, 0.1)
+        ego_location += rng.uniform(-2, 2, 3)
+        results['occ_l2e_r_mats'].append(_yaw_matrix(rng.uniform(-0.05, 0.05)))
+        results['occ_l2e_t_vecs'].append(rng.uniform(-1, 1, 3))
+        results['occ_e2g_r_mats'].append(_yaw_matrix(ego_yaw))
+        results['occ_e2g_t_vecs'].append(ego_location.copy())
+
+        if rng.random() < invalid_ratio:
+            results['occ_has_invalid_frame'] = True
+            for key in ('future_gt_bboxes_3d', 'future_gt_labels_3d', 'future_gt_inds', 'future_gt_vis_tokens'):
+                results[key].append(None)
+            continue
+
+        num_boxes = rng.integers(0, max_boxes)
+        centers = np.concatenate([rng.uniform(-30, 30, (num_boxes, 2)), rng.uniform(-2, 0, (num_boxes, 1))], axis=1)
+        sizes = rng.uniform(1, 10, (num_boxes, 3))
+        yaws = rng.uniform(-np.pi, np.pi, (num_boxes, 1))
+        boxes = LiDARInstance3DBoxes(torch.from_numpy(np.concatenate([centers, sizes, yaws], axis=1)).float())
+        results['future_gt_bboxes_3d'].append(boxes)
+        results['future_gt_labels_3d'].append(rng.integers(0, len(CLASS_NAMES), num_boxes))
+        results['future_gt_inds'].append(rng.choice(np.r_[0:60, 255], num_boxes, replace=False))
+        results['future_gt_vis_tokens'].append(rng.integers(0, 5, num_boxes))
+
+    return results
+
+
+def _check_same_labels(results, only_vehicle=True, filter_invisible=False):
+    kwargs = dict(grid_conf=GRID_CONF, ignore_index=255, only_vehicle=only_vehicle, filter_invisible=filter_invisible,
+                  all_classes=CLASS_NAMES, vehicle_classes=VEHICLE_CLASSES, plan_classes=PLAN_CLASSES)
+    expected = ReferenceOccFlowLabels(**kwargs)(copy.deepcopy(results))
+    actual = GenerateOccFlowLabels(**kwargs)(copy.deepcopy(results))
+
+    assert set(actual) == set(expected)
+    for key in ('gt_segmentation', 'gt_instance', 'gt_offset', 'gt_flow', 'gt_backward_flow'):
+        assert actual[key].dtype == expected[key].dtype, key
+        assert torch.equal(actual[key], expected[key]), key
+
+    # the gaussians are only kept while they are normal float32 numbers, the smaller values are 0
+    tiny = np.finfo(np.float32).tiny
+    normal = expected['gt_centerness'] >= tiny
+    assert torch.equal(actual['gt_centerness'][normal], expected['gt_centerness'][normal])
+    assert torch.all(actual['gt_centerness'][~normal] == 0)
+
+    assert len(actual['gt_future_boxes']) == len(expected['gt_future_boxes'])
+    for actual_boxes, expected_boxes in zip(actual['gt_future_boxes'], expected['gt_future_boxes']):
+        assert torch.equal(actual_boxes.tensor, expected_boxes.tensor)
+    for actual_labels, expected_labels in zip(actual['gt_future_labels'], expected['gt_future_labels']):
+        assert np.array_equal(actual_labels, expected_labels)
+    assert actual['gt_occ_has_invalid_frame'] == expected['gt_occ_has_invalid_frame']
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_occflow_labels(seed):
+    rng = np.random.default_rng(seed)
+    _check_same_labels(_random_results(rng, num_frames=seed % 7 + 1))
+
+
+@pytest.mark.parametrize('only_vehicle,filter_invisible', [(True, True), (False, False), (False, True)])
+def test_occflow_labels_filters(only_vehicle, filter_invisible):
+    rng = np.random.default_rng(0)
+    _check_same_labels(_random_results(rng, num_frames=5), only_vehicle, filter_invisible)
+
+
+@pytest.mark.parametrize('num_frames', [1, 5])
+def test_occflow_labels_invalid_frames(num_frames):
+    rng = np.random.default_rng(0)
+    _check_same_labels(_random_results(rng, num_frames, invalid_ratio=1.0))
+
+
+def test_occflow_labels_ignore_index():
+    rng = np.random.default_rng(0)
+    results = _random_results(rng, num_frames=4, invalid_ratio=0.0, max_boxes=20)
+    for ins_inds in results['future_gt_inds']:
+        ins_inds[:len(ins_inds) // 2] = 255
+    _check_same_labels(results, only_vehicle=False)
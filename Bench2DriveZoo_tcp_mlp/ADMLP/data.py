@@ -1,87 +1,92 @@
 import numpy as np
 import torch 
-from torch.utils.data import Dataset
+import torch.distributed as dist
+from torch.utils.data import Dataset, Sampler
 import matplotlib.pyplot as plt
 
 class CARLA_Data(Dataset):
 	def __init__(self, data_path):
-		self.x = []
-		self.y = []
-		self.theta = []
-		self.command = []
-		self.speed = []
-		self.speed_acc = []
+		data = np.load(data_path, allow_pickle=True).item()
+		self.x = np.asarray(data['input_x'], dtype=np.float64)
+		self.y = np.asarray(data['input_y'], dtype=np.float64)
+		self.theta = np.asarray(data['input_theta'], dtype=np.float64)
+		self.command = np.asarray(data['input_command'], dtype=np.int64)
+		self.speed = np.asarray(data['input_speed'], dtype=np.float64)
+		self.speed_acc = np.asarray(data['input_speed_acc'], dtype=np.float64)
 
-		self.future_x = []
-		self.future_y = []
-		self.future_theta = []
+		self.future_x = np.asarray(data['future_x'], dtype=np.float64)
+		self.future_y = np.asarray(data['future_y'], dtype=np.float64)
+		self.future_theta = np.asarray(data['future_theta'], dtype=np.float64)
 
-		data = np.load(data_path, allow_pickle=True).item()
-		self.x += data['input_x']
-		self.y += data['input_y']
-		self.theta += data['input_theta']
-		self.command += data['input_command']
-		self.speed += data['input_speed']
-		self.speed_acc += data['input_speed_acc']
+		self._precompute()
+
+	def _precompute(self):
+		''' Transforms every sample into its ego frame once, so that fetching
+		a sample (or a whole batch) is just array indexing.
+		'''
+		ego_x = self.x[:, -1:]
+		ego_y = self.y[:, -1:]
+		ego_theta = np.where(np.isnan(self.theta[:, -1:]), 0., self.theta[:, -1:] - np.pi/2) # compass on left hand (0, -1)
+		cos, sin = np.cos(ego_theta), np.sin(ego_theta)
+
+		def to_local(px, py):
+			dx, dy = px - ego_x, py - ego_y
+			return np.stack([cos*dx + sin*dy, -sin*dx + cos*dy], axis=-1) # left hand
+
+		def to_local_theta(theta):
+			theta = (theta - np.pi/2) - ego_theta
+			return np.where(np.isnan(theta), 0., theta)
+
+		self.waypoints = np.ascontiguousarray(to_local(self.future_x, self.future_y), dtype=np.float32)
+		self.thetas = np.ascontiguousarray(to_local_theta(self.future_theta), dtype=np.float32)
+		hist_waypoints = to_local(self.x[:, :4], self.y[:, :4]).reshape(len(self.x), -1)
+		hist_thetas = to_local_theta(self.theta[:, :-1])
+
+		# VOID = -1
+		# LEFT = 1
+		# RIGHT = 2
+		# STRAIGHT = 3
+		# LANEFOLLOW = 4
+		# CHANGELANELEFT = 5
+		# CHANGELANERIGHT = 6
+		command = self.command[:, -1].copy()
+		command[command < 0] = 4
+		command -= 1
+		assert np.all((command >= 0) & (command <= 5))
+		cmd_one_hot = np.eye(6, dtype=np.float32)[command]
 
-		self.future_x += data['future_x']
-		self.future_y += data['future_y']
-		self.future_theta += data['future_theta']
+		self.hist_waypoints = np.ascontiguousarray(hist_waypoints, dtype=np.float32)
+		self.hist_thetas = np.ascontiguousarray(hist_thetas, dtype=np.float32)
+		self.cur_speed = np.ascontiguousarray(self.speed[:, -1:], dtype=np.float32)
+		self.cur_speed_acc = np.ascontiguousarray(self.speed_acc[:, -1], dtype=np.float32)
+		self.cmd_one_hot = cmd_one_hot
+		self.input = np.ascontiguousarray(np.concatenate(
+			(self.hist_waypoints, self.hist_thetas, self.cur_speed, self.cur_speed_acc, self.cmd_one_hot), axis=1), dtype=np.float32)
 
 	def __getitem__(self, index):
+		''' index is either a single sample index or an array of indices
+		(see CARLA_BatchSampler), in which case a ready batch is returned.
+		'''
 		data = dict()
-		data['x'] = self.x[index]
-		data['y'] = self.y[index]
-		data['theta'] = self.theta[index]
-		data['speed'] = self.speed[index][-1]
-		data['speed_acc'] = self.speed_acc[index][-1]
-		data['future_x'] = self.future_x[index]
-		data['future_y'] = self.future_y[index]
-		data['future_theta'] = self.future_theta[index]
-
-		ego_x = self.x[index][-1]
-		ego_y = self.y[index][-1]
-		if np.isnan(self.theta[index][-1]):
-			ego_theta = 0
-		else:
-			ego_theta = self.theta[index][-1] - np.pi/2 # compass on left hand (0, -1)
-		
-		waypoints = []
-		for i in range(6):
-			R = np.array([
-			[np.cos(ego_theta), np.sin(ego_theta)],
-			[-np.sin(ego_theta),  np.cos(ego_theta)]
-			])
-			local_command_point = np.array([self.future_x[index][i]-ego_x, self.future_y[index][i]-ego_y])
-			local_command_point = R.dot(local_command_point) # left hand
-			waypoints.append([local_command_point[0], local_command_point[1]])
-		
-		thetas = [(t - np.pi/2) - ego_theta for t in self.future_theta[index]]
-		thetas = [0 if np.isnan(t) else t for t in thetas]
-		data['waypoints'] = torch.tensor(waypoints)
-		data['thetas'] = torch.tensor(thetas)
-
-		hist_waypoints = []
-		for i in range(4):
-			R = np.array([
-			[np.cos(ego_theta), np.sin(ego_theta)],
-			[-np.sin(ego_theta),  np.cos(ego_theta)]
-			])
-			local_command_point = np.array([self.x[index][i]-ego_x, self.y[index][i]-ego_y])
-			local_command_point = R.dot(local_command_point) # left hand
-			hist_waypoints.append([local_command_point[0], local_command_point[1]])
-		
-		hist_thetas = [(t - np.pi/2) - ego_theta for t in self.theta[index][:-1]]
-		hist_thetas = [0 if np.isnan(t) else t for t in hist_thetas]
-		data['hist_waypoints'] = torch.tensor(hist_waypoints).flatten()
-		data['hist_thetas'] = torch.tensor(hist_thetas)
-		data['speed'] = torch.tensor([data['speed']])
-		data['speed_acc'] = torch.tensor(data['speed_acc'])
+		data['x'] = torch.from_numpy(self.x[index])
+		data['y'] = torch.from_numpy(self.y[index])
+		data['theta'] = torch.from_numpy(self.theta[index])
+		data['future_x'] = torch.from_numpy(self.future_x[index])
+		data['future_y'] = torch.from_numpy(self.future_y[index])
+		data['future_theta'] = torch.from_numpy(self.future_theta[index])
+		data['waypoints'] = torch.from_numpy(self.waypoints[index])
+		data['thetas'] = torch.from_numpy(self.thetas[index])
+		data['hist_waypoints'] = torch.from_numpy(self.hist_waypoints[index])
+		data['hist_thetas'] = torch.from_numpy(self.hist_thetas[index])
+		data['speed'] = torch.from_numpy(self.cur_speed[index])
+		data['speed_acc'] = torch.from_numpy(self.cur_speed_acc[index])
+		data['command'] = torch.from_numpy(self.cmd_one_hot[index])
+		data['input'] = torch.from_numpy(self.input[index])
 
 		debug_plot_local = False
-		if debug_plot_local:
+		if debug_plot_local and np.ndim(index) == 0:
 			plt.figure(figsize=(10, 10))
-			points = hist_waypoints + [[0, 0]] + waypoints
+			points = self.hist_waypoints[index].reshape(-1, 2).tolist() + [[0, 0]] + self.waypoints[index].tolist()
 			x, y = zip(*points)
 			plt.scatter(x, y, color='red', zorder=5)
 			for i, (px, py) in enumerate(points):
@@ -92,25 +97,61 @@ class CARLA_Data(Dataset):
 			plt.grid(True)
 			plt.axis('equal') 
 			plt.savefig(f"{index}_local.png")
-		
-		command = self.command[index][-1]
-		# VOID = -1
-		# LEFT = 1
-		# RIGHT = 2
-		# STRAIGHT = 3
-		# LANEFOLLOW = 4
-		# CHANGELANELEFT = 5
-		# CHANGELANERIGHT = 6
-		if command < 0:
-			command = 4
-		command -= 1
-		assert command in [0, 1, 2, 3, 4, 5]
-		cmd_one_hot = [0] * 6
-		cmd_one_hot[command] = 1
-		data['command'] = torch.tensor(cmd_one_hot)	
-		data['input'] = torch.cat((data['hist_waypoints'], data['hist_thetas'], data['speed'], data['speed_acc'], data['command']))
+
 		return data
 
 	def __len__(self):
-		print(len(self.x))
-		return len(self.x)
\ No newline at end of file
+		return len(self.x)
+
+
+class CARLA_BatchSampler(Sampler):
+	''' Yields whole batches of indices for CARLA_Data, to be used with
+	DataLoader(dataset, sampler=CARLA_BatchSampler(...), batch_size=None).
+	Each batch is then built by a single fancy-indexing pass over the
+	precomputed arrays instead of per-sample collation.
+
+	Under torch.distributed every rank draws the same permutation for a
+	given epoch and keeps its own strided share of it.
+	'''
+	def __init__(self, data_source, batch_size, shuffle=False, drop_last=False, seed=0):
+		self.num_samples = len(data_source)
+		self.batch_size = batch_size
+		self.shuffle = shuffle
+		self.drop_last = drop_last
+		self.seed = seed
+		self.epoch = 0
+
+	def _rank_and_world_size(self):
+		if dist.is_available() and dist.is_initialized():
+			return dist.get_rank(), dist.get_world_size()
+		return 0, 1
+
+	def set_epoch(self, epoch):
+		self.epoch = epoch
+
+	def _indices(self):
+		if self.shuffle:
+			rng = np.random.default_rng(self.seed + self.epoch)
+			indices = rng.permutation(self.num_samples)
+		else:
+			indices = np.arange(self.num_samples)
+		rank, world_size = self._rank_and_world_size()
+		if world_size > 1:
+			per_rank = self.num_samples // world_size
+			indices = indices[rank:per_rank * world_size:world_size]
+		return indices
+
+	def __iter__(self):
+		indices = self._indices()
+		if self.shuffle:
+			self.epoch += 1
+		num_batches = len(indices) // self.batch_size if self.drop_last else -(-len(indices) // self.batch_size)
+		for i in range(num_batches):
+			yield indices[i * self.batch_size:(i + 1) * self.batch_size]
+
+	def __len__(self):
+		_, world_size = self._rank_and_world_size()
+		num_samples = self.num_samples // world_size if world_size > 1 else self.num_samples
+		if self.drop_last:
+			return num_samples // self.batch_size
+		return -(-num_samples // self.batch_size)
@@ -4,7 +4,7 @@ from ADMLP.model import ADMLP
 from ADMLP.config import GlobalConfig
 from collections import OrderedDict
 from torch.utils.data import DataLoader
-from ADMLP.data import CARLA_Data
+from ADMLP.data import CARLA_Data, CARLA_BatchSampler
 import torch.nn.functional as F
 import numpy as np
 from tqdm import tqdm
@@ -23,7 +23,7 @@ net.eval()
 
 config.val_data = 'admlp_drivee2e_final-val.npy'
 val_set = CARLA_Data(data_path=config.val_data)
-val_loader = DataLoader(val_set, batch_size=300, shuffle=False)
+val_loader = DataLoader(val_set, sampler=CARLA_BatchSampler(val_set, 300, shuffle=False), batch_size=None)
 
 # Iterate over the validation set
 l2_05 = []
@@ -7,7 +7,7 @@ import pytorch_lightning as pl
 from pytorch_lightning.callbacks import ModelCheckpoint
 from pytorch_lightning.strategies import DDPStrategy
 from ADMLP.model import ADMLP
-from ADMLP.data import CARLA_Data
+from ADMLP.data import CARLA_Data, CARLA_BatchSampler
 from ADMLP.config import GlobalConfig
 
 class ADMLP_planner(pl.LightningModule):
@@ -70,8 +70,9 @@ if __name__ == "__main__":
 	val_set = CARLA_Data(data_path=config.val_data)
 	print(len(val_set))
 
-	dataloader_train = DataLoader(train_set, batch_size=args.batch_size, shuffle=True, num_workers=8)
-	dataloader_val = DataLoader(val_set, batch_size=args.batch_size, shuffle=False, num_workers=8)
+	# samples are precomputed in memory, batches are cut by fancy indexing in the main process
+	dataloader_train = DataLoader(train_set, sampler=CARLA_BatchSampler(train_set, args.batch_size, shuffle=True), batch_size=None)
+	dataloader_val = DataLoader(val_set, sampler=CARLA_BatchSampler(val_set, args.batch_size, shuffle=False), batch_size=None)
 
 	ADMLP_model = ADMLP_planner(config)
 
@@ -83,6 +84,7 @@ if __name__ == "__main__":
                         accelerator='gpu',
                         strategy=DDPStrategy(static_graph=True),
                         sync_batchnorm=True,
+                        use_distributed_sampler=False, # CARLA_BatchSampler shards by rank itself
                         profiler='simple',
                         benchmark=True,
                         log_every_n_steps=1,
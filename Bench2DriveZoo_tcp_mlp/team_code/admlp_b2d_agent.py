@@ -16,6 +16,8 @@ from PIL import Image
 from torchvision import transforms as T
 
 from leaderboard.autoagents import autonomous_agent
+from leaderboard.utils.bev_renderer import BEVRenderer
+from leaderboard.utils.agent_recorder import AgentRecorder
 
 from ADMLP.model import ADMLP
 from ADMLP.config import GlobalConfig
@@ -23,6 +25,8 @@ from team_code.planner import RoutePlanner
 from scipy.optimize import fsolve
 
 SAVE_PATH = os.environ.get('SAVE_PATH', None)
+BEV_RENDERER = os.environ.get('BEV_RENDERER', 'camera')
+SAVE_FORMAT = os.environ.get('SAVE_FORMAT', 'png')
 
 EARTH_RADIUS_EQUA = 6378137.0
 
@@ -55,6 +59,8 @@ class ADMLPAgent(autonomous_agent.AutonomousAgent):
 		self.net.eval()
 
 		self.save_path = None
+		self.recorder = None
+		self.bev_renderer = BEVRenderer() if BEV_RENDERER == 'map' else None
 		# self.lat_ref, self.lon_ref = 42.0, 2.0
 		if SAVE_PATH is not None and SAVE_PATH != 'None':
 			now = datetime.datetime.now() 
@@ -62,10 +68,13 @@ class ADMLPAgent(autonomous_agent.AutonomousAgent):
 			string += self.save_name
 			self.save_path = pathlib.Path(os.environ['SAVE_PATH']) / string
 			self.save_path.mkdir(parents=True, exist_ok=False)
-			(self.save_path / 'rgb').mkdir()
-			(self.save_path / 'rgb_front').mkdir()
-			(self.save_path / 'meta').mkdir()
-			(self.save_path / 'bev').mkdir()
+			if SAVE_FORMAT != 'png':
+				self.recorder = AgentRecorder(self.save_path, recording_format=SAVE_FORMAT)
+			else:
+				(self.save_path / 'rgb').mkdir()
+				(self.save_path / 'rgb_front').mkdir()
+				(self.save_path / 'meta').mkdir()
+				(self.save_path / 'bev').mkdir()
 	
 	def _init(self):
 		try:
@@ -123,21 +132,27 @@ class ADMLPAgent(autonomous_agent.AutonomousAgent):
 					},
 				]
 		
-		sensors += [
-				{	
-					'type': 'sensor.camera.rgb',
-					'x': 0.0, 'y': 0.0, 'z': 50.0,
-					'roll': 0.0, 'pitch': -90.0, 'yaw': 0.0,
-					'width': 512, 'height': 512, 'fov': 5 * 10.0,
-					'id': 'bev'
-				}]
+		if BEV_RENDERER == 'camera':
+			sensors += [
+					{	
+						'type': 'sensor.camera.rgb',
+						'x': 0.0, 'y': 0.0, 'z': 50.0,
+						'roll': 0.0, 'pitch': -90.0, 'yaw': 0.0,
+						'width': 512, 'height': 512, 'fov': 5 * 10.0,
+						'id': 'bev'
+					}]
 		return sensors
 
 	def tick(self, input_data):
 		self.step += 1
 		
 		rgb = cv2.cvtColor(input_data['CAM_FRONT'][1][:, :, :3], cv2.COLOR_BGR2RGB)
-		bev = cv2.cvtColor(input_data['bev'][1][:, :, :3], cv2.COLOR_BGR2RGB)
+		if self.bev_renderer is None:
+			bev = cv2.cvtColor(input_data['bev'][1][:, :, :3], cv2.COLOR_BGR2RGB)
+		elif self._is_save_step():
+			bev = self.bev_renderer.render()
+		else:
+			bev = None  # only drawn for the saved frames
 		gps = input_data['GPS'][1][:2]
 		speed = input_data['SPEED'][1]['speed']
 		acceleration = input_data['IMU'][1][:3]
@@ -289,7 +304,7 @@ class ADMLPAgent(autonomous_agent.AutonomousAgent):
 		# metric_info = self.get_metric_info()
 		# self.metric_info[self.step] = metric_info
 		# if SAVE_PATH is not None and SAVE_PATH != 'None' and (self.step -  self.data_queue_len) % 1 == 0:
-		if SAVE_PATH is not None and SAVE_PATH != 'None' and (self.step -  self.data_queue_len) % 1 == 0:
+		if self._is_save_step():
 			self.save(tick_data)
 		self.last_control = control
   
@@ -306,13 +321,23 @@ class ADMLPAgent(autonomous_agent.AutonomousAgent):
 
 	def save_only_img(self, tick_data):
 		frame = self.step
+		if self.recorder is not None:
+			self.recorder.add_frame(frame, {'rgb': tick_data['rgb'], 'bev': tick_data['bev']})
+			return
 
 		Image.fromarray(tick_data['rgb']).save(self.save_path / 'rgb' / ('%04d.png' % frame))
 
 		Image.fromarray(tick_data['bev']).save(self.save_path / 'bev' / ('%04d.png' % frame))
     
+	def _is_save_step(self):
+		return SAVE_PATH is not None and SAVE_PATH != 'None' and (self.step -  self.data_queue_len) % 1 == 0
+
 	def save(self, tick_data):
 		frame = self.step
+		if self.recorder is not None:
+			self.recorder.add_frame(frame, {'rgb': tick_data['rgb'], 'bev': tick_data['bev']}, self.pid_metadata)
+			self.recorder.save_json('metric_info', self.metric_info)
+			return
 
 		Image.fromarray(tick_data['rgb']).save(self.save_path / 'rgb' / ('%04d.png' % frame))
 
@@ -328,6 +353,8 @@ class ADMLPAgent(autonomous_agent.AutonomousAgent):
 		outfile.close()
 
 	def destroy(self):
+		if self.recorder is not None:
+			self.recorder.close()
 		del self.net
 		torch.cuda.empty_cache()
 
@@ -16,6 +16,8 @@ from PIL import Image
 from torchvision import transforms as T
 
 from leaderboard.autoagents import autonomous_agent
+from leaderboard.utils.bev_renderer import BEVRenderer
+from leaderboard.utils.agent_recorder import AgentRecorder
 
 from TCP.model import TCP
 from TCP.config import GlobalConfig
@@ -24,6 +26,8 @@ from scipy.optimize import fsolve
 
 
 SAVE_PATH = os.environ.get('SAVE_PATH', None)
+BEV_RENDERER = os.environ.get('BEV_RENDERER', 'camera')
+SAVE_FORMAT = os.environ.get('SAVE_FORMAT', 'png')
 PLANNER_TYPE = os.environ.get('PLANNER_TYPE', None)
 print('*'*10)
 print(PLANNER_TYPE)
@@ -66,6 +70,8 @@ class TCPAgent(autonomous_agent.AutonomousAgent):
 		self.takeover_time = 0
 
 		self.save_path = None
+		self.recorder = None
+		self.bev_renderer = BEVRenderer() if BEV_RENDERER == 'map' else None
 		self._im_transform = T.Compose([T.ToTensor(), T.Normalize(mean=[0.485,0.456,0.406], std=[0.229,0.224,0.225])])
 
 		self.last_steers = deque()
@@ -78,10 +84,13 @@ class TCPAgent(autonomous_agent.AutonomousAgent):
               
 			self.save_path.mkdir(parents=True, exist_ok=False)
 
-			(self.save_path / 'rgb').mkdir()
-			(self.save_path / 'rgb_front').mkdir()
-			(self.save_path / 'meta').mkdir()
-			(self.save_path / 'bev').mkdir()
+			if SAVE_FORMAT != 'png':
+				self.recorder = AgentRecorder(self.save_path, recording_format=SAVE_FORMAT)
+			else:
+				(self.save_path / 'rgb').mkdir()
+				(self.save_path / 'rgb_front').mkdir()
+				(self.save_path / 'meta').mkdir()
+				(self.save_path / 'bev').mkdir()
 
 	def _init(self):
 		try:
@@ -153,14 +162,15 @@ class TCPAgent(autonomous_agent.AutonomousAgent):
 					},
 				]
 		
-		sensors += [
-				{	
-					'type': 'sensor.camera.rgb',
-					'x': 0.0, 'y': 0.0, 'z': 50.0,
-					'roll': 0.0, 'pitch': -90.0, 'yaw': 0.0,
-					'width': 512, 'height': 512, 'fov': 5 * 10.0,
-					'id': 'bev'
-				}]
+		if BEV_RENDERER == 'camera':
+			sensors += [
+					{	
+						'type': 'sensor.camera.rgb',
+						'x': 0.0, 'y': 0.0, 'z': 50.0,
+						'roll': 0.0, 'pitch': -90.0, 'yaw': 0.0,
+						'width': 512, 'height': 512, 'fov': 5 * 10.0,
+						'id': 'bev'
+					}]
 		return sensors
 
 	def tick(self, input_data):
@@ -190,7 +200,12 @@ class TCPAgent(autonomous_agent.AutonomousAgent):
 		rgb = torch.nn.functional.interpolate(rgb, size=(256, 900), mode='bilinear', align_corners=False)
 		rgb = rgb.squeeze(0).permute(1, 2, 0).byte().numpy()
 		
-		bev = cv2.cvtColor(input_data['bev'][1][:, :, :3], cv2.COLOR_BGR2RGB)
+		if self.bev_renderer is None:
+			bev = cv2.cvtColor(input_data['bev'][1][:, :, :3], cv2.COLOR_BGR2RGB)
+		elif self._is_save_step():
+			bev = self.bev_renderer.render()
+		else:
+			bev = None  # only drawn for the saved frames
 		gps = input_data['GPS'][1][:2]
 		speed = input_data['SPEED'][1]['speed']
 		compass = input_data['IMU'][1][-1]
@@ -323,12 +338,20 @@ class TCPAgent(autonomous_agent.AutonomousAgent):
 		self.pid_metadata['brake'] = control.brake
 		# metric_info = self.get_metric_info()
 		# self.metric_info[self.step] = metric_info
-		# if SAVE_PATH is not None and self.step % 1 == 0:
+		# if self._is_save_step():
 		# 	self.save(tick_data)
 		return control
 
+	def _is_save_step(self):
+		return SAVE_PATH is not None and self.step % 1 == 0
+
 	def save(self, tick_data):
 		frame = self.step
+		if self.recorder is not None:
+			images = {'rgb': tick_data['rgb'], 'rgb_front': tick_data['rgb_front'], 'bev': tick_data['bev']}
+			self.recorder.add_frame(frame, images, self.pid_metadata)
+			self.recorder.save_json('metric_info', self.metric_info)
+			return
 
 		Image.fromarray(tick_data['rgb']).save(self.save_path / 'rgb' / ('%04d.png' % frame))
 
@@ -346,6 +369,8 @@ class TCPAgent(autonomous_agent.AutonomousAgent):
 		outfile.close()
 
 	def destroy(self):
+		if self.recorder is not None:
+			self.recorder.close()
 		del self.net
 		torch.cuda.empty_cache()
 
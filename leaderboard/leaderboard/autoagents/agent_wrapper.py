@@ -146,6 +146,12 @@ class AgentWrapper(object):
         """
         return self._agent()
 
+    def set_tick_profiler(self, tick_profiler):
+        """
+        Lets the agent record the time spent waiting for the sensors and in its run_step
+        """
+        self._agent.tick_profiler = tick_profiler
+
     def _preprocess_sensor_spec(self, sensor_spec):
         type_ = sensor_spec["type"]
         id_ = sensor_spec["id"]
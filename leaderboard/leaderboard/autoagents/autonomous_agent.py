@@ -10,6 +10,7 @@ This module provides the base class for all autonomous agents
 from __future__ import print_function
 
 from enum import Enum
+import time
 
 import carla
 from srunner.scenariomanager.timer import GameTime
@@ -46,6 +47,9 @@ class AutonomousAgent(object):
 
         self.wallclock_t0 = None
 
+        # Set by the ScenarioManager when profiling the ticks
+        self.tick_profiler = None
+
     def setup(self, path_to_conf_file):
         """
         Initialize everything needed by your agent and set the track attribute to the right type:
@@ -101,7 +105,10 @@ class AutonomousAgent(object):
         Execute the agent call, e.g. agent()
         Returns the next vehicle controls
         """
+        start = time.perf_counter()
         input_data = self.sensor_interface.get_data(GameTime.get_frame())
+        if self.tick_profiler is not None:
+            self.tick_profiler.record('sensor_data', start)
 
         timestamp = GameTime.get_time()
 
@@ -114,7 +121,10 @@ class AutonomousAgent(object):
         print('=== [Agent] -- Wallclock = {} -- System time = {} -- Game time = {} -- Ratio = {}x'.format(
             str(wallclock)[:-3], format(wallclock_diff, '.3f'), format(timestamp, '.3f'), format(sim_ratio, '.3f')), flush=True)
 
+        start = time.perf_counter()
         control = self.run_step(input_data, timestamp)
+        if self.tick_profiler is not None:
+            self.tick_profiler.record('run_step', start)
         control.manual_gear_shift = False
 
         return control
@@ -136,7 +136,8 @@ class LeaderboardEvaluator(object):
 
         # Create the ScenarioManager
         # print("simulation_time_thd is ",args.simulation_time_thd)
-        self.manager = ScenarioManager(args.timeout, args.agent_timeout, args.simulation_time_thd, self.frame_rate, self.statistics_manager, args.debug, args.use_predefined_route, args.other_agent_setting)
+        self.manager = ScenarioManager(args.timeout, args.agent_timeout, args.simulation_time_thd, self.frame_rate, self.statistics_manager, args.debug, args.use_predefined_route, args.other_agent_setting,
+                                       tick_profile=bool(args.tick_profile))
 
         # Time control for summary purposes
         self._start_time = GameTime.get_time()
@@ -332,6 +333,15 @@ class LeaderboardEvaluator(object):
             route_index, self.manager.scenario_duration_system, self.manager.scenario_duration_game, crash_message
         )
 
+    def _save_tick_profile(self, args, config):
+        """
+        Saves the timeline of the route ticks as a Chrome trace, and their summary in the route statistics
+        """
+        profiler = self.manager.tick_profiler
+        trace_file = os.path.join(args.tick_profile, "{}_rep{}.json".format(config.name, config.repetition_index))
+        profiler.export_chrome_trace(trace_file, config.name)
+        self.statistics_manager.save_tick_profile(config.index, profiler.summary())
+
     def _load_and_run_scenario(self, args, config):
         """
         Load and run the scenario given by config.
@@ -516,6 +526,8 @@ class LeaderboardEvaluator(object):
             if crash_message != "Simulation crashed":
                 self.manager.stop_scenario()
             self._register_statistics(config.index, entry_status, crash_message)
+            if args.tick_profile:
+                self._save_tick_profile(args, config)
 
             if args.record:
                 self.client.stop_recorder()
@@ -612,6 +624,8 @@ def main():
                         help='Run with debug output', default=0)
     parser.add_argument('--record', type=str, default='',
                         help='Use CARLA recording feature to create a recording of the scenario')
+    parser.add_argument('--tick-profile', type=str, default='',
+                        help='Profile the stages of each tick, saving a Chrome trace per route in this folder')
     parser.add_argument('--timeout', default=600.0, type=float,
                         help='Set the CARLA client timeout value in seconds')    
     # simulation setup
@@ -301,76 +301,71 @@ class RouteScenario(BasicScenario):
         return ego_vehicle
 
     def _get_parking_slots(self, max_distance=100, route_step=10):
-        """Spawn parked vehicles."""
-
-        def is_close(slot_location):
-            for i in range(0, len(self.route), route_step):
-                route_transform = self.route[i][0]
-                if route_transform.location.distance(slot_location) < max_distance:
-                    return True
-            return False
-
-        min_x, min_y = float('inf'), float('inf')
-        max_x, max_y = float('-inf'), float('-inf')
-        for route_transform, _ in self.route:
-            min_x = min(min_x, route_transform.location.x - max_distance)
-            min_y = min(min_y, route_transform.location.y - max_distance)
-            max_x = max(max_x, route_transform.location.x + max_distance)
-            max_y = max(max_y, route_transform.location.y + max_distance)
-
+        """Gets the parking slots close to the route, where parked vehicles will be spawned."""
         # Occupied parking locations
         self.occupied_parking_locations = []
         for scenario in self.list_scenarios:
             self.occupied_parking_locations.extend(scenario.get_parking_slots())
 
-        available_parking_locations = []
         map_name = self.map.name.split('/')[-1]
-        available_parking_locations = getattr(parked_vehicles, map_name, [])
+        self._parking_slots = parked_vehicles.get_parking_slots(map_name)
+        if self._parking_slots is None:
+            self.available_parking_locations = []
+            self._available_slots_grid = None
+            return
 
         # Exclude parking slots that are too far from the route
-        for slot in available_parking_locations:
-            slot_transform = carla.Transform(
-                location=carla.Location(slot["location"][0], slot["location"][1], slot["location"][2]),
-                rotation=carla.Rotation(slot["rotation"][0], slot["rotation"][1], slot["rotation"][2])
-            )
-
-            in_area = (min_x < slot_transform.location.x < max_x) and (min_y < slot_transform.location.y < max_y)
-            close_to_route = is_close(slot_transform.location)
-            if not in_area or not close_to_route:
-                available_parking_locations.remove(slot)
-                continue
-
-        self.available_parking_locations = available_parking_locations
+        route_locations = np.array([
+            [t.location.x, t.location.y, t.location.z] for t, _ in self.route[::route_step]
+        ], dtype=np.float64).reshape(-1, 3)
+        route_grid = parked_vehicles.ParkingSlotGrid(self._parking_slots.locations, max_distance)
+        available_slots = route_grid.query_polyline(route_locations, max_distance)
+
+        # Only the slots along the route are indexed, using cells as big as the spawn radius
+        self.available_parking_locations = available_slots.tolist()
+        self._available_slots_mask = np.zeros(len(self._parking_slots), dtype=bool)
+        self._available_slots_mask[available_slots] = True
+        self._available_slots_grid = parked_vehicles.ParkingSlotGrid(
+            self._parking_slots.locations, self.PARKED_VEHICLES_INIT_THRESHOLD, available_slots)
 
     def spawn_parked_vehicles(self, ego_vehicle, max_scenario_distance=10):
         """Spawn parked vehicles."""
-        def is_close(slot_location, ego_location):
-            return slot_location.distance(ego_location) < self.PARKED_VEHICLES_INIT_THRESHOLD
-        def is_free(slot_location):
-            for occupied_slot in self.occupied_parking_locations:
-                if slot_location.distance(occupied_slot) < max_scenario_distance:
-                    return False
-            return True
-
-        new_parked_vehicles = []
+        if self._available_slots_grid is None or not self.available_parking_locations:
+            return
 
         ego_location = CarlaDataProvider.get_location(ego_vehicle)
         if ego_location is None:
             return
 
-        for slot in self.available_parking_locations:
+        # Add all vehicles that are close to the ego and in a free space
+        close_slots = self._available_slots_grid.query_radius(
+            (ego_location.x, ego_location.y, ego_location.z), self.PARKED_VEHICLES_INIT_THRESHOLD)
+        close_slots = close_slots[self._available_slots_mask[close_slots]]
+        if len(close_slots) == 0:
+            return
+
+        slot_locations = self._parking_slots.locations[close_slots]
+        if self.occupied_parking_locations:
+            occupied = np.array([[l.x, l.y, l.z] for l in self.occupied_parking_locations], dtype=np.float64)
+            distances = np.linalg.norm(slot_locations[:, None, :] - occupied[None, :, :], axis=2)
+            close_slots = close_slots[np.all(distances >= max_scenario_distance, axis=1)]
+
+        new_parked_vehicles = []
+        blueprint_library = CarlaDataProvider.get_world().get_blueprint_library()
+        for slot in close_slots:
+            location = self._parking_slots.locations[slot]
+            rotation = self._parking_slots.rotations[slot]
             slot_transform = carla.Transform(
-                location=carla.Location(slot["location"][0], slot["location"][1], slot["location"][2]),
-                rotation=carla.Rotation(slot["rotation"][0], slot["rotation"][1], slot["rotation"][2])
+                location=carla.Location(*location.tolist()),
+                rotation=carla.Rotation(*rotation.tolist())
             )
+            mesh_bp = blueprint_library.filter("static.prop.mesh")[0]
+            mesh_bp.set_attribute("mesh_path", self._parking_slots.get_mesh(slot))
+            mesh_bp.set_attribute("scale", "0.9")
+            new_parked_vehicles.append(carla.command.SpawnActor(mesh_bp, slot_transform))
 
-            # Add all vehicles that are close to the ego and in a free space
-            if is_close(slot_transform.location, ego_location) and is_free(slot_transform.location):
-                mesh_bp = CarlaDataProvider.get_world().get_blueprint_library().filter("static.prop.mesh")[0]
-                mesh_bp.set_attribute("mesh_path", slot["mesh"])
-                mesh_bp.set_attribute("scale", "0.9")
-                new_parked_vehicles.append(carla.command.SpawnActor(mesh_bp, slot_transform))
-                self.available_parking_locations.remove(slot)
+        self._available_slots_mask[close_slots] = False
+        self.available_parking_locations = np.flatnonzero(self._available_slots_mask).tolist()
 
         # Add the actors to _parked_ids
         for response in CarlaDataProvider.get_client().apply_batch_sync(new_parked_vehicles):
@@ -26,6 +26,7 @@ from srunner.scenariomanager.watchdog import Watchdog
 from leaderboard.autoagents.agent_wrapper import AgentWrapperFactory, AgentError, TickRuntimeError
 from leaderboard.envs.sensor_interface import SensorReceivedNoData
 from leaderboard.utils.result_writer import ResultOutputProvider
+from leaderboard.utils.tick_profiler import TickProfiler
 
 
 class ScenarioManager(object):
@@ -46,7 +47,7 @@ class ScenarioManager(object):
     """
 
     def __init__(self, timeout, agent_timeout,simulation_time_thd,frame_rate, statistics_manager, debug_mode=0,
-                 use_predefined_route=False, other_agent_setting=False):
+                 use_predefined_route=False, other_agent_setting=False, tick_profile=False):
         """
         Setups up the parameters, which will be filled at load_scenario()
         """
@@ -84,6 +85,9 @@ class ScenarioManager(object):
         self.use_predefined_route = use_predefined_route
         self.other_agent_setting = other_agent_setting
 
+        # Opt-in wall clock profiling of the tick stages, reset at each route
+        self.tick_profiler = TickProfiler(enabled=tick_profile)
+
         # Use the callback_id inside the signal handler to allow external interrupts
         signal.signal(signal.SIGINT, self.signal_handler)
 
@@ -134,6 +138,10 @@ class ScenarioManager(object):
 
         self._agent_wrapper.setup_sensors(self.ego_vehicles[0],self.use_predefined_route)
 
+        self.tick_profiler.reset()
+        if self.tick_profiler.enabled:
+            self._agent_wrapper.set_tick_profiler(self.tick_profiler)
+
     def build_scenarios_loop(self, debug):
         """
         Keep periodically trying to start the scenarios that are close to the ego vehicle
@@ -172,9 +180,18 @@ class ScenarioManager(object):
         """
         Run next tick of scenario and the agent and tick the world.
         """
+        self.tick_profiler.start_tick()
+        with self.tick_profiler.stage('tick'):
+            self._tick_scenario_stages()
+
+    def _tick_scenario_stages(self):
+        """
+        Stages of the tick, timed by the tick profiler when it is enabled
+        """
         # if self._running and self.get_running_status():
         #     # very important!!!                                   
         #     CarlaDataProvider.get_world().tick(self._timeout)                
+        profiler = self.tick_profiler
 
         timestamp = CarlaDataProvider.get_world().get_snapshot().timestamp
 
@@ -183,8 +200,9 @@ class ScenarioManager(object):
 
             self._watchdog.update()
             # Update game time and actor information
-            GameTime.on_carla_tick(timestamp)
-            CarlaDataProvider.on_carla_tick()   
+            with profiler.stage('on_carla_tick'):
+                GameTime.on_carla_tick(timestamp)
+                CarlaDataProvider.on_carla_tick()   
                                                                           
             self._watchdog.pause()
 
@@ -196,7 +214,8 @@ class ScenarioManager(object):
                 self._agent_watchdog.update()
 
                 #planning or collecting data in cur time 
-                ego_action = self._agent_wrapper()
+                with profiler.stage('agent'):
+                    ego_action = self._agent_wrapper()
 
                 self._agent_watchdog.pause()
             # Special exception inside the agent that isn't caused by the agent
@@ -210,24 +229,27 @@ class ScenarioManager(object):
                                 
             self.tick_count += 1  
             ## DriveE2E: tick ego actor
-            if self.use_predefined_route:
-                if self.tick_count < len(self.scenario.route):
-                    # raise ValueError("Currently: The tick number must be less than 100.")                    
-                    current_transform = self.scenario.ego_predefined_route[self.tick_count]                               
-                    #need convert ego control
-                    self.ego_vehicles[0].set_transform(current_transform)
+            with profiler.stage('apply_control'):
+                if self.use_predefined_route:
+                    if self.tick_count < len(self.scenario.route):
+                        # raise ValueError("Currently: The tick number must be less than 100.")                    
+                        current_transform = self.scenario.ego_predefined_route[self.tick_count]                               
+                        #need convert ego control
+                        self.ego_vehicles[0].set_transform(current_transform)
+                    else:
+                        self._running = False
                 else:
-                    self._running = False
-            else:
-                self.ego_vehicles[0].apply_control(ego_action)   
+                    self.ego_vehicles[0].apply_control(ego_action)   
                                      
             ## DriveE2E: tick other actor
             if self._running and self.other_agent_setting:
-                self._tick_other_actors()
+                with profiler.stage('other_actors'):
+                    self._tick_other_actors()
                             
             # Tick scenario. Add the ego control to the blackboard in case some behaviors want to change it
-            py_trees.blackboard.Blackboard().set("AV_control", ego_action, overwrite=True)
-            self.scenario_tree.tick_once()
+            with profiler.stage('scenario_tree'):
+                py_trees.blackboard.Blackboard().set("AV_control", ego_action, overwrite=True)
+                self.scenario_tree.tick_once()
             
             if self._debug_mode > 1:
                 self.compute_duration_time()
@@ -254,13 +276,15 @@ class ScenarioManager(object):
             if self.scenario_tree.status != py_trees.common.Status.RUNNING:
                 self._running = False
 
-            ego_trans = self.ego_vehicles[0].get_transform()
-            self._spectator.set_transform(carla.Transform(ego_trans.location + carla.Location(z=70),
-                                                          carla.Rotation(pitch=-90)))
+            with profiler.stage('spectator'):
+                ego_trans = self.ego_vehicles[0].get_transform()
+                self._spectator.set_transform(carla.Transform(ego_trans.location + carla.Location(z=70),
+                                                              carla.Rotation(pitch=-90)))
             
         if self._running and self.get_running_status():
             # very important!!!                                   
-            CarlaDataProvider.get_world().tick(self._timeout)   
+            with profiler.stage('world_tick'):
+                CarlaDataProvider.get_world().tick(self._timeout)   
 
     def _tick_other_actors(self):        
         act_tick_count = self.tick_count
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Debug recordings of the agents.
+
+Instead of one PNG per camera and one JSON per saved frame, the recorder streams each image
+stream into a video container ('<stream>.mp4' or MJPEG '<stream>.avi') and appends the
+metadata of every saved frame to a single 'meta.jsonl'. Encoding and writing run on a background
+thread, so saving only costs the agent a queue insertion.
+
+The recordings are read back with RecordingReader, e.g.
+
+    reader = RecordingReader(path)
+    for meta, image in zip(reader.meta, reader.frames('rgb_front')):
+        ...
+"""
+
+import json
+import os
+import queue
+import threading
+
+import cv2
+import numpy as np
+
+RECORDING_FORMATS = {
+    # format: (fourcc, extension)
+    'mp4': ('mp4v', '.mp4'),
+    'mjpeg': ('MJPG', '.avi'),
+}
+META_FILE = 'meta.jsonl'
+
+_STOP = object()
+
+
+def _to_json(value):
+    """json 'default' hook for the numpy values of the agent metadata"""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError("Object of type {} is not JSON serializable".format(type(value).__name__))
+
+
+class AgentRecorder(object):
+
+    """
+    Streams the debug images and metadata of an agent into 'save_path'.
+
+    The images are RGB uint8 arrays and are not copied, so they must not be modified after
+    being passed to 'add_frame'. The queue is bounded: if the writer falls behind,
+    'add_frame' blocks instead of accumulating frames in memory. A recording already in
+    'save_path' is overwritten, like its videos, so that the metadata matches their frames.
+    """
+
+    def __init__(self, save_path, fps=10, recording_format='mp4', queue_size=64):
+        if recording_format not in RECORDING_FORMATS:
+            raise ValueError("Unknown recording format '{}', expected one of {}".format(
+                recording_format, list(RECORDING_FORMATS)))
+        self.save_path = str(save_path)
+        self.fps = fps
+        self.fourcc, self.extension = RECORDING_FORMATS[recording_format]
+        os.makedirs(self.save_path, exist_ok=True)
+
+        self._writers = {}
+        self._meta_file = open(os.path.join(self.save_path, META_FILE), 'w')
+        self._error = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name='AgentRecorder', daemon=True)
+        self._thread.start()
+
+    def add_frame(self, frame, images, meta=None):
+        """
+        Queues the images (dict of stream name -> RGB array) and the metadata of a frame.
+        A line is written to the JSONL for every frame, so that its lines match the video frames.
+        The metadata is serialized right away, so the caller can keep updating its dict.
+        """
+        self._check_error()
+        line = json.dumps(dict(meta or {}, frame=frame), default=_to_json)
+        self._queue.put((images, line))
+
+    def save_json(self, name, data):
+        """Queues a json file to be (over)written in the recording directory"""
+        self._check_error()
+        self._queue.put((name, json.dumps(data, default=_to_json)))
+
+    def close(self):
+        """Writes the pending frames and closes all the files"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        for writer, _ in self._writers.values():
+            writer.release()
+        self._writers = {}
+        self._meta_file.close()
+        self._check_error()
+
+    def _check_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("The agent recorder failed: {}".format(error))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            if self._error is not None:
+                continue  # Keep draining the queue so that the agent doesn't block
+            try:
+                if isinstance(item[0], str):
+                    self._write_json(*item)
+                else:
+                    self._write_frame(*item)
+            except Exception as e:  # pylint: disable=broad-except
+                self._error = e
+
+    def _write_json(self, name, text):
+        path = os.path.join(self.save_path, name + '.json')
+        with open(path + '.tmp', 'w') as fd:
+            fd.write(text)
+        os.replace(path + '.tmp', path)
+
+    def _write_frame(self, images, line):
+        for stream, image in images.items():
+            writer, size = self._get_writer(stream, image)
+            if (image.shape[1], image.shape[0]) != size:
+                image = cv2.resize(image, size)
+            writer.write(cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+        self._meta_file.write(line + '\n')
+        self._meta_file.flush()
+
+    def _get_writer(self, stream, image):
+        if stream not in self._writers:
+            size = (image.shape[1], image.shape[0])
+            path = os.path.join(self.save_path, stream + self.extension)
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, size)
+            if not writer.isOpened():
+                raise IOError("Couldn't open the video writer for {}".format(path))
+            self._writers[stream] = (writer, size)
+        return self._writers[stream]
+
+
+def is_recording(path):
+    """Returns whether 'path' is a recording made by the AgentRecorder"""
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+
+class RecordingReader(object):
+
+    """Reads back the recordings of the AgentRecorder"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.streams = {}
+        for filename in sorted(os.listdir(self.path)):
+            stream, extension = os.path.splitext(filename)
+            if extension in [ext for _, ext in RECORDING_FORMATS.values()]:
+                self.streams[stream] = os.path.join(self.path, filename)
+
+        self.meta = []
+        meta_path = os.path.join(self.path, META_FILE)
+        if os.path.isfile(meta_path):
+            with open(meta_path) as fd:
+                self.meta = [json.loads(line) for line in fd if line.strip()]
+
+    def frames(self, stream, rgb=True):
+        """Yields the images of a stream, in RGB (or BGR, as read by OpenCV)"""
+        if stream not in self.streams:
+            raise KeyError("No stream '{}' in {}, available: {}".format(stream, self.path, list(self.streams)))
+        capture = cv2.VideoCapture(self.streams[stream])
+        try:
+            while True:
+                success, image = capture.read()
+                if not success:
+                    break
+                yield cv2.cvtColor(image, cv2.COLOR_BGR2RGB) if rgb else image
+        finally:
+            capture.release()
@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+CPU renderer of the top-down view of the 'bev' camera used by the agents for visualization
+(512x512, fov 50, 50 m above the ego vehicle, looking down with the ego heading up).
+
+The static part is drawn from the HD map generated by tools/gen_hdmap.py. The world is
+split in square tiles which are rasterized the first time they are seen and kept in an LRU
+cache per town, so each frame only composes the cached tiles around the ego vehicle, rotates
+them to its heading and draws the dynamic elements (traffic light states, vehicles and walkers)
+taken from the CarlaDataProvider.
+
+The HD maps are looked for in the HD_MAP_DIR environment variable, which defaults to
+'Bench2DriveZoo/data/drivee2e_maps_20241126'.
+"""
+
+from collections import OrderedDict
+import math
+import os
+
+import cv2
+import numpy as np
+
+import carla
+from srunner.scenariomanager.carla_data_provider import CarlaDataProvider
+
+from leaderboard.utils.hd_map import find_hd_map, load_hd_map
+
+HD_MAP_DIR = os.environ.get('HD_MAP_DIR', 'Bench2DriveZoo/data/drivee2e_maps_20241126')
+
+BEV_SIZE = 512
+BEV_FOV = 50.0
+BEV_HEIGHT = 50.0
+PIXELS_PER_METER = BEV_SIZE / 2.0 / math.tan(math.radians(BEV_FOV / 2.0)) / BEV_HEIGHT
+
+TILE_PIXELS = 512
+SAMPLE_DISTANCE = 0.25  # meters between the map points used to draw
+DASH_LENGTH = 3.0  # length of the dashes and gaps of the broken lane markings
+DEFAULT_LANE_WIDTH = 3.5
+
+# Colors are RGB, as the images given by the agents' tick
+COLOR_BACKGROUND = (48, 52, 56)
+COLOR_ROAD = (96, 100, 104)
+COLOR_JUNCTION = (88, 92, 96)
+COLOR_STOP = (200, 60, 60)
+COLOR_HERO = (240, 240, 240)
+COLOR_VEHICLE = (60, 120, 230)
+COLOR_WALKER = (250, 170, 40)
+COLOR_LANE_MARKINGS = {
+    'White': (230, 230, 230),
+    'Standard': (230, 230, 230),
+    'Yellow': (240, 200, 40),
+    'Blue': (60, 120, 230),
+    'Green': (60, 200, 90),
+    'Red': (220, 50, 50),
+}
+COLOR_TRAFFIC_LIGHTS = {
+    carla.TrafficLightState.Red: (220, 40, 40),
+    carla.TrafficLightState.Yellow: (240, 200, 40),
+    carla.TrafficLightState.Green: (60, 200, 90),
+}
+
+_SHIFT = 2  # sub-pixel precision of the cv2 drawing functions
+_MAP_TILES = {}
+
+
+def _resample(points, step=SAMPLE_DISTANCE):
+    """
+    Keeps the points of a polyline that are at least 'step' meters apart, plus its last point
+    """
+    if len(points) < 3:
+        return points
+    segments = np.linalg.norm(np.diff(points, axis=0), axis=1)
+    accum = np.concatenate([[0.0], np.cumsum(segments)])
+    keep = np.unique(np.searchsorted(accum, np.arange(0.0, accum[-1], step)))
+    if keep[-1] != len(points) - 1:
+        keep = np.append(keep, len(points) - 1)
+    return points[keep]
+
+
+def _dashes(points, length=DASH_LENGTH):
+    """
+    Splits a polyline into the pieces drawn for a broken lane marking
+    """
+    segments = np.linalg.norm(np.diff(points, axis=0), axis=1)
+    accum = np.concatenate([[0.0], np.cumsum(segments)])
+    dash_ids = (accum // length).astype(np.int64)
+    dashes = []
+    for dash_id in np.unique(dash_ids[dash_ids % 2 == 0]):
+        dash = points[dash_ids == dash_id]
+        if len(dash) > 1:
+            dashes.append(dash)
+    return dashes
+
+
+class MapTiles(object):
+
+    """
+    Static layer of a town, rasterized per tile on demand. Tiles are aligned with the world axes,
+    x to the right and y downwards, with 'pixels_per_meter' resolution.
+    """
+
+    def __init__(self, hd_map, pixels_per_meter=PIXELS_PER_METER, tile_pixels=TILE_PIXELS, max_tiles=64):
+        """
+        Args:
+            hd_map (HDMap): HD map of the town, see leaderboard.utils.hd_map
+            pixels_per_meter (float): resolution of the tiles
+            tile_pixels (int): size of the tiles, in pixels
+            max_tiles (int): number of tiles kept in memory
+        """
+        self.pixels_per_meter = pixels_per_meter
+        self.tile_pixels = tile_pixels
+        self.max_tiles = max_tiles
+
+        # Each element is (kind, points (N, 2) in pixels, color, thickness in pixels)
+        self.elements = []
+        self.traffic_light_volumes = []
+        self._parse_map(hd_map)
+
+        self._tile_elements = {}
+        for index, (_, points, _, thickness) in enumerate(self.elements):
+            margin = thickness / 2.0 + 1
+            min_tile = np.floor((points.min(axis=0) - margin) / tile_pixels).astype(np.int64)
+            max_tile = np.floor((points.max(axis=0) + margin) / tile_pixels).astype(np.int64)
+            for tx in range(min_tile[0], max_tile[0] + 1):
+                for ty in range(min_tile[1], max_tile[1] + 1):
+                    self._tile_elements.setdefault((tx, ty), []).append(index)
+
+        self._tiles = OrderedDict()
+
+    def _parse_map(self, hd_map):
+        ppm = self.pixels_per_meter
+        surfaces, markings = [], []
+        for road_id in hd_map.roads():
+            for lane_id, lines in hd_map.road_lanes(road_id):
+                centers, lane_markings = [], []
+                for index in lines:
+                    points = hd_map.line_points(index)[:, :2].astype(np.float64)
+                    if hd_map.line_type(index) == 'Center':
+                        junction = bool(hd_map.junction[hd_map.line_offsets[index]])
+                        centers.append((points, junction))
+                    else:
+                        lane_markings.append((points, hd_map.line_type(index), hd_map.line_color(index)))
+
+                # The markings of a lane are half a lane width away from its center
+                marking_points = [_resample(points, 1.0) for points, _, _ in lane_markings]
+                marking_points = np.concatenate(marking_points) if marking_points else np.zeros((0, 2))
+                for points, junction in centers:
+                    width = DEFAULT_LANE_WIDTH
+                    if len(marking_points):
+                        samples = _resample(points, 1.0)
+                        distances = np.linalg.norm(samples[:, None] - marking_points[None], axis=-1).min(axis=1)
+                        width = float(np.clip(2 * np.median(distances), 2.0, 2 * DEFAULT_LANE_WIDTH))
+                    color = COLOR_JUNCTION if junction else COLOR_ROAD
+                    surfaces.append(('line', _resample(points) * ppm, color, max(int(round(width * ppm)), 1)))
+
+                for points, marking_type, marking_color in lane_markings:
+                    color = COLOR_LANE_MARKINGS.get(marking_color)
+                    if color is None or marking_type in ('NONE', 'Other', 'Grass', 'Curb'):
+                        continue
+                    points = _resample(points)
+                    if marking_type.startswith('Broken'):
+                        markings.extend(('line', dash * ppm, color, 1) for dash in _dashes(points))
+                    else:
+                        markings.append(('line', points * ppm, color, 1))
+
+            for index in hd_map.road_volumes(road_id):
+                points = hd_map.volume_vertices(index)[:, :2].astype(np.float64)
+                if hd_map.volume_type(index) == 'StopSign':
+                    markings.append(('polygon', points * ppm, COLOR_STOP, 2))
+                elif hd_map.volume_type(index) == 'TrafficLight':
+                    self.traffic_light_volumes.append(
+                        (points, hd_map.volume_parents[index, :2].astype(np.float64)))
+
+        # Road surfaces go below the markings
+        self.elements = surfaces + markings
+
+    def _render_tile(self, tx, ty):
+        tile = np.empty((self.tile_pixels, self.tile_pixels, 3), dtype=np.uint8)
+        tile[:] = COLOR_BACKGROUND
+        origin = np.array([tx, ty], dtype=np.float64) * self.tile_pixels
+        for index in self._tile_elements.get((tx, ty), []):
+            kind, points, color, thickness = self.elements[index]
+            points = np.round((points - origin) * (1 << _SHIFT)).astype(np.int32)
+            if kind == 'polygon':
+                cv2.polylines(tile, [points], True, color, thickness, cv2.LINE_AA, _SHIFT)
+            else:
+                cv2.polylines(tile, [points], False, color, thickness, cv2.LINE_AA, _SHIFT)
+        return tile
+
+    def get_tile(self, tx, ty):
+        """
+        Returns the image of a tile, rendering it if it isn't cached
+        """
+        key = (tx, ty)
+        tile = self._tiles.get(key)
+        if tile is None:
+            tile = self._render_tile(tx, ty)
+            self._tiles[key] = tile
+            if len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+        else:
+            self._tiles.move_to_end(key)
+        return tile
+
+    def get_patch(self, center, radius):
+        """
+        Returns the static image around a world xy 'center', covering at least 'radius' pixels,
+        and the pixel coordinates of its top left corner.
+        """
+        center = np.asarray(center, dtype=np.float64) * self.pixels_per_meter
+        min_tile = np.floor((center - radius) / self.tile_pixels).astype(np.int64)
+        max_tile = np.floor((center + radius) / self.tile_pixels).astype(np.int64)
+        num_x, num_y = max_tile - min_tile + 1
+
+        patch = np.empty((num_y * self.tile_pixels, num_x * self.tile_pixels, 3), dtype=np.uint8)
+        for i in range(num_x):
+            for j in range(num_y):
+                patch[j * self.tile_pixels:(j + 1) * self.tile_pixels, i * self.tile_pixels:(i + 1) * self.tile_pixels] = \
+                    self.get_tile(min_tile[0] + i, min_tile[1] + j)
+        return patch, min_tile * self.tile_pixels
+
+
+def get_map_tiles(town, map_dir=HD_MAP_DIR, pixels_per_meter=PIXELS_PER_METER):
+    """
+    Returns the MapTiles of a town, or None if its HD map isn't found.
+    Loaded lazily and kept in memory for the following routes.
+    """
+    key = (town, pixels_per_meter)
+    if key not in _MAP_TILES:
+        path = find_hd_map(map_dir, town)
+        if path is None:
+            print("WARNING: No HD map of {} found in '{}', the BEV will only show the actors".format(town, map_dir), flush=True)
+            _MAP_TILES[key] = None
+        else:
+            _MAP_TILES[key] = MapTiles(load_hd_map(path), pixels_per_meter)
+    return _MAP_TILES[key]
+
+
+class BEVRenderer(object):
+
+    """
+    Renders the top-down view around the hero vehicle, as an RGB image of the same size and
+    scale as the 'bev' camera. Elements are drawn on the ground plane.
+    """
+
+    def __init__(self, size=BEV_SIZE, pixels_per_meter=PIXELS_PER_METER, map_dir=HD_MAP_DIR):
+        self.size = size
+        self.pixels_per_meter = pixels_per_meter
+        self.map_dir = map_dir
+        # Half diagonal of the view, the area that can be seen at any heading
+        self.radius = size / math.sqrt(2) + 2
+
+        self._town = None
+        self._map_tiles = None
+        self._traffic_lights = []
+
+    def _set_town(self):
+        town = CarlaDataProvider.get_map().name.split('/')[-1]
+        if town == self._town:
+            return
+        self._town = town
+        self._map_tiles = get_map_tiles(town, self.map_dir, self.pixels_per_meter)
+
+        # Match the traffic light trigger volumes with their actors, to draw their state
+        self._traffic_lights = []
+        if self._map_tiles is not None and self._map_tiles.traffic_light_volumes:
+            lights = list(CarlaDataProvider.get_all_actors().filter('*traffic_light*'))
+            if lights:
+                locations = np.array([[l.get_location().x, l.get_location().y] for l in lights])
+                for points, parent_location in self._map_tiles.traffic_light_volumes:
+                    distances = np.linalg.norm(locations - parent_location, axis=1)
+                    if distances.min() < 1.0:
+                        self._traffic_lights.append((points, lights[int(np.argmin(distances))]))
+
+    def _get_world_to_image(self, transform):
+        """
+        Returns the (2, 3) affine matrix from world xy coordinates to image pixels
+        """
+        yaw = math.radians(transform.rotation.yaw)
+        cos, sin = math.cos(yaw) * self.pixels_per_meter, math.sin(yaw) * self.pixels_per_meter
+        x, y = transform.location.x, transform.location.y
+        center = self.size / 2.0
+        # Forward is up and right is right
+        return np.array([
+            [-sin, cos, center + sin * x - cos * y],
+            [-cos, -sin, center + cos * x + sin * y],
+        ])
+
+    @staticmethod
+    def _get_actor_corners(actor):
+        transform = actor.get_transform()
+        bbox = actor.bounding_box
+        yaw = math.radians(transform.rotation.yaw)
+        cos, sin = math.cos(yaw), math.sin(yaw)
+        ex, ey = max(bbox.extent.x, 0.2), max(bbox.extent.y, 0.2)
+        local = np.array([[ex, ey], [ex, -ey], [-ex, -ey], [-ex, ey]]) + (bbox.location.x, bbox.location.y)
+        return local @ np.array([[cos, sin], [-sin, cos]]) + (transform.location.x, transform.location.y)
+
+    def _draw_polygon(self, image, world_to_image, points, color):
+        pixels = points @ world_to_image[:, :2].T + world_to_image[:, 2]
+        cv2.fillConvexPoly(image, np.round(pixels * (1 << _SHIFT)).astype(np.int32), color, cv2.LINE_AA, _SHIFT)
+
+    def render(self, hero=None):
+        """
+        Returns the (size, size, 3) RGB image around the hero vehicle
+        """
+        if hero is None:
+            hero = CarlaDataProvider.get_hero_actor()
+        self._set_town()
+
+        hero_transform = hero.get_transform()
+        world_to_image = self._get_world_to_image(hero_transform)
+
+        if self._map_tiles is not None:
+            hero_xy = (hero_transform.location.x, hero_transform.location.y)
+            patch, origin = self._map_tiles.get_patch(hero_xy, self.radius)
+            # Patch pixels to world, then world to image
+            patch_to_world = np.array([
+                [1.0 / self.pixels_per_meter, 0.0, origin[0] / self.pixels_per_meter],
+                [0.0, 1.0 / self.pixels_per_meter, origin[1] / self.pixels_per_meter],
+                [0.0, 0.0, 1.0],
+            ])
+            image = cv2.warpAffine(patch, world_to_image @ patch_to_world, (self.size, self.size),
+                                   flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=COLOR_BACKGROUND)
+        else:
+            image = np.empty((self.size, self.size, 3), dtype=np.uint8)
+            image[:] = COLOR_BACKGROUND
+
+        hero_location = np.array([hero_transform.location.x, hero_transform.location.y])
+        max_distance = self.radius / self.pixels_per_meter
+
+        for points, light in self._traffic_lights:
+            color = COLOR_TRAFFIC_LIGHTS.get(light.state)
+            if color is None or np.linalg.norm(points[0] - hero_location) > max_distance + 10:
+                continue
+            self._draw_polygon(image, world_to_image, points, color)
+
+        for actor in CarlaDataProvider.get_all_actors():
+            if actor.id == hero.id:
+                continue
+            if actor.type_id.startswith('vehicle.'):
+                color = COLOR_VEHICLE
+            elif actor.type_id.startswith('walker.'):
+                color = COLOR_WALKER
+            else:
+                continue
+            location = actor.get_location()
+            if np.hypot(location.x - hero_location[0], location.y - hero_location[1]) > max_distance + 5:
+                continue
+            self._draw_polygon(image, world_to_image, self._get_actor_corners(actor), color)
+
+        self._draw_polygon(image, world_to_image, self._get_actor_corners(hero), COLOR_HERO)
+        return image
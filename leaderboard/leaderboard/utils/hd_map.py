@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+HD maps of the towns, as extracted by tools/gen_hdmap.py.
+
+A map is made of polylines, the lane centers and the lane markings, grouped by road and lane,
+and of the trigger volumes of the stop signs and traffic lights of each road. It is stored as
+flat typed arrays: the points of all the polylines in a single (P, 3) float32 buffer, with the
+offsets of each polyline in it and its road, lane, type and color, and likewise for the trigger
+volumes. The file '<town>_HD_map.bin' is laid out as
+
+    header size (uint64) | JSON header | arrays
+
+where the header holds the dtype, shape and offset of each array and the names of the types
+and colors. Nothing is pickled, and the arrays of a loaded map are views of a read-only memory
+map of the file, so only the parts of the map that are used are read.
+
+The legacy '<town>_HD_map.npz' files, pickled nested dicts, are still loaded by load_hd_map.
+Running this module converts them:
+
+    python leaderboard/leaderboard/utils/hd_map.py Bench2DriveZoo/data/drivee2e_maps_20241126/*.npz
+"""
+
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+
+HD_MAP_FORMAT = 1
+HD_MAP_SUFFIX = '_HD_map.bin'
+LEGACY_HD_MAP_SUFFIX = '_HD_map.npz'
+
+_HEADER_SIZE = struct.Struct('<Q')
+_ALIGNMENT = 8
+
+# Name and dtype of the arrays of a map, in file order
+_ARRAYS = [
+    ('points', np.float32),              # (P, 3) x, y, z of the points of all the lines
+    ('rotations', np.float32),           # (P, 3) roll, pitch, yaw of the waypoint of each point
+    ('junction', np.bool_),              # (P,) whether the waypoint is in a junction, centers only
+    ('line_offsets', np.int64),          # (L + 1,) start of each line in points
+    ('line_ids', np.int32),              # (L, 2) road id and lane id of each line
+    ('line_types', np.int16),            # (L,) index in the 'types' names
+    ('line_colors', np.int16),           # (L,) index in the 'colors' names
+    ('line_topology_types', np.int16),   # (L,) index in the 'topology_types' names, -1 for markings
+    ('line_sides', np.int32),            # (L, 2, 2) road and lane ids of the left and right lanes of
+                                         # the centers, -1 road id if there is none
+    ('topology_offsets', np.int64),      # (L + 1,) start of the topology of each line
+    ('topology', np.int32),              # (T, 2) road and lane ids connected to the end of the lines
+    ('volume_offsets', np.int64),        # (V + 1,) start of each trigger volume in volume_points
+    ('volume_points', np.float32),       # (Q, 3) x, y, z of the vertices of all the trigger volumes
+    ('volume_roads', np.int32),          # (V,) road id of each trigger volume
+    ('volume_types', np.int16),          # (V,) index in the 'volume_types' names
+    ('volume_parents', np.float32),      # (V, 3) location of the sign or light of each volume
+]
+_NAMES = ['types', 'colors', 'topology_types', 'volume_types']
+
+
+class HDMap(object):
+
+    """
+    HD map of a town. The arrays are described in '_ARRAYS', the polylines are called lines
+    and the string attributes are indices in 'names'.
+    """
+
+    def __init__(self, arrays, names, town=None):
+        self.town = town
+        self.names = names
+        for name, _ in _ARRAYS:
+            setattr(self, name, arrays[name])
+        self._build_index()
+
+    def _build_index(self):
+        """Road -> lane -> range of lines, and road -> range of trigger volumes, in map order"""
+        self._roads = {}
+        ids = self.line_ids
+        if len(ids):
+            starts = np.flatnonzero(np.any(ids[1:] != ids[:-1], axis=1)) + 1
+            starts = np.concatenate([[0], starts, [len(ids)]])
+            for start, end in zip(starts[:-1].tolist(), starts[1:].tolist()):
+                road_id, lane_id = ids[start].tolist()
+                self._roads.setdefault(road_id, {})[lane_id] = range(start, end)
+
+        self._volumes = {}
+        roads = self.volume_roads
+        if len(roads):
+            starts = np.concatenate([[0], np.flatnonzero(roads[1:] != roads[:-1]) + 1, [len(roads)]])
+            for start, end in zip(starts[:-1].tolist(), starts[1:].tolist()):
+                self._volumes[int(roads[start])] = range(start, end)
+
+    def __len__(self):
+        return len(self.line_types)
+
+    def roads(self):
+        """Returns the road ids, in map order"""
+        return list(self._roads)
+
+    def road_lanes(self, road_id):
+        """Returns the (lane id, range of lines) of a road"""
+        return list(self._roads.get(road_id, {}).items())
+
+    def lane_lines(self, road_id, lane_id):
+        """Returns the range of the lines of a lane, empty if the lane isn't in the map"""
+        return self._roads.get(road_id, {}).get(lane_id, range(0))
+
+    def road_volumes(self, road_id):
+        """Returns the range of the trigger volumes of a road"""
+        return self._volumes.get(road_id, range(0))
+
+    def line_points(self, index):
+        """Returns the (N, 3) points of a line"""
+        return self.points[self.line_offsets[index]:self.line_offsets[index + 1]]
+
+    def line_type(self, index):
+        return self.names['types'][self.line_types[index]]
+
+    def line_color(self, index):
+        return self.names['colors'][self.line_colors[index]]
+
+    def line_topology(self, index):
+        """Returns the (road id, lane id) connected to the end of a line"""
+        topology = self.topology[self.topology_offsets[index]:self.topology_offsets[index + 1]]
+        return [tuple(ids) for ids in topology.tolist()]
+
+    def volume_vertices(self, index):
+        """Returns the (N, 3) vertices of a trigger volume"""
+        return self.volume_points[self.volume_offsets[index]:self.volume_offsets[index + 1]]
+
+    def volume_type(self, index):
+        return self.names['volume_types'][self.volume_types[index]]
+
+    @classmethod
+    def from_dict(cls, lane_marking_dict, town=None):
+        """
+        Builds the map from the nested dict of LankMarkingGettor (see tools/gen_hdmap.py), also
+        the content of the legacy npz files. The lines keep the order of the dict.
+        """
+        names = {key: [] for key in _NAMES}
+        name_ids = {key: {} for key in _NAMES}
+
+        def name_id(key, value):
+            ids = name_ids[key]
+            if value not in ids:
+                ids[value] = len(names[key])
+                names[key].append(value)
+            return ids[value]
+
+        points, rotations, junction, line_lengths = [], [], [], []
+        line_ids, line_types, line_colors, line_topology_types, line_sides = [], [], [], [], []
+        topology, topology_lengths = [], []
+        volume_points, volume_lengths, volume_roads, volume_types, volume_parents = [], [], [], [], []
+
+        for road_id, road in lane_marking_dict.items():
+            for lane_id, lane in road.items():
+                if lane_id == 'Trigger_Volumes':
+                    for volume in lane:
+                        volume_points.extend(volume['Points'])
+                        volume_lengths.append(len(volume['Points']))
+                        volume_roads.append(road_id)
+                        volume_types.append(name_id('volume_types', volume['Type']))
+                        volume_parents.append(volume['ParentActor_Location'])
+                    continue
+                for line in lane:
+                    for point in line['Points']:
+                        points.append(point[0])
+                        rotations.append(point[1])
+                        junction.append(bool(point[2]) if len(point) > 2 else False)
+                    line_lengths.append(len(line['Points']))
+                    line_ids.append((road_id, lane_id))
+                    line_types.append(name_id('types', line['Type']))
+                    line_colors.append(name_id('colors', line['Color']))
+                    if 'TopologyType' in line:
+                        line_topology_types.append(name_id('topology_types', line['TopologyType']))
+                    else:
+                        line_topology_types.append(-1)
+                    sides = []
+                    for side in (line.get('Left'), line.get('Right')):
+                        if side is None or side[0] is None:
+                            sides.append((-1, 0))
+                        else:
+                            sides.append(side)
+                    line_sides.append(sides)
+                    connected = [ids for ids in line['Topology'] if ids is not None]
+                    topology.extend(connected)
+                    topology_lengths.append(len(connected))
+
+        def offsets(lengths):
+            return np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]).astype(np.int64)
+
+        arrays = {
+            'points': np.array(points, dtype=np.float32).reshape(-1, 3),
+            'rotations': np.array(rotations, dtype=np.float32).reshape(-1, 3),
+            'junction': np.array(junction, dtype=np.bool_),
+            'line_offsets': offsets(line_lengths),
+            'line_ids': np.array(line_ids, dtype=np.int32).reshape(-1, 2),
+            'line_types': np.array(line_types, dtype=np.int16),
+            'line_colors': np.array(line_colors, dtype=np.int16),
+            'line_topology_types': np.array(line_topology_types, dtype=np.int16),
+            'line_sides': np.array(line_sides, dtype=np.int32).reshape(-1, 2, 2),
+            'topology_offsets': offsets(topology_lengths),
+            'topology': np.array(topology, dtype=np.int32).reshape(-1, 2),
+            'volume_offsets': offsets(volume_lengths),
+            'volume_points': np.array(volume_points, dtype=np.float32).reshape(-1, 3),
+            'volume_roads': np.array(volume_roads, dtype=np.int32),
+            'volume_types': np.array(volume_types, dtype=np.int16),
+            'volume_parents': np.array(volume_parents, dtype=np.float32).reshape(-1, 3),
+        }
+        return cls(arrays, names, town)
+
+    def to_dict(self):
+        """Returns the map as the nested dict of LankMarkingGettor, with float32 precision"""
+        lane_marking_dict = {}
+        for road_id in self.roads():
+            road = lane_marking_dict[road_id] = {}
+            for lane_id, lines in self.road_lanes(road_id):
+                road[lane_id] = []
+                for index in lines:
+                    start, end = self.line_offsets[index], self.line_offsets[index + 1]
+                    line = {'Type': self.line_type(index), 'Color': self.line_color(index),
+                            'Topology': self.line_topology(index)}
+                    point_list = zip(self.points[start:end].tolist(), self.rotations[start:end].tolist())
+                    if self.line_topology_types[index] >= 0:
+                        line['Points'] = [(tuple(location), tuple(rotation), bool(junction)) for (location, rotation), junction
+                                          in zip(point_list, self.junction[start:end].tolist())]
+                        line['TopologyType'] = self.names['topology_types'][self.line_topology_types[index]]
+                        for key, (side_road, side_lane) in zip(('Left', 'Right'), self.line_sides[index].tolist()):
+                            line[key] = (side_road, side_lane) if side_road >= 0 else (None, None)
+                    else:
+                        line['Points'] = [(tuple(location), tuple(rotation)) for location, rotation in point_list]
+                    road[lane_id].append(line)
+            volumes = self.road_volumes(road_id)
+            if len(volumes):
+                road['Trigger_Volumes'] = [{
+                    'Points': self.volume_vertices(index).tolist(),
+                    'Type': self.volume_type(index),
+                    'ParentActor_Location': self.volume_parents[index].tolist(),
+                } for index in volumes]
+        return lane_marking_dict
+
+
+def _align(offset):
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def save_hd_map(filename, hd_map):
+    """
+    Saves an HDMap, or the nested dict of LankMarkingGettor, in the binary format. The file is
+    written next to 'filename' and then moved there, so readers never see a partial map.
+    """
+    if isinstance(hd_map, dict):
+        hd_map = HDMap.from_dict(hd_map)
+
+    arrays = {}
+    offset = 0
+    for name, dtype in _ARRAYS:
+        array = np.ascontiguousarray(getattr(hd_map, name), dtype=dtype)
+        arrays[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = _align(offset + array.nbytes)
+    header = {'format': HD_MAP_FORMAT, 'town': hd_map.town, 'names': hd_map.names, 'arrays': arrays}
+    header = json.dumps(header).encode('utf-8')
+    # the arrays start aligned in the file
+    header += b' ' * (_align(_HEADER_SIZE.size + len(header)) - _HEADER_SIZE.size - len(header))
+
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'wb') as f:
+        f.write(_HEADER_SIZE.pack(len(header)))
+        f.write(header)
+        for name, dtype in _ARRAYS:
+            array = np.ascontiguousarray(getattr(hd_map, name), dtype=dtype)
+            f.write(array.tobytes())
+            f.write(b'\0' * (_align(array.nbytes) - array.nbytes))
+    os.replace(tmp_filename, filename)
+
+
+def load_hd_map(filename):
+    """
+    Loads an HD map, memory mapped for the binary format. The legacy npz files are converted
+    on the fly.
+    """
+    if filename.endswith('.npz'):
+        lane_marking_dict = dict(np.load(filename, allow_pickle=True)['arr'])
+        town = os.path.basename(filename)[:-len(LEGACY_HD_MAP_SUFFIX)]
+        return HDMap.from_dict(lane_marking_dict, town)
+
+    with open(filename, 'rb') as f:
+        header_size, = _HEADER_SIZE.unpack(f.read(_HEADER_SIZE.size))
+        header = json.loads(f.read(header_size).decode('utf-8'))
+    if header.get('format') != HD_MAP_FORMAT:
+        raise ValueError('{} has HD map format {}, expected {}'.format(filename, header.get('format'), HD_MAP_FORMAT))
+
+    data_offset = _HEADER_SIZE.size + header_size
+    buffer = np.memmap(filename, dtype=np.uint8, mode='r')
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        start = data_offset + spec['offset']
+        size = int(np.prod(spec['shape'], dtype=np.int64)) * dtype.itemsize
+        arrays[name] = buffer[start:start + size].view(dtype).reshape(spec['shape'])
+    return HDMap(arrays, header['names'], header['town'])
+
+
+def find_hd_map(map_dir, town):
+    """
+    Returns the path of the HD map of a town in 'map_dir', preferring the binary format over
+    the legacy npz, or None if there is none.
+    """
+    for suffix in (HD_MAP_SUFFIX, LEGACY_HD_MAP_SUFFIX):
+        path = os.path.join(map_dir, town + suffix)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+if __name__ == '__main__':
+    for legacy_filename in sys.argv[1:]:
+        if not legacy_filename.endswith(LEGACY_HD_MAP_SUFFIX):
+            print('Skipping {}, not a legacy HD map'.format(legacy_filename))
+            continue
+        filename = legacy_filename[:-len(LEGACY_HD_MAP_SUFFIX)] + HD_MAP_SUFFIX
+        save_hd_map(filename, load_hd_map(legacy_filename))
+        print('{} -> {}'.format(legacy_filename, filename))
@@ -8,8 +8,14 @@
 """
 Module to manipulate the routes, by making then more or less dense (Up to a certain parameter).
 It also contains functions to convert the CARLA world location do GPS coordinates.
+
+Route planners and map georeferences are kept per town for the lifetime of the process.
+If the ROUTE_CACHE_DIR environment variable is set, interpolated routes are also stored there,
+keyed by town and keypoints, so that evaluating the same routes again skips the densification.
 """
 
+import hashlib
+import json
 import math
 import carla
 import xml.etree.ElementTree as ET
@@ -58,12 +64,25 @@ def location_route_to_gps(route, lat_ref, lon_ref):
     return gps_route
 
 
+ROUTE_CACHE_VERSION = 1
+
+_ROUTE_PLANNERS = {}
+_LATLON_REFS = {}
+
+
 def _get_latlon_ref(world):
     """
     Convert from waypoints world coordinates to CARLA GPS coordinates
     :return: tuple with lat and lon coordinates
     """
-    xodr = world.get_map().to_opendrive()
+    return _parse_latlon_ref(world.get_map().to_opendrive())
+
+
+def _parse_latlon_ref(xodr):
+    """
+    Parses the georeference of an OpenDRIVE string
+    :return: tuple with lat and lon coordinates
+    """
     tree = ET.ElementTree(ET.fromstring(xodr))
 
     # default reference
@@ -83,6 +102,94 @@ def _get_latlon_ref(world):
     return lat_ref, lon_ref
 
 
+def get_latlon_ref(carla_map):
+    """
+    Same as _get_latlon_ref, but the OpenDRIVE is only parsed once per town
+    :return: tuple with lat and lon coordinates
+    """
+    if carla_map.name not in _LATLON_REFS:
+        _LATLON_REFS[carla_map.name] = _parse_latlon_ref(carla_map.to_opendrive())
+    return _LATLON_REFS[carla_map.name]
+
+
+def get_route_planner(carla_map, hop_resolution=1.0):
+    """
+    Returns a GlobalRoutePlanner for the given map. Its topology graph is built once per town
+    and hop resolution, and reused by all the following routes of that town.
+    """
+    key = (carla_map.name, hop_resolution)
+    grp = _ROUTE_PLANNERS.get(key)
+    if grp is None:
+        grp = GlobalRoutePlanner(carla_map, hop_resolution)
+        _ROUTE_PLANNERS[key] = grp
+    else:
+        # The graph only depends on the town, but waypoint queries go through the current map
+        grp._wmap = carla_map  # pylint: disable=protected-access
+    return grp
+
+
+def _get_route_cache_path(carla_map, keypoints, hop_resolution):
+    """
+    Returns the path of the on-disk cache file of a route, or None if caching is disabled
+    """
+    cache_dir = os.environ.get('ROUTE_CACHE_DIR')
+    if not cache_dir:
+        return None
+
+    town = os.path.basename(carla_map.name)
+    key = hashlib.sha1('{}|{}|{}'.format(ROUTE_CACHE_VERSION, town, hop_resolution).encode())
+    for keypoint in keypoints:
+        location = keypoint.location if isinstance(keypoint, carla.Transform) else keypoint
+        key.update('|{:.3f},{:.3f},{:.3f}'.format(location.x, location.y, location.z).encode())
+
+    return os.path.join(cache_dir, town, key.hexdigest() + '.json')
+
+
+def _load_route_cache(cache_path):
+    """
+    Loads the gps and world routes from a cache file, or returns None if they aren't available
+    """
+    try:
+        with open(cache_path, 'r') as fd:
+            data = json.load(fd)
+    except (OSError, ValueError):
+        return None
+    if data.get('version') != ROUTE_CACHE_VERSION:
+        return None
+
+    route = []
+    for x, y, z, pitch, yaw, roll, option in data['route']:
+        transform = carla.Transform(carla.Location(x, y, z), carla.Rotation(pitch=pitch, yaw=yaw, roll=roll))
+        route.append((transform, RoadOption(option)))
+
+    gps_route = []
+    for lat, lon, z, option in data['gps_route']:
+        gps_route.append(({'lat': lat, 'lon': lon, 'z': z}, RoadOption(option)))
+
+    return gps_route, route
+
+
+def _save_route_cache(cache_path, gps_route, route):
+    """
+    Saves the gps and world routes to a cache file. The file is written atomically,
+    as several evaluation processes might be sharing the same cache
+    """
+    data = {
+        'version': ROUTE_CACHE_VERSION,
+        'route': [
+            [t.location.x, t.location.y, t.location.z, t.rotation.pitch, t.rotation.yaw, t.rotation.roll, c.value]
+            for t, c in route
+        ],
+        'gps_route': [[g['lat'], g['lon'], g['z'], c.value] for g, c in gps_route],
+    }
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+    with open(tmp_path, 'w') as fd:
+        json.dump(data, fd)
+    os.replace(tmp_path, cache_path)
+
+
 def downsample_route(route, sample_factor):
     """
     Downsample the route by some factor.
@@ -144,9 +251,16 @@ def interpolate_trajectory(waypoints_trajectory, drivee2e_scenario_setting = Fal
         - hop_resolution: distance between the trajectory's waypoints
     """
 
-    grp = GlobalRoutePlanner(CarlaDataProvider.get_map(), hop_resolution)
-    lat_ref, lon_ref = _get_latlon_ref(CarlaDataProvider.get_world())
-       
+    carla_map = CarlaDataProvider.get_map()
+    lat_ref, lon_ref = get_latlon_ref(carla_map)
+
+    cache_path = None
+    if not drivee2e_scenario_setting:
+        cache_path = _get_route_cache_path(carla_map, waypoints_trajectory, hop_resolution)
+        cached_routes = _load_route_cache(cache_path) if cache_path else None
+        if cached_routes is not None:
+            return cached_routes
+
     route = []
     gps_route = []
     if drivee2e_scenario_setting:
@@ -159,7 +273,8 @@ def interpolate_trajectory(waypoints_trajectory, drivee2e_scenario_setting = Fal
                 
                 gps_coord = _location_to_gps(lat_ref, lon_ref, cur_trans.location)
                 gps_route.append((gps_coord, connection))
-    else:    
+    else:
+        grp = get_route_planner(carla_map, hop_resolution)
         for i in range(len(waypoints_trajectory) - 1):
             waypoint = waypoints_trajectory[i]
             waypoint_next = waypoints_trajectory[i + 1]
@@ -172,7 +287,10 @@ def interpolate_trajectory(waypoints_trajectory, drivee2e_scenario_setting = Fal
                 
                 gps_coord = _location_to_gps(lat_ref, lon_ref, wp.transform.location)
                 gps_route.append((gps_coord, connection))
-            
+
+        if cache_path:
+            _save_route_cache(cache_path, gps_route, route)
+
     return gps_route, route
 
 
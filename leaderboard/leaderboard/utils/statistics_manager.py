@@ -328,6 +328,11 @@ class StatisticsManager(object):
         else:
             self._results.checkpoint.records.append(route_record)
 
+    def save_tick_profile(self, route_index, tick_profile):
+        """Saves the summary of the tick durations of a route"""
+        route_record = self._results.checkpoint.records[route_index]
+        route_record.meta['tick_profile'] = tick_profile
+
     def set_scenario(self, scenario):
         """Sets the scenario from which the statistics will be taken"""
         self._scenario = scenario
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Wall clock profiling of the stages of each simulation tick.
+
+The durations are stored in preallocated ring buffers (one row per tick, one column per stage),
+so recording has a constant and small cost. At the end of a route, the buffers can be summarized
+as percentiles per stage, or exported as a Chrome trace (chrome://tracing, Perfetto) timeline.
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+TICK_STAGES = (
+    'tick',             # The whole ScenarioManager._tick_scenario
+    'on_carla_tick',    # GameTime and CarlaDataProvider updates
+    'agent',            # The whole agent call
+    'sensor_data',      # Waiting for the sensor data, inside the agent call
+    'run_step',         # The agent's run_step, inside the agent call
+    'apply_control',    # Applying the ego control or predefined route
+    'other_actors',     # ScenarioManager._tick_other_actors
+    'scenario_tree',    # scenario_tree.tick_once
+    'spectator',        # Spectator update
+    'world_tick',       # world.tick
+)
+
+
+class _Stage(object):
+
+    """Context manager recording the duration of a stage"""
+
+    __slots__ = ('_profiler', '_column', '_start')
+
+    def __init__(self, profiler, column):
+        self._profiler = profiler
+        self._column = column
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self._profiler._record(self._column, self._start, time.perf_counter())
+        return False
+
+
+class _NullStage(object):
+
+    """Context manager used when the profiler is disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class TickProfiler(object):
+
+    """
+    Records the wall clock duration of each stage of the ticks, keeping the last 'capacity' ticks.
+    When disabled, all the methods are no-ops.
+    """
+
+    def __init__(self, enabled=True, stages=TICK_STAGES, capacity=20000):
+        self.enabled = enabled
+        self.stages = tuple(stages)
+        self.capacity = int(capacity)
+        self._columns = {stage: i for i, stage in enumerate(self.stages)}
+        self._stage_contexts = [_Stage(self, i) for i in range(len(self.stages))]
+
+        self._starts = np.full((self.capacity, len(self.stages)), np.nan)
+        self._durations = np.full((self.capacity, len(self.stages)), np.nan)
+        self._row = -1
+        self._num_ticks = 0
+        self._origin = time.perf_counter()
+
+    def reset(self):
+        """Removes all the recorded ticks"""
+        self._starts.fill(np.nan)
+        self._durations.fill(np.nan)
+        self._row = -1
+        self._num_ticks = 0
+        self._origin = time.perf_counter()
+
+    def start_tick(self):
+        """Starts recording a new tick, overwriting the oldest one if the buffers are full"""
+        if not self.enabled:
+            return
+        self._row = (self._row + 1) % self.capacity
+        self._starts[self._row] = np.nan
+        self._durations[self._row] = np.nan
+        self._num_ticks += 1
+
+    def _record(self, column, start, end):
+        if self._row < 0:
+            return
+        if np.isnan(self._starts[self._row, column]):
+            self._starts[self._row, column] = start
+            self._durations[self._row, column] = end - start
+        else:
+            # Stages run more than once per tick are accumulated
+            self._durations[self._row, column] += end - start
+
+    def record(self, stage, start, end=None):
+        """
+        Records a stage of the current tick that started at 'start' (time.perf_counter)
+        and ended at 'end', or now if not given
+        """
+        if not self.enabled:
+            return
+        self._record(self._columns[stage], start, time.perf_counter() if end is None else end)
+
+    def stage(self, stage):
+        """
+        Returns a context manager recording the duration of a stage of the current tick
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._stage_contexts[self._columns[stage]]
+
+    @property
+    def num_ticks(self):
+        """Number of ticks in the buffers"""
+        return min(self._num_ticks, self.capacity)
+
+    def _ordered(self, array):
+        if self._num_ticks <= self.capacity:
+            return array[:self._num_ticks]
+        return np.roll(array, -(self._row + 1), axis=0)
+
+    def get_durations(self):
+        """
+        Returns the (ticks, stages) durations in seconds, from the oldest to the newest tick.
+        Stages that didn't run in a tick are NaN.
+        """
+        return self._ordered(self._durations).copy()
+
+    def summary(self, percentiles=(50, 90, 99)):
+        """
+        Returns a JSON serializable dict with the number of ticks and, for each stage that ran,
+        its mean, max, total and percentiles, in milliseconds
+        """
+        durations = self._ordered(self._durations) * 1000.0
+        summary = {'ticks': self.num_ticks, 'stages': {}}
+        for stage, column in self._columns.items():
+            values = durations[:, column]
+            values = values[~np.isnan(values)]
+            if not len(values):
+                continue
+            stage_summary = {
+                'count': int(len(values)),
+                'mean': round(float(values.mean()), 3),
+                'max': round(float(values.max()), 3),
+                'total': round(float(values.sum()), 3),
+            }
+            for percentile, value in zip(percentiles, np.percentile(values, percentiles)):
+                stage_summary['p{}'.format(percentile)] = round(float(value), 3)
+            summary['stages'][stage] = stage_summary
+        return summary
+
+    def to_chrome_trace(self, name='tick'):
+        """
+        Returns the recorded ticks in the Chrome trace event format. The whole tick, the stages
+        inside the agent call, and the rest of the stages are shown in three different tracks.
+        The events keep the number of their tick, also when the oldest ticks have been dropped.
+        """
+        starts = (self._ordered(self._starts) - self._origin) * 1e6
+        durations = self._ordered(self._durations) * 1e6
+        first_tick = self._num_ticks - len(starts)
+        tracks = {'tick': 0, 'sensor_data': 2, 'run_step': 2}
+
+        events = []
+        for stage, column in self._columns.items():
+            tid = tracks.get(stage, 1)
+            valid = np.flatnonzero(~np.isnan(starts[:, column]))
+            for tick, start, duration in zip(valid, starts[valid, column], durations[valid, column]):
+                events.append({
+                    'name': stage, 'cat': name, 'ph': 'X', 'pid': os.getpid(), 'tid': tid,
+                    'ts': round(float(start), 3), 'dur': round(float(duration), 3), 'args': {'tick': first_tick + int(tick)}
+                })
+        events.sort(key=lambda event: event['ts'])
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, path, name='tick'):
+        """Saves the Chrome trace of the recorded ticks as a json file"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as fd:
+            json.dump(self.to_chrome_trace(name), fd)
@@ -42,24 +42,25 @@ class MetricsManager(object):
         self._args = args
 
         # Parse the arguments
-        recorder_str = self._get_recorder(self._args.log)
+        recorder_file = self._get_recorder(self._args.log)
         criteria_dict = self._get_criteria(self._args.criteria)
 
+        # Instanciate the MetricsLog, used to querry the needed information.
+        # The recorder is only requested to the server if the log isn't cached yet
+        log = MetricsLog(lambda: self._client.show_recorder_file_info(recorder_file, True), recorder_file)
+
         # Get the correct world and load it
-        map_name = self._get_recorder_map(recorder_str)
+        map_name = log.get_map_name()
         world = self._client.load_world(map_name)
         town_map = world.get_map()
 
-        # Instanciate the MetricsLog, used to querry the needed information
-        log = MetricsLog(recorder_str)
-
         # Read and run the metric class
         metric_class = self._get_metric_class(self._args.metric)
         metric_class(town_map, log, criteria_dict)
 
     def _get_recorder(self, log):
         """
-        Parses the log argument into readable information
+        Returns the path to the recorder file of the log argument
         """
 
         # Get the log information.
@@ -74,9 +75,7 @@ class MetricsManager(object):
             print("ERROR: The specified log file does not exist")
             sys.exit(-1)
 
-        recorder_str = self._client.show_recorder_file_info(recorder_file, True)
-
-        return recorder_str
+        return recorder_file
 
     def _get_criteria(self, criteria_file):
         """
@@ -113,16 +112,6 @@ class MetricsManager(object):
         print("No child class of BasicMetric was found ... Exiting")
         sys.exit(-1)
 
-    def _get_recorder_map(self, recorder_str):
-        """
-        Returns the name of the map the simulation took place in
-        """
-
-        header = recorder_str.split("\n")
-        sim_map = header[1][5:]
-
-        return sim_map
-
 
 def main():
     """
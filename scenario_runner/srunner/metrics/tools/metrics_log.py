@@ -15,22 +15,130 @@ specific information
 """
 
 import fnmatch
-from srunner.metrics.tools.metrics_parser import MetricsParser
+
+import numpy as np
+
+import carla
+
+from srunner.metrics.tools.metrics_parser import (MetricsParser, VEHICLE_LIGHTS, get_cache_file,
+                                                  load_parsed_recorder, save_parsed_recorder,
+                                                  parse_physics_control)
+
+# States of the old API that are a column of one of the parser states
+STATE_ALIASES = {
+    "state": ("traffic_light", 0),
+    "frozen": ("traffic_light", 1),
+    "elapsed_time": ("traffic_light", 2),
+}
+
+NUMBER_TO_TRAFFIC_LIGHT_STATE = {
+    0: carla.TrafficLightState.Red,
+    1: carla.TrafficLightState.Yellow,
+    2: carla.TrafficLightState.Green,
+    3: carla.TrafficLightState.Off,
+    4: carla.TrafficLightState.Unknown,
+}
+
+TRAFFIC_LIGHT_STATE_TO_COLUMN = {
+    carla.TrafficLightState.Green: 0,
+    carla.TrafficLightState.Yellow: 1,
+    carla.TrafficLightState.Red: 2,
+}
+
+
+def _to_location(values):
+    return carla.Location(x=float(values[0]), y=float(values[1]), z=float(values[2]))
+
+def _to_bounding_box(values):
+    location, extent = values
+    return carla.BoundingBox(
+        _to_location(location),
+        carla.Vector3D(x=float(extent[0]), y=float(extent[1]), z=float(extent[2])))
+
+def _to_state(state, values):
+    """Converts a row of values of a parser state into the objects of the old API"""
+    if state == "transform":
+        return carla.Transform(
+            _to_location(values[:3]),
+            carla.Rotation(roll=float(values[3]), pitch=float(values[4]), yaw=float(values[5])))
+    if state in ("velocity", "angular_velocity", "acceleration"):
+        return carla.Vector3D(x=float(values[0]), y=float(values[1]), z=float(values[2]))
+    if state == "control":
+        return carla.VehicleControl(
+            throttle=float(values[0]),
+            steer=float(values[1]),
+            brake=float(values[2]),
+            hand_brake=bool(values[3]),
+            reverse=bool(values[4] < 0),
+            manual_gear_shift=False,
+            gear=int(values[4]),
+        )
+    if state == "lights":
+        mask = int(values[0])
+        return [getattr(carla.VehicleLightState, "NONE" if name == "None" else name)
+                for i, name in enumerate(VEHICLE_LIGHTS) if mask & (1 << i)]
+    if state == "state":
+        return NUMBER_TO_TRAFFIC_LIGHT_STATE[int(values)]
+    if state == "frozen":
+        return bool(values)
+    return float(values[0]) if np.ndim(values) else float(values)
+
 
 class MetricsLog(object):  # pylint: disable=too-many-public-methods
     """
     Utility class to query the log.
+
+    The states of the actors are kept as arrays, one per actor and state, so time series can be
+    queried as arrays with the get_actor_state_array family of functions. The rest of the functions
+    return CARLA objects, built on demand.
     """
 
-    def __init__(self, recorder):
-        """
-        Initializes the log class and parses it to extract the dictionaries.
+    def __init__(self, recorder, log_file=None):
         """
-        # Parse the information
-        parser = MetricsParser(recorder)
-        self._simulation, self._actors, self._frames = parser.parse_recorder_info()
+        Initializes the log class and parses it to extract the arrays.
+
+        Args:
+            recorder (str, iterable or callable): string given by the recorder, or its lines.
+                A callable returning them can be used to only get them if there is no cache.
+            log_file (str): path to the recorder .log file. If given, the parsed log is cached
+                next to it, and reused while the log doesn't change.
+        """
+        parsed = None
+        cache_file = None
+        if log_file is not None:
+            cache_file = get_cache_file(log_file)
+            parsed = load_parsed_recorder(cache_file, log_file)
+
+        if parsed is None:
+            if callable(recorder):
+                recorder = recorder()
+            parser = MetricsParser(recorder)
+            parsed = parser.parse_recorder_info()
+            if cache_file is not None:
+                save_parsed_recorder(cache_file, parsed)
+
+        self._simulation = parsed["simulation"]
+        self._frames = parsed["frames"]
+        self._states = parsed["states"]
+        self._collisions = parsed["collisions"]
+        self._physics_controls = parsed["physics_control"]
+
+        self._actors = {}
+        for actor_id, actor_info in parsed["actors"].items():
+            actor = dict(actor_info)
+            actor["location"] = _to_location(actor["location"])
+            for name in ("bounding_box", "trigger_volume"):
+                if name in actor:
+                    actor[name] = _to_bounding_box(actor[name])
+            self._actors[actor_id] = actor
 
     ### Functions used to get general info of the simulation ###
+    def get_map_name(self):
+        """
+        Returns the name of the map the simulation took place in.
+        """
+        return self._simulation["map"]
+
     def get_actor_collisions(self, actor_id):
         """
         Returns a dict where the keys are the frame number and the values,
@@ -41,8 +149,8 @@ class MetricsLog(object):  # pylint: disable=too-many-public-methods
         """
         actor_collisions = {}
 
-        for i, frame in enumerate(self._frames):
-            collisions = frame["events"]["collisions"]
+        for i in sorted(self._collisions):
+            collisions = self._collisions[i]
 
             if actor_id in collisions:
                 actor_collisions.update({i: collisions[actor_id]})
@@ -61,21 +169,28 @@ class MetricsLog(object):  # pylint: disable=too-many-public-methods
         Returns a float with the elapsed time of a specific frame.
         """
 
-        return self._frames[frame]["frame"]["elapsed_time"]
+        return float(self._frames["elapsed_time"][frame])
 
     def get_delta_time(self, frame):
         """
         Returns a float with the delta time of a specific frame.
         """
 
-        return self._frames[frame]["frame"]["delta_time"]
+        return float(self._frames["delta_time"][frame])
 
     def get_platform_time(self, frame):
         """
         Returns a float with the platform time time of a specific frame.
         """
 
-        return self._frames[frame]["frame"]["platform_time"]
+        platform_time = self._frames["platform_time"][frame]
+        return None if np.isnan(platform_time) else float(platform_time)
+
+    def get_elapsed_times(self):
+        """
+        Returns a (F,) array with the elapsed time of all the frames.
+        """
+        return self._frames["elapsed_time"]
 
     ### Functions used to get info about the actors ###
     def get_ego_vehicle_id(self):
@@ -181,6 +296,78 @@ class MetricsLog(object):  # pylint: disable=too-many-public-methods
         return None, None
 
     ### Functions used to get the actor states ###
+    def get_actor_state_array(self, actor_id, state, first_frame=None, last_frame=None):
+        """
+        Given an actor id, returns the frames at which it had the state, and its values.
+        By default, first_frame and last_frame are the start and end of the simulation, respectively.
+
+        Args:
+            actor_id (int): ID of the actor.
+            state (str): one of the states of metrics_parser.STATE_COLUMNS.
+            first_frame (int): First frame checked. By default, 1.
+            last_frame (int): Last frame checked. By default, max number of frames.
+
+        Returns:
+            tuple [np.ndarray, np.ndarray]: (K,) frames and (K, columns) values
+        """
+        frames, values = self._states[state].get(actor_id)
+        if first_frame is not None or last_frame is not None:
+            start = 0 if first_frame is None else np.searchsorted(frames, first_frame, side='left')
+            end = len(frames) if last_frame is None else np.searchsorted(frames, last_frame, side='right')
+            frames, values = frames[start:end], values[start:end]
+        return frames, values
+
+    def get_actor_transforms_array(self, actor_id, first_frame=None, last_frame=None):
+        """
+        Returns the frames and (K, 6) x, y, z, roll, pitch, yaw of the actor at the frame interval.
+        """
+        return self.get_actor_state_array(actor_id, "transform", first_frame, last_frame)
+
+    def get_actor_velocities_array(self, actor_id, first_frame=None, last_frame=None):
+        """
+        Returns the frames and (K, 3) velocities of the actor at the frame interval.
+        """
+        return self.get_actor_state_array(actor_id, "velocity", first_frame, last_frame)
+
+    def get_actor_accelerations_array(self, actor_id, first_frame=None, last_frame=None):
+        """
+        Returns the frames and (K, 3) accelerations of the actor at the frame interval.
+        """
+        return self.get_actor_state_array(actor_id, "acceleration", first_frame, last_frame)
+
+    def get_vehicle_controls_array(self, vehicle_id, first_frame=None, last_frame=None):
+        """
+        Returns the frames and (K, 5) throttle, steer, brake, hand brake, gear of the vehicle
+        at the frame interval.
+        """
+        return self.get_actor_state_array(vehicle_id, "control", first_frame, last_frame)
+
+    def _get_state_column(self, state):
+        """Returns the parser state and the column of the values of a state of the old API"""
+        if state in STATE_ALIASES:
+            return STATE_ALIASES[state]
+        return state, None
+
+    def _get_state_values(self, actor_id, state, frame):
+        """Returns the row of values of the actor at the frame, or None"""
+        state_name, column = self._get_state_column(state)
+        if state_name not in self._states:
+            return None
+
+        frames, values = self._states[state_name].get(actor_id)
+        index = np.searchsorted(frames, frame)
+        if index == len(frames) or frames[index] != frame:
+            return None
+        return values[index] if column is None else values[index, column]
+
+    def _get_last_state_values(self, actor_id, state, frame):
+        """Returns the last row of values of the actor up to the frame, or None"""
+        frames, values = self._states[state].get(actor_id)
+        index = np.searchsorted(frames, frame, side='right') - 1
+        if index < 0:
+            return None
+        return values[index]
+
     def _get_actor_state(self, actor_id, state, frame):
         """
         Given an actor id, returns the specific variable of that actor at a given frame.
@@ -191,19 +378,10 @@ class MetricsLog(object):  # pylint: disable=too-many-public-methods
             frame: (int): frame number of the simulation.
             attribute (str): name of the actor's attribute to be returned.
         """
-        frame_state = self._frames[frame - 1]["actors"]
-
-        # Check if the actor exists
-        if actor_id in frame_state:
-
-            # Check if the state exists
-            if state not in frame_state[actor_id]:
-                return None
-
-            state_info = frame_state[actor_id][state]
-            return state_info
-
-        return None
+        values = self._get_state_values(actor_id, state, frame)
+        if values is None:
+            return None
+        return _to_state(state, values)
 
     def _get_all_actor_states(self, actor_id, state, first_frame=None, last_frame=None):
         """
@@ -223,14 +401,23 @@ class MetricsLog(object):  # pylint: disable=too-many-public-methods
         if last_frame is None:
             last_frame = self.get_total_frame_count()
 
-        state_list = []
+        state_list = [None] * max(last_frame - first_frame + 1, 0)
 
-        for frame_number in range(first_frame, last_frame + 1):
-            state_info = self._get_actor_state(actor_id, state, frame_number)
-            state_list.append(state_info)
+        state_name, column = self._get_state_column(state)
+        if state_name not in self._states:
+            return state_list
+
+        frames, values = self.get_actor_state_array(actor_id, state_name, first_frame, last_frame)
+        for frame, row in zip(frames, values):
+            state_list[frame - first_frame] = _to_state(state, row if column is None else row[column])
 
         return state_list
 
+    def _is_actor_at_frame(self, actor_id, frame):
+        """Whether the actor has a transform, or a traffic light state, at the frame"""
+        return self._get_state_values(actor_id, "transform", frame) is not None or \
+            self._get_state_values(actor_id, "state", frame) is not None
+
     def _get_states_at_frame(self, frame, state, actor_list=None):
         """
         Returns a dict where the keys are the frame number, and the values are the
@@ -239,16 +426,18 @@ class MetricsLog(object):  # pylint: disable=too-many-public-methods
         By default, all actors will be considered.
         """
         states = {}
-        actor_info = self._frames[frame]["actors"]
 
-        for actor_id in actor_info:
-            if not actor_list:
+        if not actor_list:
+            state_name, _ = self._get_state_column(state)
+            for actor_id in self._states[state_name].actor_ids():
                 _state = self._get_actor_state(actor_id, state, frame)
                 if _state:
                     states.update({actor_id: _state})
-            elif actor_id in actor_list:
-                _state = self._get_actor_state(actor_id, state, frame)
-                states.update({actor_id: _state})
+        else:
+            for actor_id in actor_list:
+                if self._is_actor_at_frame(actor_id, frame):
+                    _state = self._get_actor_state(actor_id, state, frame)
+                    states.update({actor_id: _state})
 
         return states
 
@@ -345,11 +534,10 @@ class MetricsLog(object):  # pylint: disable=too-many-public-methods
         Returns None if the id can't be found.
         """
 
-        for i in range(frame - 1, -1, -1):  # Go backwards from the frame until 0
-            physics_info = self._frames[i]["events"]["physics_control"]
-
-            if vehicle_id in physics_info:
-                return physics_info[vehicle_id]
+        physics_controls = self._physics_controls.get(vehicle_id, [])
+        for physics_frame, rows in reversed(physics_controls):  # Go backwards from the frame until 0
+            if physics_frame <= frame:
+                return parse_physics_control(rows)
 
         return None
 
@@ -384,15 +572,13 @@ class MetricsLog(object):  # pylint: disable=too-many-public-methods
         Returns None if the id can't be found.
         """
 
-        for i in range(frame - 1, -1, -1):  # Go backwards from the frame until 0
-            state_times_info = self._frames[i]["events"]["traffic_light_state_time"]
-
-            if traffic_light_id in state_times_info:
-                states = state_times_info[traffic_light_id]
-                if state in states:
-                    return state_times_info[traffic_light_id][state]
+        if state not in TRAFFIC_LIGHT_STATE_TO_COLUMN:
+            return None
 
-        return None
+        values = self._get_last_state_values(traffic_light_id, "traffic_light_state_time", frame)
+        if values is None:
+            return None
+        return float(values[TRAFFIC_LIGHT_STATE_TO_COLUMN[state]])
 
     # Vehicle lights
     def get_vehicle_lights(self, vehicle_id, frame):
@@ -419,10 +605,14 @@ class MetricsLog(object):  # pylint: disable=too-many-public-methods
         Returns None if the id can't be found.
         """
 
-        for i in range(frame - 1, -1, -1):  # Go backwards from the frame until 0
-            scene_lights_info = self._frames[i]["events"]["scene_lights"]
-
-            if light_id in scene_lights_info:
-                return scene_lights_info[light_id]
+        values = self._get_last_state_values(light_id, "scene_light", frame)
+        if values is None:
+            return None
 
-        return None
+        active, intensity, red, green, blue = values
+        return carla.LightState(
+            intensity=int(intensity),
+            color=carla.Color(int(red), int(green), int(blue)),
+            group=carla.LightGroup.NONE,
+            active=bool(active)
+        )
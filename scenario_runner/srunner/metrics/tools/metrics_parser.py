@@ -8,160 +8,106 @@
 
 """
 Support class of the MetricsManager to parse the information of
-the CARLA recorder into a readable dictionary
+the CARLA recorder into per actor arrays.
+
+The recorder is read line by line, and the states of the actors are stored
+as columns, one array per actor and state, indexed by frame. As this is
+independent of CARLA, the result can be cached next to the .log file.
 """
 
+import io
+import os
+import pickle
+from array import array
+
+import numpy as np
+
 import carla
 
+CACHE_VERSION = 1
+
+# Names of the vehicle lights, in the order of the bits of the 'lights' state
+VEHICLE_LIGHTS = [
+    "None", "Position", "LowBeam", "HighBeam", "Brake", "RightBlinker",
+    "LeftBlinker", "Reverse", "Fog", "Interior", "Special1", "Special2"
+]
+
+# Columns of each of the actor states
+STATE_COLUMNS = {
+    "transform": ["x", "y", "z", "roll", "pitch", "yaw"],
+    "velocity": ["x", "y", "z"],
+    "angular_velocity": ["x", "y", "z"],
+    "acceleration": ["x", "y", "z"],
+    "control": ["throttle", "steer", "brake", "hand_brake", "gear"],
+    "traffic_light": ["state", "frozen", "elapsed_time"],
+    "speed": ["speed"],
+    "lights": ["mask"],
+    "scene_light": ["active", "intensity", "r", "g", "b"],
+    "traffic_light_state_time": ["green", "yellow", "red"],
+}
+
+
+def parse_vector(info):
+    """Parses a '(x, y, z)' list into a tuple of floats"""
+    return float(info[0][1:-1]), float(info[1][:-1]), float(info[2][:-1])
 
 def parse_actor(info):
     """Returns a dictionary with the basic actor information"""
+    x, y, z = parse_vector(info[5:8])
     actor = {
         "type_id": info[2],
-        "location": carla.Location(
-            x=float(info[5][1:-1]) / 100,
-            y=float(info[6][:-1]) / 100,
-            z=float(info[7][:-1]) / 100
-        )
+        "location": (x / 100, y / 100, z / 100)
     }
     return actor
 
 def parse_transform(info):
-    """Parses a list into a carla.Transform"""
-    transform = carla.Transform(
-        carla.Location(
-            x=float(info[3][1:-1]) / 100,
-            y=float(info[4][:-1]) / 100,
-            z=float(info[5][:-1]) / 100,
-        ),
-        carla.Rotation(
-            roll=float(info[7][1:-1]),
-            pitch=float(info[8][:-1]), 
-            yaw=float(info[9][:-1])
-        )
-    )
-    return transform
+    """Parses a list into the x, y, z, roll, pitch and yaw of a transform"""
+    x, y, z = parse_vector(info[3:6])
+    roll, pitch, yaw = parse_vector(info[7:10])
+    return x / 100, y / 100, z / 100, roll, pitch, yaw
 
 def parse_control(info):
-    """Parses a list into a carla.VehicleControl"""
-    control = carla.VehicleControl(
-        throttle=float(info[5]),
-        steer=float(info[3]),
-        brake=float(info[7]),
-        hand_brake=bool(int(info[9])),
-        reverse=int(info[11]) < 0,
-        manual_gear_shift=False,
-        gear=int(info[11]),
-    )
-    return control
+    """Parses a list into the throttle, steer, brake, hand brake and gear of a control"""
+    return float(info[5]), float(info[3]), float(info[7]), float(int(info[9])), float(int(info[11]))
 
 def parse_vehicle_lights(info):
-    """Parses a list into a carla.VehicleLightState"""
-    srt_to_vlight = {
-        "None": carla.VehicleLightState.NONE,
-        "Position": carla.VehicleLightState.Position,
-        "LowBeam": carla.VehicleLightState.LowBeam,
-        "HighBeam": carla.VehicleLightState.HighBeam,
-        "Brake": carla.VehicleLightState.Brake,
-        "RightBlinker": carla.VehicleLightState.RightBlinker,
-        "LeftBlinker": carla.VehicleLightState.LeftBlinker,
-        "Reverse": carla.VehicleLightState.Reverse,
-        "Fog": carla.VehicleLightState.Fog,
-        "Interior": carla.VehicleLightState.Interior,
-        "Special1": carla.VehicleLightState.Special1,
-        "Special2": carla.VehicleLightState.Special2,
-    }
-
-    lights = []
+    """Parses a list into a bit mask of VEHICLE_LIGHTS"""
+    mask = 0
     for i in range(2, len(info)):
-        lights.append(srt_to_vlight[info[i]])
-
-    return lights
+        mask |= 1 << VEHICLE_LIGHTS.index(info[i])
+    return mask
 
 def parse_traffic_light(info):
-    """Parses a list into a dictionary with all the traffic light's information"""
-    number_to_state = {
-        "0": carla.TrafficLightState.Red,
-        "1": carla.TrafficLightState.Yellow,
-        "2": carla.TrafficLightState.Green,
-        "3": carla.TrafficLightState.Off,
-        "4": carla.TrafficLightState.Unknown,
-    }
-    traffic_light = {
-        "state": number_to_state[info[3]],
-        "frozen": bool(int(info[5])),
-        "elapsed_time": float(info[7]),
-    }
-    return traffic_light
-
-def parse_velocity(info):
-    """Parses a list into a carla.Vector3D with the velocity"""
-    velocity = carla.Vector3D(
-        x=float(info[3][1:-1]),
-        y=float(info[4][:-1]),
-        z=float(info[5][:-1])
-    )
-    return velocity
-
-def parse_angular_velocity(info):
-    """Parses a list into a carla.Vector3D with the angular velocity"""
-    velocity = carla.Vector3D(
-        x=float(info[7][1:-1]),
-        y=float(info[8][:-1]),
-        z=float(info[9][:-1])
-    )
-    return velocity
+    """Parses a list into the state, frozen and elapsed time of a traffic light"""
+    return float(int(info[3])), float(int(info[5])), float(info[7])
 
 def parse_scene_lights(info):
-    """Parses a list into a carla.VehicleLightState"""
-
+    """Parses a list into the active, intensity and color of a scene light"""
     red = int(float(info[7][1:-1]) * 255)
     green = int(float(info[8][:-1]) * 255)
     blue = int(float(info[9][:-1]) * 255)
-
-    scene_light = carla.LightState(
-        intensity=int(float(info[5])),
-        color=carla.Color(red, green, blue),
-        group=carla.LightGroup.NONE,
-        active=bool(info[3])
-    )
-    return scene_light
+    return float(bool(info[3])), float(int(float(info[5]))), red, green, blue
 
 def parse_bounding_box(info):
     """
-    Parses a list into a carla.BoundingBox.
+    Parses a list into the location and extent of a bounding box.
     Some actors like sensors might have 'nan' location and 'inf' extent, so filter those.
     """
     if 'nan' in info[3]:
-        location = carla.Location()
+        location = (0.0, 0.0, 0.0)
     else:
-        location = carla.Location(
-            float(info[3][1:-1])/100,
-            float(info[4][:-1])/100,
-            float(info[5][:-1])/100,
-        )
+        location = tuple(v / 100 for v in parse_vector(info[3:6]))
 
     if 'inf' in info[7]:
-        extent = carla.Vector3D()
+        extent = (0.0, 0.0, 0.0)
     else:
-        extent = carla.Vector3D(
-            float(info[7][1:-1])/100,
-            float(info[8][:-1])/100,
-            float(info[9][:-1])/100,
-        )
+        extent = tuple(v / 100 for v in parse_vector(info[7:10]))
 
-    bbox = carla.BoundingBox(location, extent)
-
-    return bbox
+    return location, extent
 
 def parse_state_times(info):
-    """Parses a list into a dict containing the state times of the traffic lights"""
-    state_times = {
-        carla.TrafficLightState.Green: float(info[3]),
-        carla.TrafficLightState.Yellow: float(info[5]),
-        carla.TrafficLightState.Red: float(info[7]),
-    }
-    return state_times
+    """Parses a list into the green, yellow and red times of a traffic light"""
+    return float(info[3]), float(info[5]), float(info[7])
 
 def parse_vector_list(info):
     """Parses a list of string into a list of Vector2D"""
@@ -200,341 +146,321 @@ def parse_wheels_control(info):
     )
     return wheels_control
 
-
-class MetricsParser(object):
+def parse_physics_control(rows):
+    """Parses the rows of an actor at the 'Physics Control' section into a VehiclePhysicsControl"""
+    physics_control = carla.VehiclePhysicsControl()
+    forward_gears = []
+    wheels = []
+
+    for row in rows:
+        if row.startswith('    '):
+            elements = row[4:].split(" ")
+            if elements[0] == "gear":
+                forward_gears.append(parse_gears_control(elements))
+            elif elements[0] == "wheel":
+                wheels.append(parse_wheels_control(elements))
+
+        else:
+            elements = row[3:].split(" = ")
+            name = elements[0]
+
+            if name == "center_of_mass":
+                values = elements[1].split(" ")
+                value = carla.Vector3D(
+                    float(values[0][1:-1]),
+                    float(values[1][:-1]),
+                    float(values[2][:-1]),
+                )
+                setattr(physics_control, name, value)
+            elif name == "torque_curve" or name == "steering_curve":
+                values = elements[1].split(" ")
+                value = parse_vector_list(values)
+                setattr(physics_control, name, value)
+
+            elif name == "use_gear_auto_box":
+                name = "use_gear_autobox"
+                value = True if elements[1] == "true" else False
+                setattr(physics_control, name, value)
+
+            elif "forward_gears" in name or "wheels" in name:
+                pass
+
+            else:
+                name = name.lower()
+                value = float(elements[1])
+                setattr(physics_control, name, value)
+
+    setattr(physics_control, "forward_gears", forward_gears)
+    setattr(physics_control, "wheels", wheels)
+    return physics_control
+
+
+class StateColumns(object):
     """
-    Class used to parse the CARLA recorder into readable information
+    Values of a state of all the actors. While parsing, the rows are appended to flat
+    buffers, which are then split into one (frames, values) pair of arrays per actor,
+    with the frames sorted.
     """
 
-    def __init__(self, recorder_info):
+    def __init__(self, columns):
+        self.columns = columns
+        self._actors = {}
 
-        self.recorder_info = recorder_info
-        self.frame_list = None
-        self.frame_row = None
-        self.i = 0
+        self._ids = array('q')
+        self._frames = array('q')
+        self._values = array('d')
 
-    def get_row_elements(self, indent_num, split_string):
-        """
-        returns a list with the elements of the row
-        """
-        return self.frame_row[indent_num:].split(split_string)
+    def append(self, actor_id, frame, values):
+        """Adds the values of an actor at a frame"""
+        self._ids.append(actor_id)
+        self._frames.append(frame)
+        self._values.extend(values)
 
-    def next_row(self):
-        """
-        Gets the next row of the recorder
-        """
-        self.i += 1
-        self.frame_row = self.frame_list[self.i]
+    def finalize(self):
+        """Groups the appended rows by actor"""
+        ids = np.frombuffer(self._ids, dtype=np.int64)
+        frames = np.frombuffer(self._frames, dtype=np.int64)
+        values = np.frombuffer(self._values, dtype=np.float64).reshape(-1, len(self.columns))
 
-    def parse_recorder_info(self):
-        """
-        Parses the recorder into readable information.
+        order = np.lexsort((frames, ids))
+        ids, frames, values = ids[order], frames[order], values[order]
+        unique_ids, starts = np.unique(ids, return_index=True)
+        ends = np.append(starts[1:], len(ids))
+        for actor_id, start, end in zip(unique_ids, starts, ends):
+            self._actors[int(actor_id)] = (frames[start:end].copy(), values[start:end].copy())
 
-        Args:
-            recorder_info (str): string given by the recorder
-        """
+        self._ids, self._frames, self._values = array('q'), array('q'), array('d')
 
-        # Divide it into frames
-        recorder_list = self.recorder_info.split("Frame")
+    def actor_ids(self):
+        """Returns the ids of the actors with this state"""
+        return self._actors.keys()
 
-        # Get general information
-        header = recorder_list[0].split("\n")
-        sim_map = header[1][5:]
-        sim_date = header[2][6:]
+    def get(self, actor_id):
+        """Returns the (K,) frames and the (K, columns) values of an actor"""
+        if actor_id not in self._actors:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, len(self.columns)))
+        return self._actors[actor_id]
 
-        annex = recorder_list[-1].split("\n")
-        sim_frames = int(annex[0][3:])
-        sim_duration = float(annex[1][10:-8])
 
-        recorder_list = recorder_list[1:-1]
+class MetricsParser(object):
+    """
+    Class used to parse the CARLA recorder into readable information
+    """
 
-        simulation_info = {
-            "map": sim_map,
-            "date:": sim_date,
-            "total_frames": sim_frames,
-            "duration": sim_duration
-        }
+    def __init__(self, recorder_info):
+        """
+        Args:
+            recorder_info (str or iterable): string given by the recorder, or its lines
+        """
+        self.recorder_info = recorder_info
+
+    def _get_lines(self):
+        if isinstance(self.recorder_info, str):
+            return io.StringIO(self.recorder_info)
+        return self.recorder_info
 
+    def parse_recorder_info(self):
+        """
+        Parses the recorder into readable information, returned as a dictionary with:
+        - simulation: map, date, total frames and duration
+        - actors: dictionary with the static information of each actor
+        - frames: (F,) arrays of the elapsed, delta and platform time of each frame
+        - states: StateColumns of each of STATE_COLUMNS. Frames are numbered from 1
+        - collisions: {frame index (from 0): {actor_id: [other ids]}}
+        - physics_control: {actor_id: [(frame, rows)]}, parsed on demand
+        """
+        header = []
+        simulation_info = {}
         actors_info = {}
-        frames_info = []
-
-        for frame in recorder_list:
-
-            # Divide the frame in lines
-            self.frame_list = frame.split("\n")
-
-            # Get the general frame information
-            frame_info = self.frame_list[0].split(" ")
-            frame_number = int(frame_info[1])
-            frame_time = float(frame_info[3])
-
-            try:
-                prev_frame = frames_info[frame_number - 2]
-                prev_time = prev_frame["frame"]["elapsed_time"]
-                delta_time = round(frame_time - prev_time, 6)
-            except IndexError:
-                delta_time = 0
-
-            # Variable to store all the information about the frame
-            frame_state = {
-                "frame": {
-                    "elapsed_time": frame_time,
-                    "delta_time": delta_time,
-                    "platform_time": None
-                },
-                "actors": {},
-                "events":{
-                    "scene_lights": {},
-                    "physics_control": {},
-                    "traffic_light_state_time": {},
-                    "collisions": {}
-                }
-            }
-
-            # Loop through all the other rows.
-            self.i = 0
-            self.next_row()
-
-            while self.frame_row.startswith(' Create') or self.frame_row.startswith('  '):
-
-                if self.frame_row.startswith(' Create'):
-                    elements = self.get_row_elements(1, " ")
-                    actor_id = int(elements[1][:-1])
-
-                    actor = parse_actor(elements)
-                    actors_info.update({actor_id: actor})
-                    actors_info[actor_id].update({"created": frame_number})
-                else:
-                    elements = self.get_row_elements(2, " = ")
+        elapsed_times, delta_times, platform_times = array('d'), array('d'), array('d')
+        states = {name: StateColumns(columns) for name, columns in STATE_COLUMNS.items()}
+        collisions = {}
+        physics_controls = {}
+
+        frame = 0
+        section = None
+        actor_id = None
+        physics_rows = None
+        last_velocities = {}
+
+        for line in self._get_lines():
+            row = line.rstrip("\r\n")
+
+            if frame == 0 and not row.startswith("Frame "):
+                header.append(row)
+                continue
+
+            if row.startswith("Frame "):
+                # New frame
+                frame_info = row.split(" ")
+                frame_time = float(frame_info[3])
+                delta_time = round(frame_time - elapsed_times[-1], 6) if frame > 0 else 0
+                frame += 1
+                elapsed_times.append(frame_time)
+                delta_times.append(delta_time)
+                platform_times.append(np.nan)
+                section = None
+                continue
+
+            if row.startswith("Frames: "):
+                simulation_info["total_frames"] = int(row[8:])
+                continue
+            if row.startswith("Duration: "):
+                simulation_info["duration"] = float(row[10:-8])
+                continue
+
+            if row.startswith('   '):
+                # Properties of the physics control of an actor
+                if section == 'physics_control':
+                    physics_rows.append(row)
+                continue
+
+            if row.startswith('  '):
+                if section == 'create':
+                    elements = row[2:].split(" = ")
                     actors_info[actor_id].update({elements[0]: elements[1]})
+                    continue
 
-                self.next_row()
-
-            while self.frame_row.startswith(' Destroy'):
-
-                elements = self.get_row_elements(1, " ")
-
-                actor_id = int(elements[1])
-                actors_info[actor_id].update({"destroyed": frame_number})
-
-                self.next_row()
-
-            while self.frame_row.startswith(' Collision'):
-
-                elements = self.get_row_elements(1, " ")
-
-                actor_id = int(elements[4])
-                other_id = int(elements[-1])
-
-                if actor_id not in frame_state["events"]["collisions"]:
-                    frame_state["events"]["collisions"][actor_id] = [other_id]
-                else:
-                    collisions = frame_state["events"]["collisions"][actor_id]
-                    collisions.append(other_id)
-                    frame_state["events"]["collisions"].update({actor_id: collisions})
-
-                self.next_row()
-
-            while self.frame_row.startswith(' Parenting'):
-
-                elements = self.get_row_elements(1, " ")
-
+                elements = row[2:].split(" ")
+                if section is None or len(elements) < 2:
+                    continue
                 actor_id = int(elements[1])
-                parent_id = int(elements[3])
-                actors_info[actor_id].update({"parent": parent_id})
-
-                self.next_row()
-
-            if self.frame_row.startswith(' Positions'):
-                self.next_row()
-
-                while self.frame_row.startswith('  '):
-
-                    elements = self.get_row_elements(2, " ")
-                    actor_id = int(elements[1])
-
-                    transform = parse_transform(elements)
-                    frame_state["actors"].update({actor_id: {"transform": transform}})
-
-                    self.next_row()
-
-            if self.frame_row.startswith(' State traffic lights'):
-                self.next_row()
-
-                while self.frame_row.startswith('  '):
-
-                    elements = self.get_row_elements(2, " ")
-                    actor_id = int(elements[1])
-
-                    traffic_light = parse_traffic_light(elements)
-                    frame_state["actors"].update({actor_id: traffic_light})
-                    self.next_row()
-
-            if self.frame_row.startswith(' Vehicle animations'):
-                self.next_row()
-
-                while self.frame_row.startswith('  '):
-
-                    elements = self.get_row_elements(2, " ")
-                    actor_id = int(elements[1])
-
-                    control = parse_control(elements)
-                    frame_state["actors"][actor_id].update({"control": control})
-                    self.next_row()
-
-            if self.frame_row.startswith(' Walker animations'):
-                self.next_row()
-
-                while self.frame_row.startswith('  '):
-                    elements = self.get_row_elements(2, " ")
-                    actor_id = int(elements[1])
-
-                    frame_state["actors"][actor_id].update({"speed": elements[3]})
-                    self.next_row()
-
-            if self.frame_row.startswith(' Vehicle light animations'):
-                self.next_row()
-
-                while self.frame_row.startswith('  '):
-                    elements = self.get_row_elements(2, " ")
-                    actor_id = int(elements[1])
-
-                    lights = parse_vehicle_lights(elements)
-                    frame_state["actors"][actor_id].update({"lights": lights})
-                    self.next_row()
-
-            if self.frame_row.startswith(' Scene light changes'):
-                self.next_row()
-
-                while self.frame_row.startswith('  '):
-                    elements = self.get_row_elements(2, " ")
-                    actor_id = int(elements[1])
-
-                    scene_light = parse_scene_lights(elements)
-                    frame_state["events"]["scene_lights"].update({actor_id: scene_light})
-                    self.next_row()
-
-            if self.frame_row.startswith(' Dynamic actors'):
-                self.next_row()
-
-                while self.frame_row.startswith('  '):
-                    elements = self.get_row_elements(2, " ")
-                    actor_id = int(elements[1])
 
-                    velocity = parse_velocity(elements)
-                    frame_state["actors"][actor_id].update({"velocity": velocity})
-
-                    angular_v = parse_angular_velocity(elements)
-                    frame_state["actors"][actor_id].update({"angular_velocity": angular_v})
-
-                    if delta_time == 0:
-                        acceleration = carla.Vector3D(0, 0, 0)
+                if section == 'positions':
+                    states["transform"].append(actor_id, frame, parse_transform(elements))
+                elif section == 'traffic_lights':
+                    states["traffic_light"].append(actor_id, frame, parse_traffic_light(elements))
+                elif section == 'vehicle_animations':
+                    states["control"].append(actor_id, frame, parse_control(elements))
+                elif section == 'walker_animations':
+                    states["speed"].append(actor_id, frame, (float(elements[3]),))
+                elif section == 'vehicle_lights':
+                    states["lights"].append(actor_id, frame, (parse_vehicle_lights(elements),))
+                elif section == 'scene_lights':
+                    states["scene_light"].append(actor_id, frame, parse_scene_lights(elements))
+                elif section == 'dynamic_actors':
+                    velocity = parse_vector(elements[3:6])
+                    states["velocity"].append(actor_id, frame, velocity)
+                    states["angular_velocity"].append(actor_id, frame, parse_vector(elements[7:10]))
+
+                    delta_time = delta_times[-1]
+                    last_frame, last_velocity = last_velocities.get(actor_id, (None, None))
+                    if delta_time == 0 or last_frame != frame - 1:
+                        acceleration = (0.0, 0.0, 0.0)
                     else:
-                        prev_velocity = frame_state["actors"][actor_id]["velocity"]
-                        acceleration = (velocity - prev_velocity) / delta_time
-
-                    frame_state["actors"][actor_id].update({"acceleration": acceleration})
-                    self.next_row()
-
-            if self.frame_row.startswith(' Actor bounding boxes'):
-                self.next_row()
-
-                while self.frame_row.startswith('  '):
-                    elements = self.get_row_elements(2, " ")
-                    actor_id = int(elements[1])
-
-                    bbox = parse_bounding_box(elements)
-                    actors_info[actor_id].update({"bounding_box": bbox})
-                    self.next_row()
-
-            if self.frame_row.startswith(' Actor trigger volumes'):
-                self.next_row()
-
-                while self.frame_row.startswith('  '):
-                    elements = self.get_row_elements(2, " ")
-                    actor_id = int(elements[1])
-
-                    trigvol = parse_bounding_box(elements)
-                    actors_info[actor_id].update({"trigger_volume": trigvol})
-                    self.next_row()
-
-            if self.frame_row.startswith(' Current platform time'):
-
-                elements = self.get_row_elements(1, " ")
-
-                platform_time = float(elements[-1])
-                frame_state["frame"]["platform_time"] = platform_time
-                self.next_row()
-
-            if self.frame_row.startswith(' Physics Control'):
-                self.next_row()
-
-                actor_id = None
-                while self.frame_row.startswith('  '):
-
-                    elements = self.get_row_elements(2, " ")
-                    actor_id = int(elements[1])
-                    physics_control = carla.VehiclePhysicsControl()
-                    self.next_row()
+                        acceleration = tuple((v - lv) / delta_time for v, lv in zip(velocity, last_velocity))
+                    states["acceleration"].append(actor_id, frame, acceleration)
+                    last_velocities[actor_id] = (frame, velocity)
+                elif section == 'bounding_boxes':
+                    actors_info[actor_id].update({"bounding_box": parse_bounding_box(elements)})
+                elif section == 'trigger_volumes':
+                    actors_info[actor_id].update({"trigger_volume": parse_bounding_box(elements)})
+                elif section == 'physics_control':
+                    physics_rows = []
+                    physics_controls.setdefault(actor_id, []).append((frame, physics_rows))
+                elif section == 'traffic_light_state_time':
+                    states["traffic_light_state_time"].append(actor_id, frame, parse_state_times(elements))
+                continue
+
+            if not row.startswith(' '):
+                continue
+
+            # Start of a new section, or a single line event
+            elements = row[1:].split(" ")
+            if row.startswith(' Create'):
+                section = 'create'
+                actor_id = int(elements[1][:-1])
+                actors_info[actor_id] = parse_actor(elements)
+                actors_info[actor_id].update({"created": frame})
+            elif row.startswith(' Destroy'):
+                section = None
+                actors_info[int(elements[1])].update({"destroyed": frame})
+            elif row.startswith(' Collision'):
+                section = None
+                frame_collisions = collisions.setdefault(frame - 1, {})
+                frame_collisions.setdefault(int(elements[4]), []).append(int(elements[-1]))
+            elif row.startswith(' Parenting'):
+                section = None
+                actors_info[int(elements[1])].update({"parent": int(elements[3])})
+            elif row.startswith(' Positions'):
+                section = 'positions'
+            elif row.startswith(' State traffic lights'):
+                section = 'traffic_lights'
+            elif row.startswith(' Vehicle animations'):
+                section = 'vehicle_animations'
+            elif row.startswith(' Walker animations'):
+                section = 'walker_animations'
+            elif row.startswith(' Vehicle light animations'):
+                section = 'vehicle_lights'
+            elif row.startswith(' Scene light changes'):
+                section = 'scene_lights'
+            elif row.startswith(' Dynamic actors'):
+                section = 'dynamic_actors'
+            elif row.startswith(' Actor bounding boxes'):
+                section = 'bounding_boxes'
+            elif row.startswith(' Actor trigger volumes'):
+                section = 'trigger_volumes'
+            elif row.startswith(' Current platform time'):
+                section = None
+                platform_times[-1] = float(elements[-1])
+            elif row.startswith(' Physics Control'):
+                section = 'physics_control'
+            elif row.startswith(' Traffic Light time events'):
+                section = 'traffic_light_state_time'
+            else:
+                section = None
 
-                    forward_gears = []
-                    wheels = []
-                    while self.frame_row.startswith('   '):
-
-                        if self.frame_row.startswith('    '):
-                            elements = self.get_row_elements(4, " ")
-                            if elements[0] == "gear":
-                                forward_gears.append(parse_gears_control(elements))
-                            elif elements[0] == "wheel":
-                                wheels.append(parse_wheels_control(elements))
-
-                        else:
-                            elements = self.get_row_elements(3, " = ")
-                            name = elements[0]
-
-                            if name == "center_of_mass":
-                                values = elements[1].split(" ")
-                                value = carla.Vector3D(
-                                    float(values[0][1:-1]),
-                                    float(values[1][:-1]),
-                                    float(values[2][:-1]),
-                                )
-                                setattr(physics_control, name, value)
-                            elif name == "torque_curve" or name == "steering_curve":
-                                values = elements[1].split(" ")
-                                value = parse_vector_list(values)
-                                setattr(physics_control, name, value)
-
-                            elif name == "use_gear_auto_box":
-                                name = "use_gear_autobox"
-                                value = True if elements[1] == "true" else False
-                                setattr(physics_control, name, value)
-
-                            elif "forward_gears" in name or "wheels" in name:
-                                pass
-
-                            else:
-                                name = name.lower()
-                                value = float(elements[1])
-                                setattr(physics_control, name, value)
-
-                        self.next_row()
-
-                    setattr(physics_control, "forward_gears", forward_gears)
-                    setattr(physics_control, "wheels", wheels)
-                    frame_state["events"]["physics_control"].update({actor_id: physics_control})
-
-            if self.frame_row.startswith(' Traffic Light time events'):
-                self.next_row()
-
-                while self.frame_row.startswith('  '):
-                    elements = self.get_row_elements(2, " ")
-                    actor_id = int(elements[1])
+        # Get general information
+        simulation_info["map"] = header[1][5:] if len(header) > 1 else ""
+        simulation_info["date:"] = header[2][6:] if len(header) > 2 else ""
+        simulation_info.setdefault("total_frames", frame)
+        simulation_info.setdefault("duration", elapsed_times[-1] if frame else 0.0)
+
+        for state in states.values():
+            state.finalize()
+
+        return {
+            "version": CACHE_VERSION,
+            "simulation": simulation_info,
+            "actors": actors_info,
+            "frames": {
+                "elapsed_time": np.array(elapsed_times, dtype=np.float64),
+                "delta_time": np.array(delta_times, dtype=np.float64),
+                "platform_time": np.array(platform_times, dtype=np.float64),
+            },
+            "states": states,
+            "collisions": collisions,
+            "physics_control": physics_controls,
+        }
 
-                    state_times = parse_state_times(elements)
-                    frame_state["events"]["traffic_light_state_time"].update({actor_id: state_times})
-                    self.next_row()
 
-            frames_info.append(frame_state)
+def get_cache_file(log_file):
+    """Returns the path of the parsed recorder cache of a .log file, next to it"""
+    return os.path.splitext(log_file)[0] + '.metrics.pkl'
 
-        return simulation_info, actors_info, frames_info
+def load_parsed_recorder(cache_file, log_file=None):
+    """
+    Returns the parsed recorder saved at cache_file, or None if it doesn't exist,
+    comes from another version of the parser, or is older than the log_file.
+    """
+    if not os.path.exists(cache_file):
+        return None
+    if log_file is not None and os.path.getmtime(cache_file) < os.path.getmtime(log_file):
+        return None
+
+    try:
+        with open(cache_file, 'rb') as fd:
+            parsed = pickle.load(fd)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+
+    if not isinstance(parsed, dict) or parsed.get("version") != CACHE_VERSION:
+        return None
+    return parsed
+
+def save_parsed_recorder(cache_file, parsed):
+    """Saves the parsed recorder at cache_file"""
+    tmp_file = cache_file + '.tmp'
+    with open(tmp_file, 'wb') as fd:
+        pickle.dump(parsed, fd, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, cache_file)
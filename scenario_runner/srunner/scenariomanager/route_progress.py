@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+This module provides a numpy representation of the ego route, shared by all the
+criteria that track the progress of the ego vehicle along it.
+"""
+
+import numpy as np
+
+from srunner.scenariomanager.timer import GameTime
+
+
+class RouteProgress(object):
+
+    """
+    Route locations, forward vectors and accumulated distances as numpy arrays.
+    It is built once per route, and all the route criteria query it through windows
+    that start at their current route index, so the cost of a tick doesn't depend on
+    the route length.
+
+    The results of the queries are kept for the current frame, so criteria asking the
+    same question at the same tick share the computation. The results depend on
+    the window of each criterion, so they are only returned to the caller.
+
+    Use RouteProgress.get(route) instead of the constructor to share the instance.
+    """
+
+    _route = None
+    _instance = None
+
+    def __init__(self, route):
+        """
+        Args:
+            route (list [carla.Transform, connection]): the route, as given to the criteria
+        """
+        self.length = len(route)
+
+        transforms = [transform for transform, _ in route]
+        self.locations = np.array(
+            [[t.location.x, t.location.y, t.location.z] for t in transforms], dtype=np.float64)
+
+        rotations = np.radians(np.array(
+            [[t.rotation.pitch, t.rotation.yaw] for t in transforms], dtype=np.float64))
+        pitch, yaw = rotations[:, 0], rotations[:, 1]
+        self.forward_vectors = np.stack(
+            [np.cos(pitch) * np.cos(yaw), np.cos(pitch) * np.sin(yaw), np.sin(pitch)], axis=1)
+
+        segments = np.linalg.norm(np.diff(self.locations, axis=0), axis=1)
+        self.accum_meters = np.concatenate([[0.0], np.cumsum(segments)])
+        self.total_meters = float(self.accum_meters[-1])
+
+        self._frame = None
+        self._frame_queries = {}
+
+    @staticmethod
+    def get(route):
+        """
+        Returns the RouteProgress of the given route, building it if it is a new one
+        """
+        if RouteProgress._route is not route:
+            RouteProgress._route = route
+            RouteProgress._instance = RouteProgress(route)
+        return RouteProgress._instance
+
+    def _get_frame_queries(self):
+        """
+        Returns the query results of the current frame
+        """
+        frame = GameTime.get_frame()
+        if frame != self._frame:
+            self._frame = frame
+            self._frame_queries = {}
+        return self._frame_queries
+
+    def nearest_index(self, location, start, window):
+        """
+        Returns the closest route index (in the xy plane) to the location, as well as its distance,
+        checking the indexes from 'start' to 'start + window'. Ties are resolved to the furthest index.
+        """
+        key = ('nearest', start, window, location.x, location.y)
+        queries = self._get_frame_queries()
+        if key not in queries:
+            end = min(start + window + 1, self.length)
+            deltas = self.locations[start:end, :2] - (location.x, location.y)
+            distances = np.hypot(deltas[:, 0], deltas[:, 1])
+            last = len(distances) - 1 - int(np.argmin(distances[::-1]))
+            queries[key] = (start + last, float(distances[last]))
+
+        return queries[key]
+
+    def passed_index(self, location, start, window):
+        """
+        Returns the furthest route index the location has gone past, checking the indexes
+        from 'start' to 'start + window'. Returns 'start' if none of them has been passed.
+        """
+        key = ('passed', start, window, location.x, location.y, location.z)
+        queries = self._get_frame_queries()
+        if key not in queries:
+            end = min(start + window + 1, self.length)
+            vectors = (location.x, location.y, location.z) - self.locations[start:end]
+            passed = np.flatnonzero(np.einsum('ij,ij->i', vectors, self.forward_vectors[start:end]) > 0)
+            queries[key] = start + int(passed[-1]) if len(passed) else start
+
+        return queries[key]
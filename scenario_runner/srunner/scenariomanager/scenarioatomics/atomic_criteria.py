@@ -24,6 +24,7 @@ import carla
 from agents.tools.misc import get_speed
 
 from srunner.scenariomanager.carla_data_provider import CarlaDataProvider
+from srunner.scenariomanager.route_progress import RouteProgress
 from srunner.scenariomanager.timer import GameTime
 from srunner.scenariomanager.traffic_events import TrafficEvent, TrafficEventType
 
@@ -1415,22 +1416,12 @@ class InRouteTest(Criterion):
             self._offroad_min = self._offroad_min
 
         self._world = CarlaDataProvider.get_world()
-        self._route_transforms, _ = zip(*self._route)
-        self._route_length = len(self._route)
+        self._route_progress = RouteProgress.get(self._route)
+        self._accum_meters = self._route_progress.accum_meters
         self._current_index = 0
         self._out_route_distance = 0
         self._in_safe_route = True
 
-        self._accum_meters = []
-        prev_loc = self._route_transforms[0].location
-        for i, tran in enumerate(self._route_transforms):
-            loc = tran.location
-            d = loc.distance(prev_loc)
-            accum = 0 if i == 0 else self._accum_meters[i - 1]
-
-            self._accum_meters.append(d + accum)
-            prev_loc = loc
-
         # Blackboard variable
         blackv = py_trees.blackboard.Blackboard()
         _ = blackv.set("InRoute", True)
@@ -1452,19 +1443,11 @@ class InRouteTest(Criterion):
 
             off_route = True
 
-            shortest_distance = float('inf')
-            closest_index = -1
-
             # Get the closest distance
-            for index in range(self._current_index,
-                               min(self._current_index + self.WINDOWS_SIZE + 1, self._route_length)):
-                ref_location = self._route_transforms[index].location
-                distance = math.sqrt(((location.x - ref_location.x) ** 2) + ((location.y - ref_location.y) ** 2))
-                if distance <= shortest_distance:
-                    closest_index = index
-                    shortest_distance = distance
-
-            if closest_index == -1 or shortest_distance == float('inf'):
+            closest_index, shortest_distance = self._route_progress.nearest_index(
+                location, self._current_index, self.WINDOWS_SIZE)
+
+            if shortest_distance == float('inf'):
                 return new_status
 
             # Check if the actor is out of route
@@ -1543,10 +1526,10 @@ class RouteCompletionTest(Criterion):
         
         self._index = 0
         self._route_length = len(self._route)
-        self._route_transforms, _ = zip(*self._route)
+        self._route_progress = RouteProgress.get(self._route)
         self._route_accum_perc = self._get_acummulated_percentages()
 
-        self.target_location = self._route_transforms[-1].location
+        self.target_location = self._route[-1][0].location
 
         self._traffic_event = TrafficEvent(event_type=TrafficEventType.ROUTE_COMPLETION, frame=0)
         self._traffic_event.set_dict({'route_completed': self.actual_value})
@@ -1555,21 +1538,13 @@ class RouteCompletionTest(Criterion):
 
     def _get_acummulated_percentages(self):
         """Gets the accumulated percentage of each of the route transforms"""
-        accum_meters = []
-        prev_loc = self._route_transforms[0].location
-        for i, tran in enumerate(self._route_transforms):
-            d = tran.location.distance(prev_loc)
-            new_d = 0 if i == 0 else accum_meters[i - 1]
-
-            accum_meters.append(d + new_d)
-            prev_loc = tran.location
+        accum_meters = self._route_progress.accum_meters
+        max_dist = self._route_progress.total_meters
 
-        max_dist = accum_meters[-1]
-        
         if max_dist == 0:
-            return [0 for _ in accum_meters]
+            return np.zeros_like(accum_meters)
         else:
-            return [x / max_dist * 100 for x in accum_meters]
+            return accum_meters / max_dist * 100
 
     def update(self):
         """
@@ -1593,16 +1568,9 @@ class RouteCompletionTest(Criterion):
                 if self._count == self._route_length:
                     comp_flag = True
             else:
-                for index in range(self._index, min(self._index + self.WINDOWS_SIZE + 1, self._route_length)):
-                    # Get the dot product to know if it has passed this location
-                    route_transform = self._route_transforms[index]
-                    route_location = route_transform.location
-                    wp_dir = route_transform.get_forward_vector()          # Waypoint's forward vector
-                    wp_veh = location - route_location                     # vector route - vehicle
-
-                    if wp_veh.dot(wp_dir) > 0:
-                        self._index = index
-                        self.actual_value = self._route_accum_perc[self._index]
+                # Get the dot product to know if it has passed the next locations
+                self._index = self._route_progress.passed_index(location, self._index, self.WINDOWS_SIZE)
+                self.actual_value = float(self._route_accum_perc[self._index])
 
                 self.actual_value = round(self.actual_value, 2)
                 self._traffic_event.set_dict({'route_completed': self.actual_value})
@@ -1642,6 +1610,9 @@ class RunningRedLightTest(Criterion):
     """
     Check if an actor is running a red light
 
+    The stop lines of all the traffic lights are precomputed at initialization, and lights are
+    indexed in a grid of DISTANCE_LIGHT cells, so that only the ones close to the actor are checked.
+
     Important parameters:
     - actor: CARLA actor to be used for this test
     - terminate_on_failure [optional]: If True, the complete scenario will terminate upon failure of this test
@@ -1665,6 +1636,63 @@ class RunningRedLightTest(Criterion):
                 center, waypoints = self.get_traffic_light_waypoints(_actor)
                 self._list_traffic_lights.append((_actor, center, waypoints))
 
+        self._build_stop_lines()
+
+    def _build_stop_lines(self):
+        """
+        Stores the light centers, as well as the lane, direction and stop line segment of each
+        of their waypoints as arrays, and indexes the lights by grid cell
+        """
+        centers = []
+        light_indices, road_ids, lane_ids, directions, lines = [], [], [], [], []
+        for i, (_, center, waypoints) in enumerate(self._list_traffic_lights):
+            centers.append([center.x, center.y, center.z])
+            for wp in waypoints:
+                yaw_wp = wp.transform.rotation.yaw
+                lane_width = wp.lane_width
+                location_wp = wp.transform.location
+                wp_dir = wp.transform.get_forward_vector()
+
+                lft_lane_wp = self.rotate_point(carla.Vector3D(0.6 * lane_width, 0, 0), yaw_wp + 90)
+                rgt_lane_wp = self.rotate_point(carla.Vector3D(0.6 * lane_width, 0, 0), yaw_wp - 90)
+
+                light_indices.append(i)
+                road_ids.append(wp.road_id)
+                lane_ids.append(wp.lane_id)
+                directions.append([wp_dir.x, wp_dir.y, wp_dir.z])
+                lines.append([[location_wp.x + lft_lane_wp.x, location_wp.y + lft_lane_wp.y],
+                              [location_wp.x + rgt_lane_wp.x, location_wp.y + rgt_lane_wp.y]])
+
+        self._light_centers = np.array(centers, dtype=np.float64).reshape(-1, 3)
+        self._line_light_indices = np.array(light_indices, dtype=np.int64)
+        self._line_road_ids = np.array(road_ids, dtype=np.int64)
+        self._line_lane_ids = np.array(lane_ids, dtype=np.int64)
+        self._line_directions = np.array(directions, dtype=np.float64).reshape(-1, 3)
+        self._stop_lines = np.array(lines, dtype=np.float64).reshape(-1, 2, 2)
+
+        self._light_grid = {}
+        for i, center in enumerate(self._light_centers):
+            cell = (int(math.floor(center[0] / self.DISTANCE_LIGHT)), int(math.floor(center[1] / self.DISTANCE_LIGHT)))
+            self._light_grid.setdefault(cell, []).append(i)
+
+    def _get_close_lights(self, location):
+        """
+        Returns the sorted indexes of the traffic lights whose center is closer than DISTANCE_LIGHT
+        """
+        cell_x = int(math.floor(location.x / self.DISTANCE_LIGHT))
+        cell_y = int(math.floor(location.y / self.DISTANCE_LIGHT))
+
+        candidates = []
+        for x in (cell_x - 1, cell_x, cell_x + 1):
+            for y in (cell_y - 1, cell_y, cell_y + 1):
+                candidates.extend(self._light_grid.get((x, y), []))
+        if not candidates:
+            return []
+
+        candidates = np.array(sorted(candidates), dtype=np.int64)
+        distances = np.linalg.norm(self._light_centers[candidates] - (location.x, location.y, location.z), axis=1)
+        return candidates[distances <= self.DISTANCE_LIGHT].tolist()
+
     # pylint: disable=no-self-use
     def is_vehicle_crossing_line(self, seg1, seg2):
         """
@@ -1676,6 +1704,31 @@ class RunningRedLightTest(Criterion):
 
         return not inter.is_empty
 
+    @staticmethod
+    def are_segments_crossing(segment, lines):
+        """
+        Vectorized version of is_vehicle_crossing_line, checking a (2, 2) segment against (N, 2, 2) lines.
+        Touching and overlapping segments count as crossing.
+        """
+        def orientation(a, b, c):
+            return np.sign((b[..., 0] - a[..., 0]) * (c[..., 1] - a[..., 1]) -
+                           (b[..., 1] - a[..., 1]) * (c[..., 0] - a[..., 0]))
+
+        p1, p2 = segment[0], segment[1]
+        q1, q2 = lines[:, 0], lines[:, 1]
+        o1, o2 = orientation(p1, p2, q1), orientation(p1, p2, q2)
+        o3, o4 = orientation(q1, q2, p1), orientation(q1, q2, p2)
+        crossing = (o1 * o2 <= 0) & (o3 * o4 <= 0)
+
+        # Collinear segments only cross if their bounding boxes overlap
+        collinear = (o1 == 0) & (o2 == 0)
+        overlap = np.all((np.minimum(q1, q2) <= np.maximum(p1, p2)) & (np.minimum(p1, p2) <= np.maximum(q1, q2)), axis=1)
+
+        # Same as shapely, zero length segments never cross
+        degenerate = np.all(p1 == p2) | np.all(q1 == q2, axis=1)
+
+        return crossing & (~collinear | overlap) & ~degenerate
+
     def update(self):
         """
         Check if the actor is running a red light
@@ -1687,6 +1740,9 @@ class RunningRedLightTest(Criterion):
         if location is None:
             return new_status
 
+        if self.debug:
+            self._draw_traffic_lights()
+
         veh_extent = self.actor.bounding_box.extent.x
 
         tail_close_pt = self.rotate_point(carla.Vector3D(-0.8 * veh_extent, 0, 0), transform.rotation.yaw)
@@ -1695,71 +1751,51 @@ class RunningRedLightTest(Criterion):
         tail_far_pt = self.rotate_point(carla.Vector3D(-veh_extent - 1, 0, 0), transform.rotation.yaw)
         tail_far_pt = location + carla.Location(tail_far_pt)
 
-        for traffic_light, center, waypoints in self._list_traffic_lights:
-
-            if self.debug:
-                z = 2.1
-                if traffic_light.state == carla.TrafficLightState.Red:
-                    color = carla.Color(155, 0, 0)
-                elif traffic_light.state == carla.TrafficLightState.Green:
-                    color = carla.Color(0, 155, 0)
-                else:
-                    color = carla.Color(155, 155, 0)
-                self._world.debug.draw_point(center + carla.Location(z=z), size=0.2, color=color, life_time=0.01)
-                for wp in waypoints:
-                    text = "{}.{}".format(wp.road_id, wp.lane_id)
-                    self._world.debug.draw_string(
-                        wp.transform.location + carla.Location(x=1, z=z), text, color=color, life_time=0.01)
-                    self._world.debug.draw_point(
-                        wp.transform.location + carla.Location(z=z), size=0.1, color=color, life_time=0.01)
-
-            center_loc = carla.Location(center)
+        tail_wp = None
+        ve_dir = None
+        for index in self._get_close_lights(location):
+            traffic_light = self._list_traffic_lights[index][0]
 
             if self._last_red_light_id and self._last_red_light_id == traffic_light.id:
                 continue
-            if center_loc.distance(location) > self.DISTANCE_LIGHT:
-                continue
             if traffic_light.state != carla.TrafficLightState.Red:
                 continue
 
-            for wp in waypoints:
+            line_indices = np.flatnonzero(self._line_light_indices == index)
+            if len(line_indices) == 0:
+                continue
 
+            if tail_wp is None:
                 tail_wp = self._map.get_waypoint(tail_far_pt)
+                ve_dir = transform.get_forward_vector()
+                ve_dir = np.array([ve_dir.x, ve_dir.y, ve_dir.z])
+
+            # Check the lane until all the "tail" has passed
+            affecting = (self._line_road_ids[line_indices] == tail_wp.road_id) & \
+                (self._line_lane_ids[line_indices] == tail_wp.lane_id) & \
+                (self._line_directions[line_indices].dot(ve_dir) > 0)
+            line_indices = line_indices[affecting]
+            if len(line_indices) == 0:
+                continue
 
-                # Calculate the dot product (Might be unscaled, as only its sign is important)
-                ve_dir = CarlaDataProvider.get_transform(self.actor).get_forward_vector()
-                wp_dir = wp.transform.get_forward_vector()
-
-                # Check the lane until all the "tail" has passed
-                if tail_wp.road_id == wp.road_id and tail_wp.lane_id == wp.lane_id and ve_dir.dot(wp_dir) > 0:
-                    # This light is red and is affecting our lane
-                    yaw_wp = wp.transform.rotation.yaw
-                    lane_width = wp.lane_width
-                    location_wp = wp.transform.location
-
-                    lft_lane_wp = self.rotate_point(carla.Vector3D(0.6 * lane_width, 0, 0), yaw_wp + 90)
-                    lft_lane_wp = location_wp + carla.Location(lft_lane_wp)
-                    rgt_lane_wp = self.rotate_point(carla.Vector3D(0.6 * lane_width, 0, 0), yaw_wp - 90)
-                    rgt_lane_wp = location_wp + carla.Location(rgt_lane_wp)
+            # Is the vehicle traversing the stop line of a lane affected by this red light?
+            tail_segment = np.array([[tail_close_pt.x, tail_close_pt.y], [tail_far_pt.x, tail_far_pt.y]])
+            if np.any(self.are_segments_crossing(tail_segment, self._stop_lines[line_indices])):
 
-                    # Is the vehicle traversing the stop line?
-                    if self.is_vehicle_crossing_line((tail_close_pt, tail_far_pt), (lft_lane_wp, rgt_lane_wp)):
+                self.test_status = "FAILURE"
+                self.actual_value += 1
+                location = traffic_light.get_transform().location
+                red_light_event = TrafficEvent(event_type=TrafficEventType.TRAFFIC_LIGHT_INFRACTION, frame=GameTime.get_frame())
+                red_light_event.set_message(
+                    "Agent ran a red light {} at (x={}, y={}, z={})".format(
+                        traffic_light.id,
+                        round(location.x, 3),
+                        round(location.y, 3),
+                        round(location.z, 3)))
+                red_light_event.set_dict({'id': traffic_light.id, 'location': location})
 
-                        self.test_status = "FAILURE"
-                        self.actual_value += 1
-                        location = traffic_light.get_transform().location
-                        red_light_event = TrafficEvent(event_type=TrafficEventType.TRAFFIC_LIGHT_INFRACTION, frame=GameTime.get_frame())
-                        red_light_event.set_message(
-                            "Agent ran a red light {} at (x={}, y={}, z={})".format(
-                                traffic_light.id,
-                                round(location.x, 3),
-                                round(location.y, 3),
-                                round(location.z, 3)))
-                        red_light_event.set_dict({'id': traffic_light.id, 'location': location})
-
-                        self.events.append(red_light_event)
-                        self._last_red_light_id = traffic_light.id
-                        break
+                self.events.append(red_light_event)
+                self._last_red_light_id = traffic_light.id
 
         if self._terminate_on_failure and (self.test_status == "FAILURE"):
             new_status = py_trees.common.Status.FAILURE
@@ -1768,6 +1804,26 @@ class RunningRedLightTest(Criterion):
 
         return new_status
 
+    def _draw_traffic_lights(self):
+        """
+        Draws the center and waypoints of all the traffic lights
+        """
+        for traffic_light, center, waypoints in self._list_traffic_lights:
+            z = 2.1
+            if traffic_light.state == carla.TrafficLightState.Red:
+                color = carla.Color(155, 0, 0)
+            elif traffic_light.state == carla.TrafficLightState.Green:
+                color = carla.Color(0, 155, 0)
+            else:
+                color = carla.Color(155, 155, 0)
+            self._world.debug.draw_point(center + carla.Location(z=z), size=0.2, color=color, life_time=0.01)
+            for wp in waypoints:
+                text = "{}.{}".format(wp.road_id, wp.lane_id)
+                self._world.debug.draw_string(
+                    wp.transform.location + carla.Location(x=1, z=z), text, color=color, life_time=0.01)
+                self._world.debug.draw_point(
+                    wp.transform.location + carla.Location(z=z), size=0.1, color=color, life_time=0.01)
+
     def rotate_point(self, point, angle):
         """
         rotate a given point by a given angle
@@ -1996,15 +2052,8 @@ class MinimumSpeedRouteTest(Criterion):
         self.actual_value = 100
 
         self._route = route
-        self._accum_dist = []
-        prev_trans = None
-        for trans, _ in route:
-            if prev_trans:
-                dist = trans.location.distance(prev_trans.location)
-                self._accum_dist.append(dist + self._accum_dist[-1])
-            else:
-                self._accum_dist.append(0)
-            prev_trans = trans
+        self._route_progress = RouteProgress.get(self._route)
+        self._accum_dist = self._route_progress.accum_meters
         self._route_length = len(self._route)
 
         self._checkpoints = checkpoints
@@ -2034,15 +2083,8 @@ class MinimumSpeedRouteTest(Criterion):
         if location is None:
             return new_status
 
-        for index in range(self._index, min(self._index + self.WINDOWS_SIZE + 1, self._route_length)):
-            # Get the dot product to know if it has passed this location
-            route_transform = self._route[index][0]
-            route_location = route_transform.location
-            wp_dir = route_transform.get_forward_vector()
-            wp_veh = location - route_location
-
-            if wp_veh.dot(wp_dir) > 0:
-                self._index = index
+        # Get the dot product to know if it has passed the next locations
+        self._index = self._route_progress.passed_index(location, self._index, self.WINDOWS_SIZE)
 
         if self._accum_dist[self._index] - self._current_dist > self._checkpoint_dist:
             self._set_traffic_event()
@@ -8,7 +8,7 @@
 Scenario spawning elements to make the town dynamic and interesting
 """
 
-from collections import OrderedDict
+from collections import OrderedDict, Counter
 import py_trees
 
 import carla
@@ -176,12 +176,20 @@ class BackgroundBehavior(AtomicBehavior):
         self._map = CarlaDataProvider.get_map()
         self._world = CarlaDataProvider.get_world()
         self._tm_port = CarlaDataProvider.get_traffic_manager_port()
-        self._tm = CarlaDataProvider.get_client().get_trafficmanager(self._tm_port)
+        self._client = CarlaDataProvider.get_client()
+        self._tm = self._client.get_trafficmanager(self._tm_port)
         self._tm.global_percentage_speed_difference(0.0)
         self._rng = CarlaDataProvider.get_random_seed()
 
         self._attribute_filter = {'base_type': 'car', 'special_type': '', 'has_lights': True, }
 
+        # Server calls. Actor commands are applied in batch at the end of each tick
+        self._commands = []
+        self._actors_lights = {}  # Dictionary actor id - light state queued this tick
+        self._actors_desired_speed = {}  # Dictionary actor - last speed given to the TM
+        self._actors_wp = {}  # Dictionary actor id - waypoint, cleared every tick
+        self._rpc_counts = Counter()  # Calls made during the last tick
+
         # Global variables
         self._ego_actor = ego_actor
         self._ego_state = EGO_ROAD
@@ -264,9 +272,13 @@ class BackgroundBehavior(AtomicBehavior):
         self._route = []  # Transform the route into a list of waypoints
         self._route_options = []  # Extract the RoadOptions from the route
         self._accum_dist = []  # Save the total traveled distance for each waypoint
+        route_wps = {}  # Location - waypoint, as the routes go several times through the same points
         prev_trans = None
         for trans, option in route:
-            self._route.append(self._map.get_waypoint(trans.location))
+            location_key = (trans.location.x, trans.location.y, trans.location.z)
+            if location_key not in route_wps:
+                route_wps[location_key] = self._map.get_waypoint(trans.location)
+            self._route.append(route_wps[location_key])
             self._route_options.append(option)
             if prev_trans:
                 dist = trans.location.distance(prev_trans.location)
@@ -301,6 +313,8 @@ class BackgroundBehavior(AtomicBehavior):
 
     def update(self):
         prev_ego_index = self._route_index
+        self._rpc_counts = Counter()
+        self._actors_wp = {}
 
         # Check if the TM destroyed an actor
         if self._route_index > 0: # TODO: This check is due to intialization problem
@@ -339,6 +353,8 @@ class BackgroundBehavior(AtomicBehavior):
         # Update the speed of all vehicles
         self._set_actors_speed()
 
+        self._apply_commands()
+
         return py_trees.common.Status.RUNNING
 
     def terminate(self, new_status):
@@ -350,7 +366,7 @@ class BackgroundBehavior(AtomicBehavior):
 
     def _check_background_actors(self):
         """Checks if the Traffic Manager has removed a backgroudn actor"""
-        alive_ids = [actor.id for actor in CarlaDataProvider.get_all_actors().filter('vehicle*')]
+        alive_ids = {actor.id for actor in CarlaDataProvider.get_all_actors().filter('vehicle*')}
         for actor in list(self._all_actors):
             if actor.id not in alive_ids:
                 self._remove_actor_info(actor)
@@ -1009,7 +1025,7 @@ class BackgroundBehavior(AtomicBehavior):
             if source_location.distance(actor_location) > self._reuse_dist:
                 continue  # Don't use actors far away
 
-            actor_wp = self._map.get_waypoint(actor_location)
+            actor_wp = self._get_actor_waypoint(actor, actor_location)
             if get_lane_key(actor_wp) not in source.previous_lane_keys:
                 continue  # Don't use actors that won't pass through the source
 
@@ -1110,7 +1126,7 @@ class BackgroundBehavior(AtomicBehavior):
                 speed = self._ego_actor.get_velocity().length()
                 if len(source.actors):
                     speed = min(speed, source.actors[-1].get_velocity().length())
-                actor.set_target_velocity(speed * forward_vec)
+                self._add_command(carla.command.ApplyTargetVelocity(actor, speed * forward_vec))
 
                 source.actors.append(actor)
 
@@ -1748,9 +1764,7 @@ class BackgroundBehavior(AtomicBehavior):
                     self._scenario_stopped_actors.append(actor)
                     self._actors_speed_perc[actor] = 0
                     self._tm.update_vehicle_lights(actor, False)
-                    lights = actor.get_light_state()
-                    lights |= carla.VehicleLightState.Brake
-                    actor.set_light_state(carla.VehicleLightState(lights))
+                    self._set_actor_lights(actor, self._get_actor_lights(actor) | carla.VehicleLightState.Brake)
 
     def _start_road_front_vehicles(self):
         """
@@ -1759,9 +1773,7 @@ class BackgroundBehavior(AtomicBehavior):
         for actor in self._scenario_stopped_actors:
             self._actors_speed_perc[actor] = 100
             self._tm.update_vehicle_lights(actor, True)
-            lights = actor.get_light_state()
-            lights &= ~carla.VehicleLightState.Brake
-            actor.set_light_state(carla.VehicleLightState(lights))
+            self._set_actor_lights(actor, self._get_actor_lights(actor) & ~carla.VehicleLightState.Brake)
         self._scenario_stopped_actors = []
 
     def _stop_road_back_vehicles(self):
@@ -1790,7 +1802,7 @@ class BackgroundBehavior(AtomicBehavior):
             if not location:
                 continue
 
-            actor_wp = self._map.get_waypoint(location)
+            actor_wp = self._get_actor_waypoint(actor, location)
             new_actor_wps = actor_wp.next(space)
             if len(new_actor_wps) > 0:
                 new_transform = new_actor_wps[0].transform
@@ -1855,7 +1867,7 @@ class BackgroundBehavior(AtomicBehavior):
             if collision_dist < destruction_dist:
                 self._destroy_actor(actor)
             elif collision_dist < stop_dist:
-                actor.set_target_velocity(carla.Vector3D())
+                self._add_command(carla.command.ApplyTargetVelocity(actor, carla.Vector3D()))
 
     def _remove_road_lane(self, lane_wp):
         """Removes a road lane"""
@@ -1925,7 +1937,8 @@ class BackgroundBehavior(AtomicBehavior):
             actor = self._spawn_actor(spawn_wp)
             if not actor:
                 continue
-            actor.set_target_velocity(spawn_wp.transform.get_forward_vector() * ego_speed)
+            self._add_command(carla.command.ApplyTargetVelocity(
+                actor, spawn_wp.transform.get_forward_vector() * ego_speed))
             actors.append(actor)
 
         self._road_dict[add_lane_key] = Source(prev_wp, actors, active=self._active_road_sources)
@@ -2215,20 +2228,20 @@ class BackgroundBehavior(AtomicBehavior):
                     continue
 
                 # TODO: Lane changes are weird with the TM, so just stop them
-                actor_wp = self._map.get_waypoint(location)
+                actor_wp = self._get_actor_waypoint(actor, location)
                 if actor_wp.lane_width < self._lane_width_threshold:
 
                     # Ensure only ending lanes are affected. not sure if it is needed though
                     next_wps = actor_wp.next(0.5)
                     if next_wps and next_wps[0].lane_width < actor_wp.lane_width:
-                        actor.set_target_velocity(carla.Vector3D(0, 0, 0))
+                        self._add_command(carla.command.ApplyTargetVelocity(actor, carla.Vector3D(0, 0, 0)))
                         self._actors_speed_perc[actor] = 0
-                        lights = actor.get_light_state()
+                        lights = self._get_actor_lights(actor)
                         lights |= carla.VehicleLightState.RightBlinker
                         lights |= carla.VehicleLightState.LeftBlinker
                         lights |= carla.VehicleLightState.Position
-                        actor.set_light_state(carla.VehicleLightState(lights))
-                        actor.set_autopilot(False, self._tm_port)
+                        self._set_actor_lights(actor, lights)
+                        self._add_command(carla.command.SetAutopilot(actor, False, self._tm_port))
                         continue
 
                 self._set_road_actor_speed(location, actor)
@@ -2412,7 +2425,7 @@ class BackgroundBehavior(AtomicBehavior):
 
                 # Monitor its entry
                 elif state == JUNCTION_ENTRY:
-                    actor_wp = self._map.get_waypoint(location)
+                    actor_wp = self._get_actor_waypoint(actor, location)
                     if self._is_junction(actor_wp) and junction.contains_wp(actor_wp):
                         if junction.clear_middle:
                             self._destroy_actor(actor)  # Don't clutter the junction if a junction scenario is active
@@ -2421,7 +2434,7 @@ class BackgroundBehavior(AtomicBehavior):
 
                 # Monitor its exit and destroy an actor if needed
                 elif state == JUNCTION_MIDDLE:
-                    actor_wp = self._map.get_waypoint(location)
+                    actor_wp = self._get_actor_waypoint(actor, location)
                     actor_lane_key = get_lane_key(actor_wp)
                     if not self._is_junction(actor_wp) and actor_lane_key in exit_dict:
                         if i < max_index and actor_lane_key in junction.route_exit_keys:
@@ -2488,7 +2501,7 @@ class BackgroundBehavior(AtomicBehavior):
 
             # Ending / starting lanes create issues as the lane width gradually decreases until reaching 0,
             # where the lane starts / ends. Set their speed to 0, and they'll eventually dissapear.
-            actor_wp = self._map.get_waypoint(location)
+            actor_wp = self._get_actor_waypoint(actor, location)
             if actor_wp.lane_width < self._lane_width_threshold:
                 self._actors_speed_perc[actor] = 0
 
@@ -2504,7 +2517,57 @@ class BackgroundBehavior(AtomicBehavior):
 
             # TODO: Fix very high speed traffic
             speed = min(speed, 90)
+
+            # Only update the TM if the speed has changed
+            if self._actors_desired_speed.get(actor) == speed:
+                continue
+            self._actors_desired_speed[actor] = speed
             self._tm.set_desired_speed(actor, speed)
+            self._rpc_counts['set_desired_speed'] += 1
+
+    def _get_actor_waypoint(self, actor, location):
+        """
+        Returns the waypoint of an actor at its given location. These are computed once per tick
+        """
+        if actor.id not in self._actors_wp:
+            self._actors_wp[actor.id] = self._map.get_waypoint(location)
+            self._rpc_counts['get_waypoint'] += 1
+        return self._actors_wp[actor.id]
+
+    def _add_command(self, command):
+        """Adds an actor command, applied in batch at the end of the tick by `_apply_commands`"""
+        self._commands.append(command)
+
+    def _get_actor_lights(self, actor):
+        """
+        Returns the light state of an actor, including the changes queued this tick,
+        as `get_light_state` doesn't know about the commands not yet applied
+        """
+        if actor.id not in self._actors_lights:
+            self._actors_lights[actor.id] = actor.get_light_state()
+        return self._actors_lights[actor.id]
+
+    def _set_actor_lights(self, actor, lights):
+        """Queues a change of the light state of an actor. Use `_get_actor_lights` to build it"""
+        self._actors_lights[actor.id] = lights
+        self._add_command(carla.command.SetVehicleLightState(actor, carla.VehicleLightState(lights)))
+
+    def _apply_commands(self):
+        """Applies all the actor commands of this tick in a single call"""
+        self._actors_lights = {}
+        if not self._commands:
+            return
+        self._client.apply_batch(self._commands)
+        self._rpc_counts['apply_batch'] += 1
+        self._rpc_counts['commands'] += len(self._commands)
+        self._commands = []
+
+    def get_rpc_counts(self):
+        """
+        Returns a dictionary with the amount of server and map calls of the last tick.
+        Commands are applied in a single batch, so 'commands' doesn't count towards the total calls
+        """
+        return dict(self._rpc_counts)
 
     def _remove_actor_info(self, actor):
         """Removes all the references of the actor"""
@@ -2541,6 +2604,7 @@ class BackgroundBehavior(AtomicBehavior):
                     break
 
         self._actors_speed_perc.pop(actor, None)
+        self._actors_desired_speed.pop(actor, None)
         if actor in self._all_actors:
             self._all_actors.remove(actor)
 
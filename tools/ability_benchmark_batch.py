@@ -62,16 +62,6 @@ def get_route_result(records, route_id):
             return record
     return None
 
-def get_waypoint_route(locs, grp):
-    route = []
-    for i in range(len(locs) - 1):
-        loc = locs[i]
-        loc_next = locs[i + 1]
-        interpolated_trace = grp.trace_route(loc, loc_next)
-        for wp, _ in interpolated_trace:
-            route.append(wp)
-    return route
-
 def main(args):
     routes_path = args.xml_file_path 
     result_file = args.result_file
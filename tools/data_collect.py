@@ -11,7 +11,8 @@ from easydict import EasyDict
 import math
 import h5py
 import laspy
-from tools.utils import build_projection_matrix, convert_depth, get_relative_transform, normalize_angle, build_skeleton,  get_matrix, calculate_cube_vertices, compute_2d_distance
+from tools.utils import build_projection_matrix, convert_depth, normalize_angle, build_skeleton,  get_matrix, compute_2d_distance
+from tools.utils import get_matrices, get_inverse_matrices, transform_points, calculate_cubes_vertices, get_relative_transforms
 from tools.utils import DIS_CAR_SAVE, DIS_WALKER_SAVE, DIS_SIGN_SAVE, DIS_LIGHT_SAVE
 
 import torch
@@ -1021,132 +1022,134 @@ class Env_Manager(object):
             results[key] = result
         return results
 
+    def _get_actor_state(self, snapshot, npc):
+        """ Returns the transform and velocity of an actor in the world snapshot of the tick """
+        actor_snapshot = snapshot.find(npc.id)
+        if actor_snapshot is None:
+            return npc.get_transform(), npc.get_velocity()
+        return actor_snapshot.get_transform(), actor_snapshot.get_velocity()
+
+    def _get_box_poses(self, transforms, velocities, bbox_locations, extents, ego_matrix):
+        """
+        Computes the poses of the bounding boxes of a group of actors at once.
+        :param transforms: List of the carla.Transform of the actors
+        :param velocities: List of the carla.Vector3D velocities of the actors
+        :param bbox_locations: List of the bounding box locations, in the actor coordinate systems
+        :param extents: List of the bounding box extents
+        :param ego_matrix: ndarray 4x4 Matrix of the ego vehicle in global coordinates
+        :return: dict of ndarrays, with the matrices and their inverse (N, 4, 4), the box centers (N, 3),
+        the world vertices of the boxes (N, 8, 3), the positions in the ego coordinate system (N, 3),
+        the forward speeds (N,) and the 2d distances to the ego (N,)
+        """
+        locations = [[t.location.x, t.location.y, t.location.z] for t in transforms]
+        rotations = [[t.rotation.pitch, t.rotation.roll, t.rotation.yaw] for t in transforms]
+        matrices = get_matrices(locations, rotations)
+        bbox_locations = np.array([[l.x, l.y, l.z] for l in bbox_locations], dtype=np.float64).reshape(-1, 1, 3)
+        local_verts = calculate_cubes_vertices(bbox_locations[:, 0], [[e.x, e.y, e.z] for e in extents])
+        velocities = np.array([[v.x, v.y, v.z] for v in velocities], dtype=np.float64).reshape(-1, 3)
+        return {
+            'matrix': matrices,
+            'inverse_matrix': get_inverse_matrices(matrices),
+            'center': transform_points(matrices, bbox_locations)[:, 0],
+            'world_cord': transform_points(matrices, local_verts),
+            'relative_pos': get_relative_transforms(ego_matrix, matrices),
+            # the forward vector is the first column of the rotation
+            'speed': np.einsum('ni,ni->n', velocities, matrices[:, :3, 0]),
+            'distance': np.hypot(matrices[:, 0, 3] - ego_matrix[0, 3], matrices[:, 1, 3] - ego_matrix[1, 3]),
+        }
+
     def get_bounding_boxes(self, lidar=None, radar=None):
         results = []
+        carla_map = CarlaDataProvider.get_map()
+        # a single snapshot of the actor poses for the whole tick, the boxes of each group of actors
+        # are then computed at once from the stacked matrices
+        snapshot = self.world.get_snapshot()
 
         # ego_vehicle
         npc = self.manager.ego_vehicles[0]
-        npc_id = str(npc.id)
-        npc_type_id = npc.type_id
-
-        npc_base_type = npc.attributes['base_type']
-        location = npc.get_transform().location
-        rotation = npc.get_transform().rotation
-        # 
-        # verts = [v for v in npc.bounding_box.get_world_vertices(npc.get_transform())]
-        # center, extent = get_center_and_extent(verts)
-        # from carla official
-        # bb_cords = _bounding_box_to_world(npc.bounding_box)
-        # world_cord = _vehicle_to_world(bb_cords, npc)
-        # from handcraft
+        ego_transform, ego_velocity = self._get_actor_state(snapshot, npc)
+        ego_location = ego_transform.location
+        ego_matrix = get_matrices([[ego_location.x, ego_location.y, ego_location.z]],
+                                  [[ego_transform.rotation.pitch, ego_transform.rotation.roll, ego_transform.rotation.yaw]])[0]
+        poses = self._get_box_poses([ego_transform], [ego_velocity], [npc.bounding_box.location], [npc.bounding_box.extent], ego_matrix)
+        location = ego_transform.location
+        rotation = ego_transform.rotation
         extent = npc.bounding_box.extent
-        center = npc.get_transform().transform(npc.bounding_box.location)
-        local_verts = calculate_cube_vertices(npc.bounding_box.location, npc.bounding_box.extent)
-        global_verts = []
-        for l_v in local_verts:
-            g_v = npc.get_transform().transform(carla.Location(l_v[0], l_v[1], l_v[2]))
-            global_verts.append([g_v.x, g_v.y, g_v.z])
-        ###################
-        ego_speed = self._get_forward_speed(transform=npc.get_transform(), velocity=npc.get_velocity())
-        ego_brake = npc.get_control().brake
-        ego_matrix = np.array(npc.get_transform().get_matrix())
         ego_yaw = np.deg2rad(rotation.yaw)
-        road_id = CarlaDataProvider.get_map().get_waypoint(location).road_id
-        lane_id = CarlaDataProvider.get_map().get_waypoint(location).lane_id
-        section_id = CarlaDataProvider.get_map().get_waypoint(location).section_id
-        world2ego = npc.get_transform().get_inverse_matrix()
-
+        waypoint = carla_map.get_waypoint(location)
         result = {
             'class': 'ego_vehicle',
-            'id': npc_id,
-            'type_id': npc_type_id,
-            'base_type': npc_base_type,
+            'id': str(npc.id),
+            'type_id': npc.type_id,
+            'base_type': npc.attributes['base_type'],
             'location': [location.x, location.y, location.z],
             'rotation': [rotation.pitch, rotation.roll, rotation.yaw],
             'bbx_loc': [npc.bounding_box.location.x, npc.bounding_box.location.y, npc.bounding_box.location.z],
-            'center': [center.x, center.y, center.z],
+            'center': poses['center'][0].tolist(),
             'extent': [extent.x, extent.y, extent.z],
-            'world_cord': global_verts,
+            'world_cord': poses['world_cord'][0].tolist(),
             'semantic_tags': [npc.semantic_tags],
             # 'color': npc.attributes['color'],
             'color': npc.attributes.get('color','default_color'),
-            'speed': ego_speed,
-            'brake': ego_brake,
-            'road_id': road_id,
-            'lane_id': lane_id,
-            'section_id': section_id,
-            'world2ego': world2ego,
+            'speed': float(poses['speed'][0]),
+            'brake': npc.get_control().brake,
+            'road_id': waypoint.road_id,
+            'lane_id': waypoint.lane_id,
+            'section_id': waypoint.section_id,
+            'world2ego': poses['inverse_matrix'][0].tolist(),
         }
         results.append(result)
 
         # vehicles.vehicle
         vehicles = self.get_actor_filter_vehicle()
+        npcs, states = [], []
         for npc in vehicles.vehicle:
             if not npc.is_alive: continue
             if npc.id == self.manager.ego_vehicles[0].id: continue
-            npc_id = str(npc.id)
-            location = npc.get_transform().location
-            rotation = npc.get_transform().rotation
-            road_id = CarlaDataProvider.get_map().get_waypoint(location).road_id
-            lane_id = CarlaDataProvider.get_map().get_waypoint(location).lane_id
-            section_id = CarlaDataProvider.get_map().get_waypoint(location).section_id
-            # verts = [v for v in npc.bounding_box.get_world_vertices(npc.get_transform())]
-            # center, extent = get_center_and_extent(verts)
-            # # from carla official
-            # bb_cords = _bounding_box_to_world(npc.bounding_box)
-            # world_cord = _vehicle_to_world(bb_cords, npc)
-            # #
-            # from handcraft
-            world2vehicle = npc.get_transform().get_inverse_matrix()
+            npcs.append(npc)
+            states.append(self._get_actor_state(snapshot, npc))
+        poses = self._get_box_poses([s[0] for s in states], [s[1] for s in states],
+                                    [npc.bounding_box.location for npc in npcs],
+                                    [npc.bounding_box.extent for npc in npcs], ego_matrix)
+        for i, npc in enumerate(npcs):
+            location = states[i][0].location
+            rotation = states[i][0].rotation
             extent = npc.bounding_box.extent
-            center = npc.get_transform().transform(npc.bounding_box.location)
-            local_verts = calculate_cube_vertices(npc.bounding_box.location, npc.bounding_box.extent)
-            global_verts = []
-            for l_v in local_verts:
-                g_v = npc.get_transform().transform(carla.Location(l_v[0], l_v[1], l_v[2]))
-                global_verts.append([g_v.x, g_v.y, g_v.z])
-            ###################
-            vehicle_speed = self._get_forward_speed(transform=npc.get_transform(), velocity=npc.get_velocity())
-            vehicle_brake = npc.get_control().brake
-            vehicle_matrix = np.array(npc.get_transform().get_matrix())
-            yaw = np.deg2rad(rotation.yaw)
+            waypoint = carla_map.get_waypoint(location)
             try:
                 light_state = str(npc.get_light_state()).split('.')[-1]
             except:
                 light_state = 'None'
             # Computes how many LiDAR hits are on a bounding box. Used to filter invisible boxes during data loading.
-            relative_yaw = normalize_angle(yaw - ego_yaw)
-            relative_pos = get_relative_transform(ego_matrix, vehicle_matrix)
+            relative_yaw = normalize_angle(np.deg2rad(rotation.yaw) - ego_yaw)
             if not lidar is None:
-                num_in_bbox_lidar_points = self.get_lidar_points_in_bbox(relative_pos, relative_yaw, extent, lidar)
+                num_in_bbox_lidar_points = self.get_lidar_points_in_bbox(poses['relative_pos'][i], relative_yaw, extent, lidar)
             else:
                 num_in_bbox_lidar_points = -1
-            
-            distance = compute_2d_distance(npc.get_transform().location, self.manager.ego_vehicles[0].get_transform().location)
             result = {
                 'class': 'vehicle',
                 'state': 'dynamic',
-                'id': npc_id,
+                'id': str(npc.id),
                 'location': [location.x, location.y, location.z],
                 'rotation': [rotation.pitch, rotation.roll, rotation.yaw],
                 'bbx_loc': [npc.bounding_box.location.x, npc.bounding_box.location.y, npc.bounding_box.location.z],
-                'center': [center.x, center.y, center.z],
+                'center': poses['center'][i].tolist(),
                 'extent': [extent.x, extent.y, extent.z],
-                'world_cord': global_verts,
+                'world_cord': poses['world_cord'][i].tolist(),
                 'semantic_tags': npc.semantic_tags,
                 'type_id': npc.type_id,
                 # 'color': npc.attributes['color'],
                 'color': npc.attributes.get('color','default_color'),
                 'base_type': npc.attributes['base_type'],
                 'num_points': int(num_in_bbox_lidar_points),
-                'distance': distance,
-                'speed': vehicle_speed,
-                'brake': vehicle_brake,
+                'distance': float(poses['distance'][i]),
+                'speed': float(poses['speed'][i]),
+                'brake': npc.get_control().brake,
                 'light_state': light_state,
-                'road_id': road_id,
-                'lane_id': lane_id,
-                'section_id': section_id,
-                'world2vehicle': world2vehicle,
+                'road_id': waypoint.road_id,
+                'lane_id': waypoint.lane_id,
+                'section_id': waypoint.section_id,
+                'world2vehicle': poses['inverse_matrix'][i].tolist(),
                 # 'actor': npc, # for debug 
               }
             results.append(result)
@@ -1161,14 +1164,16 @@ class Env_Manager(object):
         vehicles_static_bbox = car_bbox_list + bicycle_list + bus_list + motorcycle_list + train_list + truck_list
         vehicles_static_bbox_nearby = []
         for v_s in vehicles_static_bbox:
-            if compute_2d_distance(v_s.location, self.manager.ego_vehicles[0].get_transform().location) < (DIS_LIGHT_SAVE + 20):
+            if compute_2d_distance(v_s.location, ego_location) < (DIS_LIGHT_SAVE + 20):
                 vehicles_static_bbox_nearby.append(v_s)
+        npcs, states, extents = [], [], []
         for npc in vehicles.static:
             if not npc.is_alive: continue
+            state = self._get_actor_state(snapshot, npc)
             new_bbox = None
             min_dis = 50
             for vehicle_bbox in vehicles_static_bbox_nearby:
-                dis = compute_2d_distance(npc.get_transform().location, vehicle_bbox.location)
+                dis = compute_2d_distance(state[0].location, vehicle_bbox.location)
                 if dis < min_dis:
                     new_bbox = vehicle_bbox
                     min_dis = dis
@@ -1179,175 +1184,140 @@ class Env_Manager(object):
             if new_bbox not in vehicles_static_bbox_nearby:
                 raise Exception('new_bbox not in vehicles_static_bbox_nearby')
             vehicles_static_bbox_nearby.remove(new_bbox)
-            npc_id = str(npc.id)
-            # location = new_bbox.location
-            # rotation = new_bbox.rotation
-            # center = new_bbox.location
-            extent = new_bbox.extent
-            ####
-            location = npc.get_transform().location
-            rotation = npc.get_transform().rotation
-            road_id = CarlaDataProvider.get_map().get_waypoint(location).road_id
-            lane_id = CarlaDataProvider.get_map().get_waypoint(location).lane_id
-            section_id = CarlaDataProvider.get_map().get_waypoint(location).section_id
-            # verts = [v for v in npc.bounding_box.get_world_vertices(npc.get_transform())]
-            # center, extent = get_center_and_extent(verts)
-            # # from carla official
-            # bb_cords = _bounding_box_to_world(npc.bounding_box)
-            # world_cord = _vehicle_to_world(bb_cords, npc)
-            # #
-            # from handcraft
-            world2vehicle = npc.get_transform().get_inverse_matrix()
-            # extent = npc.bounding_box.extent
-            # extent = carla.Vector3D(extent.y, extent.x, extent.z) # staic need swap
-            center = npc.get_transform().transform(npc.bounding_box.location)
-            local_verts = calculate_cube_vertices(npc.bounding_box.location, extent)
-            global_verts = []
-            for l_v in local_verts:
-                g_v = npc.get_transform().transform(carla.Location(l_v[0], l_v[1], l_v[2]))
-                # g_v = np.dot(np.matrix(npc.get_transform().get_inverse_matrix()).I, [l_v[0], l_v[1], l_v[2],1])
-                global_verts.append([g_v.x, g_v.y, g_v.z])
-            ###################
-            vehicle_speed = self._get_forward_speed(transform=npc.get_transform(), velocity=npc.get_velocity())
-            vehicle_brake = 1.0
-            vehicle_matrix = np.array(npc.get_transform().get_matrix())
-            yaw = np.deg2rad(rotation.yaw)
-            light_state= 'NONE'
+            npcs.append(npc)
+            states.append(state)
+            # the extent of the static vehicles is the one of the level bounding box
+            extents.append(new_bbox.extent)
+        poses = self._get_box_poses([s[0] for s in states], [s[1] for s in states],
+                                    [npc.bounding_box.location for npc in npcs], extents, ego_matrix)
+        for i, npc in enumerate(npcs):
+            location = states[i][0].location
+            rotation = states[i][0].rotation
+            extent = extents[i]
+            waypoint = carla_map.get_waypoint(location)
             # Computes how many LiDAR hits are on a bounding box. Used to filter invisible boxes during data loading.
-            relative_yaw = normalize_angle(yaw - ego_yaw)
-            relative_pos = get_relative_transform(ego_matrix, vehicle_matrix)
+            relative_yaw = normalize_angle(np.deg2rad(rotation.yaw) - ego_yaw)
             if not lidar is None:
-                num_in_bbox_points = self.get_lidar_points_in_bbox(relative_pos, relative_yaw, extent, lidar)
+                num_in_bbox_points = self.get_lidar_points_in_bbox(poses['relative_pos'][i], relative_yaw, extent, lidar)
             else:
                 num_in_bbox_points = -1
-
-            distance = compute_2d_distance(npc.get_transform().location, self.manager.ego_vehicles[0].get_transform().location)
             result = {
                 'class': 'vehicle',
                 'state': 'static',
-                'id': npc_id,
+                'id': str(npc.id),
                 'location': [location.x, location.y, location.z],
                 'rotation': [rotation.pitch, rotation.roll, rotation.yaw],
                 'bbx_loc': [npc.bounding_box.location.x, npc.bounding_box.location.y, npc.bounding_box.location.z],
-                'center': [center.x, center.y, center.z],
+                'center': poses['center'][i].tolist(),
                 'extent': [extent.x, extent.y, extent.z],
-                'world_cord': global_verts,
+                'world_cord': poses['world_cord'][i].tolist(),
                 'semantic_tags': npc.semantic_tags,
                 'type_id': npc.attributes['mesh_path'],
                 'num_points': int(num_in_bbox_points),
-                'distance': distance,
-                'speed': vehicle_speed,
-                'brake': vehicle_brake,
-                'light_state': light_state,
-                'road_id': road_id,
-                'lane_id': lane_id,
-                'section_id': section_id,
-                'world2vehicle': world2vehicle,
+                'distance': float(poses['distance'][i]),
+                'speed': float(poses['speed'][i]),
+                'brake': 1.0,
+                'light_state': 'NONE',
+                'road_id': waypoint.road_id,
+                'lane_id': waypoint.lane_id,
+                'section_id': waypoint.section_id,
+                'world2vehicle': poses['inverse_matrix'][i].tolist(),
                 # 'actor': npc, # for debug
                 }
             results.append(result)
         
         # pedestrians
         pedestrians = self.world.get_actors().filter('walker*')
+        npcs, states = [], []
         for npc in pedestrians:
             if not npc.is_alive: 
                 continue
-            else:
-                try:
-                    if compute_2d_distance(npc.get_transform().location, self.manager.ego_vehicles[0].get_transform().location) < DIS_WALKER_SAVE:
-                        npc_id = str(npc.id)
-                        location = npc.get_transform().location
-                        rotation = npc.get_transform().rotation
-                        road_id = CarlaDataProvider.get_map().get_waypoint(location).road_id
-                        lane_id = CarlaDataProvider.get_map().get_waypoint(location).lane_id
-                        section_id = CarlaDataProvider.get_map().get_waypoint(location).section_id
-                        # verts = [v for v in npc.bounding_box.get_world_vertices(npc.get_transform())]
-                        # center, extent = get_center_and_extent(verts)
-                        # # from carla official
-                        # bb_cords = _bounding_box_to_world(npc.bounding_box)
-                        # world_cord = _vehicle_to_world(bb_cords, npc)
-                        # #
-                        # from handcraft
-                        world2ped = npc.get_transform().get_inverse_matrix()
-                        extent = npc.bounding_box.extent
-                        center = npc.get_transform().transform(npc.bounding_box.location)
-                        local_verts = calculate_cube_vertices(npc.bounding_box.location, npc.bounding_box.extent)
-                        global_verts = []
-                        for l_v in local_verts:
-                            g_v = npc.get_transform().transform(carla.Location(l_v[0], l_v[1], l_v[2]))
-                            global_verts.append([g_v.x, g_v.y, g_v.z])
-                        ###################
-                        walker_speed = self._get_forward_speed(transform=npc.get_transform(), velocity=npc.get_velocity())
-                        # walker_speed = npc.attributes['speed'] #(TODO) yzj
-                        walker_matrix = np.array(npc.get_transform().get_matrix())
-                        yaw = np.deg2rad(rotation.yaw)
-                        # bones_3d_lines = build_skeleton(npc, self.skeleton_links)
-                        # Computes how many LiDAR hits are on a bounding box. Used to filter invisible boxes during data loading.
-                        relative_yaw = normalize_angle(yaw - ego_yaw)
-                        relative_pos = get_relative_transform(ego_matrix, walker_matrix)
-                        if not lidar is None:
-                            num_in_bbox_points = self.get_lidar_points_in_bbox(relative_pos, relative_yaw, extent, lidar)
-                        else:
-                            num_in_bbox_points = -1
-
-                        distance = compute_2d_distance(npc.get_transform().location, self.manager.ego_vehicles[0].get_transform().location)
-                        result = {
-                            'class': 'walker',
-                            'id': npc_id,
-                            'location': [location.x, location.y, location.z],
-                            'rotation': [rotation.pitch, rotation.roll, rotation.yaw],
-                            'bbx_loc': [npc.bounding_box.location.x, npc.bounding_box.location.y, npc.bounding_box.location.z],
-                            'center': [center.x, center.y, center.z],
-                            'extent': [extent.x, extent.y, extent.z],
-                            'world_cord': global_verts,
-                            'semantic_tags': npc.semantic_tags,
-                            'type_id': npc.type_id,
-                            'gender': npc.attributes['gender'],
-                            'age': npc.attributes['age'],
-                            'num_points': int(num_in_bbox_points),
-                            'distance': distance,
-                            'speed': walker_speed,
-                            # 'bone': bones_3d_lines,
-                            'road_id': road_id,
-                            'lane_id': lane_id,
-                            'section_id': section_id,
-                            'world2ped': world2ped,
-                            # 'actor': npc, # for debug
-                        }
-                        results.append(result)
-                except RuntimeError:
-                    continue
+            try:
+                state = self._get_actor_state(snapshot, npc)
+            except RuntimeError:
+                continue
+            if compute_2d_distance(state[0].location, ego_location) < DIS_WALKER_SAVE:
+                npcs.append(npc)
+                states.append(state)
+        poses = self._get_box_poses([s[0] for s in states], [s[1] for s in states],
+                                    [npc.bounding_box.location for npc in npcs],
+                                    [npc.bounding_box.extent for npc in npcs], ego_matrix)
+        for i, npc in enumerate(npcs):
+            try:
+                location = states[i][0].location
+                rotation = states[i][0].rotation
+                extent = npc.bounding_box.extent
+                waypoint = carla_map.get_waypoint(location)
+                # bones_3d_lines = build_skeleton(npc, self.skeleton_links)
+                # Computes how many LiDAR hits are on a bounding box. Used to filter invisible boxes during data loading.
+                relative_yaw = normalize_angle(np.deg2rad(rotation.yaw) - ego_yaw)
+                if not lidar is None:
+                    num_in_bbox_points = self.get_lidar_points_in_bbox(poses['relative_pos'][i], relative_yaw, extent, lidar)
+                else:
+                    num_in_bbox_points = -1
+                result = {
+                    'class': 'walker',
+                    'id': str(npc.id),
+                    'location': [location.x, location.y, location.z],
+                    'rotation': [rotation.pitch, rotation.roll, rotation.yaw],
+                    'bbx_loc': [npc.bounding_box.location.x, npc.bounding_box.location.y, npc.bounding_box.location.z],
+                    'center': poses['center'][i].tolist(),
+                    'extent': [extent.x, extent.y, extent.z],
+                    'world_cord': poses['world_cord'][i].tolist(),
+                    'semantic_tags': npc.semantic_tags,
+                    'type_id': npc.type_id,
+                    'gender': npc.attributes['gender'],
+                    'age': npc.attributes['age'],
+                    'num_points': int(num_in_bbox_points),
+                    'distance': float(poses['distance'][i]),
+                    'speed': float(poses['speed'][i]),
+                    # 'bone': bones_3d_lines,
+                    'road_id': waypoint.road_id,
+                    'lane_id': waypoint.lane_id,
+                    'section_id': waypoint.section_id,
+                    'world2ped': poses['inverse_matrix'][i].tolist(),
+                    # 'actor': npc, # for debug
+                }
+                results.append(result)
+            except RuntimeError:
+                continue
         
         # traffic_light
         traffic_light = self.get_actor_filter_traffic_light()
         traffic_light_bbox = self.world.get_level_bbs(carla.CityObjectLabel.TrafficLight)
         traffic_light_bbox_nearby = []
         for light_bbox in traffic_light_bbox:
-            if compute_2d_distance(light_bbox.location, self.manager.ego_vehicles[0].get_transform().location) < (DIS_LIGHT_SAVE + 20):
+            if compute_2d_distance(light_bbox.location, ego_location) < (DIS_LIGHT_SAVE + 20):
                 traffic_light_bbox_nearby.append(light_bbox)
+        npcs, states, new_bboxes = [], [], []
         for npc in traffic_light.lights:
+            state = self._get_actor_state(snapshot, npc)
             new_bbox = None
             min_dis = 50
             for light_bbox in traffic_light_bbox_nearby:
-                dis = compute_2d_distance(npc.get_transform().location, light_bbox.location)
+                dis = compute_2d_distance(state[0].location, light_bbox.location)
                 if dis < min_dis:
                     new_bbox = light_bbox
                     min_dis = dis
             if min_dis > 20:
                 continue
             traffic_light_bbox_nearby.remove(new_bbox)
+            npcs.append(npc)
+            states.append(state)
+            new_bboxes.append(new_bbox)
+        # the trigger volumes take the place of the bounding boxes
+        poses = self._get_box_poses([s[0] for s in states], [s[1] for s in states],
+                                    [npc.trigger_volume.location for npc in npcs],
+                                    [npc.trigger_volume.extent for npc in npcs], ego_matrix)
+        for i, npc in enumerate(npcs):
+            new_bbox = new_bboxes[i]
             npc_id = str(npc.id)
             location = new_bbox.location
             rotation = new_bbox.rotation
             center = new_bbox.location
             extent = new_bbox.extent
-            road_id = CarlaDataProvider.get_map().get_waypoint(new_bbox.location).road_id
-            lane_id = CarlaDataProvider.get_map().get_waypoint(new_bbox.location).lane_id
-            section_id = CarlaDataProvider.get_map().get_waypoint(new_bbox.location).section_id
-            volume_location = npc.get_transform().transform(npc.trigger_volume.location)
+            waypoint = carla_map.get_waypoint(new_bbox.location)
             volume_rotation = carla.Rotation(pitch=(rotation.pitch + npc.trigger_volume.rotation.pitch)%360, roll=(rotation.roll + npc.trigger_volume.rotation.roll)%360, yaw=(rotation.yaw + npc.trigger_volume.rotation.yaw) % 360)
-            state = npc.state
-            distance = compute_2d_distance(npc.get_transform().location, self.manager.ego_vehicles[0].get_transform().location)
             if traffic_light.most_affect_light and str(traffic_light.most_affect_light.id) == npc_id:
                 affects_ego = True
             else:
@@ -1361,15 +1331,15 @@ class Env_Manager(object):
                 'extent': [extent.x, extent.y, extent.z],
                 'semantic_tags': npc.semantic_tags,
                 'type_id': npc.type_id,
-                'distance': distance,
-                'state': state,
+                'distance': float(poses['distance'][i]),
+                'state': npc.state,
                 'affects_ego': affects_ego,
-                'trigger_volume_location': [volume_location.x, volume_location.y, volume_location.z],
+                'trigger_volume_location': poses['center'][i].tolist(),
                 'trigger_volume_rotation': [volume_rotation.pitch, volume_rotation.roll, volume_rotation.yaw],
                 'trigger_volume_extent': [npc.trigger_volume.extent.x, npc.trigger_volume.extent.y, npc.trigger_volume.extent.z],
-                'road_id': road_id,
-                'lane_id': lane_id,
-                'section_id': section_id,
+                'road_id': waypoint.road_id,
+                'lane_id': waypoint.lane_id,
+                'section_id': waypoint.section_id,
                 # 'actor': npc, # for debug
                 # 'new_bbox': new_bbox, # for debug
             }
@@ -1380,37 +1350,46 @@ class Env_Manager(object):
         traffic_sign_bbox = self.world.get_level_bbs(carla.CityObjectLabel.TrafficSigns)
         traffic_sign_bbox_nearby = []
         for sign_bbox in traffic_sign_bbox:
-            if compute_2d_distance(sign_bbox.location, self.manager.ego_vehicles[0].get_transform().location) < (DIS_SIGN_SAVE + 20):
+            if compute_2d_distance(sign_bbox.location, ego_location) < (DIS_SIGN_SAVE + 20):
                 traffic_sign_bbox_nearby.append(sign_bbox)
 
+        npcs, states, new_bboxes = [], [], []
         for npc in traffic_sign.actors:
+            state = self._get_actor_state(snapshot, npc)
+            new_bbox = None
             if hasattr(npc, 'trigger_volume'):
-                new_bbox = None
                 min_dis = 50
                 for sign_bbox in traffic_sign_bbox_nearby:
-                    dis = compute_2d_distance(npc.get_transform().location, sign_bbox.location)
+                    dis = compute_2d_distance(state[0].location, sign_bbox.location)
                     if dis < min_dis:
                         new_bbox = sign_bbox
                         min_dis = dis
                 if min_dis > 20:
                     continue
                 traffic_sign_bbox_nearby.remove(new_bbox)
-                npc_id = str(npc.id)
-                world2sign = npc.get_transform().get_inverse_matrix()
+            npcs.append(npc)
+            states.append(state)
+            new_bboxes.append(new_bbox)
+        # the signs with a trigger volume use it in place of their bounding box
+        poses = self._get_box_poses([s[0] for s in states], [s[1] for s in states],
+                                    [npc.bounding_box.location if new_bbox is None else npc.trigger_volume.location
+                                     for npc, new_bbox in zip(npcs, new_bboxes)],
+                                    [npc.bounding_box.extent if new_bbox is None else npc.trigger_volume.extent
+                                     for npc, new_bbox in zip(npcs, new_bboxes)], ego_matrix)
+        for i, npc in enumerate(npcs):
+            npc_id = str(npc.id)
+            new_bbox = new_bboxes[i]
+            if traffic_sign.most_affect_sign and str(traffic_sign.most_affect_sign.id) == npc_id:
+                affects_ego = True
+            else:
+                affects_ego = False
+            if new_bbox is not None:
                 location = new_bbox.location
                 rotation = new_bbox.rotation
                 center = new_bbox.location
                 extent = new_bbox.extent
-                road_id = CarlaDataProvider.get_map().get_waypoint(new_bbox.location).road_id
-                lane_id = CarlaDataProvider.get_map().get_waypoint(new_bbox.location).lane_id
-                section_id = CarlaDataProvider.get_map().get_waypoint(new_bbox.location).section_id
-                volume_location = npc.get_transform().transform(npc.trigger_volume.location)
+                waypoint = carla_map.get_waypoint(new_bbox.location)
                 volume_rotation = carla.Rotation(pitch=(rotation.pitch + npc.trigger_volume.rotation.pitch)%360, roll=(rotation.roll + npc.trigger_volume.rotation.roll)%360, yaw=(rotation.yaw + npc.trigger_volume.rotation.yaw) % 360)
-                distance = compute_2d_distance(npc.get_transform().location, self.manager.ego_vehicles[0].get_transform().location)
-                if traffic_sign.most_affect_sign and str(traffic_sign.most_affect_sign.id) == npc_id:
-                    affects_ego = True
-                else:
-                    affects_ego = False
                 result = {
                     'class': 'traffic_sign',
                     'id': npc_id,
@@ -1421,61 +1400,41 @@ class Env_Manager(object):
                     # 'extent': [extent.x, 0.5, extent.z],
                     'semantic_tags': npc.semantic_tags,
                     'type_id': npc.type_id,
-                    'distance': distance,
+                    'distance': float(poses['distance'][i]),
                     'affects_ego': affects_ego,
-                    'trigger_volume_location': [volume_location.x, volume_location.y, volume_location.z],
+                    'trigger_volume_location': poses['center'][i].tolist(),
                     'trigger_volume_rotation': [volume_rotation.pitch, volume_rotation.roll, volume_rotation.yaw],
                     'trigger_volume_extent': [npc.trigger_volume.extent.x, npc.trigger_volume.extent.y, npc.trigger_volume.extent.z],
-                    'road_id': road_id,
-                    'lane_id': lane_id,
-                    'section_id': section_id,
-                    'world2sign': world2sign,
+                    'road_id': waypoint.road_id,
+                    'lane_id': waypoint.lane_id,
+                    'section_id': waypoint.section_id,
+                    'world2sign': poses['inverse_matrix'][i].tolist(),
                     # 'actor': npc, # for debug
                     # 'new_bbox': new_bbox, # for debug
                 }
             else:
-                npc_id = str(npc.id)
-                location = npc.get_transform().location
-                rotation = npc.get_transform().rotation
-                # verts = [v for v in npc.bounding_box.get_world_vertices(npc.get_transform())]
-                # center, extent = get_center_and_extent(verts)
-                # from handcraft
-                world2sign = npc.get_transform().get_inverse_matrix()
+                location = states[i][0].location
+                rotation = states[i][0].rotation
                 extent = npc.bounding_box.extent
-                center = npc.get_transform().transform(npc.bounding_box.location)
-                local_verts = calculate_cube_vertices(npc.bounding_box.location, npc.bounding_box.extent)
-                global_verts = []
-                for l_v in local_verts:
-                    g_v = npc.get_transform().transform(carla.Location(l_v[0], l_v[1], l_v[2]))
-                    global_verts.append([g_v.x, g_v.y, g_v.z])
-                road_id = CarlaDataProvider.get_map().get_waypoint(location).road_id
-                lane_id = CarlaDataProvider.get_map().get_waypoint(location).lane_id
-                section_id = CarlaDataProvider.get_map().get_waypoint(location).section_id
-                # distance = npc.get_transform().location.distance(self.manager.ego_vehicles[0].get_transform().location)
-                distance = compute_2d_distance(npc.get_transform().location, self.manager.ego_vehicles[0].get_transform().location)
-                if traffic_sign.most_affect_sign and str(traffic_sign.most_affect_sign.id) == npc_id:
-                    affects_ego = True
-                else:
-                    affects_ego = False
-
+                waypoint = carla_map.get_waypoint(location)
                 result = {
                     'class': 'traffic_sign',
                     'id': npc_id,
                     'location': [location.x, location.y, location.z],
                     'rotation': [rotation.pitch, rotation.roll, rotation.yaw],
                     'bbx_loc': [npc.bounding_box.location.x, npc.bounding_box.location.y, npc.bounding_box.location.z],
-                    'center': [center.x, center.y, center.z],
+                    'center': poses['center'][i].tolist(),
                     'extent': [extent.x, extent.y, extent.z],
-                    'world_cord': global_verts,
+                    'world_cord': poses['world_cord'][i].tolist(),
                     # 'extent': [extent.x, 0.5, extent.z],
                     'semantic_tags': npc.semantic_tags,
                     'type_id': npc.type_id,
-                    'distance': distance,
+                    'distance': float(poses['distance'][i]),
                     'affects_ego': affects_ego,
-                    'road_id': road_id,
-                    'lane_id': lane_id,
-                    'section_id': section_id,
-                    'world2sign': world2sign,
+                    'road_id': waypoint.road_id,
+                    'lane_id': waypoint.lane_id,
+                    'section_id': waypoint.section_id,
+                    'world2sign': poses['inverse_matrix'][i].tolist(),
                     # 'actor': npc, # for debug
                 }
             results.append(result)
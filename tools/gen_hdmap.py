@@ -9,8 +9,13 @@ import argparse
 import time
 import subprocess
 import json
+import multiprocessing
+import queue
+import sys
 
-import atexit,signal
+import signal
+
+from leaderboard.utils.hd_map import HDMap, HD_MAP_SUFFIX, save_hd_map
 
 
 def check_waypoints_status(waypoints_list):
@@ -332,32 +337,37 @@ class LankMarkingGettor(object):
         yaw = transform.rotation.yaw
         return ((x, y, z), (roll, pitch, yaw))
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--save_dir', default='../Bench2DriveZoo/data/drivee2e/maps/')
-    parser.add_argument('--carla_town', default='DriveE2ETown04Opt')
-
-    carla_path = os.environ["CARLA_ROOT"]
-    port = 2000
-    gpu_rank=2
-    cmd1 = f"{os.path.join(carla_path, 'CarlaUE4.sh')} -RenderOffScreen -nosound -carla-rpc-port={port} -graphicsadapter={gpu_rank}"
-    server = subprocess.Popen(cmd1, shell=True, preexec_fn=os.setsid)
-    print(cmd1, server.returncode, flush=True)
-    atexit.register(os.killpg, server.pid, signal.SIGKILL)
-    time.sleep(100)
+def start_server(carla_path, port, gpu_rank):
+    cmd = f"{os.path.join(carla_path, 'CarlaUE4.sh')} -RenderOffScreen -nosound -carla-rpc-port={port} -graphicsadapter={gpu_rank}"
+    server = subprocess.Popen(cmd, shell=True, preexec_fn=os.setsid)
+    print(cmd, flush=True)
+    return server
 
-    args = parser.parse_args()
-    
-    carla_town = args.carla_town
+def wait_for_server(server, port, timeout, poll_interval=2.0):
+    """
+    Polls the server until it answers, and returns a client of it
+    """
+    deadline = time.time() + timeout
+    while True:
+        if server.poll() is not None:
+            raise RuntimeError(f"CARLA server on port {port} exited with code {server.returncode}")
+        try:
+            client = carla.Client('localhost', port)
+            client.set_timeout(poll_interval)
+            client.get_server_version()
+            return client
+        except RuntimeError:
+            if time.time() > deadline:
+                raise RuntimeError(f"CARLA server on port {port} not ready after {timeout} s")
+            time.sleep(poll_interval)
 
-    client = carla.Client('localhost', port)
-    client.set_timeout(300)
+def extract_hd_map(client, carla_town, precision):
     world = client.load_world(carla_town)
     print("******** sucessfully load the town:", carla_town, " ********")
     carla_map = world.get_map()
 
     lane_marking_dict = {}
-    LankMarkingGettor.get_lanemarkings(world.get_map(), lane_marking_dict)
+    LankMarkingGettor.get_lanemarkings(carla_map, lane_marking_dict, precision=precision)
     print("****** get all lanemarkings ******")
     
     all_actors = world.get_actors()
@@ -373,9 +383,75 @@ if __name__ == '__main__':
     TriggerVolumeGettor.get_stop_sign_trigger_volume(all_stop_sign_actors, lane_marking_dict, carla_map)
     TriggerVolumeGettor.get_traffic_light_trigger_volume(all_traffic_light_actors, lane_marking_dict, carla_map)
     print("******* Have get all trigger volumes ! *********")
+    return HDMap.from_dict(lane_marking_dict, carla_town)
 
-    if not os.path.exists(args.save_dir):
-        os.makedirs(args.save_dir,exist_ok=True)
-    
-    arr = np.array(list(lane_marking_dict.items()), dtype=object)
-    np.savez_compressed(args.save_dir+"/"+args.carla_town+"_HD_map.npz", arr=arr)
+def run_server(rank, towns, failed, args):
+    """
+    Extracts the towns of the queue one after the other with its own CARLA server
+    """
+    port = args.port + rank * args.port_step
+    gpu_rank = args.gpu_ranks[rank % len(args.gpu_ranks)]
+    server = start_server(os.environ["CARLA_ROOT"], port, gpu_rank)
+    try:
+        client = wait_for_server(server, port, args.server_timeout)
+        client.set_timeout(args.timeout)
+        while True:
+            try:
+                carla_town = towns.get(timeout=1)
+            except queue.Empty:
+                break
+            try:
+                start = time.time()
+                hd_map = extract_hd_map(client, carla_town, args.precision)
+                save_hd_map(os.path.join(args.save_dir, carla_town + HD_MAP_SUFFIX), hd_map)
+                print(f"******** saved {carla_town}: {len(hd_map)} lines, {len(hd_map.points)} points, {time.time() - start:.0f} s ********", flush=True)
+            except Exception as e:
+                print(f"Failed to extract {carla_town}: {e}", flush=True)
+                failed.put(carla_town)
+                if server.poll() is not None:
+                    break
+    except Exception as e:
+        print(e, flush=True)
+    finally:
+        os.killpg(server.pid, signal.SIGKILL)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--save_dir', default='../Bench2DriveZoo/data/drivee2e/maps/')
+    parser.add_argument('--carla_towns', '--carla_town', nargs='+', default=['DriveE2ETown04Opt'])
+    parser.add_argument('--num_servers', type=int, default=1, help='number of CARLA servers extracting towns in parallel')
+    parser.add_argument('--port', type=int, default=2000, help='rpc port of the first server')
+    parser.add_argument('--port_step', type=int, default=10, help='port offset between the servers')
+    parser.add_argument('--gpu_ranks', type=int, nargs='+', default=[2], help='graphics adapters of the servers, used in turn')
+    parser.add_argument('--server_timeout', type=float, default=300, help='maximum time for a server to start, in seconds')
+    parser.add_argument('--timeout', type=float, default=300, help='CARLA client timeout, in seconds')
+    parser.add_argument('--precision', type=float, default=0.05, help='distance between the waypoints of the lines, in meters')
+    parser.add_argument('--overwrite', action='store_true', help='extract the towns which already have a map')
+    args = parser.parse_args()
+
+    os.makedirs(args.save_dir, exist_ok=True)
+    carla_towns = [town for town in args.carla_towns
+                   if args.overwrite or not os.path.exists(os.path.join(args.save_dir, town + HD_MAP_SUFFIX))]
+    for town in set(args.carla_towns) - set(carla_towns):
+        print(f"Skipping {town}, its map already exists", flush=True)
+
+    towns = multiprocessing.Queue()
+    for town in carla_towns:
+        towns.put(town)
+    failed = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=run_server, args=(rank, towns, failed, args))
+               for rank in range(min(args.num_servers, len(carla_towns)))]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    failed_towns = []
+    while not failed.empty():
+        failed_towns.append(failed.get())
+    # the towns left in the queue if all the servers failed
+    while not towns.empty():
+        failed_towns.append(towns.get())
+    if failed_towns:
+        print("Failed towns:", " ".join(failed_towns), flush=True)
+        sys.exit(1)
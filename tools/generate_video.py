@@ -2,10 +2,37 @@ import cv2
 import os
 import numpy as np
 import json
-from tqdm import trange
+from tqdm import tqdm, trange
+from leaderboard.utils.agent_recorder import RecordingReader, is_recording
+
+
+def get_text(meta):
+    steer = float(meta['steer'])
+    throttle = float(meta['throttle'])
+    brake = float(meta['brake'])
+    speed = float(meta['speed'])
+    return f'speed: {round(speed,2)}, steer: {round(steer,2)}, throttle: {round(throttle,2)}, brake: {round(brake,2)}'
+
+
+def create_video_from_recording(recording_folder, output_video, fps, font_scale, text_color, text_position):
+    # recordings saved with SAVE_FORMAT=mp4/mjpeg: one video per camera and one meta.jsonl line per frame
+    reader = RecordingReader(recording_folder)
+    video = None
+    for meta, img in tqdm(zip(reader.meta, reader.frames('rgb_front', rgb=False)), total=len(reader.meta)):
+        if video is None:
+            height, width = img.shape[:2]
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            video = cv2.VideoWriter(output_video, fourcc, fps, (width, height))
+        if 'speed' in meta:
+            cv2.putText(img, get_text(meta), text_position, cv2.FONT_HERSHEY_SIMPLEX, font_scale, text_color, 2, cv2.LINE_AA)
+        video.write(img)
+    if video is not None:
+        video.release()
 
 
 def create_video(images_folder, output_video, fps, font_scale, text_color, text_position):
+    if is_recording(images_folder):
+        return create_video_from_recording(images_folder, output_video, fps, font_scale, text_color, text_position)
     images = [img for img in os.listdir(os.path.join(images_folder, 'rgb_front')) if img.endswith(".jpg") or img.endswith(".png")]
     images.sort()
 
@@ -19,13 +46,9 @@ def create_video(images_folder, output_video, fps, font_scale, text_color, text_
         image = images[i]
         f = open(os.path.join(images_folder, f'meta/{i:04}.json'), 'r')
         meta = json.load(f)
-        steer = float(meta['steer'])
-        throttle = float(meta['throttle'])
-        brake = float(meta['brake'])
         # command = float(meta['command'])
         # command_list = ["VOID", "LEFT", "RIGHT", "STRAIGHT", "LANE FOLLOW", "CHANGE LANE LEFT",  "CHANGE LANE RIGHT",]
-        speed = float(meta['speed'])
-        text = f'speed: {round(speed,2)}, steer: {round(steer,2)}, throttle: {round(throttle,2)}, brake: {round(brake,2)}'#, command: {command_list[int(command)]}'
+        text = get_text(meta)#, command: {command_list[int(command)]}'
         img = cv2.imread(os.path.join(os.path.join(images_folder, 'rgb_front'), image))
         cv2.putText(img, text, text_position, cv2.FONT_HERSHEY_SIMPLEX, font_scale, text_color, 2, cv2.LINE_AA)
         video.write(img)
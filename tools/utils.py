@@ -225,4 +225,65 @@ def get_matrix(location, rotation):
     matrix[2, 0] = s_p
     matrix[2, 1] = -c_p * s_r
     matrix[2, 2] = c_p * c_r
-    return matrix
\ No newline at end of file
+    return matrix
+
+CUBE_VERTEX_SIGNS = np.array([[1, 1, 1], [1, 1, -1], [1, -1, 1], [1, -1, -1],
+                              [-1, 1, 1], [-1, 1, -1], [-1, -1, 1], [-1, -1, -1]], dtype=np.float64)
+
+def get_matrices(locations, rotations):
+    """
+    Creates the matrices of several carla transforms at once, as get_matrix does.
+    :param locations: array (N, 3) of x, y, z
+    :param rotations: array (N, 3) of pitch, roll, yaw in degrees
+    :return: ndarray (N, 4, 4)
+    """
+    locations = np.asarray(locations, dtype=np.float64).reshape(-1, 3)
+    pitch, roll, yaw = np.radians(np.asarray(rotations, dtype=np.float64).reshape(-1, 3)).T
+    c_y, s_y = np.cos(yaw), np.sin(yaw)
+    c_r, s_r = np.cos(roll), np.sin(roll)
+    c_p, s_p = np.cos(pitch), np.sin(pitch)
+    matrices = np.zeros((len(locations), 4, 4))
+    matrices[:, :3, 3] = locations
+    matrices[:, 0, 0] = c_p * c_y
+    matrices[:, 0, 1] = c_y * s_p * s_r - s_y * c_r
+    matrices[:, 0, 2] = -c_y * s_p * c_r - s_y * s_r
+    matrices[:, 1, 0] = s_y * c_p
+    matrices[:, 1, 1] = s_y * s_p * s_r + c_y * c_r
+    matrices[:, 1, 2] = -s_y * s_p * c_r + c_y * s_r
+    matrices[:, 2, 0] = s_p
+    matrices[:, 2, 1] = -c_p * s_r
+    matrices[:, 2, 2] = c_p * c_r
+    matrices[:, 3, 3] = 1.0
+    return matrices
+
+def get_inverse_matrices(matrices):
+    """
+    Inverts matrices (N, 4, 4) of carla transforms, as carla.Transform.get_inverse_matrix does.
+    """
+    rot = matrices[:, :3, :3].transpose(0, 2, 1)
+    inverse = np.zeros_like(matrices)
+    inverse[:, :3, :3] = rot
+    inverse[:, :3, 3] = -np.einsum('nij,nj->ni', rot, matrices[:, :3, 3])
+    inverse[:, 3, 3] = 1.0
+    return inverse
+
+def transform_points(matrices, points):
+    """
+    Transforms points (N, K, 3), given in the coordinate system of each of the matrices (N, 4, 4),
+    to global coordinates, as carla.Transform.transform does.
+    """
+    return np.einsum('nij,nkj->nki', matrices[:, :3, :3], points) + matrices[:, None, :3, 3]
+
+def calculate_cubes_vertices(centers, extents):
+    """
+    Vertices (N, 8, 3) of the boxes of centers (N, 3) and extents (N, 3), in the order of calculate_cube_vertices.
+    """
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+    extents = np.asarray(extents, dtype=np.float64).reshape(-1, 3)
+    return centers[:, None, :] + CUBE_VERTEX_SIGNS[None] * extents[:, None, :]
+
+def get_relative_transforms(ego_matrix, matrices):
+    """
+    Returns the positions (N, 3) of the matrices (N, 4, 4) in the ego coordinate system, as get_relative_transform does.
+    """
+    return (matrices[:, :3, 3] - ego_matrix[:3, 3]) @ ego_matrix[:3, :3]
@@ -6,400 +6,494 @@ import cv2
 import pathlib
 import random
 import laspy
+import multiprocessing
 import matplotlib.cm as cm
-from tqdm import trange
-from utils import get_image_point, point_in_canvas_wh, edges, world_to_ego, get_forward_vector, calculate_cube_vertices, draw_dashed_line, vector_angle, get_weather_id
+from tqdm import tqdm
+from leaderboard.utils.hd_map import load_hd_map
+from utils import WINDOW_WIDTH, WINDOW_HEIGHT, edges, get_forward_vector, calculate_cube_vertices, draw_dashed_line
 
-def visualize_data(file_path, map_path, save_path, vis_bbox=True,  vis_top_down=True, vis_road=True, vis_lidar_bev=True, vis_lidar_to_back_image=True, vis_lidar_to_front_image=True, vis_lidar_to_front_left_image=True):
+CAM_MAP = {
+    'CAM_FRONT': 'rgb_front',
+    'CAM_FRONT_LEFT': 'rgb_front_left',
+    'CAM_FRONT_RIGHT': 'rgb_front_right',
+    'CAM_BACK': 'rgb_back',
+    'CAM_BACK_LEFT': 'rgb_back_left',
+    'CAM_BACK_RIGHT': 'rgb_back_right',
+    'TOP_DOWN': 'rgb_top_down'
+}
+BBOX_CAMERAS = ['CAM_FRONT', 'CAM_FRONT_LEFT', 'CAM_FRONT_RIGHT', 'CAM_BACK', 'CAM_BACK_LEFT', 'CAM_BACK_RIGHT']
+LIDAR_CAMERAS = {'CAM_FRONT': 'lidar_front', 'CAM_BACK': 'lidar_back', 'CAM_FRONT_LEFT': 'lidar_front_left'}
+
+# rendered views -> their images in save_path
+OUTPUTS = {
+    'rgb_front_3d_bbox': 'camera/rgb_front_3d_bbox/{step:05}.jpg',
+    'rgb_front_left_3d_bbox': 'camera/rgb_front_left_3d_bbox/{step:05}.jpg',
+    'rgb_front_right_3d_bbox': 'camera/rgb_front_right_3d_bbox/{step:05}.jpg',
+    'rgb_back_3d_bbox': 'camera/rgb_back_3d_bbox/{step:05}.jpg',
+    'rgb_back_left_3d_bbox': 'camera/rgb_back_left_3d_bbox/{step:05}.jpg',
+    'rgb_back_right_3d_bbox': 'camera/rgb_back_right_3d_bbox/{step:05}.jpg',
+    'rgb_top_down_3d_bbox': 'camera/rgb_top_down_3d_bbox/{step:05}.jpg',
+    'rgb_front_landmark': 'camera/rgb_front_landmark/{step:05}.png',
+    'lidar_bev': 'lidar/bev/{step:05}.png',
+    'lidar_front': 'lidar/front/{step:05}_front.png',
+    'lidar_back': 'lidar/back/{step:05}_back.png',
+    'lidar_front_left': 'lidar/front_left/{step:05}_front_left.png',
+}
+
+# colors of the lane points, BGR
+WHITE_LINE_COLOR = (255, 255, 255)
+CENTER_LINE_COLOR = (0, 255, 0)
+YELLOW_LINE_COLOR = (0, 255, 255)
+
+LIDAR_BEV_RANGE = 85.0
+
+
+class MapLayer(object):
+
+    """
+    The lane lines of a town with the color each of their points is drawn with, computed once for
+    the whole map and shared by all the frames.
+    """
+
+    def __init__(self, hd_map):
+        self.hd_map = hd_map
+        self.points = hd_map.points
+        white = np.array([color == 'White' for color in hd_map.names['colors']], dtype=bool)[hd_map.line_colors]
+        center = np.array([kind == 'Center' for kind in hd_map.names['types']], dtype=bool)[hd_map.line_types]
+        line_colors = np.where(white[:, None], np.where(center[:, None], CENTER_LINE_COLOR, WHITE_LINE_COLOR), YELLOW_LINE_COLOR)
+        self.colors = np.repeat(line_colors.reshape(-1, 3).astype(np.uint8), np.diff(hd_map.line_offsets), axis=0)
+        self._topology = {}
+
+    def lane_points(self, lanes):
+        """Returns the points (N, 3) of the lines of the (road id, lane id) lanes and their colors (N, 3)"""
+        points, colors = [], []
+        for road_id, lane_id in lanes:
+            lines = self.hd_map.lane_lines(road_id, lane_id)
+            start, end = self.hd_map.line_offsets[lines.start], self.hd_map.line_offsets[lines.stop]
+            points.append(self.points[start:end])
+            colors.append(self.colors[start:end])
+        return np.concatenate(points).reshape(-1, 3), np.concatenate(colors).reshape(-1, 3)
+
+    def lane_topology(self, road_id, lane_id):
+        """Returns the (road id, lane id) connected to the lines of a lane"""
+        key = (road_id, lane_id)
+        if key not in self._topology:
+            all_road_topology = set()
+            for line in self.hd_map.lane_lines(road_id, lane_id):
+                for r_t in self.hd_map.line_topology(line):
+                    all_road_topology.add(r_t)
+            self._topology[key] = list(all_road_topology)
+        return self._topology[key]
+
+
+class BlendCanvas(object):
+
+    """
+    Image of the top down view, on which each polygon used to be blended with
+    cv2.addWeighted(img, 1.0, layer, alpha, 1) of a layer as large as the image.
+    The blends only add to the pixels (the gamma of 1 brightens the whole image
+    each time), so they are accumulated in an int32 image over the polygon only,
+    plus an offset for the whole image, and saturated once at the end. The lines
+    and texts drawn between the blends are drawn as they were on the blended image.
+    """
+
+    def __init__(self, img):
+        self.img = img.astype(np.int32)
+        self.offset = 0
+        self._mask = np.zeros(img.shape[:2], dtype=np.uint8)
+
+    def fill(self, points, color, alpha):
+        self.offset += 1
+        points = np.round(points).astype(np.int32)
+        height, width = self.img.shape[:2]
+        x0, y0 = np.maximum(points.min(axis=0), 0)
+        x1, y1 = np.minimum(points.max(axis=0) + 1, (width, height))
+        if x0 >= x1 or y0 >= y1:
+            return
+        mask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        cv2.fillConvexPoly(mask, points - np.array([x0, y0], dtype=np.int32), 1)
+        self.img[y0:y1, x0:x1][mask.astype(bool)] += np.rint(np.asarray(color[:3]) * alpha).astype(np.int32)
+
+    def line(self, p1, p2, color, thickness):
+        cv2.line(self._mask, p1, p2, 1, thickness)
+        self._paint(color)
+
+    def text(self, text, org, color):
+        # putText may blend the text with the pixels, it draws on them as they are at this point
+        (w, h), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_COMPLEX, 0.5, 1)
+        height, width = self.img.shape[:2]
+        x0, y0 = max(org[0] - h, 0), max(org[1] - 2 * h, 0)
+        x1, y1 = min(org[0] + w + h, width), min(org[1] + baseline + h, height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        roi = np.clip(self.img[y0:y1, x0:x1] + self.offset, 0, 255).astype(np.uint8)
+        cv2.putText(roi, text, (org[0] - x0, org[1] - y0), cv2.FONT_HERSHEY_COMPLEX, 0.5, color, 1)
+        self.img[y0:y1, x0:x1] = roi.astype(np.int32) - self.offset
+
+    def _paint(self, color):
+        pixels = cv2.findNonZero(self._mask)
+        if pixels is None:
+            return
+        xs, ys = pixels.reshape(-1, 2).T
+        self.img[ys, xs] = np.asarray(color[:3]) - self.offset
+        self._mask[ys, xs] = 0
+
+    def result(self):
+        return np.clip(self.img + self.offset, 0, 255).astype(np.uint8)
+
+
+def project_points(points, K, world2cam):
+    """
+    Projects points (..., 3) on one or several cameras (K (..., 3, 3), world2cam (..., 4, 4)), as
+    get_image_point does for one point and one camera.
+    Returns the image points (cameras..., points..., 2) and their depths (cameras..., points...)
+    """
+    points = np.asarray(points, dtype=np.float64)
+    K = np.asarray(K, dtype=np.float64)
+    world2cam = np.asarray(world2cam, dtype=np.float64)
+    point_camera = points.reshape(-1, 3) @ np.swapaxes(world2cam[..., :3, :3], -1, -2) + world2cam[..., None, :3, 3]
+    # From UE4's coordinate system to an "standard" (x, y ,z) -> (y, -z, x)
+    point_camera = np.stack([point_camera[..., 1], -point_camera[..., 2], point_camera[..., 0]], axis=-1)
+    point_img = point_camera @ np.swapaxes(K, -1, -2)
+    shape = K.shape[:-2] + points.shape[:-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        point_img = point_img[..., :2] / point_img[..., 2:]
+    return point_img.reshape(shape + (2,)), point_camera[..., 2].reshape(shape)
+
+
+def in_canvas(points):
+    """Vectorized point_in_canvas_wh"""
+    return (points[..., 0] >= 0) & (points[..., 0] < WINDOW_WIDTH) & (points[..., 1] >= 0) & (points[..., 1] < WINDOW_HEIGHT)
+
+
+def draw_points(img, points, colors, radius):
+    """
+    Draws the points (N, 2) as filled circles, in order. The points on the same pixel as a later
+    point are skipped, the later circle covers them.
+    """
+    if not len(points):
+        return
+    pixels = points.astype(np.int64)
+    _, last = np.unique(pixels[::-1], axis=0, return_index=True)
+    keep = np.sort(len(pixels) - 1 - last)
+    for (x, y), color in zip(pixels[keep].tolist(), np.asarray(colors)[keep].tolist()):
+        cv2.circle(img, (x, y), radius=radius, color=tuple(color), thickness=-1)
+
+
+def draw_lanes(img, map_layer, lanes, K, world2cam):
+    points, colors = map_layer.lane_points(lanes)
+    points_img, depth = project_points(points, K, world2cam)
+    visible = (depth > 0) & in_canvas(points_img)
+    draw_points(img, points_img[visible], colors[visible], 1)
+
+
+def get_camera_boxes(bounding_boxes):
+    """
+    Returns the boxes drawn on the cameras with their vertices (8, 3). The extent of the traffic
+    signs is set to 0.5 on the way, which the top down view then also uses.
+    """
+    ego_z = bounding_boxes[0]['location'][2]
+    boxes = []
+    for npc in bounding_boxes:
+        if npc['class'] == 'ego_vehicle': continue
+        if npc['distance'] > 75: continue
+        if abs(npc['location'][2] - ego_z) > 10: continue # car in sky and underground
+        if 'vehicle' in npc['class']: # vehicle
+            verts = npc['world_cord']
+        else: # sign, light, pedestrians
+            if npc['class'] == 'traffic_sign':
+                npc['extent'][1] = 0.5 # traffic_sign origin y is too small
+            if 'world_cord' in npc.keys():
+                if 'dirtdebris' in npc['type_id']:
+                    local_verts = calculate_cube_vertices(npc['bbx_loc'], [npc['extent'][1], npc['extent'][0], npc['extent'][2]])
+                    local_verts = np.concatenate([np.array(local_verts), np.ones((8, 1))], axis=1)
+                    verts = (np.linalg.inv(np.array(npc['world2sign'])) @ local_verts.T).T[:, :3]
+                else:
+                    verts = npc['world_cord']
+            else:
+                verts = calculate_cube_vertices(npc['center'], npc['extent'])
+        boxes.append((npc, np.asarray(verts, dtype=np.float64)))
+    return boxes
+
+
+def draw_camera_boxes(images, sensors_anno, boxes, rng):
+    """Draws the boxes on the images of the BBOX_CAMERAS, projected on all the cameras at once"""
+    if not boxes:
+        return
+    verts = np.stack([verts for _, verts in boxes])
+    locations = np.array([npc['location'] for npc, _ in boxes], dtype=np.float64)
+    K = np.stack([sensors_anno[key]['intrinsic'] for key in BBOX_CAMERAS])
+    world2cam = np.stack([sensors_anno[key]['world2cam'] for key in BBOX_CAMERAS])
+    points_img, _ = project_points(verts, K, world2cam)
+
+    # the boxes in front of each camera
+    forward_vec = np.stack([get_forward_vector(sensors_anno[key]['rotation'][2]) for key in BBOX_CAMERAS])
+    ray = locations[None] - np.array([sensors_anno[key]['location'] for key in BBOX_CAMERAS], dtype=np.float64)[:, None]
+    dot = np.einsum('ci,cni->cn', forward_vec, ray)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos_theta = dot / (np.linalg.norm(forward_vec, axis=-1)[:, None] * np.linalg.norm(ray, axis=-1))
+        visible = (dot > 1) & (np.degrees(np.arccos(cos_theta)) < 45)
+
+    for c, key in enumerate(BBOX_CAMERAS):
+        visulize_img = images[key]
+        for n, (npc, _) in enumerate(boxes):
+            if 'vehicle' in npc['class']:
+                color = (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255))
+                text = npc['class'] + npc['id']
+            else:
+                if str(npc.get('affects_ego')) == 'True':
+                    color = (0, 0, 255)
+                else:
+                    color = (255, 255, 255)
+                text = npc['class']
+            if not visible[c, n]:
+                continue
+            for edge in edges:
+                p1, p2 = points_img[c, n, edge[0]], points_img[c, n, edge[1]]
+                draw_dashed_line(visulize_img, (int(p1[0]),int(p1[1])), (int(p2[0]),int(p2[1])), color, 2)
+            cv2.putText(visulize_img, text, (int(p1[0])+2,int(p1[1])+2), cv2.FONT_HERSHEY_COMPLEX, 0.5, color, 1)
+
+
+def draw_top_down(visulize_img, bounding_boxes, K, world2cam, map_layer):
+    ego = bounding_boxes[0]
+    # draw lane
+    draw_lanes(visulize_img, map_layer, [(ego['road_id'], ego['lane_id'])], K, world2cam)
+
+    canvas = BlendCanvas(visulize_img)
+    npcs = [npc for npc in bounding_boxes if abs(npc['location'][2] - ego['location'][2]) <= 10] # car in sky and underground
+    # draw vehicle
+    vehicles = [npc for npc in npcs if 'vehicle' in npc['class']]
+    if vehicles:
+        # corners 0, 2, 6, 4 of the boxes
+        points_img, _ = project_points(np.array([npc['world_cord'] for npc in vehicles])[:, [0, 2, 6, 4]], K, world2cam)
+        for npc, points in zip(vehicles, points_img):
+            if npc['class'] == 'ego_vehicle':
+                canvas.fill(points, (255, 255, 255, 255), 1)
+                canvas.text(npc['class'], (int(points[0][0])+2,int(points[0][1])+2), (0,0,0))
+            else:
+                canvas.fill(points, (255, 0, 0, 255), 0.25)
+                canvas.text(npc['class'], (int(points[0][0])+2,int(points[0][1])+2), (255, 0, 0, 255))
+    # draw sign
+    for npc in npcs:
+        # traffic_sign
+        if 'traffic_sign' in npc['class']:
+            color = (0, 0, 255, 255)
+            if 'world_cord' in npc.keys():
+                verts = np.array(npc['world_cord'])
+            else:
+                verts = np.array(calculate_cube_vertices(npc['center'], npc['extent']))
+            points, _ = project_points(verts[[0, 2, 6, 4]], K, world2cam)
+            canvas.fill(points, color, 0.25)
+            canvas.text(npc['class'], (int(points[0][0])+2,int(points[0][1])+2), color)
+        # traffic_light
+        if 'traffic_light' in npc['class']:
+            color = (255, 0, 0)
+            points, _ = project_points(calculate_cube_vertices(npc['center'], npc['extent']), K, world2cam)
+            for edge in edges:
+                p1, p2 = points[edge[0]], points[edge[1]]
+                canvas.line((int(p1[0]),int(p1[1])), (int(p2[0]),int(p2[1])), color, 2)
+            canvas.text('traffic_light', (int(p1[0])+2,int(p1[1])+2), color)
+    return canvas.result()
+
+
+def draw_road(sensors_anno, ego, map_layer):
+    key = 'CAM_FRONT'
+    road_seg = np.zeros((900, 1600, 3), dtype=np.uint8)
+    # draw current road, then the road topology
+    lanes = [(ego['road_id'], ego['lane_id'])] + map_layer.lane_topology(ego['road_id'], ego['lane_id'])
+    draw_lanes(road_seg, map_layer, lanes, sensors_anno[key]['intrinsic'], sensors_anno[key]['world2cam'])
+    return road_seg
+
+
+def draw_lidar_bev(lidars, bounding_boxes):
+    lidar_image = np.zeros((900, 1600, 3), dtype=np.uint8)
+    header = laspy.LasHeader(point_format=0)  # LARS point format used for storing
+    header.offsets = np.min(lidars, axis=0)
+    point_precision = 0.001
+    header.scales = np.array([point_precision, point_precision, point_precision])
+    point_record = laspy.ScaleAwarePointRecord.zeros(lidars.shape[0], header=header)
+
+    # (x, y,z) -> (y, -x, z), the x,y plane of the lidar system is different from that of the ego-car
+    point_record.x = lidars[:, 1]
+    point_record.y = - lidars[:, 0]
+    point_record.z = lidars[:, 2]
+
+    # Convert normalized coordinates to image pixel index
+    x_pixels = (np.asarray(point_record.x) + LIDAR_BEV_RANGE) / (2 * LIDAR_BEV_RANGE) * (lidar_image.shape[1] - 1)
+    y_pixels = (np.asarray(point_record.y) + LIDAR_BEV_RANGE) / (2 * LIDAR_BEV_RANGE) * (lidar_image.shape[0] - 1)
+    pixels = np.stack([x_pixels, y_pixels], axis=-1)
+    draw_points(lidar_image, pixels, np.full((len(pixels), 3), 255), 2)
+
+    ego = bounding_boxes[0]
+    vehicles = [npc for npc in bounding_boxes if npc['class'] in ['vehicle', 'ego_vehicle']
+                and abs(npc['location'][2] - ego['location'][2]) <= 10] # car in sky and underground
+    if not vehicles:
+        return lidar_image
+    # world_to_ego of all the vertices
+    verts = np.array([npc['world_cord'] for npc in vehicles], dtype=np.float64)
+    world2ego = np.array(ego['world2ego'], dtype=np.float64)
+    verts = verts @ world2ego[:3, :3].T + world2ego[:3, 3]
+    verts = np.stack([verts[..., 1], -verts[..., 0]], axis=-1)
+    verts = (verts + LIDAR_BEV_RANGE) / (2 * LIDAR_BEV_RANGE) * (np.array([lidar_image.shape[1], lidar_image.shape[0]]) - 1)
+    for npc, points in zip(vehicles, verts.tolist()):
+        if npc['class'] == 'ego_vehicle':
+            color = (0, 255, 0)
+        else:
+            color = (0, 128, 255)
+        for edge in edges:
+            p1, p2 = points[edge[0]], points[edge[1]]
+            cv2.line(lidar_image, (int(p1[0]), int(p1[1])), (int(p2[0]), int(p2[1])), color, 2)
+    return lidar_image
+
+
+def draw_lidar_on_image(visulize_img, lidars, K, cam2ego):
+    # lidar in ego coordinate
+    ego2cam = np.linalg.inv(np.array(cam2ego, dtype=np.float64))
+    points_img, depth = project_points(lidars, K, ego2cam)
+    visible = (depth > 0) & in_canvas(points_img)
+    color_scale = depth[visible] / 80
+    colors = cm.rainbow(color_scale)
+    # min(depth / 80, 1) used to be the int 1 beyond 80m, which the colormap takes as the index of its second color
+    colors[color_scale > 1] = cm.rainbow(1)
+    colors = (colors[:, :3] * 255).astype(np.int64)
+    draw_points(visulize_img, points_img[visible], colors, 2)
+
+
+def render_frame(file_path, step, map_layer, vis_bbox=True, vis_top_down=True, vis_road=True, vis_lidar_bev=True, vis_lidar_to_back_image=True, vis_lidar_to_front_image=True, vis_lidar_to_front_left_image=True):
+    """Returns the rendered views of a step, see OUTPUTS"""
+    with gzip.open(os.path.join(file_path, f'anno/{step:05}.json.gz'), 'rt', encoding='utf-8') as gz_file:
+        anno = json.load(gz_file)
+    bounding_boxes = anno['bounding_boxes']
+    sensors_anno = anno['sensors']
+    outputs = {}
+
+    images = {}
+    def read_image(key):
+        if key not in images:
+            images[key] = cv2.imread(os.path.join(file_path, f'camera/{CAM_MAP[key]}/{step:05}.jpg'))
+        return images[key].copy()
+
+    if vis_bbox:
+        camera_images = {key: read_image(key) for key in BBOX_CAMERAS}
+        # the random colors of the vehicles are the same whichever worker renders the step
+        draw_camera_boxes(camera_images, sensors_anno, get_camera_boxes(bounding_boxes), random.Random(step))
+        for key in BBOX_CAMERAS:
+            outputs[f'{CAM_MAP[key]}_3d_bbox'] = camera_images[key]
+
+    if vis_top_down:
+        key = 'TOP_DOWN'
+        outputs[f'{CAM_MAP[key]}_3d_bbox'] = draw_top_down(read_image(key), bounding_boxes, sensors_anno[key]['intrinsic'],
+                                                            sensors_anno[key]['world2cam'], map_layer)
+
+    if vis_road:
+        outputs['rgb_front_landmark'] = draw_road(sensors_anno, bounding_boxes[0], map_layer)
+
+    lidar_cameras = [key for key, enabled in [('CAM_FRONT', vis_lidar_to_front_image), ('CAM_BACK', vis_lidar_to_back_image),
+                                              ('CAM_FRONT_LEFT', vis_lidar_to_front_left_image)] if enabled]
+    if vis_lidar_bev or lidar_cameras:
+        lidars = np.asarray(laspy.read(os.path.join(file_path, f'lidar/{step:05}.laz')).xyz)
+        if vis_lidar_bev:
+            outputs['lidar_bev'] = draw_lidar_bev(lidars, bounding_boxes)
+        for key in lidar_cameras:
+            visulize_img = read_image(key)
+            draw_lidar_on_image(visulize_img, lidars, sensors_anno[key]['intrinsic'], sensors_anno[key]['cam2ego'])
+            outputs[LIDAR_CAMERAS[key]] = visulize_img
+    return outputs
+
+
+def parse_frames(frames, frame_count):
+    """
+    Returns the steps selected by frames, comma separated steps or start:end ranges (end excluded,
+    both optional), e.g. '0:100,150,200:'. All the steps if frames is None.
+    """
+    if frames is None:
+        return list(range(frame_count))
+    steps = set()
+    for part in frames.split(','):
+        part = part.strip()
+        if ':' in part:
+            start, end = part.split(':')
+            steps.update(range(int(start) if start else 0, int(end) if end else frame_count))
+        elif part:
+            steps.add(int(part))
+    return sorted(step for step in steps if 0 <= step < frame_count)
+
+
+_worker = {}
+
+def _init_worker(file_path, map_path, save_path, options):
+    # the map layer is built once per worker, for all the frames
+    _worker['file_path'] = file_path
+    _worker['map_layer'] = MapLayer(load_hd_map(map_path))
+    _worker['save_path'] = save_path
+    _worker['options'] = options
+
+
+def _render_step(step):
+    """Renders a step, writes its views in save_path, or returns them if save_path is None"""
+    outputs = render_frame(_worker['file_path'], step, _worker['map_layer'], **_worker['options'])
+    if _worker['save_path'] is None:
+        return step, outputs
+    for view, img in outputs.items():
+        cv2.imwrite(os.path.join(_worker['save_path'], OUTPUTS[view].format(step=step)), img)
+    return step, None
+
+
+def visualize_data(file_path, map_path, save_path, vis_bbox=True,  vis_top_down=True, vis_road=True, vis_lidar_bev=True, vis_lidar_to_back_image=True, vis_lidar_to_front_image=True, vis_lidar_to_front_left_image=True,
+                   frames=None, num_workers=None, video=False, fps=10):
+    """
+    Renders the views of the steps of a clip, over a pool of num_workers processes (all the cpus by
+    default, 0 renders in this process). The views are saved as images in save_path, or as one mp4
+    video per view if video is set. frames selects the steps to render, see parse_frames.
+    """
     print(f'file_path={file_path}')
     print(f'map_path={map_path}')
 
     # save_path = pathlib.Path(file_path.replace('v0','v0-vis'))
     save_path = pathlib.Path(save_path)
-    (save_path / 'camera' / 'rgb_front_3d_bbox').mkdir(parents=True, exist_ok=True)
-    (save_path / 'camera' / 'rgb_front_landmark').mkdir(parents=True, exist_ok=True)
-    (save_path / 'camera' / 'rgb_front_left_3d_bbox').mkdir(parents=True, exist_ok=True)
-    (save_path / 'camera' / 'rgb_front_right_3d_bbox').mkdir(parents=True, exist_ok=True)
-    (save_path / 'camera' / 'rgb_back_3d_bbox').mkdir(parents=True, exist_ok=True)
-    (save_path / 'camera' / 'rgb_back_left_3d_bbox').mkdir(parents=True, exist_ok=True)
-    (save_path / 'camera' / 'rgb_back_right_3d_bbox').mkdir(parents=True, exist_ok=True)
-    (save_path / 'camera' / 'rgb_top_down_3d_bbox').mkdir(parents=True, exist_ok=True)
-    (save_path / 'lidar'  / 'bev').mkdir(parents=True, exist_ok=True)
-    (save_path / 'lidar'  / 'front').mkdir(parents=True, exist_ok=True)
-    (save_path / 'lidar'  / 'front_left').mkdir(parents=True, exist_ok=True)
-    (save_path / 'lidar'  / 'back').mkdir(parents=True, exist_ok=True)
-
-    cam_map = {
-        'CAM_FRONT': 'rgb_front',
-        'CAM_FRONT_LEFT': 'rgb_front_left',
-        'CAM_FRONT_RIGHT': 'rgb_front_right',
-        'CAM_BACK': 'rgb_back', 
-        'CAM_BACK_LEFT': 'rgb_back_left', 
-        'CAM_BACK_RIGHT': 'rgb_back_right',
-        'TOP_DOWN': 'rgb_top_down'
-    }
+    if video:
+        save_path.mkdir(parents=True, exist_ok=True)
+    else:
+        for output in OUTPUTS.values():
+            (save_path / output).parent.mkdir(parents=True, exist_ok=True)
 
     folder_path = os.path.join(file_path, 'anno')
     file_count = len([name for name in os.listdir(folder_path) if os.path.isfile(os.path.join(folder_path, name))])
-    map_info = dict(np.load(map_path, allow_pickle=True)['arr'])
-
     #DriveE2E
-    # for step in trange(1,file_count+1):
-    for step in trange(0,file_count):
-        with gzip.open(os.path.join(file_path, f'anno/{step:05}.json.gz'), 'rt', encoding='utf-8') as gz_file:
-            anno = json.load(gz_file)
-        # weather_id = get_weather_id(anno['weather'])
-        bounding_boxes = anno['bounding_boxes']
-        sensors_anno = anno['sensors']
-        # ========================== bbox ==========================
-        if vis_bbox:            
-            for key in ['CAM_FRONT','CAM_FRONT_LEFT','CAM_FRONT_RIGHT','CAM_BACK', 'CAM_BACK_LEFT', 'CAM_BACK_RIGHT']:
-                K = sensors_anno[key]['intrinsic']
-                world2cam = sensors_anno[key]['world2cam']
-                visulize_img = cv2.imread(os.path.join(file_path, f'camera/{cam_map[key]}/{step:05}.jpg'))
-                for npc in bounding_boxes:
-                    if npc['class'] == 'ego_vehicle': continue
-                    if npc['distance'] > 75: continue
-                    if abs(npc['location'][2] - anno['bounding_boxes'][0]['location'][2]) > 10: continue # car in sky and underground
-                    if 'vehicle' in npc['class']: # vehicle
-                        forward_vec = get_forward_vector(sensors_anno[key]['rotation'][2])
-                        ray = np.array(npc['location']) - np.array(sensors_anno[key]['location'])
-                        color = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
-                        if forward_vec.dot(ray) > 1 and vector_angle(forward_vec, ray)<45:
-                            verts = np.array(npc['world_cord'])
-                            for edge in edges:
-                                p1, p1_depth = get_image_point(verts[edge[0]], K, world2cam)
-                                p2, p2_depth = get_image_point(verts[edge[1]],  K, world2cam)
-                                draw_dashed_line(visulize_img, (int(p1[0]),int(p1[1])), (int(p2[0]),int(p2[1])), color, 2)
-                            cv2.putText(visulize_img, npc['class']+npc['id'], (int(p1[0])+2,int(p1[1])+2), cv2.FONT_HERSHEY_COMPLEX, 0.5, color, 1)
-                    else: # sign, light, pedestrians
-                        if npc['class'] == 'traffic_sign': 
-                            npc['extent'][1] = 0.5 # traffic_sign origin y is too small
-                        
-                        forward_vec = get_forward_vector(sensors_anno[key]['rotation'][2])
-                        ray = np.array(npc['location']) - np.array(sensors_anno[key]['location'])
-                        if 'affects_ego' in npc.keys() and str(npc['affects_ego']) == 'True':
-                            color = (0, 0, 255)
-                        else:
-                            color = (255, 255, 255)
-                        if forward_vec.dot(ray) > 1 and vector_angle(forward_vec, ray)<45:
-                            if 'world_cord' in npc.keys():
-                                if 'dirtdebris' in npc['type_id']:
-                                    local_verts = calculate_cube_vertices(npc['bbx_loc'], [npc['extent'][1], npc['extent'][0], npc['extent'][2]])
-                                    verts = []
-                                    for l_v in local_verts:
-                                        g_v = np.dot(np.matrix(npc['world2sign']).I, [l_v[0], l_v[1], l_v[2],1])
-                                        verts.append(g_v.tolist()[0][:-1])
-                                else:
-                                    verts = np.array(npc['world_cord'])
-                            else:
-                                verts = calculate_cube_vertices(npc['center'], npc['extent'])
-                            for edge in edges:
-                                p1, p1_depth = get_image_point(verts[edge[0]], K, world2cam)
-                                p2, p2_depth = get_image_point(verts[edge[1]],  K, world2cam)
-                                draw_dashed_line(visulize_img, (int(p1[0]),int(p1[1])), (int(p2[0]),int(p2[1])), color, 2)
-                            if 'affects_ego' in npc.keys():
-                                cv2.putText(visulize_img, npc['class'], (int(p1[0])+2,int(p1[1])+2), cv2.FONT_HERSHEY_COMPLEX, 0.5, color, 1)
-                            else:
-                                cv2.putText(visulize_img, npc['class'], (int(p1[0])+2,int(p1[1])+2), cv2.FONT_HERSHEY_COMPLEX, 0.5, color, 1)
-                cv2.imwrite(os.path.join(save_path, f'camera/{cam_map[key]}_3d_bbox/{step:05}.jpg'), visulize_img)
-        
-        if vis_top_down:        
-            for key in ['TOP_DOWN']:
-                K = sensors_anno[key]['intrinsic']
-                world2cam = sensors_anno[key]['world2cam']
-                visulize_img = cv2.imread(os.path.join(file_path, f'camera/{cam_map[key]}/{step:05}.jpg'))
-                road_points = map_info[anno['bounding_boxes'][0]['road_id']]
-                # draw lane
-                for r_p in road_points[anno['bounding_boxes'][0]['lane_id']]:
-                    road_point = r_p['Points']
-                    road_type = r_p['Type']
-                    road_color = r_p['Color']
-                    road_topology = r_p['Topology']
-                    for point in road_point:
-                        point = np.array([point[0][0], point[0][1], point[0][2], 1])
-                        point_camera = np.dot(world2cam, point)
-                        point_camera = [point_camera[1], -point_camera[2], point_camera[0]]
-                        depth = point_camera[2]
-                        point_img = np.dot(K, point_camera)
-                        if depth >0:
-                            point_img[0] /= point_img[2]
-                            point_img[1] /= point_img[2]
-                            point_img = point_img[0:2]
-                            if point_in_canvas_wh(point_img):
-                                if road_color == 'White':
-                                    cv2.circle(visulize_img, (int(point_img[0]), int(point_img[1])), radius=1, color=(255, 255, 255), thickness=-1)
-                                    if road_type == 'Center':
-                                        cv2.circle(visulize_img, (int(point_img[0]), int(point_img[1])), radius=1, color=(0, 255, 0), thickness=-1)
-                                else:
-                                    cv2.circle(visulize_img, (int(point_img[0]), int(point_img[1])), radius=1, color=(0, 255, 255), thickness=-1)                      
-                # draw vehicle
-                for npc in bounding_boxes:
-                    if 'vehicle' in npc['class']:
-                        if abs(npc['location'][2] - anno['bounding_boxes'][0]['location'][2]) > 10: continue # car in sky and underground
-                        if npc['class'] == 'ego_vehicle':
-                            color = (255, 255, 255, 255)
-                        else:
-                            color = (255, 0, 0, 255)
-                        verts = np.array(npc['world_cord'])
-                        p1, p1_depth = get_image_point(verts[0], K, world2cam)
-                        p2, p2_depth = get_image_point(verts[2],  K, world2cam)
-                        p3, p3_depth = get_image_point(verts[4],  K, world2cam)
-                        p4, p4_depth = get_image_point(verts[6],  K, world2cam)
-                        points = np.array([p1, p2, p4, p3])
-                        height, width = visulize_img.shape[:2]
-                        blk = np.zeros((height, width, 4), np.uint8)
-                        cv2.fillConvexPoly(blk, np.round(points).astype(np.int32), color)
-                        if npc['class'] == 'ego_vehicle':
-                            visulize_img = cv2.addWeighted(visulize_img, 1.0, blk[:,:,:3], 1, 1)
-                        else:
-                            visulize_img = cv2.addWeighted(visulize_img, 1.0, blk[:,:,:3], 0.25, 1)
-                        if npc['class'] == 'ego_vehicle':
-                            cv2.putText(visulize_img, npc['class'], (int(p1[0])+2,int(p1[1])+2), cv2.FONT_HERSHEY_COMPLEX, 0.5, (0,0,0), 1)
-                        else:
-                            cv2.putText(visulize_img, npc['class'], (int(p1[0])+2,int(p1[1])+2), cv2.FONT_HERSHEY_COMPLEX, 0.5, color, 1)
-                # draw sign
-                for npc in bounding_boxes:
-                    if abs(npc['location'][2] - anno['bounding_boxes'][0]['location'][2]) > 10: continue # car in sky and underground
-                    # traffic_sign
-                    if 'traffic_sign' in npc['class']:
-                        color = (0, 0, 255, 255)
-                        if 'world_cord' in npc.keys():
-                            verts = np.array(npc['world_cord'])
-                        else:
-                            verts = calculate_cube_vertices(npc['center'], npc['extent'])
-                        p1, p1_depth = get_image_point(verts[0], K, world2cam)
-                        p2, p2_depth = get_image_point(verts[2],  K, world2cam)
-                        p3, p3_depth = get_image_point(verts[4],  K, world2cam)
-                        p4, p4_depth = get_image_point(verts[6],  K, world2cam)
-                        points = np.array([p1, p2, p4, p3])
-                        height, width = visulize_img.shape[:2]
-                        blk = np.zeros((height, width, 4), np.uint8)
-                        cv2.fillConvexPoly(blk, np.round(points).astype(np.int32), color)
-                        visulize_img = cv2.addWeighted(visulize_img, 1.0, blk[:,:,:3], 0.25, 1)
-                        cv2.putText(visulize_img, npc['class'], (int(p1[0])+2,int(p1[1])+2), cv2.FONT_HERSHEY_COMPLEX, 0.5, color, 1)
-                    # traffic_light
-                    if 'traffic_light' in npc['class']:
-                        color = (255, 0, 0)
-                        verts = calculate_cube_vertices(npc['center'], npc['extent'])
-                        for edge in edges:
-                            p1, p1_depth = get_image_point(verts[edge[0]], K, world2cam)
-                            p2, p2_depth = get_image_point(verts[edge[1]],  K, world2cam)
-                            cv2.line(visulize_img, (int(p1[0]),int(p1[1])), (int(p2[0]),int(p2[1])), color, 2)
-                        cv2.putText(visulize_img, 'traffic_light', (int(p1[0])+2,int(p1[1])+2), cv2.FONT_HERSHEY_COMPLEX, 0.5, color, 1)
-                cv2.imwrite(os.path.join(save_path, f'camera/{cam_map[key]}_3d_bbox/{step:05}.jpg'), visulize_img)
-        # ==========================================================
-
-        # ========================== road ==========================
-        if vis_road:
-            key = 'CAM_FRONT'
-            K = sensors_anno[key]['intrinsic']
-            world2cam = sensors_anno[key]['world2cam']
-            road_points = map_info[anno['bounding_boxes'][0]['road_id']]
-            road_seg = np.zeros((900, 1600, 3), dtype=np.uint8)
-            all_road_topology = set()
-            # draw current road
-            for r_p in road_points[anno['bounding_boxes'][0]['lane_id']]:
-                road_point = r_p['Points']
-                road_type = r_p['Type']
-                road_color = r_p['Color']
-                road_topology = r_p['Topology']
-                for r_t in road_topology:
-                    all_road_topology.add(r_t)
-                for point in road_point:
-                    point = np.array([point[0][0], point[0][1], point[0][2], 1])
-                    point_camera = np.dot(world2cam, point)
-                    point_camera = [point_camera[1], -point_camera[2], point_camera[0]]
-                    depth = point_camera[2]
-                    point_img = np.dot(K, point_camera)
-                    if depth >0:
-                        point_img[0] /= point_img[2]
-                        point_img[1] /= point_img[2]
-                        point_img = point_img[0:2]
-                        if point_in_canvas_wh(point_img):
-                            if road_color == 'White':
-                                cv2.circle(road_seg, (int(point_img[0]), int(point_img[1])), radius=1, color=(255, 255, 255), thickness=-1)
-                                if road_type == 'Center':
-                                    cv2.circle(road_seg, (int(point_img[0]), int(point_img[1])), radius=1, color=(0, 255, 0), thickness=-1)
-                            else:
-                                cv2.circle(road_seg, (int(point_img[0]), int(point_img[1])), radius=1, color=(0, 255, 255), thickness=-1)
-            # draw road topology
-            for r_t in all_road_topology:
-                road_points = map_info[r_t[0]][r_t[1]]
-                for r_p in road_points:
-                    road_point = r_p['Points']
-                    road_type = r_p['Type']
-                    road_color = r_p['Color']
-                    road_topology = r_p['Topology']
-                    for point in road_point:
-                        point = np.array([point[0][0], point[0][1], point[0][2], 1])
-                        point_camera = np.dot(world2cam, point)
-                        point_camera = [point_camera[1], -point_camera[2], point_camera[0]]
-                        depth = point_camera[2]
-                        point_img = np.dot(K, point_camera)
-                        if depth >0:
-                            point_img[0] /= point_img[2]
-                            point_img[1] /= point_img[2]
-                            point_img = point_img[0:2]
-                            if point_in_canvas_wh(point_img):
-                                if road_color == 'White':
-                                    cv2.circle(road_seg, (int(point_img[0]), int(point_img[1])), radius=1, color=(255, 255, 255), thickness=-1)
-                                    if road_type == 'Center':
-                                        cv2.circle(road_seg, (int(point_img[0]), int(point_img[1])), radius=1, color=(0, 255, 0), thickness=-1)
-                                else:
-                                    cv2.circle(road_seg, (int(point_img[0]), int(point_img[1])), radius=1, color=(0, 255, 255), thickness=-1)
-            cv2.imwrite(os.path.join(save_path, f'camera/{cam_map[key]}_landmark/{step:05}.png'), road_seg)
-        # # ===========================================================
-
-        # ========================== lidar to bev =====================
-        if vis_lidar_bev:
-            lidar_path = os.path.join(file_path, f'lidar/{step:05}.laz')
-            lidars = laspy.read(lidar_path).xyz
-
-            lidar_image = np.zeros((900, 1600, 3), dtype=np.uint8)
-            header = laspy.LasHeader(point_format=0)  # LARS point format used for storing
-            header.offsets = np.min(lidars, axis=0)
-            point_precision = 0.001
-            header.scales = np.array([point_precision, point_precision, point_precision])
-            point_record = laspy.ScaleAwarePointRecord.zeros(lidars.shape[0], header=header)
-
-            point_record.x = lidars[:, 0]
-            point_record.y = lidars[:, 1]
-            point_record.z = lidars[:, 2]
-            # (x, y,z) -> (y, -x, z), the x,y plane of the lidar system is different from that of the ego-car
-            point_record.x = lidars[:, 1]
-            point_record.y = - lidars[:, 0]
-            point_record.z = lidars[:, 2]
-
-            range_x = 85.0
-            range_y = 85.0
-            range_z = 85.0
-
-            # Normalized point cloud data
-            x_normalized = (point_record.x + range_x) / (2 * range_x)
-            y_normalized = (point_record.y + range_y) / (2 * range_y)
-            z_normalized = (point_record.z + range_z) / (2 * range_z)
-
-            # Convert normalized coordinates to image pixel index
-            x_pixels = x_normalized * (lidar_image.shape[1] - 1)
-            y_pixels = y_normalized * (lidar_image.shape[0] - 1)
-
-            for x, y, z in zip(x_pixels, y_pixels, z_normalized):
-                rgb_color = (255, 255, 255)
-                cv2.circle(lidar_image, (int(x), int(y)), radius=2, color=(int(rgb_color[0]), int(rgb_color[1]), int(rgb_color[2])), thickness=-1)
-
-            cv2.imwrite(os.path.join(save_path, f'lidar_bev/{step:05}.png'), lidar_image)
-            for npc in bounding_boxes:
-                if npc['class'] not in ['vehicle', 'ego_vehicle']: continue
-                if abs(npc['location'][2] - anno['bounding_boxes'][0]['location'][2]) > 10: continue # car in sky and underground
-                verts = calculate_cube_vertices(npc['center'], npc['extent'])
-                verts = np.array(npc['world_cord'])
-                # verts[:, 2] = verts[:, 2] - npc['extent'][2] # carla bbox need minus z 
-                if npc['class'] == 'ego_vehicle':
-                    color = (0, 255, 0)
-                else:
-                    color = (0, 128, 255)
-                for edge in edges:
-                    p1 = verts[edge[0]]
-                    p1 = world_to_ego(p1, anno['bounding_boxes'][0]['world2ego'])
-                    p1_x = (p1[0] + range_x) / (2 * range_x) * (lidar_image.shape[1] - 1)
-                    p1_y = (p1[1] + range_y) / (2 * range_y) * (lidar_image.shape[0] - 1)
-
-                    p2 = verts[edge[1]]
-                    p2 = world_to_ego(p2, anno['bounding_boxes'][0]['world2ego'])
-                    p2_x = (p2[0] + range_x) / (2 * range_x) * (lidar_image.shape[1] - 1)
-                    p2_y = (p2[1] + range_y) / (2 * range_y) * (lidar_image.shape[0] - 1)
-                    cv2.line(lidar_image, (int(p1_x), int(p1_y)), (int(p2_x), int(p2_y)), color, 2)
-
-            cv2.imwrite(os.path.join(save_path, f'lidar/bev/{step:05}.png'), lidar_image)
-        # ===========================================================
-        
-        # ================ lidar to front image =====================
-        if vis_lidar_to_front_image:
-            key = 'CAM_FRONT'
-            K = sensors_anno[key]['intrinsic']
-            visulize_img = cv2.imread(os.path.join(file_path, f'camera/{cam_map[key]}/{step:05}.jpg'))
-            ego2cam = np.matrix(sensors_anno[key]['cam2ego']).I.tolist()
-
-            # lidar in ego coordinate
-            lidar_path = os.path.join(file_path, f'lidar/{step:05}.laz')
-            lidars = laspy.read(lidar_path).xyz
-
-            for lidar in lidars:
-                lidar = np.array([lidar[0], lidar[1], lidar[2], 1])
-                point_camera = np.dot(ego2cam, lidar)
-                point_camera = [point_camera[1], -point_camera[2], point_camera[0]]
-                depth = point_camera[2]
-                point_img = np.dot(K, point_camera)
-                if depth > 0:
-                    point_img[0] /= point_img[2]
-                    point_img[1] /= point_img[2]
-                    point_img = point_img[0:2]
-                    if point_in_canvas_wh(point_img):
-                        color_scale = min(depth / 80, 1)
-                        color = cm.rainbow(color_scale)
-                        color = tuple([int(x*255) for x in color[:3]])
-                        cv2.circle(visulize_img, (int(point_img[0]), int(point_img[1])), radius=2, color=color, thickness=-1)
-            cv2.imwrite(os.path.join(save_path, f'lidar/front/{step:05}_front.png'), visulize_img)
-            # ==========================================================
-
-        # ================ lidar to back image =====================
-        if vis_lidar_to_back_image:
-            key = 'CAM_BACK'
-            K = sensors_anno[key]['intrinsic']
-            visulize_img = cv2.imread(os.path.join(file_path, f'camera/{cam_map[key]}/{step:05}.jpg'))
-            ego2cam = np.matrix(sensors_anno[key]['cam2ego']).I.tolist()
-
-            # lidar in ego coordinate
-            lidar_path = os.path.join(file_path, f'lidar/{step:05}.laz')
-            lidars = laspy.read(lidar_path).xyz
-
-            for lidar in lidars:
-                lidar = np.array([lidar[0], lidar[1], lidar[2], 1])
-                point_camera = np.dot(ego2cam, lidar)
-                point_camera = [point_camera[1], -point_camera[2], point_camera[0]]
-                depth = point_camera[2]
-                point_img = np.dot(K, point_camera)
-                if depth > 0:
-                    point_img[0] /= point_img[2]
-                    point_img[1] /= point_img[2]
-                    point_img = point_img[0:2]
-                    if point_in_canvas_wh(point_img):
-                        color_scale = min(depth / 80, 1)
-                        color = cm.rainbow(color_scale)
-                        color = tuple([int(x*255) for x in color[:3]])
-                        cv2.circle(visulize_img, (int(point_img[0]), int(point_img[1])), radius=2, color=color, thickness=-1)
-            cv2.imwrite(os.path.join(save_path, f'lidar/back/{step:05}_back.png'), visulize_img)
-        # ===========================================================
-
-        # ================ lidar to fomr left image =====================
-        if vis_lidar_to_front_left_image:
-            key = 'CAM_FRONT_LEFT'
-            K = sensors_anno[key]['intrinsic']
-            visulize_img = cv2.imread(os.path.join(file_path, f'camera/{cam_map[key]}/{step:05}.jpg'))
-            ego2cam = np.matrix(sensors_anno[key]['cam2ego']).I.tolist()
-
-            # lidar in ego coordinate
-            lidar_path = os.path.join(file_path, f'lidar/{step:05}.laz')
-            lidars = laspy.read(lidar_path).xyz
-
-            for lidar in lidars:
-                lidar = np.array([lidar[0], lidar[1], lidar[2], 1])
-                point_camera = np.dot(ego2cam, lidar)
-                point_camera = [point_camera[1], -point_camera[2], point_camera[0]]
-                depth = point_camera[2]
-                point_img = np.dot(K, point_camera)
-                if depth > 0:
-                    point_img[0] /= point_img[2]
-                    point_img[1] /= point_img[2]
-                    point_img = point_img[0:2]
-                    if point_in_canvas_wh(point_img):
-                        color_scale = min(depth / 80, 1)
-                        color = cm.rainbow(color_scale)
-                        color = tuple([int(x*255) for x in color[:3]])
-                        cv2.circle(visulize_img, (int(point_img[0]), int(point_img[1])), radius=2, color=color, thickness=-1)
-            cv2.imwrite(os.path.join(save_path, f'lidar/front_left/{step:05}_front_left.png'), visulize_img)
-        # ===========================================================
+    steps = parse_frames(frames, file_count)
+
+    options = dict(vis_bbox=vis_bbox, vis_top_down=vis_top_down, vis_road=vis_road, vis_lidar_bev=vis_lidar_bev,
+                   vis_lidar_to_back_image=vis_lidar_to_back_image, vis_lidar_to_front_image=vis_lidar_to_front_image,
+                   vis_lidar_to_front_left_image=vis_lidar_to_front_left_image)
+    initargs = (file_path, map_path, None if video else str(save_path), options)
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+
+    writers = {}
+    pool = None
+    if num_workers > 0:
+        pool = multiprocessing.Pool(num_workers, initializer=_init_worker, initargs=initargs)
+        results = pool.imap(_render_step, steps)
+    else:
+        _init_worker(*initargs)
+        results = map(_render_step, steps)
+    try:
+        # the steps come back in order, for the videos
+        for step, outputs in tqdm(results, total=len(steps)):
+            if not video:
+                continue
+            for view, img in outputs.items():
+                if view not in writers:
+                    path = str(save_path / (view + '.mp4'))
+                    writers[view] = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (img.shape[1], img.shape[0]))
+                    if not writers[view].isOpened():
+                        raise IOError("Couldn't open the video writer for {}".format(path))
+                writers[view].write(img)
+    finally:
+        if pool is not None:
+            pool.terminate()
+        for writer in writers.values():
+            writer.release()
 
 if __name__ == '__main__':
     import argparse
@@ -407,8 +501,13 @@ if __name__ == '__main__':
     parser.add_argument('--file_path','-f', type=str)
     parser.add_argument('--map_path','-m', type=str)
     parser.add_argument('--save_path','-s', type=str)
+    parser.add_argument('--frames', type=str, default=None, help='steps to render, e.g. 0:100,150,200: (all by default)')
+    parser.add_argument('--num_workers','-j', type=int, default=None, help='rendering processes, all the cpus by default, 0 to render in this process')
+    parser.add_argument('--video', action='store_true', help='save one mp4 video per view instead of the images')
+    parser.add_argument('--fps', type=int, default=10)
 
     args = parser.parse_args()
 
     # map_path = f'./maps/Town{args.map_path}_HD_map.npz'
-    visualize_data(args.file_path, args.map_path, args.save_path, vis_bbox=True, vis_top_down=True, vis_road=True, vis_lidar_bev=True, vis_lidar_to_back_image=True, vis_lidar_to_front_image=True, vis_lidar_to_front_left_image=True)
\ No newline at end of file
+    visualize_data(args.file_path, args.map_path, args.save_path, vis_bbox=True, vis_top_down=True, vis_road=True, vis_lidar_bev=True, vis_lidar_to_back_image=True, vis_lidar_to_front_image=True, vis_lidar_to_front_left_image=True,
+                   frames=args.frames, num_workers=args.num_workers, video=args.video, fps=args.fps)